@@ -0,0 +1,216 @@
+"""Admission control: per-user/session rate limits, upstream concurrency caps and load shedding.
+
+Requests carry a priority class (interactive > normal > batch) in a context
+variable. Every limiter serves waiters in priority order and sheds a request as
+soon as its expected queueing delay would exceed the class's latency budget, so
+overload turns into fast 429/503 responses instead of unbounded tail latency.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+PRIORITY_CLASSES = {"interactive": 0, "normal": 1, "batch": 2}
+
+# Longest a request of each class may wait for a slot before it is shed.
+LATENCY_BUDGETS = {"interactive": 2.0, "normal": 5.0, "batch": 30.0}
+
+current_priority: contextvars.ContextVar[str] = contextvars.ContextVar("current_priority", default="normal")
+
+
+class OverloadedError(Exception):
+    def __init__(self, message: str, retry_after: float, status_code: int = 503):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def try_acquire(self, cost: float = 1.0) -> float:
+        """Take `cost` tokens. Returns 0 on success, otherwise seconds until enough tokens refill."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+
+class KeyedTokenBuckets:
+    """Token bucket per key, keeping only the most recently seen `max_keys` keys."""
+
+    def __init__(self, rate: float, capacity: float, max_keys: int = 100000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rejected = 0
+
+    def try_acquire(self, key: str, cost: float = 1.0) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.capacity)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        wait = bucket.try_acquire(cost)
+        if wait:
+            self.rejected += 1
+        return wait
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent work, granting free slots to the highest-priority waiter first."""
+
+    def __init__(self, name: str, max_concurrency: int):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.waiters: list = []
+        self.sequence = itertools.count()
+        # EWMA of how long a slot is held, used to predict queueing delay.
+        self.service_time = 1.0
+        self.admitted = 0
+        self.shed = 0
+
+    def expected_wait(self, priority: int) -> float:
+        ahead = sum(1 for waiter_priority, _, future in self.waiters
+                    if waiter_priority <= priority and not future.done())
+        return (ahead + 1) * self.service_time / self.max_concurrency
+
+    def _release(self, held_for: float):
+        self.service_time = 0.8 * self.service_time + 0.2 * held_for
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority_class: Optional[str] = None):
+        priority_class = priority_class or current_priority.get()
+        priority = PRIORITY_CLASSES.get(priority_class, 1)
+        budget = LATENCY_BUDGETS.get(priority_class, LATENCY_BUDGETS["normal"])
+
+        # Released slots go straight to live waiters, so a free slot means nobody is queued.
+        if self.active < self.max_concurrency:
+            self.active += 1
+        else:
+            expected = self.expected_wait(priority)
+            if expected > budget:
+                self.shed += 1
+                raise OverloadedError(f"{self.name} is overloaded", retry_after=expected)
+
+            future = asyncio.get_running_loop().create_future()
+            heapq.heappush(self.waiters, (priority, next(self.sequence), future))
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=budget)
+            except asyncio.TimeoutError:
+                if future.done():
+                    # Granted just as we timed out; hand the slot back.
+                    self._release(self.service_time)
+                else:
+                    future.cancel()
+                self.shed += 1
+                raise OverloadedError(f"{self.name} queue exceeded its latency budget",
+                                      retry_after=self.expected_wait(priority))
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self._release(self.service_time)
+                else:
+                    future.cancel()
+                raise
+
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": sum(1 for _, _, future in self.waiters if not future.done()),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_service_seconds": round(self.service_time, 3),
+        }
+
+
+class AdmissionController:
+    def __init__(self, user_rate: float, user_burst: float, session_rate: float, session_burst: float,
+                 max_inflight_requests: int, upstream_limits: Dict[str, int]):
+        self.user_buckets = KeyedTokenBuckets(user_rate, user_burst)
+        self.session_buckets = KeyedTokenBuckets(session_rate, session_burst)
+        self.requests = ConcurrencyLimiter("requests", max_inflight_requests)
+        self.upstreams = {name: ConcurrencyLimiter(name, limit) for name, limit in upstream_limits.items()}
+
+    def check_rate(self, user_key: Optional[str] = None, session_key: Optional[str] = None):
+        """Raise a 429 OverloadedError when the user's or session's token bucket is empty."""
+        if user_key:
+            wait = self.user_buckets.try_acquire(user_key)
+            if wait:
+                raise OverloadedError("Too many requests for this user", retry_after=wait, status_code=429)
+        if session_key:
+            wait = self.session_buckets.try_acquire(session_key)
+            if wait:
+                raise OverloadedError("Too many requests for this session", retry_after=wait, status_code=429)
+
+    async def call_upstream(self, upstream: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        limiter = self.upstreams.get(upstream)
+        if limiter is None:
+            return await call()
+        async with limiter.slot():
+            return await call()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "rate_limited": {"user": self.user_buckets.rejected, "session": self.session_buckets.rejected},
+            "requests": self.requests.metrics(),
+            "upstreams": {name: limiter.metrics() for name, limiter in self.upstreams.items()},
+        }
+
+
+async def run_with_priority(priority_class: str, work: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `work` with upstream calls admitted under `priority_class`."""
+    token = current_priority.set(priority_class)
+    try:
+        return await work()
+    finally:
+        current_priority.reset(token)
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def client_key(forwarded_for: Optional[str], peer: Optional[str], trusted_proxies: int = 1) -> Optional[str]:
+    """Rate-limit key for a request: the client address.
+
+    Behind a reverse proxy every request arrives from the proxy's address, so the
+    client is read from X-Forwarded-For instead: each of the `trusted_proxies`
+    hops appends the address it received from, and the entry the outermost
+    trusted proxy added is the first one a client cannot forge. Identity headers
+    such as X-User-Id are unauthenticated and a client could rotate them for a
+    fresh bucket per request, so they play no part.
+    """
+    hops = [hop.strip() for hop in (forwarded_for or "").split(",") if hop.strip()]
+    if trusted_proxies > 0 and hops:
+        return f"ip:{hops[-min(trusted_proxies, len(hops))]}"
+    return f"ip:{peer}" if peer else None
@@ -0,0 +1,349 @@
+"""Streaming threshold, rate-of-change and anomaly alerts over sensor and spectral streams.
+
+Each stream (field sensors, spectral analyses) keeps fixed-size state per
+series: EWMA mean and variance per metric for z-scores, a reference point per
+rate rule, and a violation flag per rule. Memory is constant per series however
+long it runs. A batch is evaluated in rank order: the first reading of every
+series in one vector step, then the second, and so on, so 100k series cost a
+few array operations per rule rather than a Python loop per reading.
+
+Rules fire on the transition into violation, not on every violating reading.
+Alerts are then deduplicated per (field, rule) with a cooldown and rate-limited
+per field with a token bucket, so a noisy sensor can't flood a farmer.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from sensor_store import EARLIEST_TIMESTAMP, MAX_FUTURE_SECONDS, METRICS as SENSOR_METRICS
+from spectral_monitoring import METRICS as SPECTRAL_METRICS
+
+STREAM_METRICS = {"sensor": SENSOR_METRICS, "spectral": SPECTRAL_METRICS}
+# EWMA weight of each new reading, per stream: sensors report every few seconds, analyses every few days.
+STREAM_ALPHA = {"sensor": 0.02, "spectral": 0.3}
+
+COOLDOWN_SECONDS = 30 * 60
+FIELD_BURST = 5
+FIELD_ALERTS_PER_HOUR = 10
+RECENT_ALERTS_PER_FIELD = 50
+
+DEFAULT_RULES = [
+    {"id": "soil_moisture_low", "stream": "sensor", "metric": "soil_moisture", "kind": "threshold", "below": 15,
+     "severity": "high", "message": "Soil moisture is down to {value:.0f}%. Irrigate soon."},
+    {"id": "soil_moisture_high", "stream": "sensor", "metric": "soil_moisture", "kind": "threshold", "above": 45,
+     "severity": "medium", "message": "Soil moisture is {value:.0f}%, a waterlogging risk. Check drainage."},
+    {"id": "heat_stress", "stream": "sensor", "metric": "air_temperature", "kind": "threshold", "above": 40,
+     "severity": "high", "message": "Air temperature reached {value:.0f}°C. Crops may suffer heat stress."},
+    {"id": "frost_risk", "stream": "sensor", "metric": "air_temperature", "kind": "threshold", "below": 4,
+     "severity": "high", "message": "Air temperature dropped to {value:.0f}°C. Protect crops from frost."},
+    {"id": "fungal_risk", "stream": "sensor", "metric": "humidity", "kind": "threshold", "above": 90,
+     "severity": "medium", "message": "Humidity is {value:.0f}%. Fungal disease risk is high."},
+    {"id": "soil_moisture_drop", "stream": "sensor", "metric": "soil_moisture", "kind": "rate", "below": -5,
+     "per_seconds": 3600, "window_seconds": 1800, "severity": "medium",
+     "message": "Soil moisture is falling {rate:.1f}% per hour."},
+    {"id": "soil_moisture_anomaly", "stream": "sensor", "metric": "soil_moisture", "kind": "zscore", "z": 5,
+     "min_samples": 30, "severity": "low", "message": "Soil moisture reading {value:.1f}% is unusual for this sensor. Check it."},
+    {"id": "air_temperature_anomaly", "stream": "sensor", "metric": "air_temperature", "kind": "zscore", "z": 5,
+     "min_samples": 30, "severity": "low", "message": "Air temperature reading {value:.1f}°C is unusual for this sensor."},
+    {"id": "disease_stress_high", "stream": "spectral", "metric": "disease_stress", "kind": "threshold", "above": 60,
+     "severity": "high", "message": "Spectral disease stress index is {value:.0f}%. Inspect and treat the field."},
+    {"id": "severity_high", "stream": "spectral", "metric": "severity", "kind": "threshold", "above": 7,
+     "severity": "high", "message": "Disease severity scored {value:.0f}/10."},
+    {"id": "ndvi_decline", "stream": "spectral", "metric": "ndvi", "kind": "rate", "below": -0.02,
+     "per_seconds": 86400, "window_seconds": 86400, "severity": "medium",
+     "message": "NDVI is falling {rate:.3f} per day. Crop vigour is declining."},
+    {"id": "ndvi_anomaly", "stream": "spectral", "metric": "ndvi", "kind": "zscore", "z": 3,
+     "min_samples": 5, "severity": "medium", "message": "NDVI of {value:.2f} is far outside this field's usual range."},
+]
+
+
+class _Stream:
+    """State arrays for every series of one stream; grown by doubling as series appear."""
+
+    def __init__(self, name: str, rules: List[Dict[str, Any]]):
+        self.name = name
+        self.metrics = STREAM_METRICS[name]
+        self.alpha = STREAM_ALPHA[name]
+        self.rules = [rule for rule in rules if rule["stream"] == name]
+        self.columns = [self.metrics.index(rule["metric"]) for rule in self.rules]
+        self.keys: List[Tuple[str, str]] = []
+        self.ids: Dict[Tuple[str, str], int] = {}
+        self.capacity = 0
+        self._grow(64)
+
+    def _grow(self, capacity: int):
+        m, r = len(self.metrics), len(self.rules)
+        fresh = {
+            "count": np.zeros((capacity, m), dtype=np.int64),
+            "mean": np.zeros((capacity, m)),
+            "var": np.zeros((capacity, m)),
+            "ref_value": np.full((capacity, r), np.nan),
+            "ref_ts": np.full((capacity, r), np.nan),
+            "violating": np.zeros((capacity, r), dtype=bool),
+        }
+        for name, array in fresh.items():
+            if self.capacity:
+                array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def bytes_per_series(self) -> int:
+        return sum(getattr(self, name).itemsize * getattr(self, name).shape[1]
+                   for name in ("count", "mean", "var", "ref_value", "ref_ts", "violating"))
+
+    def series(self, field_id: str, source: str) -> int:
+        key = (field_id, source)
+        series_id = self.ids.get(key)
+        if series_id is None:
+            series_id = len(self.keys)
+            self.keys.append(key)
+            self.ids[key] = series_id
+            if series_id >= self.capacity:
+                self._grow(self.capacity * 2)
+        return series_id
+
+    def step(self, series: np.ndarray, ts: np.ndarray, values: np.ndarray) -> List[Tuple[int, int, float, float, float]]:
+        """Evaluate one reading for each of `series` (no repeats); returns (series, rule, value, ts, rate) firings."""
+        fired = []
+        count = self.count[series]
+        mean = self.mean[series]
+        std = np.sqrt(self.var[series])
+        present = ~np.isnan(values)
+        for r, (rule, column) in enumerate(zip(self.rules, self.columns)):
+            value = values[:, column]
+            has = present[:, column]
+            rate = np.full(len(series), np.nan)
+            if rule["kind"] == "threshold":
+                breach = has & ((value < rule.get("below", -np.inf)) | (value > rule.get("above", np.inf)))
+            elif rule["kind"] == "rate":
+                ref_value, ref_ts = self.ref_value[series, r], self.ref_ts[series, r]
+                elapsed = ts - ref_ts
+                due = has & (np.isnan(ref_ts) | (elapsed >= rule["window_seconds"]))
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    rate = (value - ref_value) / elapsed * rule["per_seconds"]
+                breach = due & ~np.isnan(rate) & ((rate < rule.get("below", -np.inf)) | (rate > rule.get("above", np.inf)))
+                # Re-anchor once per window so the rate compares like-sized spans.
+                anchor = series[due]
+                self.ref_value[anchor, r] = value[due]
+                self.ref_ts[anchor, r] = ts[due]
+                # Between windows the rate isn't re-evaluated; keep the previous state.
+                breach = np.where(due, breach, self.violating[series, r])
+            else:
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    z = np.abs(value - mean[:, column]) / std[:, column]
+                breach = has & (count[:, column] >= rule["min_samples"]) & (std[:, column] > 0) & (z > rule["z"])
+            # Only the transition into violation fires; the flag clears when the reading recovers.
+            # Series with no reading for this metric keep their previous state.
+            breach = np.where(has, breach, self.violating[series, r])
+            rising = breach & ~self.violating[series, r]
+            self.violating[series, r] = breach
+            for index in np.flatnonzero(rising):
+                fired.append((int(series[index]), r, float(value[index]), float(ts[index]), float(rate[index])))
+
+        # EWMA mean and variance, after evaluation so a reading is scored against its past.
+        alpha = self.alpha
+        first = present & (count == 0)
+        delta = np.where(present, values - mean, 0.0)
+        new_mean = np.where(first, np.nan_to_num(values), mean + alpha * delta)
+        new_var = np.where(first, 0.0, (1 - alpha) * (self.var[series] + alpha * delta * delta))
+        self.mean[series] = np.where(present, new_mean, mean)
+        self.var[series] = np.where(present, new_var, self.var[series])
+        self.count[series] = count + present
+        return fired
+
+
+class AlertEngine:
+    def __init__(self, rules: Optional[List[Dict[str, Any]]] = None, cooldown_seconds: float = COOLDOWN_SECONDS,
+                 burst: int = FIELD_BURST, per_hour: float = FIELD_ALERTS_PER_HOUR,
+                 clock: Callable[[], float] = time.time):
+        self.rules = rules or DEFAULT_RULES
+        self.streams = {name: _Stream(name, self.rules) for name in STREAM_METRICS}
+        self.cooldown_seconds = cooldown_seconds
+        self.burst = burst
+        self.per_hour = per_hour
+        self.clock = clock
+        self.last_fired: Dict[Tuple[str, str], float] = {}
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.stats = {"readings": 0, "rejected": 0, "evaluation_seconds": 0.0, "fired": 0, "deduplicated": 0,
+                      "rate_limited": 0}
+
+    def series_ids(self, stream: str, keys: Sequence[Tuple[str, str]]) -> np.ndarray:
+        """Resolve (field_id, source_id) keys to the stream's series ids, registering new ones."""
+        state = self.streams[stream]
+        with self.lock:
+            return np.fromiter((state.series(field_id, source) for field_id, source in keys), dtype=np.int64, count=len(keys))
+
+    def observe(self, stream: str, groups: Sequence[Tuple[str, str, np.ndarray, np.ndarray]]) -> List[Dict[str, Any]]:
+        """Evaluate readings grouped as (field_id, source_id, timestamps, values[n x metrics])."""
+        if not groups:
+            return []
+        ids = self.series_ids(stream, [(field_id, source) for field_id, source, _, _ in groups])
+        series = np.repeat(ids, [len(ts) for _, _, ts, _ in groups])
+        ts = np.concatenate([ts for _, _, ts, _ in groups]).astype(np.float64, copy=False)
+        values = np.concatenate([vals for _, _, _, vals in groups]).astype(np.float64, copy=False)
+        return self.observe_series(stream, series, ts, values)
+
+    def observe_one(self, stream: str, field_id: str, source: str, timestamp: float, metrics: Dict[str, float]) -> List[Dict[str, Any]]:
+        """Evaluate a single observation given as a metric -> value dict; missing metrics are skipped."""
+        row = [[metrics.get(name, np.nan) for name in self.streams[stream].metrics]]
+        return self.observe(stream, [(field_id, source, np.array([timestamp]), np.array(row, dtype=np.float64))])
+
+    def observe_series(self, stream: str, series: np.ndarray, ts: np.ndarray, values: np.ndarray) -> List[Dict[str, Any]]:
+        """Evaluate readings already resolved to series ids; rows may repeat a series and arrive in any order."""
+        started = time.perf_counter()
+        state = self.streams[stream]
+        # Same window the sensor store accepts; anything outside is a clock or unit error, skipped
+        # before it can move a series' state.
+        valid = (ts >= EARLIEST_TIMESTAMP) & (ts <= time.time() + MAX_FUTURE_SECONDS)
+        with self.lock:
+            self.stats["rejected"] += int((~valid).sum())
+        series, ts, values = series[valid], ts[valid], values[valid]
+        if not len(series):
+            return []
+        order = np.lexsort((ts, series))
+        series, ts, values = series[order], ts[order], values[order]
+        first = np.flatnonzero(np.r_[True, series[1:] != series[:-1]])
+        counts = np.diff(np.r_[first, len(series)])
+        rank = np.arange(len(series)) - np.repeat(first, counts)
+        # Readings of the same rank belong to distinct series, so each rank is one vector step.
+        by_rank = np.argsort(rank, kind="stable")
+        bounds = np.searchsorted(rank[by_rank], np.arange(counts.max() + 1))
+        with self.lock:
+            fired = []
+            for begin, end in zip(bounds[:-1], bounds[1:]):
+                step = by_rank[begin:end]
+                fired.extend(state.step(series[step], ts[step], values[step]))
+            self.stats["readings"] += len(series)
+            self.stats["evaluation_seconds"] += time.perf_counter() - started
+            return self._admit(state, fired)
+
+    def _admit(self, state: _Stream, fired: List[Tuple[int, int, float, float, float]]) -> List[Dict[str, Any]]:
+        now = self.clock()
+        alerts = []
+        for series_id, rule_index, value, ts, rate in fired:
+            field_id, source = state.keys[series_id]
+            rule = state.rules[rule_index]
+            self.stats["fired"] += 1
+            last = self.last_fired.get((field_id, rule["id"]))
+            if last is not None and now - last < self.cooldown_seconds:
+                self.stats["deduplicated"] += 1
+                continue
+            tokens, updated = self.buckets.get(field_id, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) * self.per_hour / 3600)
+            if tokens < 1:
+                self.buckets[field_id] = (tokens, now)
+                self.stats["rate_limited"] += 1
+                continue
+            self.buckets[field_id] = (tokens - 1, now)
+            self.last_fired[(field_id, rule["id"])] = now
+            alerts.append({
+                "action": "alert",
+                "alert_id": next(self.ids),
+                "rule_id": rule["id"],
+                "severity": rule["severity"],
+                "field_id": field_id,
+                "source": source,
+                "metric": rule["metric"],
+                "value": round(value, 4),
+                "message": rule["message"].format(value=value, rate=rate),
+                "observed_at": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(),
+                "timestamp": datetime.utcnow().isoformat(),
+            })
+        return alerts
+
+    def metrics(self) -> Dict[str, Any]:
+        seconds = self.stats["evaluation_seconds"]
+        return {
+            "series": {name: len(stream.keys) for name, stream in self.streams.items()},
+            "state_bytes_per_series": {name: stream.bytes_per_series() for name, stream in self.streams.items()},
+            "rules": len(self.rules),
+            "readings": self.stats["readings"],
+            "readings_per_second": round(self.stats["readings"] / seconds) if seconds else 0,
+            "rejected": self.stats["rejected"],
+            "fired": self.stats["fired"],
+            "deduplicated": self.stats["deduplicated"],
+            "rate_limited": self.stats["rate_limited"],
+        }
+
+
+class AlertHub:
+    """Delivers alerts to the sessions watching a field and to its WebSocket subscribers.
+
+    A session watches the field named by its own `field_id`; a user id is never taken for one.
+    """
+
+    def __init__(self, sessions: Dict[str, dict], recent: int = RECENT_ALERTS_PER_FIELD):
+        self.sessions = sessions
+        self.recent: Dict[str, Deque[Dict[str, Any]]] = {}
+        self.recent_size = recent
+        self.subscribers: Dict[str, List[asyncio.Queue]] = {}
+
+    def subscribe(self, field_id: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self.subscribers.setdefault(field_id, []).append(queue)
+        return queue
+
+    def unsubscribe(self, field_id: str, queue: asyncio.Queue):
+        queues = self.subscribers.get(field_id, [])
+        if queue in queues:
+            queues.remove(queue)
+        if not queues:
+            self.subscribers.pop(field_id, None)
+
+    def publish(self, alerts: List[Dict[str, Any]]):
+        """Call from the event loop thread."""
+        for alert in alerts:
+            field_id = alert["field_id"]
+            self.recent.setdefault(field_id, deque(maxlen=self.recent_size)).append(alert)
+            for session in self.sessions.values():
+                if session.get("field_id") == field_id:
+                    session.setdefault("notifications", []).append(alert)
+            for queue in self.subscribers.get(field_id, []):
+                if not queue.full():
+                    queue.put_nowait(alert)
+
+    def history(self, field_id: str, limit: int = RECENT_ALERTS_PER_FIELD) -> List[Dict[str, Any]]:
+        return list(self.recent.get(field_id, ()))[-limit:][::-1]
+
+
+def benchmark(series: int = 100_000, batches: int = 30, interval_seconds: int = 10, seed: int = 0) -> Dict[str, Any]:
+    """Sustained evaluation: every series reports once per batch, with occasional excursions and spikes."""
+    rng = np.random.default_rng(seed)
+    engine = AlertEngine()
+    base = rng.uniform([20, 18, 20, 50], [40, 28, 34, 80], (series, len(SENSOR_METRICS)))
+    keys = [(f"field-{index // 4}", f"s{index % 4}") for index in range(series)]
+    started = time.perf_counter()
+    alerts = 0
+    origin = time.time()
+    for batch in range(batches):
+        values = base + rng.normal(0, 0.5, base.shape)
+        values[rng.random(series) < 0.001, 0] = 5.0
+        ids = engine.series_ids("sensor", keys)
+        ts = np.full(series, origin + batch * interval_seconds)
+        alerts += len(engine.observe_series("sensor", ids, ts, values))
+    elapsed = time.perf_counter() - started
+    readings = series * batches
+    return {
+        "series": series,
+        "batches": batches,
+        "readings": readings,
+        "seconds": round(elapsed, 3),
+        "readings_per_second": round(readings / elapsed),
+        "evaluation_only_readings_per_second": engine.metrics()["readings_per_second"],
+        "alerts_emitted": alerts,
+        **{key: engine.stats[key] for key in ("fired", "deduplicated", "rate_limited")},
+    }
+
+
+if __name__ == "__main__":
+    import json
+
+    print(json.dumps(benchmark(), indent=2))
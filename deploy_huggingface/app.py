@@ -4,25 +4,92 @@ import io
 import json
 import logging
 import os
+import shutil
+import tempfile
+import threading
+import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Type, TypeVar, Union
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile, WebSocket, Body
+from fastapi import FastAPI, File, Form, Header, HTTPException, Request, UploadFile, WebSocket, WebSocketDisconnect, Body
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from google.cloud import speech, texttospeech, vision
 from google.oauth2 import service_account
 
 import random
 
 import vertexai
-from vertexai.generative_models import GenerativeModel, Part
+from vertexai.generative_models import GenerationConfig as VertexGenerationConfig, GenerativeModel, Part
+from pydantic import BaseModel
+
+from alerts import DEFAULT_RULES as ALERT_RULES, AlertEngine, AlertHub
+from admission import AdmissionController, OverloadedError, client_key, current_priority, retry_after_header, run_with_priority
+from model_router import ModelRouter, NoRouteAvailableError
+from prompts import (
+    PROMPTS, ContextCache, RenderedPrompt, configure_profiles, extractive_summary, generation_config, personalize,
+    run_with_farmer_context
+)
+from schemas import BookingDetails, MarketQuery, Workflow, WorkflowStep
+from structured import (
+    IncrementalArrayParser,
+    StructuredOutputError,
+    StructuredOutputStats,
+    compact_schema,
+    parse_json,
+    response_schema,
+    validate,
+)
+from workflow_cache import WorkflowCache, schema_version
+from resilience import UpstreamGuard, current_deadline, remaining, run_with_deadline, within_deadline
+from jobs import FINISHED_STATES as JOB_FINISHED_STATES, PRIORITIES as JOB_PRIORITIES, JobQueue, QueueFullError
+from scheduler import ReminderScheduler, SessionNotifier
+from schemes_kb import SchemeKnowledgeBase, detect_aspect
+from mandi_prices import MandiPriceStore, describe as describe_prices
+from price_forecast import PriceForecaster, describe as describe_forecast
+from cold_storage import (
+    CapacityError, ColdStorageStore, day_number as storage_day, describe_options as describe_storage_options,
+    parse_choice as parse_storage_choice, parse_duration_days, parse_quantity_quintals
+)
+from eligibility import EligibilityEngine, FarmerTable, describe_check, describe_matches
+from profiles import ALSO_PATTERN, FIELD_LABELS, ProfileStore, missing_fields, parse_details as parse_profile_details, profile_context
+from community import CommunityStore, TermIndex, describe as describe_community
+from marketplace import CHEAP_PATTERN, ProductCatalog, describe as describe_products, parse_price_limit, products_from_csv
+from orders import STATUSES as ORDER_STATUSES, IdempotencyConflict, OrderStore, describe as describe_order
+from crop_recommendation import CropRecommender, describe as describe_crops, plots_from_csv
+from sensor_store import SensorStore, describe as describe_sensors, parse_timestamp as parse_sensor_time, readings_from_payload
+from singleflight import SingleFlight, make_key, normalize_prompt
+from spectral import (
+    SpectralCubeError,
+    compute_field_statistics,
+    hyperspectral_data_from_statistics,
+    is_cube_filename,
+    open_cube,
+    parse_measurement,
+)
+from spectral_monitoring import SpectralMonitoringStore, observation_from_analysis
+from spectral_tiles import TILE_FORMATS, SpectralMapService, TileCache
 
 # Initialize FastAPI
 app = FastAPI(title="Project Kisan - Smart Agent System")
 
+INTERACTIVE_PATHS = {
+    "/api/agent/chat",
+    "/api/agent/voice-command",
+    "/api/agent/continue-task",
+    "/api/agent/navigate",
+    "/api/agent/start-session",
+    "/api/tts/speak",
+}
+BATCH_PATHS = {"/api/spectral/cubes", "/api/schemes/eligibility/batch", "/api/market/prices/ingest", "/api/crops/recommend/batch",
+               "/api/crop-monitor/readings", "/api/marketplace/catalog/import"}
+UNGATED_PATHS = {"/", "/health", "/api/metrics"}
+# Map tiles are cheap, cached and fetched dozens per pan; they take an in-flight slot but no rate tokens
+RATE_EXEMPT_PREFIXES = ("/api/spectral-maps/",)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,6 +99,9 @@ app.add_middleware(
 )
 
 import google.generativeai as genai
+from google.generativeai import caching as genai_caching
+from vertexai.preview import caching as vertex_caching
+from vertexai.preview.generative_models import GenerativeModel as PreviewGenerativeModel
 
 # Configure Gemini API
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -40,6 +110,62 @@ if GEMINI_API_KEY:
 else:
     logging.warning("GEMINI_API_KEY environment variable not set. Gemini features will be limited.")
 
+# Local storage for uploaded captures and on-box data stores
+DATA_DIR = os.getenv("KISAN_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+SPECTRAL_DATA_DIR = os.path.join(DATA_DIR, "spectral")
+SPECTRAL_TILE_CACHE_MB = int(os.getenv("SPECTRAL_TILE_CACHE_MB", "512"))
+
+# Admission control: per-client/session token buckets and per-upstream concurrency caps
+RATE_LIMIT_USER_PER_MINUTE = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", "60"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "20"))
+RATE_LIMIT_SESSION_PER_MINUTE = float(os.getenv("RATE_LIMIT_SESSION_PER_MINUTE", "30"))
+RATE_LIMIT_SESSION_BURST = float(os.getenv("RATE_LIMIT_SESSION_BURST", "10"))
+MAX_INFLIGHT_REQUESTS = int(os.getenv("MAX_INFLIGHT_REQUESTS", "128"))
+# Reverse proxies in front of the app (the Hugging Face Spaces proxy); 0 when clients connect directly
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "1"))
+UPSTREAM_CONCURRENCY = {
+    "gemini": int(os.getenv("GEMINI_MAX_CONCURRENCY", "8")),
+    "vertex": int(os.getenv("VERTEX_MAX_CONCURRENCY", "8")),
+    "vision": int(os.getenv("VISION_MAX_CONCURRENCY", "16")),
+    "speech": int(os.getenv("SPEECH_MAX_CONCURRENCY", "16")),
+    "tts": int(os.getenv("TTS_MAX_CONCURRENCY", "16")),
+}
+
+# Per-request deadlines by priority class, and circuit breakers for upstream calls
+REQUEST_DEADLINE_SECONDS = {
+    "interactive": float(os.getenv("INTERACTIVE_DEADLINE_SECONDS", "15")),
+    "normal": float(os.getenv("NORMAL_DEADLINE_SECONDS", "60")),
+    "batch": float(os.getenv("BATCH_DEADLINE_SECONDS", "300")),
+}
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RECOVERY_SECONDS = float(os.getenv("BREAKER_RECOVERY_SECONDS", "30"))
+
+# Per-profile output budgets, e.g. {"long_report": {"max_output_tokens": 1024}}
+GENERATION_PROFILE_OVERRIDES = os.getenv("GENERATION_PROFILE_OVERRIDES")
+if GENERATION_PROFILE_OVERRIDES:
+    configure_profiles(json.loads(GENERATION_PROFILE_OVERRIDES))
+
+# Government schemes knowledge base; an embedding model adds semantic retrieval on top of BM25
+SCHEMES_PATH = os.getenv("SCHEMES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge", "schemes.json"))
+SCHEMES_EMBEDDING_MODEL = os.getenv("SCHEMES_EMBEDDING_MODEL")
+SCHEMES_TOP_K = int(os.getenv("SCHEMES_TOP_K", "3"))
+
+# Commodities summarized per market query from the local mandi price store
+MARKET_MAX_COMMODITIES = int(os.getenv("MARKET_MAX_COMMODITIES", "5"))
+PRICE_FORECAST_REFRESH_SECONDS = float(os.getenv("PRICE_FORECAST_REFRESH_SECONDS", str(6 * 3600)))
+CROPS_PATH = os.getenv("CROPS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge", "crops.json"))
+DISTRICTS_PATH = os.getenv("DISTRICTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge", "districts.json"))
+CROP_HEALTH_TERMS_PATH = os.getenv(
+    "CROP_HEALTH_TERMS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge", "crop_health_terms.json")
+)
+COLD_STORAGE_FACILITIES_PATH = os.getenv(
+    "COLD_STORAGE_FACILITIES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge", "cold_storages.json")
+)
+
+# Background job pool for async task execution
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_RESULT_TTL_SECONDS = int(os.getenv("JOB_RESULT_TTL_SECONDS", "3600"))
+
 # Configure Vertex AI
 GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
 GOOGLE_CLOUD_LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION")
@@ -56,114 +182,422 @@ else:
     logging.warning("GOOGLE_CLOUD_PROJECT or GOOGLE_CLOUD_LOCATION environment variables not set. Vertex AI features will be limited.")
 
 # Helper Functions
-async def process_image_with_gcp(image_file: UploadFile, language: str):
+admission = AdmissionController(
+    user_rate=RATE_LIMIT_USER_PER_MINUTE / 60,
+    user_burst=RATE_LIMIT_USER_BURST,
+    session_rate=RATE_LIMIT_SESSION_PER_MINUTE / 60,
+    session_burst=RATE_LIMIT_SESSION_BURST,
+    max_inflight_requests=MAX_INFLIGHT_REQUESTS,
+    upstream_limits=UPSTREAM_CONCURRENCY
+)
+
+upstream_guard = UpstreamGuard(
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    recovery_seconds=BREAKER_RECOVERY_SECONDS
+)
+
+# Identical concurrent upstream calls share one request and one result
+llm_flight = SingleFlight("llm")
+vision_flight = SingleFlight("vision")
+speech_flight = SingleFlight("speech")
+tts_flight = SingleFlight("tts")
+
+def get_gcp_credentials():
+    credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    if not credentials_json:
+        raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable not set.")
+
+    credentials_info = json.loads(credentials_json)
+    return service_account.Credentials.from_service_account_info(credentials_info)
+
+def _generate_text_sync(prompt: str, model_name: str, backend: str, timeout: Optional[float] = None,
+                        system_instruction: Optional[str] = None, cached_content: Any = None,
+                        config: Optional[dict] = None):
+    """Generate text and return it with the response's usage metadata
+
+    Callers run this through asyncio.to_thread, and a deadline there stops the
+    wait, not the call: the Gemini API gets `timeout` as its request timeout, but
+    the Vertex SDK takes none, so a timed-out Vertex call keeps its worker thread
+    until the SDK returns.
+    """
+    if backend == "vertex":
+        if cached_content is not None:
+            model = PreviewGenerativeModel.from_cached_content(cached_content)
+        else:
+            model = GenerativeModel(model_name, system_instruction=system_instruction)
+        response = model.generate_content(prompt, generation_config=VertexGenerationConfig(**config) if config else None)
+    else:
+        if cached_content is not None:
+            model = genai.GenerativeModel.from_cached_content(cached_content)
+        else:
+            model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        request_options = {"timeout": timeout} if timeout else None
+        response = model.generate_content(prompt, generation_config=config, request_options=request_options)
+    return response.text, getattr(response, "usage_metadata", None)
+
+def _stream_text_sync(prompt: str, model_name: str, backend: str, timeout: Optional[float], config: dict,
+                      emit: Callable[[str], None], stopped: Callable[[], bool]):
+    """Stream generated text to `emit` chunk by chunk until done or `stopped()`
+
+    `stopped()` is checked between chunks, so an abandoned stream ends at the next
+    chunk; as with _generate_text_sync, only the Gemini API gets `timeout`.
+    """
+    if backend == "vertex":
+        chunks = GenerativeModel(model_name).generate_content(
+            prompt, generation_config=VertexGenerationConfig(**config), stream=True
+        )
+    else:
+        request_options = {"timeout": timeout} if timeout else None
+        chunks = genai.GenerativeModel(model_name).generate_content(
+            prompt, generation_config=config, stream=True, request_options=request_options
+        )
+    for chunk in chunks:
+        if stopped():
+            break
+        if chunk.text:
+            emit(chunk.text)
+
+def _create_prompt_cache_sync(backend: str, model_name: str, prefix: str, ttl_seconds: int):
+    ttl = timedelta(seconds=ttl_seconds)
+    if backend == "vertex":
+        return vertex_caching.CachedContent.create(model_name=model_name, system_instruction=prefix, ttl=ttl)
+    return genai_caching.CachedContent.create(model=f"models/{model_name}", system_instruction=prefix, ttl=ttl)
+
+async def create_prompt_cache(backend: str, model_name: str, prefix: str, ttl_seconds: int):
+    return await asyncio.to_thread(_create_prompt_cache_sync, backend, model_name, prefix, ttl_seconds)
+
+prompt_cache = ContextCache(create_prompt_cache)
+structured_stats = StructuredOutputStats()
+workflow_cache = WorkflowCache(
+    max_entries=int(os.getenv("WORKFLOW_CACHE_ENTRIES", "1000")),
+    ttl_seconds=float(os.getenv("WORKFLOW_CACHE_TTL_SECONDS", str(24 * 3600)))
+)
+
+schemes_kb = SchemeKnowledgeBase.load(SCHEMES_PATH)
+PROMPTS.attach_reference("gov_schemes", "Scheme records", schemes_kb.catalog())
+eligibility_engine = EligibilityEngine(schemes_kb.records)
+crop_recommender = CropRecommender.load(CROPS_PATH, DISTRICTS_PATH)
+
+def _embed_sync(texts: List[str], task_type: str, timeout: Optional[float] = None) -> List[List[float]]:
+    request_options = {"timeout": timeout} if timeout else None
+    result = genai.embed_content(model=SCHEMES_EMBEDDING_MODEL, content=texts, task_type=task_type,
+                                 request_options=request_options)
+    return result["embedding"]
+
+async def search_schemes(query: str, k: int = SCHEMES_TOP_K) -> List[Dict[str, Any]]:
+    """Top-k scheme records for a query; BM25 alone when embeddings are off or the embedding call fails"""
+    query_vector = None
+    if schemes_kb.embeddings is not None:
+        try:
+            query_vector = (await upstream_guard.call("gemini/embedding", lambda timeout: admission.call_upstream(
+                "gemini", lambda: asyncio.to_thread(_embed_sync, [query], "retrieval_query", timeout)
+            )))[0]
+        except Exception as e:
+            logging.warning(f"Scheme query embedding failed, using keyword search only: {e}")
+    return schemes_kb.search(query, k, query_vector)
+
+def timeout_kwargs(timeout: Optional[float]) -> dict:
+    """Pass the remaining deadline to a GCP client call, keeping its default timeout otherwise"""
+    return {"timeout": timeout} if timeout else {}
+
+def available_llm_backends() -> List[str]:
+    backends = []
+    if GEMINI_API_KEY:
+        backends.append("gemini")
+    if GOOGLE_CLOUD_PROJECT and GOOGLE_CLOUD_LOCATION:
+        backends.append("vertex")
+    return backends
+
+model_router = ModelRouter(
+    available_llm_backends,
+    route_available=lambda route: upstream_guard.available("/".join(route))
+)
+
+def route_config(profile: str, model_name: str, response_model: Optional[Type[BaseModel]] = None) -> dict:
+    """Generation config for one route: the profile's budget for that model, JSON-constrained if asked"""
+    config = generation_config(profile, model_name)
+    if response_model:
+        config["response_mime_type"] = "application/json"
+        config["response_schema"] = response_schema(response_model)
+    return config
+
+async def generate_text(prompt: Union[str, RenderedPrompt], task_class: Optional[str] = None,
+                        profile: Optional[str] = None, response_model: Optional[Type[BaseModel]] = None) -> str:
+    """Generate text on the model tier and backend the router picks for the task class.
+
+    Output is bounded by the generation profile (the template's, else the task
+    class's), and constrained to JSON matching `response_model` when one is given.
+    Registry prompts send their static prefix as the system instruction, served from
+    a context cache when the route has one. Identical in-flight prompts for the same
+    task class, profile and schema share one routed call.
+    """
+    if isinstance(prompt, RenderedPrompt):
+        task_class = task_class or prompt.template.task_class
+        profile = profile or prompt.template.profile
+        body = prompt.body
+    else:
+        task_class = task_class or "chat"
+        profile = profile or task_class
+        body = prompt
+    schema_name = response_model.__name__ if response_model else None
+    prefix_hash = prompt.template.prefix_hash if isinstance(prompt, RenderedPrompt) else None
+    key = make_key(task_class, profile, schema_name, prefix_hash, normalize_prompt(body))
+
+    async def generate(backend: str, model_name: str, timeout: Optional[float]) -> str:
+        config = route_config(profile, model_name, response_model)
+        if not isinstance(prompt, RenderedPrompt):
+            text, _ = await asyncio.to_thread(
+                _generate_text_sync, prompt, model_name, backend, timeout, None, None, config
+            )
+            return text
+
+        cached_content = await prompt_cache.get(backend, model_name, prompt)
+        started = time.monotonic()
+        text, usage = await asyncio.to_thread(
+            _generate_text_sync, prompt.body, model_name, backend, timeout,
+            prompt.prefix if cached_content is None else None, cached_content, config
+        )
+        PROMPTS.record(
+            prompt.name, prompt.estimated_tokens, time.monotonic() - started,
+            prompt_tokens=getattr(usage, "prompt_token_count", 0) or 0,
+            cached_tokens=getattr(usage, "cached_content_token_count", 0) or 0,
+            output_tokens=getattr(usage, "candidates_token_count", 0) or 0
+        )
+        return text
+
+    def invoke(backend: str, model_name: str):
+        return upstream_guard.call(f"{backend}/{model_name}", lambda timeout: admission.call_upstream(
+            backend, lambda: generate(backend, model_name, timeout)
+        ))
+
+    return await within_deadline(llm_flight.do(key, lambda: model_router.call(task_class, invoke)))
+
+async def stream_text(prompt: str, task_class: str, response_model: Optional[Type[BaseModel]] = None) -> AsyncIterator[str]:
+    """Stream text from the best available route for the task class.
+
+    Streams are not hedged or coalesced. A route that fails before its first chunk
+    fails over to the next one; after that the error reaches the caller.
+    """
+    loop = asyncio.get_running_loop()
+    last_error: Optional[Exception] = None
+    for route in model_router.candidates(task_class):
+        backend, model_name = route
+        breaker = upstream_guard.breaker(f"{backend}/{model_name}")
+        if not breaker.available:
+            continue
+
+        config = route_config(task_class, model_name, response_model)
+        chunks: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        async def produce(route, config, breaker, chunks, stop):
+            # Every outcome ends up in `chunks` so the consumer never waits on a producer that died.
+            backend, model_name = route
+            try:
+                breaker.before_call()
+            except Exception as e:
+                chunks.put_nowait(e)
+                return
+            started = time.monotonic()
+            try:
+                await admission.call_upstream(backend, lambda: asyncio.to_thread(
+                    _stream_text_sync, prompt, model_name, backend, remaining(), config,
+                    lambda text: loop.call_soon_threadsafe(chunks.put_nowait, text), stop.is_set
+                ))
+            except OverloadedError as e:
+                # Shed locally before reaching the upstream; says nothing about its health.
+                breaker.on_abandoned()
+                chunks.put_nowait(e)
+                return
+            except asyncio.CancelledError:
+                breaker.on_abandoned()
+                raise
+            except Exception as e:
+                breaker.on_failure()
+                model_router.record(task_class, route, time.monotonic() - started, success=False)
+                chunks.put_nowait(e)
+                return
+            breaker.on_success()
+            model_router.record(task_class, route, time.monotonic() - started, success=True)
+            chunks.put_nowait(None)
+
+        producer = asyncio.create_task(produce(route, config, breaker, chunks, stop))
+        streamed = False
+        try:
+            while True:
+                item = await within_deadline(chunks.get())
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                streamed = True
+                yield item
+        except OverloadedError:
+            raise
+        except Exception as e:
+            if streamed:
+                raise
+            logging.warning(f"Streaming from {backend}/{model_name} failed, trying the next route: {e}")
+            last_error = e
+        finally:
+            stop.set()
+            if not producer.done():
+                producer.cancel()
+
+    raise last_error or NoRouteAvailableError(f"No healthy route for {task_class}")
+
+StructuredModel = TypeVar("StructuredModel", bound=BaseModel)
+
+async def generate_structured(prompt: Union[str, RenderedPrompt], model: Type[StructuredModel],
+                              task_class: Optional[str] = None, profile: Optional[str] = None) -> StructuredModel:
+    """Generate JSON validated into `model`.
+
+    Malformed output is repaired locally first; the model is re-asked with a compact
+    repair prompt only when that fails. Raises StructuredOutputError if both do.
+    """
+    result, _ = await generate_structured_checked(prompt, model, task_class, profile)
+    return result
+
+async def generate_structured_checked(prompt: Union[str, RenderedPrompt], model: Type[StructuredModel],
+                                      task_class: Optional[str] = None,
+                                      profile: Optional[str] = None) -> Tuple[StructuredModel, bool]:
+    """generate_structured, plus whether the JSON that validated parsed as returned (no local repair)"""
+    text = await generate_text(prompt, task_class, profile, response_model=model)
     try:
-        credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
-        if not credentials_json:
-            raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable not set.")
-        
-        credentials_info = json.loads(credentials_json)
-        credentials = service_account.Credentials.from_service_account_info(credentials_info)
-        client = vision.ImageAnnotatorClient(credentials=credentials)
+        value, repaired = parse_json(text)
+        result = validate(model, value)
+        structured_stats.record(model.__name__, "repaired" if repaired else "clean")
+        return result, not repaired
+    except StructuredOutputError as e:
+        error = e
+
+    logging.warning(f"Re-asking for {model.__name__} after local repair failed: {error}")
+    try:
+        repair_prompt = PROMPTS.render("json_repair", schema=compact_schema(model), error=error, original=text)
+        value, repaired = parse_json(await generate_text(repair_prompt, profile=profile, response_model=model))
+        result = validate(model, value)
+    except StructuredOutputError:
+        structured_stats.record(model.__name__, "failed")
+        raise
+    structured_stats.record(model.__name__, "reasked")
+    return result, not repaired
 
-        content = await image_file.read()
-        image = vision.Image(content=content)
-        response = client.label_detection(image=image)
-        labels = response.label_annotations
-
-        analysis = {
-            "labels": [],
-            "primary_object": None,
-            "confidence": 0
-        }
+async def summarize_for_speech(report: str, context: str) -> str:
+    """A short spoken summary of a report, generated separately rather than cut from it"""
+    try:
+        return (await generate_text(PROMPTS.render("spoken_summary", context=context, report=report))).strip()
+    except Exception as e:
+        logging.error(f"Spoken summary generation failed: {e}")
+        return extractive_summary(report)
+
+def _label_image_sync(content: bytes, timeout: Optional[float] = None) -> dict:
+    client = vision.ImageAnnotatorClient(credentials=get_gcp_credentials())
+    image = vision.Image(content=content)
+    response = client.label_detection(image=image, **timeout_kwargs(timeout))
+    labels = response.label_annotations
+
+    analysis = {
+        "labels": [],
+        "primary_object": None,
+        "confidence": 0
+    }
 
-        if labels:
-            analysis["primary_object"] = labels[0].description
-            analysis["confidence"] = labels[0].score
-            for label in labels:
-                analysis["labels"].append({"description": label.description, "score": label.score})
+    if labels:
+        analysis["primary_object"] = labels[0].description
+        analysis["confidence"] = labels[0].score
+        for label in labels:
+            analysis["labels"].append({"description": label.description, "score": label.score})
+
+    return analysis
 
-        return analysis
+async def process_image_with_gcp(image_file: UploadFile, language: str):
+    try:
+        content = await image_file.read()
+        return await within_deadline(vision_flight.do(make_key(content), lambda: upstream_guard.call(
+            "vision", lambda timeout: admission.call_upstream(
+                "vision", lambda: asyncio.to_thread(_label_image_sync, content, timeout)
+            )
+        )))
     except Exception as e:
         logging.error(f"Error in process_image_with_gcp: {e}")
         raise
 
-async def process_audio_with_gcp(audio_file: UploadFile, language: str):
-    try:
-        credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
-        if not credentials_json:
-            raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable not set.")
+def _recognize_speech_sync(content: bytes, language: str, timeout: Optional[float] = None):
+    client = speech.SpeechClient(credentials=get_gcp_credentials())
+    audio = speech.RecognitionAudio(content=content)
+    config = speech.RecognitionConfig(
+        encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
+        sample_rate_hertz=48000,
+        language_code=language,
+    )
 
-        credentials_info = json.loads(credentials_json)
-        credentials = service_account.Credentials.from_service_account_info(credentials_info)
-        client = speech.SpeechClient(credentials=credentials)
+    response = client.recognize(config=config, audio=audio, **timeout_kwargs(timeout))
+    logging.info(f"Speech-to-Text API response: {response}")
 
+    if response.results:
+        return response.results[0].alternatives[0].transcript
+    else:
+        return None
+
+async def process_audio_with_gcp(audio_file: UploadFile, language: str):
+    try:
         content = await audio_file.read()
         logging.info(f"Received audio file with size: {len(content)} bytes")
-        audio = speech.RecognitionAudio(content=content)
-        config = speech.RecognitionConfig(
-            encoding=speech.RecognitionConfig.AudioEncoding.WEBM_OPUS,
-            sample_rate_hertz=48000,
-            language_code=language,
-        )
-
-        response = client.recognize(config=config, audio=audio)
-        logging.info(f"Speech-to-Text API response: {response}")
-
-        if response.results:
-            return response.results[0].alternatives[0].transcript
-        else:
-            return None
+        return await within_deadline(speech_flight.do(
+            make_key(language, content),
+            lambda: upstream_guard.call("speech", lambda timeout: admission.call_upstream(
+                "speech", lambda: asyncio.to_thread(_recognize_speech_sync, content, language, timeout)
+            ))
+        ))
     except Exception as e:
         logging.error(f"Error in process_audio_with_gcp: {e}")
         raise
 
-async def generate_speech_with_gcp(text: str, language: str):
-    try:
-        credentials_json = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
-        if not credentials_json:
-            raise Exception("GOOGLE_APPLICATION_CREDENTIALS environment variable not set.")
+def _synthesize_speech_sync(text: str, language: str, timeout: Optional[float] = None) -> bytes:
+    client = texttospeech.TextToSpeechClient(credentials=get_gcp_credentials())
 
-        credentials_info = json.loads(credentials_json)
-        credentials = service_account.Credentials.from_service_account_info(credentials_info)
-        client = texttospeech.TextToSpeechClient(credentials=credentials)
+    input_text = texttospeech.SynthesisInput(text=text)
 
-        input_text = texttospeech.SynthesisInput(text=text)
+    # Set the voice parameters
+    voice = texttospeech.VoiceSelectionParams(
+        language_code=language,
+        ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL,
+    )
 
-        # Set the voice parameters
-        voice = texttospeech.VoiceSelectionParams(
-            language_code=language,
-            ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL,
-        )
+    # Set the audio configuration
+    audio_config = texttospeech.AudioConfig(
+        audio_encoding=texttospeech.AudioEncoding.MP3,
+    )
 
-        # Set the audio configuration
-        audio_config = texttospeech.AudioConfig(
-            audio_encoding=texttospeech.AudioEncoding.MP3,
-        )
+    response = client.synthesize_speech(
+        input=input_text, voice=voice, audio_config=audio_config, **timeout_kwargs(timeout)
+    )
 
-        response = client.synthesize_speech(
-            input=input_text, voice=voice, audio_config=audio_config
-        )
+    return response.audio_content
 
-        return response.audio_content
+async def generate_speech_with_gcp(text: str, language: str):
+    try:
+        return await within_deadline(tts_flight.do(
+            make_key(language, normalize_prompt(text)),
+            lambda: upstream_guard.call("tts", lambda timeout: admission.call_upstream(
+                "tts", lambda: asyncio.to_thread(_synthesize_speech_sync, text, language, timeout)
+            ))
+        ))
     except Exception as e:
         logging.error(f"Error in generate_speech_with_gcp: {e}")
         raise
 
 async def detect_intent(user_input: str):
     try:
-        if not GEMINI_API_KEY:
-            raise Exception("Gemini API key not configured.")
-        
-        model = genai.GenerativeModel('gemini-2.5-pro')
         prompt = f"""Classify the user's intent into one of the following categories: DISEASE_ANALYSIS, COLD_STORAGE_BOOKING, FORM_FILLING, CROP_RECOMMENDATION, NAVIGATION, or GENERAL_QUERY.
 
         User input: "{user_input}"
 
         Intent:"""
-        response = model.generate_content(prompt)
-        intent = response.text.strip()
+        intent = (await generate_text(prompt, "classify")).strip()
         return intent
+    except OverloadedError:
+        raise
     except Exception as e:
         logging.error(f"Gemini intent detection failed: {e}")
         return "GENERAL_QUERY"
@@ -172,7 +606,8 @@ async def detect_intent(user_input: str):
 class AgentState:
     def __init__(self):
         self.sessions = {}
-        self.user_profiles = {}
+        # Read-through cache of the profile store, most recently used last
+        self.user_profiles = OrderedDict()
         self.task_flows = {}
 
 class TaskType(Enum):
@@ -208,8 +643,17 @@ class KisanSmartAgent:
     
     async def execute_task(self, session_id: str, task_type: str, user_input: str = None, file: UploadFile = None):
         """Main agent entry point - handles any task automatically"""
-        session = agent_state.sessions.get(session_id, {})
-        
+        return await self.with_farmer_context(
+            session_id, lambda: self.dispatch_task(session_id, task_type, user_input, file)
+        )
+
+    async def with_farmer_context(self, session_id: str, work: Callable[[], Any]):
+        """Run `work` with the session farmer's profile line available to personalized prompts"""
+        session = agent_state.sessions.get(session_id) or {}
+        context = await asyncio.to_thread(profile_store.context, session.get("user_id"), session.get("language"))
+        return await run_with_farmer_context(context, work)
+
+    async def dispatch_task(self, session_id: str, task_type: str, user_input: str = None, file: UploadFile = None):
         if task_type == TaskType.DISEASE_ANALYSIS.value:
             return await self.handle_disease_analysis(session_id, user_input, file)
         elif task_type == TaskType.FORM_FILLING.value:
@@ -260,50 +704,29 @@ class KisanSmartAgent:
             # Step 1: Perform detailed disease analysis
             analysis_result = await self.analyze_disease_detailed(file, crop_name)
 
-            # Step 2: Add hyperspectral simulation data
-            hyperspectral_data = self.generate_hyperspectral_data(analysis_result)
+            # Step 2: Add hyperspectral data (measured from the session's cube when available)
+            hyperspectral_data = self.generate_hyperspectral_data(analysis_result, session_id)
 
             # Step 3: Enhanced analysis with hyperspectral insights
             if analysis_result["has_disease"]:
                 severity_score = analysis_result.get("severity_score", 5)
 
                 try:
-                    if not GEMINI_API_KEY:
-                        raise Exception("Gemini API key not configured.")
-
-                    model = genai.GenerativeModel('gemini-2.5-pro')
-
-                    # Advanced analysis prompt with hyperspectral data
-                    advanced_prompt = f"""
-                    Provide comprehensive advanced disease analysis for {crop_name}:
-
-                    DISEASE ANALYSIS RESULTS:
-                    - Disease Type: {analysis_result["disease_type"]}
-                    - Severity Score: {severity_score}/10
-                    - Confidence: {analysis_result["confidence"]:.2%}
-                    - Affected Areas: {', '.join(analysis_result.get("affected_areas", ["Unknown"]))}
-
-                    HYPERSPECTRAL DATA:
-                    - Chlorophyll Content: {hyperspectral_data["chlorophyll_content"]}
-                    - Water Stress Level: {hyperspectral_data["water_stress"]}
-                    - Nutrient Deficiency: {hyperspectral_data["nutrient_deficiency"]}
-                    - Disease Stress Index: {hyperspectral_data["disease_stress_index"]}
-
-                    Please provide:
-                    1. **Advanced Disease Diagnosis**: Specific pathogen identification based on visual and hyperspectral data
-                    2. **Physiological Impact**: How the disease affects plant physiology (photosynthesis, water uptake, nutrient absorption)
-                    3. **Stress Analysis**: Interpretation of hyperspectral stress indicators
-                    4. **Precision Treatment**: Specific fungicides/herbicides with exact dosages and application methods
-                    5. **Recovery Timeline**: Expected recovery time and monitoring milestones
-                    6. **Preventive Protocols**: Advanced prevention strategies including resistant varieties
-                    7. **Economic Impact**: Potential yield loss and cost-benefit analysis of treatments
-                    8. **Expert Consultation**: When and why to consult agricultural pathologists
-
-                    Format as a professional agricultural pathology report with actionable recommendations.
-                    """
-
-                    response = model.generate_content(advanced_prompt)
-                    advanced_treatment = response.text
+
+                    advanced_prompt = PROMPTS.render(
+                        "advanced_disease",
+                        crop=crop_name,
+                        disease_type=analysis_result["disease_type"],
+                        severity_score=severity_score,
+                        confidence=f"{analysis_result['confidence']:.2%}",
+                        affected_areas=', '.join(analysis_result.get("affected_areas", ["Unknown"])),
+                        chlorophyll_content=hyperspectral_data["chlorophyll_content"],
+                        water_stress=hyperspectral_data["water_stress"],
+                        nutrient_deficiency=hyperspectral_data["nutrient_deficiency"],
+                        disease_stress_index=hyperspectral_data["disease_stress_index"]
+                    )
+
+                    advanced_treatment = await generate_text(advanced_prompt)
 
                 except Exception as e:
                     logging.error(f"Advanced Gemini analysis failed: {e}")
@@ -358,56 +781,26 @@ class KisanSmartAgent:
             visual_analysis = await self.analyze_disease_detailed(file, crop_name)
 
             # Step 2: Generate comprehensive hyperspectral data
-            hyperspectral_data = self.generate_hyperspectral_data(visual_analysis)
+            hyperspectral_data = self.generate_hyperspectral_data(visual_analysis, session_id)
 
             # Step 3: Create detailed spectral analysis report
             try:
-                if not GEMINI_API_KEY:
-                    raise Exception("Gemini API key not configured.")
-
-                model = genai.GenerativeModel('gemini-2.5-pro')
-
-                # Comprehensive hyperspectral analysis prompt
-                spectral_prompt = f"""
-                Provide comprehensive hyperspectral disease analysis for {crop_name}:
-
-                VISUAL ANALYSIS RESULTS:
-                - Disease Detected: {visual_analysis["has_disease"]}
-                - Disease Type: {visual_analysis["disease_type"]}
-                - Severity Score: {visual_analysis.get("severity_score", 0)}/10
-                - Affected Areas: {', '.join(visual_analysis.get("affected_areas", ["None"]))}
-
-                HYPERSPECTRAL MEASUREMENTS:
-                - Chlorophyll Content: {hyperspectral_data["chlorophyll_content"]}
-                - Water Stress Level: {hyperspectral_data["water_stress"]}
-                - Nutrient Deficiency: {hyperspectral_data["nutrient_deficiency"]}
-                - Disease Stress Index: {hyperspectral_data["disease_stress_index"]}
-                - Photosynthetic Efficiency: {hyperspectral_data["photosynthetic_efficiency"]}
-                - Leaf Temperature: {hyperspectral_data["leaf_temperature"]}
-                - Stomatal Conductance: {hyperspectral_data["stomatal_conductance"]}
-
-                SPECTRAL INDICES:
-                - NDVI (Normalized Difference Vegetation Index): {hyperspectral_data["ndvi"]}
-                - PRI (Photochemical Reflectance Index): {hyperspectral_data["pri"]}
-                - ARI (Anthocyanin Reflectance Index): {hyperspectral_data["ari"]}
-                - CRI (Carotenoid Reflectance Index): {hyperspectral_data["cri"]}
-
-                Please provide:
-                1. **Spectral Disease Signature**: Analysis of how the disease affects light absorption/reflection patterns
-                2. **Physiological Stress Assessment**: Impact on photosynthesis, water relations, and nutrient uptake
-                3. **Early Detection Markers**: Spectral indicators that appear before visible symptoms
-                4. **Disease Progression Mapping**: How spectral signatures change as disease advances
-                5. **Precision Treatment Zones**: Identify specific areas needing different treatment intensities
-                6. **Recovery Monitoring**: Spectral indicators of treatment effectiveness and plant recovery
-                7. **Preventive Spectral Monitoring**: Baseline measurements for early warning systems
-                8. **Economic Optimization**: Cost-benefit analysis based on spectral treatment zoning
-
-                Include spectral data interpretation, treatment precision recommendations, and long-term monitoring protocols.
-                Format as a professional hyperspectral agricultural analysis report.
-                """
 
-                response = model.generate_content(spectral_prompt)
-                hyperspectral_analysis = response.text
+                spectral_prompt = PROMPTS.render(
+                    "hyperspectral_report",
+                    crop=crop_name,
+                    has_disease=visual_analysis["has_disease"],
+                    disease_type=visual_analysis["disease_type"],
+                    severity_score=visual_analysis.get("severity_score", 0),
+                    affected_areas=', '.join(visual_analysis.get("affected_areas", ["None"])),
+                    **{field: hyperspectral_data[field] for field in (
+                        "data_source", "chlorophyll_content", "water_stress", "nutrient_deficiency",
+                        "disease_stress_index", "photosynthetic_efficiency", "leaf_temperature",
+                        "stomatal_conductance", "ndvi", "pri", "ari", "cri"
+                    )}
+                )
+
+                hyperspectral_analysis = await generate_text(spectral_prompt)
 
             except Exception as e:
                 logging.error(f"Hyperspectral Gemini analysis failed: {e}")
@@ -423,12 +816,13 @@ class KisanSmartAgent:
                 "analysis_summary": {
                     "method": "Hyperspectral + AI Analysis",
                     "data_points": len(hyperspectral_data),
-                    "spectral_bands": "400-2500nm (simulated)",
+                    "spectral_bands": hyperspectral_data["spectral_bands_analyzed"],
+                    "data_source": hyperspectral_data["data_source"],
                     "processing_time": "Real-time",
                     "accuracy_level": "High precision"
                 },
                 "recommendations": self.generate_spectral_recommendations(hyperspectral_data, visual_analysis),
-                "confidence_map_url": f"/api/spectral-maps/{session_id}",  # Simulated endpoint
+                "confidence_map_url": f"/api/spectral-maps/{session_id}" if hyperspectral_data["data_source"] == "measured" else None,
                 "timestamp": datetime.utcnow().isoformat()
             }
 
@@ -438,7 +832,20 @@ class KisanSmartAgent:
             summary = self.create_hyperspectral_summary(visual_analysis, hyperspectral_data)
             actions.append(await self.speak_response(summary))
 
-            # Step 6: Add spectral monitoring schedule
+            # Step 6: Compare against this field's spectral history
+            monitoring = self.record_spectral_observation(session_id, hyperspectral_data, visual_analysis)
+            if monitoring:
+                analysis_result["monitoring"] = monitoring
+                if monitoring["worsening"]:
+                    actions.append({
+                        "action": "spectral_alert",
+                        "field_id": monitoring["field_id"],
+                        "message": "Spectral signatures indicate a worsening condition: " + "; ".join(monitoring["signals"]),
+                        "signals": monitoring["signals"],
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+
+            # Step 7: Add spectral monitoring schedule
             actions.append({
                 "action": "spectral_monitoring_schedule",
                 "message": "Spectral monitoring recommended every 3-5 days during treatment period",
@@ -448,7 +855,7 @@ class KisanSmartAgent:
                     {"day": 7, "type": "Recovery assessment"},
                     {"day": 14, "type": "Final evaluation"}
                 ],
-                "alerts": "System will notify if spectral signatures indicate worsening condition",
+                "alerts": "Field alerts are sent to this session when measured spectral signatures cross alert rules",
                 "timestamp": datetime.utcnow().isoformat()
             })
 
@@ -464,12 +871,9 @@ class KisanSmartAgent:
 
     async def general_task_handler(self, session_id: str, user_input: str):
         try:
-            if not GEMINI_API_KEY:
-                raise Exception("Gemini API key not configured.")
-            
-            model = genai.GenerativeModel('gemini-2.5-pro')
-            response = model.generate_content(user_input)
-            gemini_response = response.text
+            gemini_response = await generate_text(personalize(user_input), "chat")
+        except OverloadedError:
+            raise
         except Exception as e:
             logging.error(f"Gemini generation failed: {e}")
             gemini_response = f"I received your message: {user_input}, but I couldn't generate a smart response right now."
@@ -510,107 +914,276 @@ class KisanSmartAgent:
             return await self.general_task_handler(session_id, user_input)
 
     async def handle_crop_recommendation(self, session_id: str, user_input: str):
+        """Rank crops for the farmer's plot from the local soil, climate and crop tables"""
+        # What the farmer says now overrides what their profile says
+        profile = (await self.farmer_profile(session_id)) or {}
+        plot = {
+            "district": profile.get("district"),
+            "state": profile.get("state"),
+            "soil": profile.get("soil") or profile.get("soil_type"),
+            "irrigated": profile.get("irrigation_source"),
+            "area_hectares": profile.get("land_hectares"),
+        }
+        plot.update(crop_recommender.parse_query(user_input))
+        if not (plot.get("district") or plot.get("state") or plot.get("soil")):
+            return {
+                "session_id": session_id,
+                "task_type": "crop_recommendation",
+                "actions": [{
+                    "action": "speak_response",
+                    "message": "I can help you with crop recommendations. What is your location and soil type?",
+                    "timestamp": datetime.utcnow().isoformat()
+                }],
+                "status": "awaiting_info"
+            }
+
+        recommendation = crop_recommender.recommend(plot)
         return {
             "session_id": session_id,
             "task_type": "crop_recommendation",
-            "actions": [{
-                "action": "speak_response",
-                "message": "I can help you with crop recommendations. What is your location and soil type?",
-                "timestamp": datetime.utcnow().isoformat()
-            }],
-            "status": "awaiting_info"
+            "actions": [
+                {
+                    "action": "crop_recommendation",
+                    "conditions": recommendation["conditions"],
+                    "crops": recommendation["crops"],
+                    "timestamp": datetime.utcnow().isoformat()
+                },
+                await self.speak_response(describe_crops(recommendation))
+            ],
+            "status": "completed"
         }
 
     async def handle_crop_monitor(self, session_id: str, user_input: str):
+        """Report the field's live sensor readings and today's ranges"""
+        field_id = self.session_field_id(session_id)
+        actions = [await self.navigate_to_page("crop-monitor")]
+        status = sensor_store.status(field_id)
+        if status is None:
+            actions.append(await self.speak_response(
+                "No sensors are reporting for your field yet. Once they send readings, I can show moisture, temperature and humidity here."
+            ))
+        else:
+            actions.append({
+                "action": "crop_monitor_status",
+                "status": status,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+            actions.append(await self.speak_response(describe_sensors(status)))
         return {
             "session_id": session_id,
             "task_type": "crop_monitor",
-            "status": "not_implemented"
+            "actions": actions,
+            "status": "completed"
         }
 
     async def handle_community(self, session_id: str, user_input: str):
+        """Find community discussions about the user's crop or problem; the hot feed when nothing specific is asked"""
+        actions = [await self.navigate_to_page("community")]
+        query = user_input if user_input and community.terms.match_query(user_input, match_all=False) else None
+        if query:
+            page = await asyncio.to_thread(community.search, query, "relevance", None, None, 5, False)
+        else:
+            page = await asyncio.to_thread(community.feed, "hot", None, None, 5)
+        actions.append({
+            "action": "community_posts",
+            "query": query,
+            "posts": page["posts"],
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        actions.append(await self.speak_response(describe_community(page["posts"], query)))
         return {
             "session_id": session_id,
             "task_type": "community",
-            "status": "not_implemented"
+            "actions": actions,
+            "status": "completed"
         }
 
     async def handle_profile(self, session_id: str, user_input: str):
+        """Save the profile details a farmer mentions and read back what is on file, asking only for what is missing"""
+        actions = [await self.navigate_to_page("profile")]
+        user_id = (agent_state.sessions.get(session_id) or {}).get("user_id")
+        if not user_id:
+            actions.append(await self.ask_user_question("Please sign in so I can save your profile.", "profile"))
+            return {
+                "session_id": session_id,
+                "task_type": "profile",
+                "actions": actions,
+                "status": "awaiting_info"
+            }
+
+        details = self.profile_details(user_input or "")
+        if details:
+            # "I also grow maize" adds to the crops on file instead of replacing them.
+            profile = await asyncio.to_thread(profile_store.update, user_id, details,
+                                              bool(ALSO_PATTERN.search(user_input.casefold())))
+            actions.append({
+                "action": "profile_updated",
+                "updated": sorted(details),
+                "profile": profile,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        else:
+            profile = await asyncio.to_thread(profile_store.get, user_id)
+
+        message = ("Saved. " if details else "") + (f"Your profile: {profile_context(profile)}." if profile else "")
+        missing = missing_fields(profile)
+        if missing:
+            labels = [FIELD_LABELS[field] for field in missing]
+            wanted = " and ".join([", ".join(labels[:-1]), labels[-1]] if len(labels) > 1 else labels)
+            question = f"Tell me your {wanted} so I can tailor my advice."
+            actions.append(await self.ask_user_question(f"{message} {question}".strip(), "profile"))
+        else:
+            actions.append(await self.speak_response(message))
         return {
             "session_id": session_id,
             "task_type": "profile",
-            "status": "not_implemented"
+            "actions": actions,
+            "status": "awaiting_info" if missing else "completed"
         }
 
     async def handle_grocery_marketplace(self, session_id: str, user_input: str):
+        """Search the product catalog for what was asked, preferring sellers in the farmer's own state"""
+        actions = [await self.navigate_to_page("grocery-marketplace")]
+        max_price, query = parse_price_limit(user_input)
+        sort = "price_asc" if CHEAP_PATTERN.search(user_input.casefold()) else "relevance"
+        state = ((await self.farmer_profile(session_id)) or {}).get("state")
+        result = None
+        if state:
+            result = await asyncio.to_thread(product_catalog.search, query, {"state": [state]}, None, max_price, True, sort, None, 5)
+        if not result or not result["total"]:
+            state = None
+            result = await asyncio.to_thread(product_catalog.search, query, None, None, max_price, True, sort, None, 5)
+        actions.append({
+            "action": "marketplace_results",
+            "query": query,
+            "filters": {"state": state, "max_price": max_price, "in_stock": True},
+            "sort": sort,
+            "total": result["total"],
+            "products": result["products"],
+            "facets": result["facets"],
+            "next_cursor": result["next_cursor"],
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        actions.append(await self.speak_response(describe_products(result, max_price)))
         return {
             "session_id": session_id,
             "task_type": "grocery_marketplace",
-            "status": "not_implemented"
+            "actions": actions,
+            "status": "completed"
         }
 
     async def handle_orders(self, session_id: str, user_input: str):
+        """Answer "where is my order" from the user's order summary: no scan over their history"""
+        actions = [await self.navigate_to_page("grocery-marketplace")]
+        user_id = (agent_state.sessions.get(session_id) or {}).get("user_id")
+        if not user_id:
+            actions.append(await self.ask_user_question("Please sign in so I can look up your orders.", "orders"))
+            return {
+                "session_id": session_id,
+                "task_type": "orders",
+                "actions": actions,
+                "status": "awaiting_info"
+            }
+        found = await asyncio.to_thread(order_store.where_is, user_id)
+        actions.append({
+            "action": "order_status",
+            "order": found["order"],
+            "summary": found["summary"],
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        actions.append(await self.speak_response(describe_order(found)))
         return {
             "session_id": session_id,
             "task_type": "orders",
-            "status": "not_implemented"
+            "actions": actions,
+            "status": "completed"
         }
 
+    def session_field_id(self, session_id: str) -> str:
+        """The field a session watches: the one it named, else the user's or the session's own id.
+
+        The choice is stored on the session, which is what alert delivery matches on.
+        """
+        session = agent_state.sessions.get(session_id)
+        if session is None:
+            return session_id
+        return session.setdefault("field_id", session.get("user_id") or session_id)
+
+    async def farmer_profile(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = agent_state.sessions.get(session_id) or {}
+        return await asyncio.to_thread(profile_store.get, session.get("user_id"))
+
+    def profile_details(self, text: str) -> Dict[str, Any]:
+        """Profile fields a farmer states in free text: place, soil, irrigation, land size, crops and name"""
+        plot = crop_recommender.parse_query(text)
+        details = {key: plot[key] for key in ("district", "state", "soil") if plot.get(key)}
+        if details.get("district"):
+            details["state"] = next(location["state"] for location in crop_recommender.locations
+                                    if location["district"] == details["district"])
+        if "irrigated" in plot:
+            details["irrigation_source"] = plot["irrigated"]
+        crop_ids = {crop["id"] for crop in crop_recommender.crops}
+        crops = [tag for tag in community.terms.tags(text) if tag in crop_ids]
+        if crops:
+            details["crops"] = crops
+        details.update(parse_profile_details(text))
+        return details
+
     async def handle_gov_scheme_application(self, session_id: str, user_input: str):
-        """Automated government scheme application workflow using Gemini AI"""
+        """Answer scheme questions from the local knowledge base, using Gemini only to phrase retrieved records"""
         actions = []
 
         try:
-            if not GEMINI_API_KEY:
-                raise Exception("Gemini API key not configured.")
-
-            model = genai.GenerativeModel('gemini-2.5-pro')
-
-            # Create a comprehensive prompt for government schemes
-            prompt = f"""
-            You are an expert agricultural consultant specializing in Indian government schemes for farmers.
-            Based on the user's query: "{user_input}"
-
-            Provide detailed information about relevant government schemes including:
-            1. Scheme name and full details
-            2. Eligibility criteria
-            3. Benefits and subsidies
-            4. Application process
-            5. Required documents
-            6. Contact information for help
-
-            Focus on schemes like:
-            - PM-KISAN (Pradhan Mantri Kisan Samman Nidhi)
-            - PMFBY (Pradhan Mantri Fasal Bima Yojana)
-            - Soil Health Card Scheme
-            - Kisan Credit Card
-            - National Agriculture Market (eNAM)
-            - Paramparagat Krishi Vikas Yojana
-            - Rashtriya Krishi Vikas Yojana
-            - Agricultural Mechanization schemes
-            - Micro Irrigation schemes
-            - And other relevant schemes based on the query
-
-            Structure your response as a clear, actionable summary that a farmer can understand and use.
-            """
-
-            response = model.generate_content(prompt)
-            scheme_info = response.text
+            hits = await search_schemes(user_input)
+            direct = schemes_kb.answer(user_input, hits)
+            profile = await self.farmer_profile(session_id)
+            eligible = eligibility_engine.match(profile) if profile else None
+
+            if direct:
+                # FAQ-style question about one scheme: answer straight from its record
+                schemes_kb.record("direct")
+                scheme_info = direct["text"]
+                if profile and direct["aspect"] == "eligibility":
+                    scheme_info += " " + describe_check(eligibility_engine.check(profile, direct["scheme_id"]))
+                spoken = extractive_summary(scheme_info)
+            elif eligible is not None and detect_aspect(user_input) == "eligibility":
+                # "Which schemes am I eligible for?" is answered from the farmer's profile
+                schemes_kb.record("direct")
+                direct = {"aspect": "eligibility"}
+                scheme_info = describe_matches(eligible)
+                hits = [{"scheme": schemes_kb.by_id[match["scheme_id"]], "score": match["score"]} for match in eligible[:SCHEMES_TOP_K]]
+                spoken = extractive_summary(scheme_info)
+            elif hits:
+                schemes_kb.record("llm")
+                scheme_info = await generate_text(PROMPTS.render(
+                    "scheme_answer", query=user_input, records=schemes_kb.context(hits),
+                    eligibility=describe_matches(eligible) if eligible is not None else "unknown (no farmer profile)"
+                ))
+                spoken = extractive_summary(scheme_info)
+            else:
+                schemes_kb.record("no_match")
+                scheme_info = await generate_text(PROMPTS.render("gov_schemes", query=user_input))
+                spoken = await summarize_for_speech(scheme_info, f"Government schemes relevant to: {user_input}")
 
             # Navigate to government schemes page
             actions.append(await self.navigate_to_page("gov-schemes"))
 
             # Provide the scheme information
-            actions.append(await self.speak_response(f"Here are the relevant government schemes for your query: {scheme_info[:200]}..."))
+            actions.append(await self.speak_response(spoken))
 
             # Create a detailed response action
             actions.append({
                 "action": "gov_scheme_info",
                 "query": user_input,
                 "schemes": scheme_info,
+                "records": [hit["scheme"] for hit in hits],
+                "eligible_schemes": eligible,
+                "answered_from": "knowledge_base" if direct else "llm",
                 "timestamp": datetime.utcnow().isoformat()
             })
 
+        except OverloadedError:
+            raise
         except Exception as e:
             logging.error(f"Gemini scheme generation failed: {e}")
             actions.append(await self.speak_response("I'm having trouble accessing government scheme information right now. Please try again later or visit the government schemes page directly."))
@@ -623,74 +1196,75 @@ class KisanSmartAgent:
         }
 
     async def handle_market_analysis(self, session_id: str, user_input: str):
-        """Automated market analysis with real-time price fetching using Vertex AI and Gemini"""
+        """Market analysis from the local mandi price store, with Gemini narrating the figures"""
         actions = []
 
         try:
             # Navigate to market trends page
             actions.append(await self.navigate_to_page("market-trends"))
 
-            # Use Gemini to analyze the query and determine what market data to fetch
-            if not GEMINI_API_KEY:
-                raise Exception("Gemini API key not configured.")
-
-            model = genai.GenerativeModel('gemini-2.5-pro')
-
-            # First, analyze the user's query to understand what they want
-            analysis_prompt = f"""
-            Analyze this market query: "{user_input}"
-
-            Determine:
-            1. What type of products/commodities are they asking about (crops, fruits, vegetables, artifacts, etc.)
-            2. What specific items they want prices for
-            3. Any location preferences (All India or specific states)
-            4. Time period (current, weekly, monthly trends)
+            # Commodities and states named outright need no LLM call to resolve
+            query_analysis = None
+            commodities = mandi_prices.find_commodities(user_input)
+            states = mandi_prices.find_states(user_input)
+            if not commodities and mandi_prices.commodities:
+                query_analysis = (await generate_structured(
+                    PROMPTS.render("market_query_analysis", query=user_input), MarketQuery
+                )).model_dump()
+                for item in query_analysis["specific_items"]:
+                    commodities.extend(name for name in mandi_prices.find_commodities(item) if name not in commodities)
+                for location in query_analysis["locations"]:
+                    states.extend(state for state in mandi_prices.find_states(location) if state not in states)
+
+            summaries = [mandi_prices.summary(name, states or None) for name in commodities[:MARKET_MAX_COMMODITIES]]
+            summaries = [summary for summary in summaries if summary]
+            for summary in summaries:
+                # Precomputed by the forecast refresher; only the sell advice goes into the prompt
+                forecast = price_forecasts.lookup(summary["commodity"], states or None)
+                if forecast:
+                    summary["forecast"] = {key: value for key, value in forecast.items()
+                                           if key not in ("forecast", "models", "computed_at")}
+
+            if summaries:
+                facts = " ".join(
+                    describe_prices(summary) + (f" {describe_forecast(summary['forecast'])}" if "forecast" in summary else "")
+                    for summary in summaries
+                )
+                try:
+                    market_data = await generate_text(PROMPTS.render(
+                        "market_narration", query=user_input, prices=json.dumps(summaries, separators=(",", ":"))
+                    ))
+                except Exception as e:
+                    logging.error(f"Market narration failed, returning figures only: {e}")
+                    market_data = facts
 
-            Respond with a JSON object containing:
-            {{
-                "product_categories": ["list of categories"],
-                "specific_items": ["list of specific products"],
-                "locations": ["list of locations"],
-                "time_period": "current/weekly/monthly"
-            }}
-            """
+                actions.append({
+                    "action": "market_analysis",
+                    "query": user_input,
+                    "analysis": query_analysis,
+                    "prices": summaries,
+                    "market_data": market_data,
+                    "source": "mandi_prices",
+                    "timestamp": datetime.utcnow().isoformat()
+                })
+                actions.append(await self.speak_response(extractive_summary(facts)))
 
-            analysis_response = model.generate_content(analysis_prompt)
-            query_analysis = json.loads(analysis_response.text.strip())
+            elif GOOGLE_CLOUD_PROJECT and GOOGLE_CLOUD_LOCATION:
+                # No local price data for the query: fall back to Vertex AI market intelligence
+                if query_analysis is None:
+                    query_analysis = (await generate_structured(
+                        PROMPTS.render("market_query_analysis", query=user_input), MarketQuery
+                    )).model_dump()
 
-            # Now fetch market prices using Vertex AI for comprehensive data
-            if GOOGLE_CLOUD_PROJECT and GOOGLE_CLOUD_LOCATION:
-                vertex_model = GenerativeModel("gemini-2.5-pro")
-
-                market_prompt = f"""
-                You are an expert agricultural market analyst. Provide comprehensive market price information for:
-
-                Categories: {', '.join(query_analysis.get('product_categories', []))}
-                Specific Items: {', '.join(query_analysis.get('specific_items', []))}
-                Locations: {', '.join(query_analysis.get('locations', ['All India']))}
-                Time Period: {query_analysis.get('time_period', 'current')}
-
-                For each product, provide:
-                1. Current market price per kg/quintal
-                2. Price range (min-max)
-                3. Major markets where it's traded
-                4. Price trends (increasing/decreasing/stable)
-                5. Factors affecting prices
-                6. Best time to sell
-                7. Alternative markets
-
-                Include data for:
-                - Major crops (rice, wheat, maize, cotton, sugarcane, etc.)
-                - Fruits (mango, banana, apple, grapes, orange, etc.)
-                - Vegetables (potato, tomato, onion, cabbage, cauliflower, etc.)
-                - Small farmer artifacts (handicrafts, traditional items, local products)
-                - Other agricultural commodities
-
-                Structure the response as detailed market intelligence that farmers can use for decision making.
-                """
+                market_prompt = PROMPTS.render(
+                    "market_report",
+                    categories=', '.join(query_analysis.get('product_categories', [])),
+                    items=', '.join(query_analysis.get('specific_items', [])),
+                    locations=', '.join(query_analysis.get('locations', ['All India'])),
+                    time_period=query_analysis.get('time_period', 'current')
+                )
 
-                market_response = vertex_model.generate_content(market_prompt)
-                market_data = market_response.text
+                market_data = await generate_text(market_prompt)
 
                 # Create market analysis action
                 actions.append({
@@ -702,24 +1276,12 @@ class KisanSmartAgent:
                 })
 
                 # Provide summary via speech
-                summary = f"Market analysis complete. Here are the current prices and trends for your query: {market_data[:200]}..."
+                summary = await summarize_for_speech(market_data, f"Current prices and trends for: {user_input}")
                 actions.append(await self.speak_response(summary))
 
             else:
                 # Fallback to Gemini only if Vertex AI not available
-                fallback_prompt = f"""
-                Provide market price information for: {user_input}
-
-                Include prices for major agricultural products across India, focusing on:
-                - Crops and cereals
-                - Fruits and vegetables
-                - Small farmer artifacts and local products
-
-                Note: This is estimated data as real-time market access is not available.
-                """
-
-                fallback_response = model.generate_content(fallback_prompt)
-                fallback_data = fallback_response.text
+                fallback_data = await generate_text(PROMPTS.render("market_fallback", query=user_input))
 
                 actions.append({
                     "action": "market_analysis_fallback",
@@ -729,8 +1291,12 @@ class KisanSmartAgent:
                     "timestamp": datetime.utcnow().isoformat()
                 })
 
-                actions.append(await self.speak_response(f"Market information: {fallback_data[:200]}..."))
+                actions.append(await self.speak_response(await summarize_for_speech(
+                    fallback_data, f"Estimated market prices for: {user_input}"
+                )))
 
+        except OverloadedError:
+            raise
         except Exception as e:
             logging.error(f"Market analysis failed: {e}")
             actions.append(await self.speak_response("I'm having trouble accessing market data right now. Please try again later or visit the market trends page."))
@@ -750,84 +1316,19 @@ class KisanSmartAgent:
             # Navigate to artisan marketplace page
             actions.append(await self.navigate_to_page("grocery-marketplace"))  # Using existing marketplace page
 
-            if not GEMINI_API_KEY:
-                raise Exception("Gemini API key not configured.")
-
-            model = genai.GenerativeModel('gemini-2.5-pro')
 
             # Analyze the artisan's craft and create marketing content
-            artisan_prompt = f"""
-            You are an expert marketing consultant specializing in traditional Indian crafts and artisan products.
-            Analyze this artisan query/request: "{user_input}"
-
-            Provide comprehensive assistance for marketing their craft including:
-
-            1. **Craft Analysis**: Identify the type of craft/artisan product
-            2. **Story Development**: Create compelling narratives about the artisan's heritage, techniques, and cultural significance
-            3. **Market Positioning**: Suggest pricing strategies, target audiences, and unique selling propositions
-            4. **Digital Marketing**: Provide social media content ideas, product descriptions, and online presence strategies
-            5. **Sales Channels**: Recommend platforms, marketplaces, and distribution strategies
-            6. **Branding**: Suggest brand names, logos, packaging ideas, and visual identity
-            7. **Customer Engagement**: Ideas for storytelling, customer interactions, and community building
-
-            Focus on traditional Indian crafts like:
-            - Handloom textiles (sari, dupatta, traditional wear)
-            - Pottery and ceramics
-            - Metal work (brass, copper, silver jewelry)
-            - Wood carving and furniture
-            - Leather work and footwear
-            - Handicrafts (terracotta, bamboo, jute products)
-            - Traditional paintings (Madhubani, Warli, Pattachitra)
-            - Jewelry and ornament making
-            - Basket weaving and coir products
-            - Stone carving and sculpture
-
-            Structure your response as actionable marketing intelligence that artisans can implement immediately.
-            """
-
-            artisan_response = model.generate_content(artisan_prompt)
-            marketing_content = artisan_response.text
-
-            # Generate product descriptions and marketing copy
-            product_prompt = f"""
-            Based on the artisan's craft analysis above, create:
-
-            1. **Product Title**: Catchy, SEO-friendly titles for their products
-            2. **Product Description**: Engaging descriptions highlighting craftsmanship, heritage, and unique features
-            3. **Social Media Posts**: Ready-to-use captions for Instagram, Facebook, and other platforms
-            4. **Storytelling Content**: Narrative content about the artisan's journey and craft tradition
-            5. **Pricing Strategy**: Suggested price ranges and positioning
-            6. **Target Audience**: Specific customer segments and marketing channels
-
-            Make it culturally authentic and commercially viable.
-            """
-
-            product_response = model.generate_content(product_prompt)
-            product_content = product_response.text
+            marketing_content = await generate_text(PROMPTS.render("artisan_marketing", query=user_input))
+
+            # Generate product descriptions and marketing copy from the craft analysis
+            product_content = await generate_text(PROMPTS.render(
+                "artisan_product", query=user_input, craft_analysis=marketing_content
+            ))
 
             # Use Vertex AI for advanced marketing insights if available
             if GOOGLE_CLOUD_PROJECT and GOOGLE_CLOUD_LOCATION:
-                vertex_model = GenerativeModel("gemini-2.5-pro")
-
-                advanced_prompt = f"""
-                Provide advanced marketing strategy for Indian artisans:
-
-                Original Query: "{user_input}"
 
-                Include:
-                1. **Market Research**: Current trends in traditional crafts, competitor analysis
-                2. **Digital Transformation**: E-commerce integration, online marketplace strategies
-                3. **Global Reach**: Export opportunities, international market insights
-                4. **Sustainability**: Eco-friendly marketing, fair trade positioning
-                5. **Technology Integration**: AR/VR product visualization, virtual showrooms
-                6. **Partnership Opportunities**: Collaborations with designers, brands, NGOs
-                7. **Funding and Grants**: Government schemes for artisans, crowdfunding strategies
-
-                Provide data-driven insights and actionable recommendations.
-                """
-
-                advanced_response = vertex_model.generate_content(advanced_prompt)
-                advanced_insights = advanced_response.text
+                advanced_insights = await generate_text(PROMPTS.render("artisan_advanced", query=user_input))
 
                 # Combine all content
                 complete_content = f"""
@@ -861,16 +1362,20 @@ class KisanSmartAgent:
             })
 
             # Provide summary via speech
-            summary = f"Artisan marketplace assistance ready. I've created comprehensive marketing content for your craft: {marketing_content[:150]}..."
+            summary = await summarize_for_speech(marketing_content, f"Marketing plan for an artisan's craft: {user_input}")
             actions.append(await self.speak_response(summary))
 
-            # Additional actions for marketplace integration
+            # Price comparables from similar crafts already listed in the catalog
+            comparables = await asyncio.to_thread(product_catalog.comparables, user_input)
             actions.append({
                 "action": "marketplace_listing",
-                "suggestion": "Consider listing your products on platforms like Etsy, Amazon Handmade, or local craft marketplaces",
+                "comparables": comparables,
+                "suggestion": "List your products in the marketplace, or import your whole catalog as a CSV",
                 "timestamp": datetime.utcnow().isoformat()
             })
 
+        except OverloadedError:
+            raise
         except Exception as e:
             logging.error(f"Artisan marketplace assistance failed: {e}")
             actions.append(await self.speak_response("I'm having trouble generating marketing content right now. Please try again later or visit the marketplace page for assistance."))
@@ -914,34 +1419,17 @@ class KisanSmartAgent:
 
             # Step 4: Generate detailed recommendations using AI
             try:
-                if not GEMINI_API_KEY:
-                    raise Exception("Gemini API key not configured.")
-
-                model = genai.GenerativeModel('gemini-2.5-pro')
-
-                detailed_analysis_prompt = f"""
-                Based on the crop disease analysis results, provide a comprehensive report for {crop_name}:
-
-                Analysis Results:
-                - Disease Detected: {analysis_result["has_disease"]}
-                - Primary Finding: {analysis_result["disease_type"]}
-                - Confidence Level: {analysis_result["confidence"]:.2%}
-                - Affected Areas: {', '.join(analysis_result.get("affected_areas", ["Unknown"]))}
-
-                Please provide:
-                1. **Disease Identification**: Detailed description of the identified disease/symptoms
-                2. **Severity Assessment**: Rate the severity (Low/Medium/High) and explain why
-                3. **Spread Analysis**: How the disease might spread and current containment status
-                4. **Treatment Plan**: Step-by-step treatment recommendations with specific products/dosages
-                5. **Prevention Measures**: Long-term prevention strategies
-                6. **Expected Recovery**: Timeline and success factors
-                7. **Monitoring Plan**: How to monitor progress and when to seek expert help
-
-                Format the response as a structured medical report for farmers.
-                """
 
-                detailed_response = model.generate_content(detailed_analysis_prompt)
-                detailed_report = detailed_response.text
+                detailed_analysis_prompt = PROMPTS.render(
+                    "disease_report",
+                    crop=crop_name,
+                    has_disease=analysis_result["has_disease"],
+                    disease_type=analysis_result["disease_type"],
+                    confidence=f"{analysis_result['confidence']:.2%}",
+                    affected_areas=', '.join(analysis_result.get("affected_areas", ["Unknown"]))
+                )
+
+                detailed_report = await generate_text(detailed_analysis_prompt)
 
                 # Add detailed report to analysis result
                 analysis_result["detailed_report"] = detailed_report
@@ -990,6 +1478,18 @@ class KisanSmartAgent:
         required_fields = ["name", "location", "crop_type", "area"]
         provided_data = self.extract_form_data(form_data)
         
+        # Anything already in the farmer's profile doesn't need asking for again
+        profile = (await self.farmer_profile(session_id)) or {}
+        on_file = {
+            "name": profile.get("name"),
+            "location": ", ".join(value for value in (profile.get("district"), profile.get("state")) if value),
+            "crop_type": (profile.get("crops") or [None])[0],
+            "area": f"{profile['land_hectares']:g} hectares" if profile.get("land_hectares") else None,
+        }
+        for field, value in on_file.items():
+            if value and field not in provided_data:
+                provided_data[field] = value
+        
         # Check for missing fields
         for field in required_fields:
             if field not in provided_data:
@@ -1014,11 +1514,11 @@ class KisanSmartAgent:
         }
 
     async def handle_cold_storage_booking(self, session_id: str, user_input: str):
-        """Automated cold storage booking"""
+        """Find cold storage with room for the whole stay near the farmer and offer the nearest options"""
         actions = []
         
         # Extract booking details from user input
-        booking_details = self.extract_booking_details(user_input)
+        booking_details = await self.extract_booking_details(user_input)
         
         # Navigate to cold storage page
         actions.append(await self.navigate_to_page("cold-storage"))
@@ -1030,22 +1530,134 @@ class KisanSmartAgent:
         if "quantity" in booking_details:
             actions.append(await self.fill_form_field("cold_storage_form", "quantity", booking_details["quantity"]))
         
-        # Check for missing information
-        required_booking_fields = ["crop_type", "quantity", "duration", "storage_date"]
-        missing_fields = [field for field in required_booking_fields if field not in booking_details]
+        # Check for missing information; storage starts today unless a date was given
+        crop = booking_details.get("crop_type")
+        quantity = parse_quantity_quintals(booking_details.get("quantity"))
+        days = parse_duration_days(booking_details.get("duration"))
+        missing_fields = [field for field, value in (("crop_type", crop), ("quantity", quantity), ("duration", days))
+                          if not value]
+        status = "awaiting_info"
         
         if missing_fields:
             question = f"To complete your cold storage booking, I need: {', '.join(missing_fields)}"
             actions.append(await self.ask_user_question(question, "booking_completion"))
         else:
-            actions.append(await self.complete_task("Cold storage booking completed!"))
-            actions.append(await self.speak_response("Your cold storage has been booked successfully!"))
+            profile = (await self.farmer_profile(session_id)) or {}
+            state, district = cold_storage.find_location(user_input)
+            try:
+                start_day = storage_day(booking_details.get("storage_date"))
+            except ValueError:
+                start_day = storage_day(None)
+            try:
+                options = await asyncio.to_thread(
+                    cold_storage.find_available, crop, quantity, days, start_day,
+                    latitude=None if district or state else profile.get("latitude"),
+                    longitude=None if district or state else profile.get("longitude"),
+                    state=state or profile.get("state"), district=district or profile.get("district")
+                )
+            except ValueError as e:
+                options = None
+                actions.append(await self.ask_user_question(f"{e}. Please give another date or duration.", "booking_completion"))
+            
+            if options:
+                # Nothing is reserved until the farmer picks an option in a follow-up reply
+                status = "awaiting_confirmation"
+                actions.extend(await self.offer_cold_storage(session_id, crop, quantity, days, start_day, options))
+            elif options is not None:
+                status = "unavailable"
+                actions.append(await self.speak_response(describe_storage_options(crop, quantity, days, [])))
         
         return {
             "session_id": session_id,
             "task_type": "cold_storage_booking",
             "actions": actions,
-            "status": "completed" if not missing_fields else "awaiting_info"
+            "status": status
+        }
+
+    async def offer_cold_storage(self, session_id: str, crop: str, quantity: float, days: int, start_day: int,
+                                 options: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Rank options for the farmer and remember them for the confirmation reply"""
+        agent_state.sessions.setdefault(session_id, {})["pending_cold_storage"] = {
+            "crop": crop, "quantity": quantity, "days": days, "start_day": start_day, "options": options
+        }
+        choices = "; ".join(
+            f"{number}. {option['facility']}, {option['district']} - Rs {option['estimated_cost']:,.0f}"
+            for number, option in enumerate(options, start=1)
+        )
+        return [
+            {"action": "cold_storage_options", "options": options, "timestamp": datetime.utcnow().isoformat()},
+            await self.ask_user_question(
+                f"{describe_storage_options(crop, quantity, days, options)} Options: {choices}. "
+                "Reply with the option number to book it, or no to skip.",
+                "cold_storage_confirmation"
+            ),
+        ]
+
+    async def confirm_cold_storage_booking(self, session_id: str, user_response: str):
+        """Book the option the farmer picked from the last offer; any other reply books nothing"""
+        actions = []
+        session = agent_state.sessions.get(session_id) or {}
+        pending = session.get("pending_cold_storage")
+        status = "cancelled"
+        if not pending:
+            actions.append(await self.speak_response("There is no cold storage offer waiting for confirmation."))
+        elif not session.get("user_id"):
+            status = "awaiting_info"
+            actions.append(await self.speak_response("Please sign in so the booking can be saved to your account."))
+        else:
+            crop, quantity, days, start_day = pending["crop"], pending["quantity"], pending["days"], pending["start_day"]
+            options = pending["options"]
+            choice = parse_storage_choice(user_response, len(options))
+            if choice is None:
+                session.pop("pending_cold_storage", None)
+                actions.append(await self.speak_response("Okay, I haven't booked any cold storage."))
+            else:
+                option = options[choice]
+                try:
+                    booking = await asyncio.to_thread(
+                        cold_storage.book, option["facility_id"], option["chamber_id"], crop, quantity, days,
+                        start_day, session["user_id"]
+                    )
+                except (CapacityError, KeyError, ValueError):
+                    booking = None
+                if booking:
+                    session.pop("pending_cold_storage", None)
+                    status = "completed"
+                    actions.append({
+                        "action": "cold_storage_booking",
+                        "booking": booking,
+                        "timestamp": datetime.utcnow().isoformat()
+                    })
+                    actions.append(await self.complete_task("Cold storage booking completed!"))
+                    actions.append(await self.speak_response(
+                        f"Booked {quantity:g} quintals of {crop} at {booking['facility']} from {booking['start_date']} "
+                        f"to {booking['end_date']}, about Rs {booking['estimated_cost']:,.0f}."
+                    ))
+                else:
+                    # The space went between offer and reply (or the dates lapsed); offer what is left now
+                    try:
+                        options = await asyncio.to_thread(
+                            cold_storage.find_available, crop, quantity, days, max(start_day, storage_day(None)),
+                            state=option["state"], district=option["district"]
+                        )
+                    except ValueError:
+                        options = []
+                    if options:
+                        status = "awaiting_confirmation"
+                        actions.append(await self.speak_response(f"{option['facility']} no longer has room for those dates."))
+                        actions.extend(await self.offer_cold_storage(
+                            session_id, crop, quantity, days, max(start_day, storage_day(None)), options
+                        ))
+                    else:
+                        session.pop("pending_cold_storage", None)
+                        status = "unavailable"
+                        actions.append(await self.speak_response(describe_storage_options(crop, quantity, days, [])))
+
+        return {
+            "session_id": session_id,
+            "task_type": "cold_storage_booking",
+            "actions": actions,
+            "status": status
         }
 
     # Action Implementations
@@ -1076,9 +1688,9 @@ class KisanSmartAgent:
 
     async def analyze_disease_detailed(self, image_file: UploadFile, crop_name: str):
         """Comprehensive disease analysis with detailed output using Google Vision AI and Gemini"""
+        # Step 1: Basic image analysis with Google Vision AI. Without labels there is nothing to fall back on.
+        analysis = await process_image_with_gcp(image_file, "en")
         try:
-            # Step 1: Basic image analysis with Google Vision AI
-            analysis = await process_image_with_gcp(image_file, "en")
             labels = analysis.get("labels", [])
             primary_object = analysis.get("primary_object", "Unknown")
             confidence = analysis.get("confidence", 0)
@@ -1138,38 +1750,19 @@ class KisanSmartAgent:
 
             # Step 3: Generate detailed analysis using Gemini AI
             try:
-                if not GEMINI_API_KEY:
-                    raise Exception("Gemini API key not configured.")
-
-                model = genai.GenerativeModel('gemini-2.5-pro')
-
-                analysis_prompt = f"""
-                Analyze this crop disease detection result for {crop_name}:
-
-                DETECTED FEATURES:
-                - Primary Object: {primary_object}
-                - Confidence: {confidence:.2%}
-                - Disease Indicators: {len(disease_indicators)} found
-                - Affected Areas: {', '.join(affected_areas) if affected_areas else 'None identified'}
-                - Severity Score: {severity_score}/10
-
-                DISEASE INDICATORS FOUND:
-                {chr(10).join([f"- {ind['description']} ({ind['confidence']:.1%})" for ind in disease_indicators[:5]])}
-
-                Please provide:
-                1. **Disease Diagnosis**: What specific disease/condition is likely present?
-                2. **Symptom Analysis**: Detailed explanation of visible symptoms
-                3. **Causal Factors**: What might be causing this condition?
-                4. **Impact Assessment**: How this affects crop health and yield
-                5. **Immediate Actions**: What to do right now
-                6. **Treatment Options**: Specific treatments with dosages/timing
-                7. **Prevention Strategies**: Long-term prevention measures
-
-                Format as a comprehensive agricultural diagnostic report.
-                """
 
-                gemini_response = model.generate_content(analysis_prompt)
-                ai_analysis = gemini_response.text
+                analysis_prompt = PROMPTS.render(
+                    "disease_diagnosis",
+                    crop=crop_name,
+                    primary_object=primary_object,
+                    confidence=f"{confidence:.2%}",
+                    indicator_count=len(disease_indicators),
+                    affected_areas=', '.join(affected_areas) if affected_areas else 'None identified',
+                    severity_score=severity_score,
+                    indicators=chr(10).join([f"- {ind['description']} ({ind['confidence']:.1%})" for ind in disease_indicators[:5]])
+                )
+
+                ai_analysis = await generate_text(analysis_prompt)
 
             except Exception as e:
                 logging.error(f"Gemini analysis failed: {e}")
@@ -1231,13 +1824,12 @@ class KisanSmartAgent:
 
         except Exception as e:
             logging.error(f"Detailed disease analysis failed: {e}")
-            # Fallback to basic analysis
-            return await self.analyze_disease_basic(image_file, crop_name)
+            # Fallback to basic analysis of the labels we already have
+            return self.analyze_disease_basic(analysis, crop_name)
 
-    async def analyze_disease_basic(self, image_file: UploadFile, crop_name: str):
-        """Basic fallback disease analysis"""
+    def analyze_disease_basic(self, analysis: dict, crop_name: str):
+        """Basic fallback disease analysis from already-fetched Vision labels"""
         try:
-            analysis = await process_image_with_gcp(image_file, "en")
             has_disease = any("disease" in label["description"].lower() or "blight" in label["description"].lower() for label in analysis.get("labels", []))
             primary_finding = analysis.get("primary_object", "Unknown")
 
@@ -1270,8 +1862,12 @@ class KisanSmartAgent:
             logging.error(f"Basic disease analysis failed: {e}")
             raise
 
-    def generate_hyperspectral_data(self, analysis_result: dict) -> dict:
-        """Generate simulated hyperspectral data based on disease analysis"""
+    def generate_hyperspectral_data(self, analysis_result: dict, session_id: str = None) -> dict:
+        """Hyperspectral data from the session's ingested cube, or simulated from the disease analysis"""
+        spectral_cube = agent_state.sessions.get(session_id, {}).get("spectral_cube")
+        if spectral_cube:
+            return hyperspectral_data_from_statistics(spectral_cube["statistics"])
+
         has_disease = analysis_result.get("has_disease", False)
         severity = analysis_result.get("severity_score", 0)
 
@@ -1337,11 +1933,27 @@ class KisanSmartAgent:
             "pri": pri,
             "ari": ari,
             "cri": cri,
-            "spectral_bands_analyzed": "400-2500nm",
-            "measurement_accuracy": "±2.5%",
-            "data_quality": "High" if random.random() > 0.1 else "Medium"
+            "spectral_bands_analyzed": "400-2500nm (simulated)",
+            "measurement_accuracy": "Simulated - upload a spectral cube for measured values",
+            "data_quality": "Simulated",
+            "data_source": "simulated"
         }
 
+    def record_spectral_observation(self, session_id: str, hyperspectral_data: dict, visual_analysis: dict) -> Optional[dict]:
+        """Append measured spectral data to the field's time series and assess the change"""
+        if hyperspectral_data.get("data_source") != "measured":
+            return None
+
+        field_id = self.session_field_id(session_id)
+        timestamp = datetime.utcnow().timestamp()
+        observation = observation_from_analysis(hyperspectral_data, visual_analysis)
+        alert_hub.publish(alert_engine.observe_one("spectral", field_id, "analysis", timestamp, observation))
+        try:
+            return spectral_monitoring.record(field_id, timestamp, observation)
+        except (OSError, ValueError) as e:
+            logging.error(f"Spectral monitoring update failed: {e}")
+            return None
+
     def generate_spectral_recommendations(self, hyperspectral_data: dict, visual_analysis: dict) -> list:
         """Generate spectral-based treatment recommendations"""
         recommendations = []
@@ -1349,10 +1961,10 @@ class KisanSmartAgent:
         severity = visual_analysis.get("severity_score", 0)
 
         if has_disease:
-            # Parse chlorophyll content
-            chlorophyll = float(hyperspectral_data["chlorophyll_content"].split()[0])
+            # Parse chlorophyll content; cubes without vegetated pixels report "Not measured"
+            chlorophyll = parse_measurement(hyperspectral_data["chlorophyll_content"])
 
-            if chlorophyll < 30:
+            if chlorophyll is not None and chlorophyll < 30:
                 recommendations.append({
                     "type": "Nutrient supplementation",
                     "priority": "High",
@@ -1361,9 +1973,9 @@ class KisanSmartAgent:
                 })
 
             # Parse water stress
-            water_stress = float(hyperspectral_data["water_stress"].split('%')[0])
+            water_stress = parse_measurement(hyperspectral_data["water_stress"])
 
-            if water_stress > 40:
+            if water_stress is not None and water_stress > 40:
                 recommendations.append({
                     "type": "Irrigation management",
                     "priority": "High",
@@ -1465,7 +2077,7 @@ class KisanSmartAgent:
 
             summary += "Detailed spectral mapping and treatment zone identification completed."
         else:
-            ndvi = hyperspectral_data.get("ndvi", "Unknown")
+            ndvi = hyperspectral_data.get("ndvi") or "Unknown"
             photosynthetic_eff = hyperspectral_data.get("photosynthetic_efficiency", "Unknown")
 
             summary += f"Plant health excellent with NDVI of {ndvi} and photosynthetic efficiency at {photosynthetic_eff}. "
@@ -1522,19 +2134,20 @@ class KisanSmartAgent:
     async def extract_booking_details(self, text: str) -> Dict[str, str]:
         """Extract booking details from natural language using Gemini AI."""
         prompt = f"""
-        Extract the following details from the user's request: crop_type, quantity, and duration.
+        Extract the following details from the user's request: crop_type, quantity, duration, and storage_date (YYYY-MM-DD).
+        Leave out any detail the user did not give.
         Respond with ONLY a minified JSON object. Example: {{"crop_type": "tomatoes", "quantity": "50kg", "duration": "2 weeks"}}
         
         User Request: "{text}"
         JSON Output:
         """
         try:
-            model = GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-            details = json.loads(response.text.strip())
-            return details
+            details = await generate_structured(prompt, BookingDetails, "extract")
+            return details.model_dump(exclude_none=True)
+        except OverloadedError:
+            raise
         except Exception as e:
-            logger.error(f"Gemini extraction failed: {e}")
+            logging.error(f"Gemini extraction failed: {e}")
             return {}
 
     def extract_value_after_keyword(self, text: str, keyword: str) -> str:
@@ -1591,6 +2204,83 @@ class MultiLanguageResponder:
 agent_state = AgentState()
 smart_agent = KisanSmartAgent()
 multi_lingual = MultiLanguageResponder()
+spectral_monitoring = SpectralMonitoringStore(os.path.join(DATA_DIR, "monitoring"))
+mandi_prices = MandiPriceStore(os.path.join(DATA_DIR, "mandi"))
+price_forecasts = PriceForecaster(mandi_prices, refresh_seconds=PRICE_FORECAST_REFRESH_SECONDS)
+os.makedirs(DATA_DIR, exist_ok=True)
+job_queue = JobQueue(workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL_SECONDS)
+reminder_scheduler = ReminderScheduler(os.path.join(DATA_DIR, "reminders.db"), SessionNotifier(agent_state.sessions))
+sensor_store = SensorStore(os.path.join(DATA_DIR, "sensors"))
+alert_engine = AlertEngine()
+alert_hub = AlertHub(agent_state.sessions)
+community = CommunityStore(os.path.join(DATA_DIR, "community.db"), TermIndex.load(CROPS_PATH, CROP_HEALTH_TERMS_PATH))
+product_catalog = ProductCatalog(os.path.join(DATA_DIR, "marketplace.db"), community.terms)
+order_store = OrderStore(os.path.join(DATA_DIR, "orders.db"))
+profile_store = ProfileStore(os.path.join(DATA_DIR, "profiles.db"), agent_state.user_profiles)
+cold_storage = ColdStorageStore.load(COLD_STORAGE_FACILITIES_PATH, os.path.join(DATA_DIR, "cold_storage.db"))
+spectral_maps = SpectralMapService(TileCache(os.path.join(DATA_DIR, "tiles"), SPECTRAL_TILE_CACHE_MB * 1024 * 1024))
+
+@app.middleware("http")
+async def admission_control(request: Request, call_next):
+    """Rate-limit clients, cap in-flight requests and tag the request's priority class and deadline"""
+    path = request.url.path
+    if path in UNGATED_PATHS or path.endswith("/events"):
+        return await call_next(request)
+
+    if path in INTERACTIVE_PATHS:
+        priority = "interactive"
+    elif path in BATCH_PATHS:
+        priority = "batch"
+    else:
+        priority = "normal"
+    token = current_priority.set(priority)
+    deadline_token = current_deadline.set(time.monotonic() + REQUEST_DEADLINE_SECONDS[priority])
+
+    try:
+        if not path.startswith(RATE_EXEMPT_PREFIXES):
+            admission.check_rate(user_key=client_key(
+                request.headers.get("x-forwarded-for"), request.client.host if request.client else None,
+                TRUSTED_PROXIES
+            ))
+        async with admission.requests.slot(priority):
+            return await call_next(request)
+    except OverloadedError as e:
+        return JSONResponse({"error": str(e), "status": "overloaded"}, status_code=e.status_code,
+                            headers=retry_after_header(e.retry_after))
+    finally:
+        current_deadline.reset(deadline_token)
+        current_priority.reset(token)
+
+@app.exception_handler(OverloadedError)
+async def overloaded_error_handler(request: Request, exc: OverloadedError):
+    return JSONResponse({"error": str(exc), "status": "overloaded"}, status_code=exc.status_code,
+                        headers=retry_after_header(exc.retry_after))
+
+async def build_scheme_embeddings():
+    try:
+        await asyncio.to_thread(schemes_kb.attach_embeddings, lambda texts: _embed_sync(texts, "retrieval_document"))
+    except Exception as e:
+        logging.warning(f"Scheme embedding index unavailable, using keyword search only: {e}")
+
+@app.on_event("startup")
+async def start_background_services():
+    reminder_scheduler.start()
+    job_queue.start()
+    price_forecasts.start()
+    if SCHEMES_EMBEDDING_MODEL and GEMINI_API_KEY:
+        asyncio.create_task(build_scheme_embeddings())
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    await job_queue.stop()
+    await reminder_scheduler.stop()
+    await price_forecasts.stop()
+    cold_storage.close()
+    community.close()
+    product_catalog.close()
+    order_store.close()
+    profile_store.close()
+    await asyncio.to_thread(sensor_store.flush)
 
 # API Endpoints
 @app.post("/api/agent/start-session")
@@ -1610,6 +2300,8 @@ async def start_agent_session(
         "created_at": datetime.utcnow().isoformat(),
         "history": []
     }
+    # Reminders that fell due while the user had no live session (e.g. across a restart)
+    reminder_scheduler.redeliver(user_id, session_id)
     
     greeting = multi_lingual.get_response("greeting", language)
     
@@ -1620,34 +2312,77 @@ async def start_agent_session(
         "available_tasks": [task.value for task in TaskType]
     }
 
+def record_task_result(session: dict, task_type: str, user_input: str, result: dict):
+    """Schedule any follow-up reminders and add the task to the session history"""
+    reminder_scheduler.schedule_from_result(session, result)
+    session["history"].append({
+        "task": task_type,
+        "input": user_input,
+        "result": result,
+        "timestamp": datetime.utcnow().isoformat()
+    })
+
 @app.post("/api/agent/execute-task")
 async def execute_agent_task(
     session_id: str = Form(...),
     task_type: str = Form(...),
     user_input: str = Form(None),
     language: str = Form("en"),
-    file: UploadFile = File(None)
+    file: UploadFile = File(None),
+    async_mode: bool = Form(False),
+    priority: str = Form("normal")
 ):
-    """Execute a specific task with the smart agent"""
+    """Execute a specific task with the smart agent, or queue it as a background job when async_mode is set"""
     if session_id not in agent_state.sessions:
         raise HTTPException(status_code=404, detail="Session not found")
     
     session = agent_state.sessions[session_id]
     session["language"] = language
+    admission.check_rate(session_key=session_id)
+
+    if async_mode:
+        if priority not in JOB_PRIORITIES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(JOB_PRIORITIES)}")
+        if file:
+            # The request's upload is closed once we respond, so the job gets its own copy
+            file = UploadFile(file=io.BytesIO(await file.read()), filename=file.filename, headers=file.headers)
+
+        def on_job_complete(job):
+            if job.status == "succeeded":
+                record_task_result(session, task_type, user_input, job.result)
+
+        try:
+            job = job_queue.submit(
+                session_id,
+                task_type,
+                lambda: run_with_priority(priority, lambda: run_with_deadline(
+                    REQUEST_DEADLINE_SECONDS["batch"],
+                    lambda: smart_agent.execute_task(session_id, task_type, user_input, file)
+                )),
+                priority=priority,
+                on_complete=on_job_complete
+            )
+        except QueueFullError:
+            return JSONResponse({"error": "Job queue is full", "status": "rejected"}, status_code=503,
+                                headers={"Retry-After": "30"})
+
+        return JSONResponse({
+            "session_id": session_id,
+            "job_id": job.id,
+            "status": job.status,
+            "poll_url": f"/api/jobs/{job.id}",
+            "events_url": f"/api/jobs/{job.id}/events",
+            "websocket_url": f"/ws/jobs/{job.id}"
+        }, status_code=202)
     
     try:
         result = await smart_agent.execute_task(session_id, task_type, user_input, file)
-        
-        # Add to session history
-        session["history"].append({
-            "task": task_type,
-            "input": user_input,
-            "result": result,
-            "timestamp": datetime.utcnow().isoformat()
-        })
+        record_task_result(session, task_type, user_input, result)
         
         return JSONResponse(result)
         
+    except OverloadedError:
+        raise
     except Exception as e:
         return JSONResponse({
             "error": str(e),
@@ -1655,6 +2390,64 @@ async def execute_agent_task(
             "status": "error"
         }, status_code=500)
 
+@app.get("/api/jobs/metrics")
+async def get_job_metrics():
+    """Worker pool size, queue depth and job counts by status"""
+    return job_queue.metrics()
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Poll a background job's status and, once finished, its result"""
+    job = job_queue.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job.to_dict()
+
+@app.delete("/api/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    if not job_queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="Job not found or already finished")
+    return {"job_id": job_id, "status": "cancelling"}
+
+@app.get("/api/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """Server-sent events for a job's status changes, ending when it finishes"""
+    if not job_queue.get(job_id):
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    events = job_queue.subscribe(job_id)
+
+    async def event_stream():
+        try:
+            while True:
+                event = await events.get()
+                yield f"event: {event['status']}\ndata: {json.dumps(event)}\n\n"
+                if event["status"] in JOB_FINISHED_STATES:
+                    break
+        finally:
+            job_queue.unsubscribe(job_id, events)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.websocket("/ws/jobs/{job_id}")
+async def job_websocket(websocket: WebSocket, job_id: str):
+    """WebSocket feed of a job's status changes"""
+    await websocket.accept()
+    if not job_queue.get(job_id):
+        await websocket.close(code=4404)
+        return
+    events = job_queue.subscribe(job_id)
+    try:
+        while True:
+            event = await events.get()
+            await websocket.send_json(event)
+            if event["status"] in JOB_FINISHED_STATES:
+                break
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        job_queue.unsubscribe(job_id, events)
+
 @app.post("/api/agent/continue-task")
 async def continue_agent_task(
     session_id: str = Form(...),
@@ -1667,6 +2460,7 @@ async def continue_agent_task(
     
     session = agent_state.sessions[session_id]
     session["language"] = language
+    admission.check_rate(session_key=session_id)
     
     # Get the last action that required response
     last_action = None
@@ -1686,11 +2480,16 @@ async def continue_agent_task(
     context = last_action.get("context")
     if context == "image_capture":
         # Simulate image analysis continuation
-        result = await smart_agent.handle_disease_analysis(session_id, user_response, None)
+        work = lambda: smart_agent.handle_disease_analysis(session_id, user_response, None)
     elif context == "form_completion":
-        result = await smart_agent.handle_form_filling(session_id, user_response)
+        work = lambda: smart_agent.handle_form_filling(session_id, user_response)
+    elif context == "profile":
+        work = lambda: smart_agent.handle_profile(session_id, user_response)
+    elif context == "cold_storage_confirmation":
+        work = lambda: smart_agent.confirm_cold_storage_booking(session_id, user_response)
     else:
-        result = await smart_agent.general_task_handler(session_id, user_response)
+        work = lambda: smart_agent.general_task_handler(session_id, user_response)
+    result = await smart_agent.with_farmer_context(session_id, work)
     
     session["history"].append({
         "continuation": True,
@@ -1709,33 +2508,427 @@ async def get_session_status(session_id: str):
     
     return agent_state.sessions[session_id]
 
-@app.post("/api/agent/generate-workflow")
-async def generate_workflow(payload: Dict[str, Any] = Body(...)):
+@app.post("/api/spectral/cubes")
+async def upload_spectral_cube(
+    session_id: str = Form(...),
+    file: UploadFile = File(...),
+    data_file: UploadFile = File(None),
+    wavelengths: str = Form(None),
+    field_id: str = Form(None)
+):
+    """Ingest a band-stacked raster (.npy, multi-band TIFF, or ENVI .hdr + data_file) for a session"""
+    if session_id not in agent_state.sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not is_cube_filename(file.filename):
+        raise HTTPException(status_code=400, detail="Unsupported cube format. Use .npy, .tif/.tiff or ENVI .hdr")
+
+    cube_dir = os.path.join(SPECTRAL_DATA_DIR, session_id)
+    os.makedirs(cube_dir, exist_ok=True)
+    cube_name = "cube" + os.path.splitext(file.filename)[1].lower()
+    cube_path = os.path.join(cube_dir, cube_name)
+    names = [cube_name]
+    if cube_name.endswith(".hdr"):
+        if not data_file:
+            raise HTTPException(status_code=400, detail="ENVI headers require the binary data_file")
+        names.append(os.path.splitext(cube_name)[0] + ".raw")
+
+    # The session's tile renderer has the current cube memory-mapped; rewriting that file in place
+    # would fault its next read. Stage the upload, check it, then os.replace it into position so the
+    # old mapping keeps its own inode.
+    staging = tempfile.mkdtemp(prefix=".upload-", dir=cube_dir)
     try:
-        system_prompt = payload.get("system_prompt")
-        user_prompt = payload.get("user_prompt")
-        ui_schema = payload.get("ui_schema")
+        # Stream uploads to disk so gigabyte captures never sit in memory
+        for upload, name in zip((file, data_file), names):
+            with open(os.path.join(staging, name), "wb") as out:
+                while chunk := await upload.read(8 * 1024 * 1024):
+                    out.write(chunk)
+        try:
+            band_wavelengths = [float(w) for w in wavelengths.split(",")] if wavelengths else None
+            staged = open_cube(os.path.join(staging, cube_name), band_wavelengths)
+            statistics = await asyncio.to_thread(compute_field_statistics, staged)
+        except (SpectralCubeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f"Could not process spectral cube: {e}")
+        band_wavelengths = staged.wavelengths.tolist()
+        del staged
+        cube_paths = [os.path.join(cube_dir, name) for name in names]
+        for name, path in zip(names, cube_paths):
+            os.replace(os.path.join(staging, name), path)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    cube = open_cube(cube_path, band_wavelengths)
+    await asyncio.to_thread(spectral_maps.register, session_id, cube, cube_paths)
+    if field_id:
+        agent_state.sessions[session_id]["field_id"] = field_id
+
+    agent_state.sessions[session_id]["spectral_cube"] = {
+        "path": cube_path,
+        "files": cube_paths,
+        "wavelengths": cube.wavelengths.tolist(),
+        "statistics": statistics,
+        "uploaded_at": datetime.utcnow().isoformat()
+    }
 
-        if not GOOGLE_CLOUD_PROJECT or not GOOGLE_CLOUD_LOCATION:
-            raise Exception("Vertex AI not initialized. GOOGLE_CLOUD_PROJECT or GOOGLE_CLOUD_LOCATION not set.")
+    return {
+        "session_id": session_id,
+        "status": "ingested",
+        "available_indices": cube.available_indices(),
+        "statistics": statistics
+    }
 
-        model = GenerativeModel("gemini-2.5-pro") # Use the desired Gemini model
-        
-        full_prompt = f"{system_prompt}\n\nHere is the user's request: \"{user_prompt}\"\n\nHere is the UI schema:\n{ui_schema}\n\nWorkflow:"
+async def get_spectral_map_renderer(session_id: str):
+    """Renderer for a session's cube, registering it from the stored files if the map service has none"""
+    renderer = spectral_maps.get_renderer(session_id)
+    if renderer:
+        return renderer
+
+    spectral_cube = agent_state.sessions.get(session_id, {}).get("spectral_cube")
+    if not spectral_cube:
+        raise HTTPException(status_code=404, detail="No spectral cube ingested for this session")
+    cube = open_cube(spectral_cube["path"], spectral_cube["wavelengths"])
+    return await asyncio.to_thread(spectral_maps.register, session_id, cube, spectral_cube["files"])
+
+@app.get("/api/spectral-maps/{session_id}")
+async def get_spectral_map(session_id: str):
+    """Describe the tile pyramid available for a session's spectral cube"""
+    renderer = await get_spectral_map_renderer(session_id)
+    return {
+        "session_id": session_id,
+        "layers": renderer.layers(),
+        "min_zoom": 0,
+        "max_zoom": renderer.max_zoom,
+        "tile_size": 256,
+        "width": renderer.cube.cols,
+        "height": renderer.cube.rows,
+        "formats": list(TILE_FORMATS),
+        "tiles": f"/api/spectral-maps/{session_id}/{{layer}}/{{z}}/{{x}}/{{y}}.png"
+    }
+
+@app.get("/api/spectral-maps/{session_id}/{layer}/{z}/{x}/{tile}")
+async def get_spectral_map_tile(session_id: str, layer: str, z: int, x: int, tile: str, request: Request):
+    """Serve one map tile, rendering it on first request and answering 304 for unchanged ETags"""
+    renderer = await get_spectral_map_renderer(session_id)
+    y_str, _, fmt = tile.partition(".")
+    if fmt not in TILE_FORMATS or not y_str.isdigit():
+        raise HTTPException(status_code=400, detail="Tiles must be requested as {y}.png or {y}.webp")
+    y = int(y_str)
+    if layer not in renderer.layers():
+        raise HTTPException(status_code=404, detail=f"Layer not available: {layer}")
+    if not 0 <= z <= renderer.max_zoom:
+        raise HTTPException(status_code=404, detail="Zoom level out of range")
+    columns, rows = renderer.tile_range(z)
+    if not (0 <= x < columns and 0 <= y < rows):
+        raise HTTPException(status_code=404, detail="Tile out of range")
+
+    etag = renderer.etag(layer, z, x, y, fmt)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    content = await asyncio.to_thread(spectral_maps.get_tile, session_id, layer, z, x, y, fmt)
+    return Response(content=content, media_type=TILE_FORMATS[fmt], headers=headers)
+
+@app.get("/api/spectral-monitoring/{field_id}")
+async def get_spectral_monitoring(field_id: str, since: float = None, limit: int = 100):
+    """Baseline, rolling statistics and recent spectral observations for a field"""
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    try:
+        summary = spectral_monitoring.summary(field_id)
+        summary["history"] = spectral_monitoring.history(field_id, since=since, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return summary
+
+@app.get("/api/metrics")
+async def get_upstream_metrics():
+    """Upstream call metrics, including how many calls request coalescing saved"""
+    return {
+        "coalescing": {flight.name: flight.metrics() for flight in (llm_flight, vision_flight, speech_flight, tts_flight)},
+        "admission": admission.metrics(),
+        "routing": model_router.metrics(),
+        "resilience": upstream_guard.metrics(),
+        "prompts": PROMPTS.metrics(),
+        "prompt_cache": prompt_cache.metrics(),
+        "structured_output": structured_stats.metrics(),
+        "workflow_cache": workflow_cache.metrics(),
+        "schemes": schemes_kb.metrics(),
+        "eligibility": eligibility_engine.metrics(),
+        "mandi_prices": mandi_prices.metrics(),
+        "price_forecasts": price_forecasts.metrics(),
+        "cold_storage": cold_storage.metrics(),
+        "crop_recommendation": crop_recommender.metrics(),
+        "crop_monitor": sensor_store.metrics(),
+        "alerts": alert_engine.metrics(),
+        "community": community.metrics(),
+        "marketplace": product_catalog.metrics(),
+        "orders": order_store.metrics(),
+        "profiles": profile_store.metrics()
+    }
+
+@app.get("/api/schemes/search")
+async def search_government_schemes(q: str, k: int = SCHEMES_TOP_K):
+    """Search the government schemes knowledge base, with a direct answer when the query is about one scheme"""
+    hits = await search_schemes(q, max(1, min(k, 20)))
+    return {"query": q, "answer": schemes_kb.answer(q, hits), "results": hits}
+
+@app.get("/api/schemes/eligible/{user_id}")
+async def get_eligible_schemes(user_id: str):
+    """Schemes a farmer is likely eligible for, ranked, with the profile fields that couldn't be checked"""
+    profile = await asyncio.to_thread(profile_store.get, user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {"user_id": user_id, "schemes": eligibility_engine.match(profile)}
+
+@app.post("/api/schemes/eligibility/batch")
+async def evaluate_member_eligibility(file: UploadFile = File(...), include_members: bool = Form(False)):
+    """Evaluate a cooperative's member table (CSV, one farmer per row) against every scheme"""
+    content = await file.read()
+
+    def evaluate():
+        table = FarmerTable.from_csv(content.decode("utf-8-sig"))
+        result = eligibility_engine.evaluate(table)
+        response = {"members": len(table), "eligible_counts": result.counts()}
+        if include_members:
+            response["results"] = [
+                {"member_id": member_id, "schemes": [match["scheme_id"] for match in result.ranked(row)]}
+                for row, member_id in enumerate(table.ids)
+            ]
+        return response
+
+    try:
+        return await asyncio.to_thread(evaluate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid member table: {e}")
+
+@app.get("/api/crops/recommend")
+async def recommend_crops(district: Optional[str] = None, state: Optional[str] = None, soil: Optional[str] = None,
+                          season: Optional[str] = None, irrigated: Optional[bool] = None, ph: Optional[float] = None,
+                          area_hectares: Optional[float] = None, k: int = 5):
+    """Crops ranked for one plot, with expected yield and water needs; district values fill in what isn't given"""
+    plot = {"district": district, "state": state, "soil": soil and soil.casefold(), "season": season and season.casefold(),
+            "irrigated": irrigated, "ph": ph, "area_hectares": area_hectares}
+    return crop_recommender.recommend(plot, max(1, min(k, 20)))
+
+@app.post("/api/crops/recommend/batch")
+async def recommend_crops_batch(file: UploadFile = File(...), k: int = Form(3)):
+    """Recommendations for every plot in a village CSV (plot_id, district, soil, season, irrigated, area_hectares, ...)"""
+    content = await file.read()
+    try:
+        plots = plots_from_csv(content.decode("utf-8-sig"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid plot table: {e}")
+    results = await asyncio.to_thread(crop_recommender.recommend_many, plots, max(1, min(k, 20)))
+    return {"plots": len(results), "results": results}
+
+@app.post("/api/market/prices/ingest")
+async def ingest_mandi_prices(file: UploadFile = File(...)):
+    """Bulk-load a daily mandi price dump (Agmarknet-style CSV, or Parquet with pyarrow installed)"""
+    suffix = ".parquet" if (file.filename or "").lower().endswith(".parquet") else ".csv"
+    upload_path = os.path.join(DATA_DIR, f"mandi-upload-{uuid.uuid4().hex}{suffix}")
+    with open(upload_path, "wb") as f:
+        while chunk := await file.read(1024 * 1024):
+            f.write(chunk)
+    try:
+        if suffix == ".parquet":
+            result = await asyncio.to_thread(mandi_prices.ingest_parquet, upload_path)
+        else:
+            result = await asyncio.to_thread(mandi_prices.ingest_csv, upload_path)
+    except (ValueError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(upload_path)
+    price_forecasts.request_refresh()
+    return result
+
+@app.get("/api/market/commodities")
+async def list_market_commodities():
+    return {"commodities": sorted(name for name, _, _ in mandi_prices.commodities.values()), "states": mandi_prices.states}
+
+@app.get("/api/market/prices/{commodity}")
+async def get_mandi_prices(commodity: str, state: Optional[str] = None, days: int = 30, as_of: Optional[str] = None):
+    """Current prices, trend and best markets for a commodity (as of a past date if given), with its daily price history"""
+    states = [state] if state else None
+    try:
+        summary = mandi_prices.summary(commodity, states, as_of)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No price data for this commodity")
+    return {"summary": summary, "history": mandi_prices.history(commodity, states, max(1, min(days, 365)))}
+
+@app.get("/api/market/forecast/{commodity}")
+async def get_price_forecast(commodity: str, state: Optional[str] = None):
+    """Precomputed price forecast for a commodity, with sell-now-or-hold advice and backtest accuracy"""
+    if price_forecasts.snapshot is None and len(mandi_prices.records):
+        raise HTTPException(status_code=503, detail="Forecasts are not computed yet")
+    forecast = price_forecasts.lookup(commodity, [state] if state else None)
+    if forecast is None:
+        raise HTTPException(status_code=404, detail="No forecast for this commodity")
+    return forecast
+
+@app.get("/api/cold-storage/availability")
+async def find_cold_storage(crop: str, quantity: str, duration: str, start_date: Optional[str] = None,
+                            latitude: Optional[float] = None, longitude: Optional[float] = None,
+                            state: Optional[str] = None, district: Optional[str] = None, limit: int = 5):
+    """Nearest cold-storage chambers with room for the quantity over the whole stay"""
+    quintals = parse_quantity_quintals(quantity)
+    days = parse_duration_days(duration)
+    if not quintals or not days:
+        raise HTTPException(status_code=400, detail="Quantity and duration must be like '50 quintals' and '3 weeks'")
+    try:
+        options = cold_storage.find_available(crop, quintals, days, storage_day(start_date), latitude, longitude,
+                                              state, district, max(1, min(limit, 20)))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"crop": crop, "quantity_quintals": quintals, "days": days, "options": options}
+
+@app.post("/api/cold-storage/bookings")
+async def book_cold_storage(
+    user_id: str = Form(...),
+    facility_id: str = Form(...),
+    chamber_id: str = Form(...),
+    crop: str = Form(...),
+    quantity: str = Form(...),
+    duration: str = Form(...),
+    start_date: str = Form(None)
+):
+    """Reserve chamber space; 409 when a concurrent booking took the space first"""
+    quintals = parse_quantity_quintals(quantity)
+    days = parse_duration_days(duration)
+    if not quintals or not days:
+        raise HTTPException(status_code=400, detail="Quantity and duration must be like '50 quintals' and '3 weeks'")
+    try:
+        return await asyncio.to_thread(cold_storage.book, facility_id, chamber_id, crop, quintals, days,
+                                       storage_day(start_date), user_id)
+    except CapacityError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Chamber not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/cold-storage/bookings/{user_id}")
+async def list_cold_storage_bookings(user_id: str, include_past: bool = False):
+    return {"user_id": user_id, "bookings": await asyncio.to_thread(cold_storage.bookings, user_id, include_past)}
+
+@app.delete("/api/cold-storage/bookings/{booking_id}")
+async def cancel_cold_storage_booking(booking_id: str):
+    if not await asyncio.to_thread(cold_storage.cancel, booking_id):
+        raise HTTPException(status_code=404, detail="No confirmed booking with this id")
+    return {"booking_id": booking_id, "status": "cancelled"}
+
+@app.get("/api/reminders/metrics")
+async def get_reminder_metrics():
+    """Scheduler backlog and dispatch lag"""
+    return reminder_scheduler.metrics()
+
+@app.get("/api/reminders/{user_id}")
+async def get_user_reminders(user_id: str, limit: int = 100):
+    """Pending reminders for a user, soonest first"""
+    return {"user_id": user_id, "reminders": reminder_scheduler.list_pending(user_id, limit)}
+
+@app.delete("/api/reminders/{reminder_id}")
+async def cancel_reminder(reminder_id: int):
+    if not reminder_scheduler.cancel(reminder_id):
+        raise HTTPException(status_code=404, detail="Pending reminder not found")
+    return {"reminder_id": reminder_id, "status": "cancelled"}
+
+@app.get("/api/agent/notifications/{session_id}")
+async def get_session_notifications(session_id: str):
+    """Drain reminders and alerts delivered to a session"""
+    if session_id not in agent_state.sessions:
+        raise HTTPException(status_code=404, detail="Session not found")
+    notifications = agent_state.sessions[session_id].pop("notifications", [])
+    return {"session_id": session_id, "notifications": notifications}
+
+def workflow_request(payload: Dict[str, Any]):
+    """Prompt, cache key and schema version for a workflow generation request"""
+    system_prompt = payload.get("system_prompt")
+    user_prompt = payload.get("user_prompt")
+    ui_schema = payload.get("ui_schema")
 
-        response = model.generate_content(full_prompt)
-        workflow_json = response.text.strip()
+    version = schema_version(ui_schema, payload.get("ui_schema_version"))
+    workflow_cache.observe_version(version)
+    key = workflow_cache.key(system_prompt, user_prompt, payload.get("language", "en"), version)
 
-        # Clean the response to extract only the JSON object
-        json_start = workflow_json.find('{')
-        json_end = workflow_json.rfind('}') + 1
-        cleaned_workflow_json = workflow_json[json_start:json_end]
+    full_prompt = f"{system_prompt}\n\nHere is the user's request: \"{user_prompt}\"\n\nHere is the UI schema:\n{ui_schema}\n\nWorkflow:"
+    return full_prompt, key, version
 
-        return JSONResponse(json.loads(cleaned_workflow_json))
+@app.post("/api/agent/generate-workflow")
+async def generate_workflow(payload: Dict[str, Any] = Body(...)):
+    try:
+        full_prompt, key, version = workflow_request(payload)
+        cached = workflow_cache.get(key)
+        if cached is not None:
+            return JSONResponse(cached, headers={"X-Workflow-Cache": "hit"})
+
+        result, complete = await generate_structured_checked(full_prompt, Workflow, "plan")
+        workflow = result.model_dump(exclude_none=True)
+        # A repaired response may have been cut off at the output limit; serve it, but don't keep it.
+        if workflow["workflow"] and complete:
+            workflow_cache.put(key, workflow, version)
+
+        return JSONResponse(workflow, headers={"X-Workflow-Cache": "miss"})
+    except OverloadedError:
+        raise
     except Exception as e:
-        logging.error(f"Error generating workflow with Vertex AI: {e}")
+        logging.error(f"Error generating workflow: {e}")
         raise HTTPException(status_code=500, detail=f"Error generating workflow: {e}")
 
+@app.post("/api/agent/generate-workflow/stream")
+async def stream_workflow(payload: Dict[str, Any] = Body(...)):
+    """Server-sent events: one `step` event per workflow step as soon as it is complete, then `done`"""
+    full_prompt, key, version = workflow_request(payload)
+    cached = workflow_cache.get(key)
+
+    async def event_stream():
+        if cached is not None:
+            for index, step in enumerate(cached["workflow"]):
+                yield f"event: step\ndata: {json.dumps({'index': index, 'step': step})}\n\n"
+            yield f"event: done\ndata: {json.dumps({**cached, 'cached': True})}\n\n"
+            return
+
+        parser = IncrementalArrayParser()
+        steps = []
+        try:
+            async for chunk in stream_text(full_prompt, "plan", response_model=Workflow):
+                for item in parser.feed(chunk):
+                    try:
+                        step = WorkflowStep.model_validate(item).model_dump(exclude_none=True)
+                    except ValueError:
+                        continue
+                    yield f"event: step\ndata: {json.dumps({'index': len(steps), 'step': step})}\n\n"
+                    steps.append(step)
+
+            # The full parse picks up anything the incremental pass could not (e.g. repaired JSON).
+            try:
+                value, repaired = parse_json(parser.text)
+                workflow = validate(Workflow, value).model_dump(exclude_none=True)
+                structured_stats.record("Workflow", "repaired" if repaired else "clean")
+                complete = not repaired
+            except StructuredOutputError:
+                structured_stats.record("Workflow", "failed" if not steps else "repaired")
+                workflow = {"workflow": steps}
+                complete = False
+            for index, step in enumerate(workflow["workflow"][len(steps):], start=len(steps)):
+                yield f"event: step\ndata: {json.dumps({'index': index, 'step': step})}\n\n"
+
+            # Only a response that parsed as returned is known to be whole; repaired or recovered ones aren't cached.
+            if workflow["workflow"] and complete:
+                workflow_cache.put(key, workflow, version)
+            yield f"event: done\ndata: {json.dumps({**workflow, 'cached': False})}\n\n"
+        except Exception as e:
+            logging.error(f"Error streaming workflow: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e), 'steps_sent': len(steps)})}\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/api/agent/workflow-cache")
+async def clear_workflow_cache():
+    """Drop all cached workflows, e.g. after a UI change that kept the schema version"""
+    return {"cleared": workflow_cache.clear()}
+
 @app.post("/api/agent/voice-command")
 async def handle_voice_command(
     session_id: str = Form(...),
@@ -1743,6 +2936,9 @@ async def handle_voice_command(
     language: str = Form("en")
 ):
     """Handle voice commands - convert speech to text and process"""
+    # Rate-limit before the paid transcription call, not after it
+    admission.check_rate(session_key=session_id)
+
     # 1. Transcribe audio to text using Google Cloud Speech-to-Text
     transcribed_text = await process_audio_with_gcp(audio_file, language)
     if not transcribed_text:
@@ -1814,9 +3010,10 @@ async def handle_chat_message(
 
     session = agent_state.sessions[session_id]
     session["language"] = language
+    admission.check_rate(session_key=session_id)
 
     try:
-        result = await smart_agent.handle_chat(session_id, message)
+        result = await smart_agent.with_farmer_context(session_id, lambda: smart_agent.handle_chat(session_id, message))
 
         # Add to session history
         session["history"].append({
@@ -1828,6 +3025,8 @@ async def handle_chat_message(
 
         return JSONResponse(result)
 
+    except OverloadedError:
+        raise
     except Exception as e:
         return JSONResponse({
             "error": str(e),
@@ -1844,6 +3043,8 @@ async def text_to_speech(
     try:
         audio_content = await generate_speech_with_gcp(text, language)
         return Response(content=audio_content, media_type="audio/mpeg")
+    except OverloadedError:
+        raise
     except Exception as e:
         logging.error(f"Error in text_to_speech: {e}")
         # Return a simple fallback response instead of raising exception
@@ -1884,25 +3085,277 @@ async def agent_navigation(
         "target_page": page_id
     }
 
+def ingest_sensor_groups(groups) -> Dict[str, Any]:
+    """Store a batch of readings and run the alert rules over it"""
+    result = sensor_store.ingest(groups)
+    try:
+        result["alerts"] = alert_engine.observe("sensor", groups)
+    except Exception as e:
+        # The readings are stored; a fault in alerting shouldn't turn that into an error.
+        logging.error(f"Alert evaluation failed: {e}")
+        result["alerts"] = []
+    return result
+
+@app.post("/api/crop-monitor/readings")
+async def ingest_sensor_readings(payload: Any = Body(...)):
+    """Batched sensor readings: a list of readings, or columnar batches per sensor"""
+    try:
+        groups = readings_from_payload(payload)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid readings: {e}")
+    result = await asyncio.to_thread(ingest_sensor_groups, groups)
+    alert_hub.publish(result["alerts"])
+    return result
+
+@app.websocket("/ws/crop-monitor/ingest")
+async def sensor_ingest_websocket(websocket: WebSocket):
+    """Streaming ingestion: each message is a batch in the same shapes as POST /api/crop-monitor/readings"""
+    await websocket.accept()
+    try:
+        while True:
+            payload = await websocket.receive_json()
+            try:
+                result = await asyncio.to_thread(ingest_sensor_groups, readings_from_payload(payload))
+                alert_hub.publish(result["alerts"])
+            except (ValueError, TypeError) as e:
+                result = {"error": f"Invalid readings: {e}"}
+            await websocket.send_json(result)
+    except WebSocketDisconnect:
+        pass
+
 @app.get("/api/crop-monitor/status")
-async def get_crop_monitor_status():
-    return {"status": "not_implemented"}
+async def get_crop_monitor_status(field_id: Optional[str] = None):
+    """Latest readings, sensor health and this hour's and today's ranges for a field; all fields without one"""
+    if field_id is None:
+        return {"fields": sensor_store.fields_summary()}
+    status = sensor_store.status(field_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="No sensors for this field")
+    return status
+
+@app.get("/api/crop-monitor/{field_id}/history")
+async def get_sensor_history(field_id: str, metric: str = "soil_moisture", start: Optional[str] = None,
+                             end: Optional[str] = None, max_points: int = 500, sensor_id: Optional[str] = None):
+    """A metric over a time range (default the last 24 hours), from the finest rollup that fits max_points"""
+    try:
+        end_ts = parse_sensor_time(end) if end else time.time()
+        start_ts = parse_sensor_time(start) if start else end_ts - 86400
+        history = await asyncio.to_thread(sensor_store.history, field_id, metric, start_ts, end_ts,
+                                          max(1, min(max_points, 5000)), sensor_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if history is None:
+        raise HTTPException(status_code=404, detail="No sensors for this field")
+    return history
+
+@app.get("/api/alerts/rules")
+async def get_alert_rules():
+    return {"rules": ALERT_RULES}
+
+@app.get("/api/alerts/{field_id}")
+async def get_field_alerts(field_id: str, limit: int = 20):
+    """Most recent alerts for a field, newest first"""
+    return {"field_id": field_id, "alerts": alert_hub.history(field_id, max(1, min(limit, 50)))}
+
+@app.websocket("/ws/alerts/{field_id}")
+async def field_alerts_websocket(websocket: WebSocket, field_id: str):
+    """Push alerts for a field as they fire, until the client disconnects"""
+    await websocket.accept()
+    queue = alert_hub.subscribe(field_id)
+
+    async def push():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def drain():
+        # Incoming messages are ignored; receiving is how a disconnect is noticed.
+        while True:
+            await websocket.receive_text()
+
+    tasks = [asyncio.create_task(push()), asyncio.create_task(drain())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        alert_hub.unsubscribe(field_id, queue)
 
 @app.get("/api/community/posts")
-async def get_community_posts():
-    return {"posts": []}
+async def get_community_posts(request: Request, sort: str = "hot", tag: Optional[str] = None,
+                              cursor: Optional[str] = None, limit: int = 20):
+    """Community feed by hot or new, optionally for one tag; pass next_cursor back for the following page"""
+    etag = community.listing_etag("feed", sort, tag, cursor, limit)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        page = await asyncio.to_thread(community.feed, sort, tag, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(page, headers={"ETag": etag})
+
+@app.post("/api/community/posts")
+async def create_community_post(post: Dict[str, Any] = Body(...)):
+    """New post: author_id and body required; title, tags, language and author_name optional"""
+    tags = post.get("tags") or []
+    try:
+        return await asyncio.to_thread(
+            community.create_post, post.get("author_id"), post.get("body"), post.get("title"),
+            tags if isinstance(tags, list) else [tags], post.get("language"), post.get("author_name")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/community/search")
+async def search_community_posts(request: Request, q: str, sort: str = "relevance", tag: Optional[str] = None,
+                                 cursor: Optional[str] = None, limit: int = 20):
+    """Full-text search; crop, disease and pest names match across languages"""
+    etag = community.listing_etag("search", q, sort, tag, cursor, limit)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        page = await asyncio.to_thread(community.search, q, sort, tag, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(page, headers={"ETag": etag})
+
+@app.get("/api/community/posts/{post_id}")
+async def get_community_post(post_id: int, request: Request, cursor: Optional[str] = None, limit: int = 20):
+    """A post with a page of its replies, oldest first"""
+    etag = await asyncio.to_thread(community.post_etag, post_id, cursor, limit)
+    if etag is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    try:
+        page = await asyncio.to_thread(community.get_post, post_id, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return JSONResponse(page, headers={"ETag": etag})
+
+@app.post("/api/community/posts/{post_id}/replies")
+async def reply_to_community_post(post_id: int, reply: Dict[str, Any] = Body(...)):
+    try:
+        return await asyncio.to_thread(community.add_reply, post_id, reply.get("author_id"), reply.get("body"),
+                                       reply.get("author_name"))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Post not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/community/posts/{post_id}/like")
+async def like_community_post(post_id: int, user_id: str = Form(...)):
+    try:
+        return await asyncio.to_thread(community.like, post_id, user_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Post not found")
 
 @app.get("/api/profile/{user_id}")
 async def get_user_profile(user_id: str):
-    return {"user_id": user_id, "status": "not_implemented"}
+    profile = await asyncio.to_thread(profile_store.get, user_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {"user_id": user_id, "profile": profile, "context": profile_context(profile)}
+
+@app.put("/api/profile/{user_id}")
+async def update_user_profile(user_id: str, profile: Dict[str, Any] = Body(...)):
+    """Create or update a farmer profile; fields are merged into any existing profile"""
+    stored = await asyncio.to_thread(profile_store.update, user_id, profile)
+    return {"user_id": user_id, "profile": stored}
 
 @app.get("/api/marketplace/products")
-async def get_marketplace_products():
-    return {"products": []}
+async def get_marketplace_products(q: str = "", category: Optional[str] = None, price_band: Optional[str] = None,
+                                   state: Optional[str] = None, district: Optional[str] = None,
+                                   seller_id: Optional[str] = None, craft_type: Optional[str] = None,
+                                   min_price: Optional[float] = None, max_price: Optional[float] = None,
+                                   in_stock: bool = False, sort: str = "relevance", cursor: Optional[str] = None,
+                                   limit: int = 24):
+    """Catalog search with facet counts; facet parameters take comma-separated values, pass next_cursor back to page"""
+    selected = {"category": category, "price_band": price_band, "state": state, "district": district,
+                "seller_id": seller_id, "craft_type": craft_type}
+    filters = {name: [value.strip() for value in values.split(",")] for name, values in selected.items() if values}
+    try:
+        return await asyncio.to_thread(product_catalog.search, q, filters, min_price, max_price, in_stock,
+                                       sort, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/marketplace/products")
+async def upsert_marketplace_product(product: Dict[str, Any] = Body(...)):
+    """Create or replace a listing: seller_id, title, category and price required; sku makes the id stable"""
+    try:
+        return await asyncio.to_thread(product_catalog.upsert, product)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/marketplace/products/{product_id}")
+async def get_marketplace_product(product_id: str):
+    product = await asyncio.to_thread(product_catalog.get, product_id)
+    if product is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return product
+
+@app.delete("/api/marketplace/products/{product_id}")
+async def delete_marketplace_product(product_id: str):
+    if not await asyncio.to_thread(product_catalog.delete, product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "deleted": True}
+
+@app.post("/api/marketplace/catalog/import")
+async def import_marketplace_catalog(seller_id: str = Form(...), file: UploadFile = File(...)):
+    """Bulk-load a seller catalog (CSV with title, category, price, unit, stock, sku, ... or a JSON list)"""
+    content = await file.read()
+    try:
+        text = content.decode("utf-8-sig")
+        if (file.filename or "").lower().endswith(".json"):
+            products = json.loads(text)
+            if not isinstance(products, list):
+                raise ValueError("JSON catalog must be a list of products")
+        else:
+            products = products_from_csv(text)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid catalog: {e}")
+    return await asyncio.to_thread(product_catalog.import_products, products, seller_id)
+
+@app.post("/api/orders")
+async def create_order(order: Dict[str, Any] = Body(...), idempotency_key: Optional[str] = Header(None)):
+    """Place an order for catalog products ({"user_id", "items": [{"product_id", "quantity"}], "delivery"});
+    retries with the same Idempotency-Key header return the original order"""
+    items = order.get("items") or []
+    try:
+        return await asyncio.to_thread(order_store.create, order.get("user_id"), items if isinstance(items, list) else [items],
+                                       product_catalog.get, order.get("delivery"), idempotency_key)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/orders/{user_id}")
-async def get_user_orders(user_id: str):
-    return {"user_id": user_id, "orders": []}
+async def get_user_orders(user_id: str, status: Optional[str] = None, cursor: Optional[str] = None, limit: int = 20):
+    """The user's order summary and a page of their orders, newest first; pass next_cursor back for the following page"""
+    try:
+        page = await asyncio.to_thread(order_store.history, user_id, status, cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"user_id": user_id, "summary": await asyncio.to_thread(order_store.summary, user_id), **page}
+
+@app.get("/api/orders/{user_id}/{order_id}")
+async def get_user_order(user_id: str, order_id: str):
+    order = await asyncio.to_thread(order_store.get, order_id, user_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return order
+
+@app.post("/api/orders/{user_id}/{order_id}/status")
+async def update_order_status(user_id: str, order_id: str, status: str = Form(...), note: str = Form(None)):
+    """Advance an order (placed, confirmed, packed, shipped, out_for_delivery, delivered) or cancel it before shipping"""
+    try:
+        return await asyncio.to_thread(order_store.update_status, order_id, status, note, user_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Order not found")
+    except ValueError as e:
+        raise HTTPException(status_code=409 if status in ORDER_STATUSES else 400, detail=str(e))
 
 @app.get("/")
 async def root():
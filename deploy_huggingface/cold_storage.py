@@ -0,0 +1,537 @@
+"""Cold-storage facilities, chamber capacity and reservations.
+
+Every chamber keeps its booked quantity per day in a segment tree with lazy
+range-add, so "how full is this chamber at its busiest between these dates" and
+"reserve this much over these dates" are both O(log days). A booking is checked
+and recorded under the chamber's lock, so concurrent requests for the same
+space can never oversell it. Reservations are persisted in SQLite and replayed
+into the trees on start.
+"""
+import json
+import math
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Days from the tree's base day that bookings may reach; rebased once half is in the past.
+HORIZON_DAYS = 1024
+MAX_BOOKING_DAYS = 365
+DEFAULT_OPTIONS = 5
+
+CROP_TEMPERATURE_CLASS = {
+    "potato": "cold", "aloo": "cold", "आलू": "cold",
+    "carrot": "cold", "cabbage": "cold", "cauliflower": "cold", "pea": "cold", "garlic": "cold",
+    "grape": "cold", "orange": "cold", "kinnow": "cold", "pomegranate": "cold",
+    "apple": "controlled_atmosphere", "pear": "controlled_atmosphere", "सेब": "controlled_atmosphere",
+    "onion": "cool", "प्याज": "cool", "tomato": "cool", "टमाटर": "cool", "banana": "cool",
+    "mango": "cool", "chilli": "cool", "mirchi": "cool", "मिर्च": "cool", "ginger": "cool",
+    "fish": "frozen", "meat": "frozen", "frozen": "frozen", "ice cream": "frozen",
+}
+DEFAULT_TEMPERATURE_CLASS = "cold"
+
+QUINTALS_PER_UNIT = {
+    "quintal": 1.0, "qtl": 1.0, "q": 1.0, "क्विंटल": 1.0,
+    "tonne": 10.0, "ton": 10.0, "t": 10.0, "mt": 10.0, "टन": 10.0,
+    "kg": 0.01, "kilo": 0.01, "किलो": 0.01,
+    # Standard 50 kg jute bag.
+    "bag": 0.5, "bori": 0.5, "बोरी": 0.5,
+}
+DAYS_PER_UNIT = {
+    "day": 1, "दिन": 1, "week": 7, "wk": 7, "हफ्ते": 7, "सप्ताह": 7,
+    "month": 30, "महीने": 30, "महीना": 30, "year": 365, "साल": 365,
+}
+# Units are Latin or Indic words; `\w` alone would split Devanagari on its vowel signs.
+AMOUNT_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*([a-zऀ-෿]+)?")
+WORD_PATTERN = re.compile(r"[a-zऀ-෿]+")
+
+# Replies to an offered list of chambers: an option number or ordinal, a plain yes, or a no.
+CHOICE_ORDINALS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "fifth": 5,
+                   "pehla": 1, "pehle": 1, "doosra": 2, "dusra": 2, "teesra": 3, "tisra": 3,
+                   "पहला": 1, "पहले": 1, "दूसरा": 2, "तीसरा": 3}
+CONFIRM_WORDS = {"yes", "yeah", "ok", "okay", "confirm", "book", "haan", "han", "ha", "ji", "theek", "हाँ", "हां", "ठीक"}
+DECLINE_WORDS = {"no", "nahi", "nahin", "cancel", "dont", "नहीं", "नही", "मत"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS bookings (
+    id TEXT PRIMARY KEY,
+    facility_id TEXT NOT NULL,
+    chamber_id TEXT NOT NULL,
+    user_id TEXT,
+    crop TEXT NOT NULL,
+    quantity_quintals REAL NOT NULL,
+    start_day INTEGER NOT NULL,
+    end_day INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'confirmed',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_bookings_status_end ON bookings (status, end_day);
+CREATE INDEX IF NOT EXISTS idx_bookings_user ON bookings (user_id, status);
+"""
+
+
+class CapacityError(ValueError):
+    """The chamber no longer has room for the booking over the requested dates."""
+
+
+def day_number(value: Any) -> int:
+    """Days since 1970-01-01 for a date, an ISO date string, or today when None."""
+    if value is None:
+        value = date.today()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value.strip()[:10])
+    return (value - date(1970, 1, 1)).days
+
+
+def day_to_iso(day: int) -> str:
+    return (date(1970, 1, 1) + timedelta(days=int(day))).isoformat()
+
+
+def _words(text: str) -> str:
+    """Text as space-padded lowercase words, so whole words and phrases match with `in`."""
+    return f" {' '.join(WORD_PATTERN.findall(text.casefold()))} "
+
+
+def temperature_class(crop: str) -> str:
+    """Storage class of the first known crop named as a whole word ("potatoes" yes, "pineapple" not apple)."""
+    words = _words(crop)
+    for name, storage_class in CROP_TEMPERATURE_CLASS.items():
+        if f" {name} " in words or f" {name}s " in words or f" {name}es " in words:
+            return storage_class
+    return DEFAULT_TEMPERATURE_CLASS
+
+
+def parse_choice(text: str, count: int) -> Optional[int]:
+    """Index of the offered option a reply accepts: "2" or "second" picks that one, a plain "yes" the first.
+
+    None when the reply declines, is unclear, or names an option that wasn't offered.
+    """
+    words = _words(text).split()
+    number = re.search(r"(?<![\d.])([1-9])(?![\d.])", text)
+    picked = int(number.group(1)) if number else next(
+        (CHOICE_ORDINALS[word] for word in words if word in CHOICE_ORDINALS), None)
+    if picked is not None:
+        return picked - 1 if picked <= count else None
+    if any(word in DECLINE_WORDS for word in words) or "don't" in text.casefold():
+        return None
+    return 0 if count and any(word in CONFIRM_WORDS for word in words) else None
+
+
+def _amount(text: Any, units: Dict[str, float], default_unit: float) -> Optional[float]:
+    if isinstance(text, (int, float)):
+        return float(text)
+    for number, unit in AMOUNT_PATTERN.findall(str(text or "").casefold()):
+        if not unit:
+            return float(number) * default_unit
+        for name, factor in units.items():
+            if unit == name or (len(name) > 1 and unit.startswith(name)):
+                return float(number) * factor
+    return None
+
+
+def parse_quantity_quintals(text: Any) -> Optional[float]:
+    """'50 quintals', '5 tonnes', '800kg', '100 bags' -> quintals; a bare number is taken as quintals."""
+    return _amount(text, QUINTALS_PER_UNIT, 1.0)
+
+
+def parse_duration_days(text: Any) -> Optional[int]:
+    """'3 weeks', '2 months', '45 days' -> days; a bare number is taken as days."""
+    days = _amount(text, DAYS_PER_UNIT, 1)
+    return int(math.ceil(days)) if days else None
+
+
+class OccupancyTree:
+    """Booked quantity per day: range add and range max in O(log n) via a lazy segment tree."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.peak = [0.0] * (4 * size)
+        self.pending = [0.0] * (4 * size)
+
+    def add(self, lo: int, hi: int, amount: float):
+        """Add `amount` to every day in [lo, hi)."""
+        self._add(1, 0, self.size, lo, hi, amount)
+
+    def max(self, lo: int, hi: int) -> float:
+        """Largest booked quantity on any day in [lo, hi)."""
+        return self._max(1, 0, self.size, lo, hi)
+
+    def _add(self, node: int, left: int, right: int, lo: int, hi: int, amount: float):
+        if hi <= left or right <= lo:
+            return
+        if lo <= left and right <= hi:
+            self.peak[node] += amount
+            self.pending[node] += amount
+            return
+        middle = (left + right) // 2
+        self._add(2 * node, left, middle, lo, hi, amount)
+        self._add(2 * node + 1, middle, right, lo, hi, amount)
+        self.peak[node] = max(self.peak[2 * node], self.peak[2 * node + 1]) + self.pending[node]
+
+    def _max(self, node: int, left: int, right: int, lo: int, hi: int) -> float:
+        if hi <= left or right <= lo:
+            return float("-inf")
+        if lo <= left and right <= hi:
+            return self.peak[node]
+        middle = (left + right) // 2
+        return max(self._max(2 * node, left, middle, lo, hi),
+                   self._max(2 * node + 1, middle, right, lo, hi)) + self.pending[node]
+
+
+class Chamber:
+    def __init__(self, facility: Dict[str, Any], spec: Dict[str, Any], base_day: int):
+        self.facility = facility
+        self.id = spec["id"]
+        self.key = f"{facility['id']}/{spec['id']}"
+        self.temperature_class = spec["temperature_class"]
+        self.capacity = float(spec["capacity_quintals"])
+        self.rate = float(spec.get("rate_per_quintal_day", 0.0))
+        # Re-entrant: booking holds it while validating, and validation may rebase.
+        self.lock = threading.RLock()
+        self.active: Dict[str, Tuple[int, int, float]] = {}
+        self.rebase(base_day)
+
+    def rebase(self, base_day: int):
+        """Start a fresh tree at `base_day`, replaying reservations that haven't ended."""
+        self.base_day = base_day
+        self.tree = OccupancyTree(HORIZON_DAYS)
+        self.active = {booking_id: span for booking_id, span in self.active.items() if span[1] > base_day}
+        for start, end, quantity in self.active.values():
+            self._apply(start, end, quantity)
+
+    def _apply(self, start: int, end: int, quantity: float):
+        self.tree.add(max(start, self.base_day) - self.base_day, end - self.base_day, quantity)
+
+    def free(self, start: int, end: int) -> float:
+        return self.capacity - max(self.tree.max(start - self.base_day, end - self.base_day), 0.0)
+
+
+class ColdStorageStore:
+    def __init__(self, facilities: List[Dict[str, Any]], db_path: str):
+        self.facilities = {facility["id"]: facility for facility in facilities}
+        self.base_day = day_number(None)
+        self.chambers: Dict[str, Chamber] = {}
+        for facility in facilities:
+            for spec in facility["chambers"]:
+                chamber = Chamber(facility, spec, self.base_day)
+                self.chambers[chamber.key] = chamber
+        # Per temperature class: chambers and their coordinates, for vectorized distance ranking.
+        self.by_class: Dict[str, Tuple[List[Chamber], np.ndarray]] = {}
+        for chamber in self.chambers.values():
+            self.by_class.setdefault(chamber.temperature_class, ([], None))[0].append(chamber)
+        for storage_class, (chambers, _) in self.by_class.items():
+            coordinates = np.radians([[c.facility["latitude"], c.facility["longitude"]] for c in chambers])
+            self.by_class[storage_class] = (chambers, coordinates)
+
+        self.db_lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.stats = {"searches": 0, "search_seconds": 0.0, "confirmed": 0, "rejected": 0, "cancelled": 0}
+        self._load_active()
+
+    @classmethod
+    def load(cls, facilities_path: str, db_path: str) -> "ColdStorageStore":
+        with open(facilities_path, encoding="utf-8") as f:
+            return cls(json.load(f), db_path)
+
+    def _load_active(self):
+        rows = self.conn.execute(
+            "SELECT id, facility_id, chamber_id, start_day, end_day, quantity_quintals FROM bookings "
+            "WHERE status = 'confirmed' AND end_day > ?", (self.base_day,)
+        ).fetchall()
+        for booking_id, facility_id, chamber_id, start, end, quantity in rows:
+            chamber = self.chambers.get(f"{facility_id}/{chamber_id}")
+            if chamber is not None:
+                chamber.active[booking_id] = (start, end, quantity)
+                chamber._apply(start, end, quantity)
+
+    def close(self):
+        self.conn.close()
+
+    def find_location(self, text: str) -> Tuple[Optional[str], Optional[str]]:
+        """(state, district) of a facility location named in free text, e.g. "near Agra"."""
+        lowered = _words(text)
+        for facility in self.facilities.values():
+            if f" {facility['district'].casefold()} " in lowered:
+                return facility["state"], facility["district"]
+        for facility in self.facilities.values():
+            if f" {facility['state'].casefold()} " in lowered:
+                return facility["state"], None
+        return None, None
+
+    def _window(self, chamber: Chamber, start_day: int, days: int) -> int:
+        """Validate a booking window against today and the chamber's tree; returns the end day."""
+        today = day_number(None)
+        if today - chamber.base_day > HORIZON_DAYS // 2:
+            with chamber.lock:
+                if today - chamber.base_day > HORIZON_DAYS // 2:
+                    chamber.rebase(today)
+        if not 1 <= days <= MAX_BOOKING_DAYS:
+            raise ValueError(f"Storage duration must be between 1 and {MAX_BOOKING_DAYS} days")
+        if start_day < today or start_day + days > chamber.base_day + HORIZON_DAYS:
+            raise ValueError("Storage must start today or later, within the booking horizon")
+        return start_day + days
+
+    def find_available(self, crop: str, quantity: float, days: int, start_day: Optional[int] = None,
+                       latitude: Optional[float] = None, longitude: Optional[float] = None,
+                       state: Optional[str] = None, district: Optional[str] = None,
+                       limit: int = DEFAULT_OPTIONS) -> List[Dict[str, Any]]:
+        """Nearest chambers of the crop's temperature class with room for `quantity` over the whole stay."""
+        started = time.perf_counter()
+        start_day = day_number(None) if start_day is None else start_day
+        chambers, coordinates = self.by_class.get(temperature_class(crop), ([], None))
+        if not chambers:
+            return []
+        distances = np.full(len(chambers), np.nan)
+        if latitude is not None and longitude is not None:
+            distances = _haversine_km(coordinates, math.radians(latitude), math.radians(longitude))
+            order = np.argsort(distances, kind="stable")
+        else:
+            # Without coordinates, same district first, then same state, then everything else.
+            rank = [
+                0 if district and c.facility["district"].casefold() == district.casefold()
+                else 1 if state and c.facility["state"].casefold() == state.casefold() else 2
+                for c in chambers
+            ]
+            order = np.argsort(rank, kind="stable")
+
+        options = []
+        for index in order:
+            chamber = chambers[index]
+            end_day = self._window(chamber, start_day, days)
+            free = chamber.free(start_day, end_day)
+            if free < quantity:
+                continue
+            options.append({
+                "facility_id": chamber.facility["id"],
+                "chamber_id": chamber.id,
+                "facility": chamber.facility["name"],
+                "district": chamber.facility["district"],
+                "state": chamber.facility["state"],
+                "temperature_class": chamber.temperature_class,
+                "distance_km": None if np.isnan(distances[index]) else round(float(distances[index]), 1),
+                "free_quintals": round(free, 2),
+                "rate_per_quintal_day": chamber.rate,
+                "estimated_cost": round(chamber.rate * quantity * days, 2),
+                "start_date": day_to_iso(start_day),
+                "end_date": day_to_iso(end_day),
+            })
+            if len(options) >= limit:
+                break
+        self.stats["searches"] += 1
+        self.stats["search_seconds"] += time.perf_counter() - started
+        return options
+
+    def book(self, facility_id: str, chamber_id: str, crop: str, quantity: float, days: int,
+             start_day: Optional[int] = None, user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Reserve space atomically: the capacity check and the reservation happen under the chamber lock."""
+        chamber = self.chambers.get(f"{facility_id}/{chamber_id}")
+        if chamber is None:
+            raise KeyError(f"Unknown chamber {facility_id}/{chamber_id}")
+        if quantity <= 0:
+            raise ValueError("Quantity must be positive")
+        start_day = day_number(None) if start_day is None else start_day
+        booking_id = uuid.uuid4().hex
+        with chamber.lock:
+            end_day = self._window(chamber, start_day, days)
+            free = chamber.free(start_day, end_day)
+            if free < quantity:
+                self.stats["rejected"] += 1
+                raise CapacityError(f"Only {max(free, 0):.1f} quintals free in this chamber for those dates")
+            created_at = time.time()
+            with self.db_lock, self.conn:
+                self.conn.execute(
+                    "INSERT INTO bookings (id, facility_id, chamber_id, user_id, crop, quantity_quintals, "
+                    "start_day, end_day, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (booking_id, facility_id, chamber_id, user_id, crop, quantity, start_day, end_day, created_at),
+                )
+            chamber.active[booking_id] = (start_day, end_day, quantity)
+            chamber._apply(start_day, end_day, quantity)
+            self.stats["confirmed"] += 1
+        return {
+            "booking_id": booking_id, "facility_id": facility_id, "chamber_id": chamber_id,
+            "facility": chamber.facility["name"], "user_id": user_id, "crop": crop,
+            "quantity_quintals": quantity, "start_date": day_to_iso(start_day), "end_date": day_to_iso(end_day),
+            "estimated_cost": round(chamber.rate * quantity * days, 2), "status": "confirmed",
+        }
+
+    def cancel(self, booking_id: str) -> bool:
+        row = self.get(booking_id)
+        if row is None or row["status"] != "confirmed":
+            return False
+        chamber = self.chambers.get(f"{row['facility_id']}/{row['chamber_id']}")
+        if chamber is None:
+            # The chamber left the facility list since booking; only the record is left to update.
+            with self.db_lock, self.conn:
+                updated = self.conn.execute(
+                    "UPDATE bookings SET status = 'cancelled' WHERE id = ? AND status = 'confirmed'", (booking_id,)
+                ).rowcount
+            if updated:
+                self.stats["cancelled"] += 1
+            return bool(updated)
+        with chamber.lock:
+            with self.db_lock, self.conn:
+                updated = self.conn.execute(
+                    "UPDATE bookings SET status = 'cancelled' WHERE id = ? AND status = 'confirmed'", (booking_id,)
+                ).rowcount
+            if not updated:
+                return False
+            span = chamber.active.pop(booking_id, None)
+            if span is not None:
+                chamber._apply(span[0], span[1], -span[2])
+            self.stats["cancelled"] += 1
+        return True
+
+    def get(self, booking_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._select("WHERE id = ?", (booking_id,))
+        return rows[0] if rows else None
+
+    def bookings(self, user_id: str, include_past: bool = False) -> List[Dict[str, Any]]:
+        if include_past:
+            return self._select("WHERE user_id = ? ORDER BY start_day", (user_id,))
+        return self._select("WHERE user_id = ? AND status = 'confirmed' AND end_day > ? ORDER BY start_day",
+                            (user_id, day_number(None)))
+
+    def _select(self, where: str, params: tuple) -> List[Dict[str, Any]]:
+        with self.db_lock:
+            cursor = self.conn.execute(
+                "SELECT id, facility_id, chamber_id, user_id, crop, quantity_quintals, start_day, end_day, status "
+                f"FROM bookings {where}", params
+            )
+            rows = cursor.fetchall()
+        return [{
+            "booking_id": booking_id, "facility_id": facility_id, "chamber_id": chamber_id,
+            "facility": self.facilities.get(facility_id, {}).get("name"), "user_id": user_id, "crop": crop,
+            "quantity_quintals": quantity, "start_date": day_to_iso(start), "end_date": day_to_iso(end),
+            "status": status,
+        } for booking_id, facility_id, chamber_id, user_id, crop, quantity, start, end, status in rows]
+
+    def metrics(self) -> Dict[str, Any]:
+        searches = self.stats["searches"]
+        return {
+            "facilities": len(self.facilities),
+            "chambers": len(self.chambers),
+            "active_bookings": sum(len(chamber.active) for chamber in self.chambers.values()),
+            "confirmed": self.stats["confirmed"],
+            "rejected": self.stats["rejected"],
+            "cancelled": self.stats["cancelled"],
+            "searches": searches,
+            "avg_search_ms": round(self.stats["search_seconds"] / searches * 1000, 3) if searches else 0.0,
+        }
+
+
+def _haversine_km(coordinates: np.ndarray, latitude: float, longitude: float) -> np.ndarray:
+    dlat = coordinates[:, 0] - latitude
+    dlon = coordinates[:, 1] - longitude
+    a = np.sin(dlat / 2) ** 2 + np.cos(latitude) * np.cos(coordinates[:, 0]) * np.sin(dlon / 2) ** 2
+    return 6371.0 * 2 * np.arcsin(np.sqrt(a))
+
+
+def describe_options(crop: str, quantity: float, days: int, options: List[Dict[str, Any]]) -> str:
+    if not options:
+        return f"No cold storage with room for {quantity:g} quintals of {crop} for {days} days was found."
+    best = options[0]
+    where = f"{best['facility']}, {best['district']}"
+    if best["distance_km"] is not None:
+        where += f" ({best['distance_km']:.0f} km away)"
+    return (f"{where} has {best['free_quintals']:g} quintals free for {crop} from {best['start_date']} to "
+            f"{best['end_date']}, at about Rs {best['estimated_cost']:,.0f} in total.")
+
+
+def contention_test(threads: int = 32, attempts_per_thread: int = 200, capacity: float = 20000.0,
+                    seed: int = 0) -> Dict[str, Any]:
+    """Hammer one chamber with overlapping bookings from many threads and check nothing is oversold."""
+    facility = {"id": "load", "name": "Load test", "district": "-", "state": "-", "latitude": 0.0, "longitude": 0.0,
+                "chambers": [{"id": "A", "temperature_class": "cold", "capacity_quintals": capacity}]}
+    with tempfile.TemporaryDirectory() as root:
+        store = ColdStorageStore([facility], f"{root}/bookings.db")
+        today = day_number(None)
+        outcomes = {"confirmed": 0, "rejected": 0}
+        outcome_lock = threading.Lock()
+
+        def worker(index: int):
+            rng = np.random.default_rng(seed + index)
+            for _ in range(attempts_per_thread):
+                start = today + int(rng.integers(0, 60))
+                try:
+                    store.book("load", "A", "potato", float(rng.integers(5, 50)), int(rng.integers(7, 45)), start)
+                    outcome = "confirmed"
+                except CapacityError:
+                    outcome = "rejected"
+                with outcome_lock:
+                    outcomes[outcome] += 1
+
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        # Recount occupancy from the database, independent of the tree.
+        rows = store.conn.execute(
+            "SELECT start_day, end_day, quantity_quintals FROM bookings WHERE status = 'confirmed'"
+        ).fetchall()
+        occupancy = np.zeros(HORIZON_DAYS)
+        for start, end, quantity in rows:
+            occupancy[start - today:end - today] += quantity
+        chamber = store.chambers["load/A"]
+        store.close()
+    attempts = threads * attempts_per_thread
+    return {
+        "threads": threads,
+        "attempts": attempts,
+        "confirmed": outcomes["confirmed"],
+        "rejected": outcomes["rejected"],
+        "seconds": round(elapsed, 3),
+        "bookings_per_second": round(attempts / elapsed),
+        "peak_occupancy": float(occupancy.max()),
+        "capacity": capacity,
+        "oversold": bool(occupancy.max() > capacity + 1e-6),
+        "tree_matches_database": bool(abs(chamber.tree.max(0, HORIZON_DAYS) - occupancy.max()) < 1e-6),
+    }
+
+
+def search_benchmark(facilities: int = 2000, bookings: int = 20000, searches: int = 1000, seed: int = 0) -> Dict[str, Any]:
+    """Search latency over a large synthetic network with many existing reservations."""
+    rng = np.random.default_rng(seed)
+    network = [{
+        "id": f"f{index}", "name": f"Facility {index}", "district": f"District {index % 300}", "state": "-",
+        "latitude": float(rng.uniform(8, 34)), "longitude": float(rng.uniform(68, 92)),
+        "chambers": [{"id": "A", "temperature_class": "cold", "capacity_quintals": 5000, "rate_per_quintal_day": 1.5}],
+    } for index in range(facilities)]
+    with tempfile.TemporaryDirectory() as root:
+        store = ColdStorageStore(network, f"{root}/bookings.db")
+        today = day_number(None)
+        started = time.perf_counter()
+        for _ in range(bookings):
+            try:
+                store.book(f"f{rng.integers(facilities)}", "A", "potato", float(rng.integers(50, 1500)),
+                           int(rng.integers(7, 120)), today + int(rng.integers(0, 90)))
+            except CapacityError:
+                pass
+        booking_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        for _ in range(searches):
+            store.find_available("potato", 2000, 21, today + int(rng.integers(0, 60)),
+                                 latitude=float(rng.uniform(8, 34)), longitude=float(rng.uniform(68, 92)))
+        search_seconds = time.perf_counter() - started
+        store.close()
+    return {
+        "facilities": facilities,
+        "bookings": bookings,
+        "avg_booking_ms": round(booking_seconds / bookings * 1000, 3),
+        "avg_search_ms": round(search_seconds / searches * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps({"contention": contention_test(), "search": search_benchmark()}, indent=2))
@@ -0,0 +1,590 @@
+"""Community feed: farmer posts, replies, likes and tags in SQLite with FTS5 search.
+
+Every ordering the API serves is backed by an index and paginated by keyset
+cursors, so a page costs the same at post 20 as at post 1,000,000:
+
+- "new": posts by id.
+- "hot": an indexed `hot` column. It is recomputed on the write that changes a
+  post's engagement and mirrored into `post_tags`, so tag feeds are index range
+  scans as well. The score grows linearly with creation time and
+  logarithmically with engagement, so stored scores never need to decay.
+- search: an external-content FTS5 index over title, body and tags. Crop,
+  disease and pest terms are expanded across languages from the knowledge
+  files ("गेहूं" also finds "wheat"). Relevance is ranked among the newest
+  SEARCH_CANDIDATES matches, so a common term like "wheat" cannot force a sort
+  over every post that mentions it.
+
+Writes bump a persistent version number, and the API derives feed ETags from it
+so unchanged pages are answered with 304. Reads use one connection per thread;
+WAL mode lets them proceed while a write is in progress.
+"""
+import base64
+import hashlib
+import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[\wऀ-෿]+")
+# unicode61 treats Indic vowel signs and viramas as separators and would split "गेहूं" into fragments.
+INDIC_MARKS = "".join(chr(c) for c in range(0x900, 0xE00) if unicodedata.category(chr(c)) in ("Mn", "Mc"))
+FTS_TOKENIZER = f"unicode61 remove_diacritics 2 tokenchars '{INDIC_MARKS}'"
+
+HOT_EPOCH = 1_700_000_000
+# Ten times the engagement is worth a post being this much newer.
+HOT_GRAVITY_SECONDS = 45000
+SEARCH_CANDIDATES = 1000
+MAX_PAGE_SIZE = 50
+MAX_TAGS = 8
+MAX_TITLE_CHARS = 200
+MAX_BODY_CHARS = 5000
+EXCERPT_CHARS = 280
+SORTS = ("hot", "new")
+SEARCH_SORTS = ("relevance", "new")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "at", "be", "can", "do", "does", "for", "from", "has", "have", "how", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "our", "should", "the", "there", "this", "to", "what", "when", "which",
+    "why", "will", "with", "you", "your", "any", "about", "please", "tell", "show", "community", "farmers", "posts",
+    "का", "की", "के", "को", "में", "से", "पर", "और", "है", "हैं", "क्या", "कैसे", "मेरे", "मेरी", "मेरा", "लिए",
+    "तो", "भी", "यह", "वह", "हो", "रहा", "रही", "रहे", "कोई", "बताओ", "बताइए",
+}
+
+SCRIPT_LANGUAGES = (
+    (0x0900, 0x097F, "hi"), (0x0980, 0x09FF, "bn"), (0x0A00, 0x0A7F, "pa"), (0x0A80, 0x0AFF, "gu"),
+    (0x0B00, 0x0B7F, "or"), (0x0B80, 0x0BFF, "ta"), (0x0C00, 0x0C7F, "te"), (0x0C80, 0x0CFF, "kn"),
+    (0x0D00, 0x0D7F, "ml"),
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    author_id TEXT NOT NULL,
+    author_name TEXT,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '',
+    language TEXT,
+    created_at REAL NOT NULL,
+    last_activity REAL NOT NULL,
+    reply_count INTEGER NOT NULL DEFAULT 0,
+    like_count INTEGER NOT NULL DEFAULT 0,
+    hot REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_posts_hot ON posts (hot DESC, id DESC);
+CREATE TABLE IF NOT EXISTS post_tags (
+    tag TEXT NOT NULL,
+    post_id INTEGER NOT NULL,
+    hot REAL NOT NULL,
+    PRIMARY KEY (tag, post_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_post_tags_hot ON post_tags (tag, hot DESC, post_id DESC);
+CREATE TABLE IF NOT EXISTS replies (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id INTEGER NOT NULL,
+    author_id TEXT NOT NULL,
+    author_name TEXT,
+    body TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_replies_post ON replies (post_id, id);
+CREATE TABLE IF NOT EXISTS likes (
+    post_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    PRIMARY KEY (post_id, user_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+    title, body, tags, content='posts', content_rowid='id', tokenize="{FTS_TOKENIZER}"
+);
+"""
+
+POST_COLUMNS = ("id", "author_id", "author_name", "title", "body", "tags", "language", "created_at",
+                "last_activity", "reply_count", "like_count", "hot")
+POST_SELECT = ", ".join(f"p.{column}" for column in POST_COLUMNS)
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(unicodedata.normalize("NFC", text).casefold())
+
+
+def hot_score(like_count: int, reply_count: int, created_at: float) -> float:
+    engagement = 1 + like_count + 2 * reply_count
+    return math.log10(engagement) + (created_at - HOT_EPOCH) / HOT_GRAVITY_SECONDS
+
+
+def detect_language(text: str) -> str:
+    """Language code from the dominant Indic script, "en" when there is none."""
+    counts: Dict[str, int] = {}
+    for char in text:
+        code = ord(char)
+        for start, end, language in SCRIPT_LANGUAGES:
+            if start <= code <= end:
+                counts[language] = counts.get(language, 0) + 1
+                break
+    return max(counts, key=counts.get) if counts else "en"
+
+
+def normalize_tag(tag: str) -> str:
+    return "-".join(tokenize(tag))[:32]
+
+
+# JSON types accepted for each value type a cursor declares; JSON has no separate float for whole numbers.
+CURSOR_TYPES = {int: (int,), float: (int, float), str: (str,)}
+
+
+def encode_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str, *types: type) -> list:
+    """Values of an encode_cursor(kind, ...) cursor; ValueError unless they match `types` in number and type."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or not values or values[0] != kind:
+        raise ValueError("Cursor does not belong to this listing")
+    values = values[1:]
+    # Cursors come back from clients, so a crafted one must not reach the query with the wrong shape.
+    if len(values) != len(types) or not all(
+            isinstance(value, CURSOR_TYPES[expected]) and not isinstance(value, bool)
+            for value, expected in zip(values, types)):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+class TermIndex:
+    """Multilingual crop, disease and pest vocabulary used for search expansion and automatic tags."""
+
+    def __init__(self, groups: Sequence[Dict[str, Any]]):
+        self.groups: Dict[str, List[Tuple[str, ...]]] = {}
+        self.phrases: Dict[Tuple[str, ...], str] = {}
+        for group in groups:
+            phrases = {tuple(tokenize(name)) for name in [group["id"].replace("-", " "), group["name"], *group.get("aliases", ())]}
+            phrases.discard(())
+            self.groups[group["id"]] = sorted(phrases)
+            for phrase in phrases:
+                self.phrases.setdefault(phrase, group["id"])
+        self.longest = max((len(phrase) for phrase in self.phrases), default=1)
+
+    @classmethod
+    def load(cls, *paths: str) -> "TermIndex":
+        groups = []
+        for path in paths:
+            with open(path, encoding="utf-8") as f:
+                groups.extend(json.load(f))
+        return cls(groups)
+
+    def analyze(self, text: str) -> List[Tuple[Optional[str], List[Tuple[str, ...]]]]:
+        """Query clauses as (group id or None, alternative phrases), matching the longest known phrase first."""
+        tokens = tokenize(text)
+        clauses, i = [], 0
+        while i < len(tokens):
+            for size in range(min(self.longest, len(tokens) - i), 0, -1):
+                group = self.phrases.get(tuple(tokens[i:i + size]))
+                if group is not None:
+                    clauses.append((group, self.groups[group]))
+                    i += size
+                    break
+            else:
+                if tokens[i] not in STOPWORDS and not tokens[i].isdigit():
+                    clauses.append((None, [(tokens[i],)]))
+                i += 1
+        return clauses
+
+    def tags(self, text: str) -> List[str]:
+        return list(dict.fromkeys(group for group, _ in self.analyze(text) if group))
+
+    def match_query(self, text: str, match_all: bool = True) -> Optional[str]:
+        """FTS5 query for `text`; with match_all=False any known term is enough and other words only rank."""
+        clauses = self.analyze(text)
+        if not match_all and any(group for group, _ in clauses):
+            clauses = [clause for clause in clauses if clause[0]]
+        parts = []
+        for _, phrases in dict.fromkeys((group, tuple(phrases)) for group, phrases in clauses):
+            alternatives = " OR ".join('"' + " ".join(phrase) + '"' for phrase in phrases)
+            parts.append(f"({alternatives})" if len(phrases) > 1 else alternatives)
+        if not parts:
+            return None
+        return (" AND " if match_all else " OR ").join(parts)
+
+
+class CommunityStore:
+    def __init__(self, db_path: str, terms: TermIndex):
+        self.db_path = db_path
+        self.terms = terms
+        self.write_lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.executescript(FTS_SCHEMA)
+        self.version = self.conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        self.local = threading.local()
+        self.readers: List[sqlite3.Connection] = []
+        self.stats = {"posts_created": 0, "replies_created": 0, "likes": 0}
+        self.latencies: Dict[str, Deque[float]] = {name: deque(maxlen=1000) for name in ("feed", "search", "post")}
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+        self.conn.close()
+
+    def _reader(self) -> sqlite3.Connection:
+        reader = getattr(self.local, "conn", None)
+        if reader is None:
+            reader = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.local.conn = reader
+            with self.write_lock:
+                self.readers.append(reader)
+        return reader
+
+    def _bump_version(self):
+        self.conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        self.version += 1
+
+    # Writes
+
+    def create_post(self, author_id: str, body: str, title: Optional[str] = None, tags: Iterable[str] = (),
+                    language: Optional[str] = None, author_name: Optional[str] = None,
+                    created_at: Optional[float] = None) -> Dict[str, Any]:
+        body = (body or "").strip()
+        title = (title or "").strip() or body.split("\n", 1)[0][:80]
+        if not author_id:
+            raise ValueError("author_id is required")
+        if not body:
+            raise ValueError("Post body is required")
+        if len(body) > MAX_BODY_CHARS or len(title) > MAX_TITLE_CHARS:
+            raise ValueError(f"Posts are limited to {MAX_TITLE_CHARS} title and {MAX_BODY_CHARS} body characters")
+        tag_list = self._tags(tags, f"{title} {body}")
+        created_at = time.time() if created_at is None else created_at
+        hot = hot_score(0, 0, created_at)
+        language = language or detect_language(f"{title} {body}")
+        with self.write_lock, self.conn:
+            post_id = self.conn.execute(
+                "INSERT INTO posts (author_id, author_name, title, body, tags, language, created_at, last_activity, hot) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (author_id, author_name, title, body, " ".join(tag_list), language, created_at, created_at, hot),
+            ).lastrowid
+            self.conn.execute("INSERT INTO posts_fts (rowid, title, body, tags) VALUES (?, ?, ?, ?)",
+                              (post_id, title, body, " ".join(tag_list)))
+            self.conn.executemany("INSERT INTO post_tags (tag, post_id, hot) VALUES (?, ?, ?)",
+                                  [(tag, post_id, hot) for tag in tag_list])
+            self._bump_version()
+            self.stats["posts_created"] += 1
+        return self.get_post(post_id)["post"]
+
+    def _tags(self, tags: Iterable[str], text: str) -> List[str]:
+        given = [normalize_tag(tag) for tag in tags if isinstance(tag, str)]
+        return list(dict.fromkeys(tag for tag in given + self.terms.tags(text) if tag))[:MAX_TAGS]
+
+    def import_posts(self, posts: Iterable[Dict[str, Any]], batch_size: int = 50000) -> int:
+        """Bulk load posts (migrations, seeding). Tags are normalized but not inferred from text."""
+        imported = 0
+        batch: List[tuple] = []
+
+        def flush():
+            nonlocal imported
+            with self.write_lock, self.conn:
+                first = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM posts").fetchone()[0] + 1
+                self.conn.executemany(
+                    "INSERT INTO posts (author_id, author_name, title, body, tags, language, created_at, last_activity, "
+                    "reply_count, like_count, hot) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                self.conn.execute("INSERT INTO posts_fts (rowid, title, body, tags) "
+                                  "SELECT id, title, body, tags FROM posts WHERE id >= ?", (first,))
+                self.conn.execute("INSERT OR IGNORE INTO post_tags (tag, post_id, hot) SELECT t.value, p.id, p.hot "
+                                  "FROM posts p, json_each('[\"' || replace(p.tags, ' ', '\",\"') || '\"]') t "
+                                  "WHERE p.id >= ? AND p.tags != ''", (first,))
+                self._bump_version()
+            imported += len(batch)
+            batch.clear()
+
+        for post in posts:
+            created_at = float(post.get("created_at") or time.time())
+            likes, replies = int(post.get("like_count", 0)), int(post.get("reply_count", 0))
+            tags = " ".join(dict.fromkeys(filter(None, map(normalize_tag, post.get("tags", ())))))
+            batch.append((post["author_id"], post.get("author_name"), post.get("title") or post["body"][:80], post["body"],
+                          tags, post.get("language") or detect_language(post["body"]), created_at,
+                          float(post.get("last_activity") or created_at), replies, likes,
+                          hot_score(likes, replies, created_at)))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return imported
+
+    def _engage(self, post_id: int, likes: int, replies: int, at: float):
+        """Apply an engagement change inside the caller's transaction and refresh the post's hot score."""
+        row = self.conn.execute("SELECT like_count, reply_count, created_at, tags FROM posts WHERE id = ?", (post_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"Post {post_id} not found")
+        like_count, reply_count = row[0] + likes, row[1] + replies
+        hot = hot_score(like_count, reply_count, row[2])
+        self.conn.execute(
+            "UPDATE posts SET like_count = ?, reply_count = ?, hot = ?, last_activity = MAX(last_activity, ?) WHERE id = ?",
+            (like_count, reply_count, hot, at, post_id))
+        self.conn.executemany("UPDATE post_tags SET hot = ? WHERE tag = ? AND post_id = ?",
+                              [(hot, tag, post_id) for tag in row[3].split()])
+        self._bump_version()
+        return like_count, reply_count
+
+    def add_reply(self, post_id: int, author_id: str, body: str, author_name: Optional[str] = None) -> Dict[str, Any]:
+        body = (body or "").strip()
+        if not author_id or not body:
+            raise ValueError("author_id and body are required")
+        if len(body) > MAX_BODY_CHARS:
+            raise ValueError(f"Replies are limited to {MAX_BODY_CHARS} characters")
+        created_at = time.time()
+        with self.write_lock, self.conn:
+            self._engage(post_id, 0, 1, created_at)
+            reply_id = self.conn.execute(
+                "INSERT INTO replies (post_id, author_id, author_name, body, created_at) VALUES (?, ?, ?, ?, ?)",
+                (post_id, author_id, author_name, body, created_at)).lastrowid
+            self.stats["replies_created"] += 1
+        return {"reply_id": reply_id, "post_id": post_id, "author_id": author_id, "author_name": author_name,
+                "body": body, "created_at": datetime.utcfromtimestamp(created_at).isoformat()}
+
+    def like(self, post_id: int, user_id: str) -> Dict[str, Any]:
+        """Idempotent: liking a post twice counts once."""
+        if not user_id:
+            raise ValueError("user_id is required")
+        with self.write_lock, self.conn:
+            exists = self.conn.execute("SELECT 1 FROM posts WHERE id = ?", (post_id,)).fetchone()
+            if exists is None:
+                raise KeyError(f"Post {post_id} not found")
+            added = self.conn.execute("INSERT OR IGNORE INTO likes (post_id, user_id) VALUES (?, ?)",
+                                      (post_id, user_id)).rowcount
+            if added:
+                like_count, _ = self._engage(post_id, 1, 0, time.time())
+                self.stats["likes"] += 1
+            else:
+                like_count = self.conn.execute("SELECT like_count FROM posts WHERE id = ?", (post_id,)).fetchone()[0]
+        return {"post_id": post_id, "liked": bool(added), "like_count": like_count}
+
+    # Reads
+
+    def feed(self, sort: str = "hot", tag: Optional[str] = None, cursor: Optional[str] = None,
+             limit: int = 20) -> Dict[str, Any]:
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+        started = time.perf_counter()
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after = decode_cursor(cursor, sort, *((float, int) if sort == "hot" else (int,))) if cursor else None
+        params: List[Any] = []
+        if tag:
+            source, key = "post_tags t JOIN posts p ON p.id = t.post_id", ("t.hot", "t.post_id") if sort == "hot" else ("t.post_id",)
+            where = ["t.tag = ?"]
+            params.append(normalize_tag(tag))
+        else:
+            source, key = "posts p", ("p.hot", "p.id") if sort == "hot" else ("p.id",)
+            where = []
+        if after:
+            where.append(f"({', '.join(key)}) < ({', '.join('?' * len(key))})")
+            params.extend(after)
+        sql = (f"SELECT {POST_SELECT} FROM {source} {'WHERE ' + ' AND '.join(where) if where else ''} "
+               f"ORDER BY {', '.join(column + ' DESC' for column in key)} LIMIT ?")
+        rows = self._reader().execute(sql, (*params, limit + 1)).fetchall()
+        page = self._page(rows, limit, lambda row: encode_cursor(sort, *((row[11], row[0]) if sort == "hot" else (row[0],))))
+        self.latencies["feed"].append(time.perf_counter() - started)
+        return page
+
+    def search(self, query: str, sort: str = "relevance", tag: Optional[str] = None, cursor: Optional[str] = None,
+               limit: int = 20, match_all: bool = True) -> Dict[str, Any]:
+        if sort not in SEARCH_SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SEARCH_SORTS)}")
+        started = time.perf_counter()
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        match = self.terms.match_query(query, match_all)
+        if match is None:
+            return {"posts": [], "next_cursor": None, "query": None}
+        if tag:
+            match = f'({match}) AND tags : "{" ".join(tokenize(tag))}"'
+        after = decode_cursor(cursor, sort, *((int,) if sort == "new" else (float, int))) if cursor else None
+        if sort == "new":
+            sql = (f"SELECT {POST_SELECT} FROM posts_fts f JOIN posts p ON p.id = f.rowid "
+                   f"WHERE posts_fts MATCH ? {'AND f.rowid < ?' if after else ''} ORDER BY f.rowid DESC LIMIT ?")
+            params = (match, *(after or ()), limit + 1)
+            encode = lambda row: encode_cursor(sort, row[0])
+        else:
+            # bm25 is lower-is-better; title matches weigh most, then tags, then body.
+            sql = (f"SELECT {POST_SELECT}, c.score FROM (SELECT rowid, bm25(posts_fts, 4.0, 1.0, 2.0) AS score "
+                   f"FROM posts_fts WHERE posts_fts MATCH ? ORDER BY rowid DESC LIMIT {SEARCH_CANDIDATES}) c "
+                   f"JOIN posts p ON p.id = c.rowid {'WHERE (c.score, c.rowid) > (?, ?)' if after else ''} "
+                   f"ORDER BY c.score, c.rowid LIMIT ?")
+            params = (match, *(after or ()), limit + 1)
+            encode = lambda row: encode_cursor(sort, row[-1], row[0])
+        try:
+            rows = self._reader().execute(sql, params).fetchall()
+        except sqlite3.OperationalError as e:
+            raise ValueError(f"Invalid search query: {e}")
+        page = self._page(rows, limit, encode)
+        page["query"] = match
+        self.latencies["search"].append(time.perf_counter() - started)
+        return page
+
+    def _page(self, rows: List[tuple], limit: int, cursor_for) -> Dict[str, Any]:
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "posts": [self._post(row, excerpt=True) for row in rows],
+            "next_cursor": cursor_for(rows[-1]) if has_more else None,
+        }
+
+    def get_post(self, post_id: int, reply_cursor: Optional[str] = None, limit: int = 20) -> Optional[Dict[str, Any]]:
+        started = time.perf_counter()
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        reader = self._reader()
+        row = reader.execute(f"SELECT {POST_SELECT} FROM posts p WHERE p.id = ?", (post_id,)).fetchone()
+        if row is None:
+            return None
+        after = decode_cursor(reply_cursor, "replies", int)[0] if reply_cursor else 0
+        replies = reader.execute(
+            "SELECT id, author_id, author_name, body, created_at FROM replies WHERE post_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (post_id, after, limit + 1)).fetchall()
+        has_more = len(replies) > limit
+        replies = replies[:limit]
+        self.latencies["post"].append(time.perf_counter() - started)
+        return {
+            "post": self._post(row),
+            "replies": [{"reply_id": reply_id, "author_id": author_id, "author_name": author_name, "body": body,
+                         "created_at": datetime.utcfromtimestamp(created_at).isoformat()}
+                        for reply_id, author_id, author_name, body, created_at in replies],
+            "next_reply_cursor": encode_cursor("replies", replies[-1][0]) if has_more else None,
+        }
+
+    def post_etag(self, post_id: int, reply_cursor: Optional[str], limit: int) -> Optional[str]:
+        """ETag for a post page from the post's own activity, so unrelated writes don't invalidate it."""
+        row = self._reader().execute("SELECT last_activity, like_count, reply_count FROM posts WHERE id = ?",
+                                     (post_id,)).fetchone()
+        if row is None:
+            return None
+        return self._etag("post", post_id, *row, reply_cursor, limit)
+
+    def listing_etag(self, *params) -> str:
+        """ETag for a feed or search page; any write to the store changes it."""
+        return self._etag(self.version, *params)
+
+    @staticmethod
+    def _etag(*parts) -> str:
+        return '"' + hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:20] + '"'
+
+    @staticmethod
+    def _post(row: tuple, excerpt: bool = False) -> Dict[str, Any]:
+        post = dict(zip(POST_COLUMNS, row))
+        body = post["body"]
+        if excerpt and len(body) > EXCERPT_CHARS:
+            post["body"] = body[:EXCERPT_CHARS].rsplit(" ", 1)[0] + "…"
+            post["truncated"] = True
+        post["post_id"] = post.pop("id")
+        post["tags"] = post["tags"].split() if post["tags"] else []
+        post["created_at"] = datetime.utcfromtimestamp(post["created_at"]).isoformat()
+        post["last_activity"] = datetime.utcfromtimestamp(post["last_activity"]).isoformat()
+        del post["hot"]
+        return post
+
+    def metrics(self) -> Dict[str, Any]:
+        def percentiles(samples):
+            if not samples:
+                return {"p50_ms": 0.0, "p99_ms": 0.0}
+            values = np.array(samples) * 1000
+            return {"p50_ms": round(float(np.percentile(values, 50)), 3), "p99_ms": round(float(np.percentile(values, 99)), 3)}
+
+        return {
+            "version": self.version,
+            **self.stats,
+            **{name: percentiles(samples) for name, samples in self.latencies.items()},
+        }
+
+
+def describe(posts: List[Dict[str, Any]], query: Optional[str] = None) -> str:
+    """Short spoken summary of community posts."""
+    if not posts:
+        return ("I couldn't find community posts about that yet. You can ask the community on the Community page."
+                if query else "The community feed is empty. Be the first to share a question on the Community page.")
+    lead = "Farmers in the community discussed this" if query else "Popular in the community right now"
+    items = [f"\"{post['title']}\" with {post['reply_count']} repl{'y' if post['reply_count'] == 1 else 'ies'}"
+             for post in posts[:3]]
+    return f"{lead}: " + "; ".join(items) + ". Open the Community page to read the answers."
+
+
+def benchmark(posts: int = 1_000_000, queries: int = 300, seed: int = 0, terms: Optional[TermIndex] = None) -> Dict[str, Any]:
+    """Bulk-load synthetic posts, then measure feed, search and write latencies at that size."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    terms = terms or TermIndex.load(os.path.join(here, "knowledge", "crops.json"),
+                                    os.path.join(here, "knowledge", "crop_health_terms.json"))
+    rng = np.random.default_rng(seed)
+    groups = list(terms.groups.items())
+    filler = ("leaves turning yellow after rain what spray dose should I use field irrigation yield market price "
+              "seed variety sowing fertilizer urea dap pattern spots patches drying plants help advice").split()
+    hindi_filler = "पत्ते पीले हो रहे हैं बारिश के बाद कौन सी दवा डालें खेत में सिंचाई बीज खाद सलाह मदद".split()
+    now = time.time()
+    directory = tempfile.mkdtemp()
+    store = CommunityStore(os.path.join(directory, "community.db"), terms)
+
+    def synthetic():
+        for index in range(posts):
+            crop, disease = groups[rng.integers(len(groups))], groups[rng.integers(len(groups))]
+            hindi = rng.random() < 0.3
+            words = list(rng.choice(hindi_filler if hindi else filler, 20))
+            for group in (crop, disease):
+                words.insert(int(rng.integers(len(words))), " ".join(group[1][int(rng.integers(len(group[1])))]))
+            body = " ".join(words)
+            yield {"author_id": f"u{index % 50000}", "body": body, "title": body[:60],
+                   "tags": [crop[0], disease[0]], "created_at": now - (posts - index) * 30,
+                   "like_count": int(rng.poisson(2)), "reply_count": int(rng.poisson(1))}
+
+    started = time.perf_counter()
+    store.import_posts(synthetic())
+    load_seconds = time.perf_counter() - started
+
+    def timed(calls):
+        samples = []
+        for call in calls:
+            begin = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - begin) * 1000)
+        return {"p50_ms": round(float(np.percentile(samples, 50)), 3), "p99_ms": round(float(np.percentile(samples, 99)), 3)}
+
+    def walk(sort, tag=None, pages=20):
+        cursor = None
+        for _ in range(pages):
+            cursor = store.feed(sort, tag, cursor)["next_cursor"]
+
+    tags = [groups[i][0] for i in rng.integers(len(groups), size=queries)]
+    words = ["wheat", "गेहूं", "yellow rust", "धान झोंका", "whitefly cotton", "tomato leaf curl", "दीमक", "seed variety"]
+    results = {
+        "posts": posts,
+        "load_seconds": round(load_seconds, 1),
+        "feed_hot_first_page": timed(lambda: store.feed("hot") for _ in range(queries)),
+        "feed_new_first_page": timed(lambda: store.feed("new") for _ in range(queries)),
+        "feed_hot_20_pages": timed(lambda: walk("hot") for _ in range(queries // 10)),
+        "feed_tag_hot": timed((lambda tag=tag: store.feed("hot", tag)) for tag in tags),
+        "search_relevance": timed((lambda q=words[i % len(words)]: store.search(q)) for i in range(queries)),
+        "search_new": timed((lambda q=words[i % len(words)]: store.search(q, sort="new")) for i in range(queries)),
+        "create_post": timed(lambda: store.create_post("bench", "My wheat has yellow rust on the leaves") for _ in range(queries)),
+        "reply": timed((lambda post_id=int(post_id): store.add_reply(post_id, "bench", "Spray propiconazole"))
+                       for post_id in rng.integers(1, posts, size=queries)),
+    }
+    store.close()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2, ensure_ascii=False))
@@ -0,0 +1,393 @@
+"""Crop recommendations from soil, agro-climatic, season and rainfall tables.
+
+Crop requirements (seasons, soil suitability, pH and temperature ranges, water
+need, base yield) and district profiles (dominant soil, pH, seasonal rainfall
+and temperature, irrigated share, what is grown there and at what yield) are
+compiled into arrays once. District priors (how established each crop is
+locally, expected yields) are precomputed per location, with state and national
+rows built from the districts, so scoring a set of plots is a handful of
+(plots x crops) array operations. One plot and a whole village go through the
+same path.
+
+Suitability is the product of season, soil, pH, temperature and water fits in
+[0, 1]; the local prior then nudges crops farmers in the district already grow
+well.
+"""
+import csv
+import io
+import json
+import re
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+SEASONS = ("kharif", "rabi", "zaid")
+SOILS = ("alluvial", "black", "red", "laterite", "sandy", "loamy", "clay")
+SOIL_ALIASES = {
+    "regur": "black", "black cotton": "black", "काली": "black",
+    "दोमट": "loamy", "loam": "loamy", "बलुई": "sandy", "desert": "sandy", "arid": "sandy",
+    "laterite": "laterite", "लाल": "red", "clayey": "clay", "चिकनी": "clay", "जलोढ़": "alluvial",
+}
+SEASON_ALIASES = {"खरीफ": "kharif", "रबी": "rabi", "जायद": "zaid", "summer": "zaid", "winter": "rabi", "monsoon": "kharif"}
+IRRIGATED_WORDS = ("irrigat", "borewell", "bore well", "tube well", "tubewell", "canal", "drip", "sprinkler", "सिंचित", "सिंचाई")
+RAINFED_WORDS = ("rainfed", "rain-fed", "rain fed", "no irrigation", "unirrigated", "बारानी", "असिंचित")
+
+# Weight of the local prior: a crop nobody grows in the district keeps this share of its score.
+PRIOR_FLOOR = 0.75
+# How fast fit decays outside a crop's pH (units) and temperature (degrees C) range.
+PH_TOLERANCE = 0.6
+TEMPERATURE_TOLERANCE = 4.0
+# Yield at zero suitability as a share of the local expected yield.
+YIELD_FLOOR = 0.5
+DEFAULT_TOP_K = 5
+# The weakest of these fits is reported as a crop's limiting factor when it falls below the threshold.
+LIMITING_FACTORS = ("soil", "ph", "temperature", "water")
+LIMITING_BELOW = 0.8
+NATIONAL = "india"
+
+TOKEN_PATTERN = re.compile(r"[\wऀ-෿]+")
+
+
+def season_for(day: Optional[date] = None) -> str:
+    """The season being sown around `day`: kharif Jun-Sep, rabi Oct-Feb, zaid Mar-May."""
+    month = (day or date.today()).month
+    if 6 <= month <= 9:
+        return "kharif"
+    if month >= 10 or month <= 2:
+        return "rabi"
+    return "zaid"
+
+
+def _padded(text: str) -> str:
+    return " " + " ".join(TOKEN_PATTERN.findall(text.casefold())) + " "
+
+
+def _flag(value: Any) -> float:
+    """1.0 irrigated, 0.0 rainfed, NaN unknown."""
+    if value is None or value == "":
+        return np.nan
+    if isinstance(value, bool):
+        return float(value)
+    text = str(value).strip().casefold()
+    if text in ("1", "true", "yes", "y", "irrigated"):
+        return 1.0
+    if text in ("0", "false", "no", "n", "rainfed", "none"):
+        return 0.0
+    if any(word in text for word in RAINFED_WORDS):
+        return 0.0
+    if any(word in text for word in IRRIGATED_WORDS):
+        return 1.0
+    return np.nan
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _range_fit(values: np.ndarray, low: np.ndarray, high: np.ndarray, tolerance: float) -> np.ndarray:
+    """1 inside [low, high], decaying with distance outside it."""
+    distance = np.maximum(low - values, 0) + np.maximum(values - high, 0)
+    return np.exp(-distance / tolerance)
+
+
+class CropRecommender:
+    def __init__(self, crops: List[Dict[str, Any]], districts: List[Dict[str, Any]]):
+        self.crops = crops
+        self.crop_index = {crop["id"]: index for index, crop in enumerate(crops)}
+        n = len(crops)
+        self.season_mask = np.array([[season in crop["seasons"] for crop in crops] for season in SEASONS], dtype=np.float32)
+        self.soil_fit = np.array(
+            [[crop["soil_suitability"].get(soil, 0.5) for crop in crops] for soil in SOILS], dtype=np.float32
+        )
+        self.ph_low, self.ph_high = (np.array([crop["ph"][i] for crop in crops], dtype=np.float32) for i in (0, 1))
+        self.temp_low, self.temp_high = (np.array([crop["temperature_c"][i] for crop in crops], dtype=np.float32) for i in (0, 1))
+        self.water_low, self.water_high = (np.array([crop["water_mm"][i] for crop in crops], dtype=np.float32) for i in (0, 1))
+        self.base_yield = np.array([crop["base_yield_q_per_ha"] for crop in crops], dtype=np.float32)
+        self.water_need = [int(round((low + high) / 2)) for low, high in (crop["water_mm"] for crop in crops)]
+
+        # Location rows: every district, then each state and the country as district averages.
+        self.locations: List[Dict[str, Any]] = list(districts)
+        by_state: Dict[str, List[Dict[str, Any]]] = {}
+        for district in districts:
+            by_state.setdefault(district["state"], []).append(district)
+        groups = [(state, members) for state, members in by_state.items()] + [("India", districts)]
+        location_count = len(districts) + len(groups)
+        self.location_ph = np.zeros(location_count, dtype=np.float32)
+        self.location_soil = np.zeros(location_count, dtype=np.int64)
+        self.location_irrigated = np.zeros(location_count, dtype=np.float32)
+        self.season_rain = np.zeros((location_count, len(SEASONS)), dtype=np.float32)
+        self.season_temp = np.zeros((location_count, len(SEASONS)), dtype=np.float32)
+        self.prior = np.zeros((location_count, n), dtype=np.float32)
+        self.expected_yield = np.zeros((location_count, n), dtype=np.float32)
+
+        area = np.zeros((len(districts), n), dtype=np.float32)
+        yields = np.full((len(districts), n), np.nan, dtype=np.float32)
+        for row, district in enumerate(districts):
+            self.location_ph[row] = district["ph"]
+            self.location_soil[row] = SOILS.index(district["soil"])
+            self.location_irrigated[row] = district["irrigated_fraction"]
+            self.season_rain[row] = [district["annual_rainfall_mm"] * district["season_rainfall_share"][s] for s in SEASONS]
+            self.season_temp[row] = [district["season_temperature_c"][s] for s in SEASONS]
+            for crop_id, stats in district.get("crops", {}).items():
+                if crop_id in self.crop_index:
+                    area[row, self.crop_index[crop_id]] = stats["area_share"]
+                    yields[row, self.crop_index[crop_id]] = stats["yield_q_per_ha"]
+        # Crops a district doesn't report scale base yield by how its reported yields compare to base.
+        with np.errstate(invalid="ignore"):
+            factor = np.nanmean(yields / self.base_yield, axis=1)
+        factor = np.where(np.isnan(factor), 1.0, factor)
+        filled = np.where(np.isnan(yields), self.base_yield * factor[:, None], yields)
+        self.prior[:len(districts)] = area / np.maximum(area.max(axis=1, keepdims=True), 1e-9)
+        self.expected_yield[:len(districts)] = filled
+
+        self.location_index: Dict[str, int] = {district["district"].casefold(): row for row, district in enumerate(districts)}
+        for offset, (name, members) in enumerate(groups):
+            row = len(districts) + offset
+            rows = [districts.index(member) for member in members]
+            self.location_ph[row] = self.location_ph[rows].mean()
+            soils = np.bincount(self.location_soil[rows], minlength=len(SOILS))
+            self.location_soil[row] = int(np.argmax(soils))
+            self.location_irrigated[row] = self.location_irrigated[rows].mean()
+            self.season_rain[row] = self.season_rain[rows].mean(axis=0)
+            self.season_temp[row] = self.season_temp[rows].mean(axis=0)
+            shares = area[rows].mean(axis=0)
+            self.prior[row] = shares / max(float(shares.max()), 1e-9)
+            self.expected_yield[row] = filled[rows].mean(axis=0)
+            self.locations.append({"district": None, "state": None if name == "India" else name,
+                                   "agro_climatic_zone": None})
+            self.location_index.setdefault(NATIONAL if name == "India" else name.casefold(), row)
+        self.national = self.location_index[NATIONAL]
+        # Away from any known district the prior says nothing; flatten it.
+        self.prior[self.national] = 0.5
+        self.states = {name.casefold(): name for name, _ in groups if name != "India"}
+        self.stats = {"requests": 0, "plots": 0, "seconds": 0.0}
+
+    @classmethod
+    def load(cls, crops_path: str, districts_path: str) -> "CropRecommender":
+        with open(crops_path, encoding="utf-8") as f:
+            crops = json.load(f)
+        with open(districts_path, encoding="utf-8") as f:
+            districts = json.load(f)
+        return cls(crops, districts)
+
+    def locate(self, district: Optional[str] = None, state: Optional[str] = None) -> int:
+        for name in (district, state):
+            if name and name.strip().casefold() in self.location_index:
+                return self.location_index[name.strip().casefold()]
+        return self.national
+
+    def parse_query(self, text: str) -> Dict[str, Any]:
+        """Plot fields named in free text: district or state, soil, season and irrigation."""
+        padded = _padded(text)
+        lowered = text.casefold()
+        plot: Dict[str, Any] = {}
+        for row, location in enumerate(self.locations):
+            if location["district"] and f" {location['district'].casefold()} " in padded:
+                plot["district"] = location["district"]
+                break
+        if "district" not in plot:
+            plot["state"] = next((name for key, name in self.states.items() if f" {key} " in padded), None)
+        plot["soil"] = next((soil for soil in SOILS if f" {soil} " in padded), None) or next(
+            (soil for alias, soil in SOIL_ALIASES.items() if f" {alias} " in padded), None
+        )
+        plot["season"] = next((season for season in SEASONS if f" {season} " in padded), None) or next(
+            (season for alias, season in SEASON_ALIASES.items() if f" {alias} " in padded), None
+        )
+        if any(word in lowered for word in RAINFED_WORDS):
+            plot["irrigated"] = False
+        elif any(word in lowered for word in IRRIGATED_WORDS):
+            plot["irrigated"] = True
+        return {key: value for key, value in plot.items() if value is not None}
+
+    def score(self, plots: Sequence[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+        """Suitability, score, yield and irrigation need as (plots x crops) arrays."""
+        started = time.perf_counter()
+        location = np.array([self.locate(plot.get("district"), plot.get("state")) for plot in plots], dtype=np.int64)
+        soil = np.array([SOILS.index(plot["soil"]) if plot.get("soil") in SOILS else -1 for plot in plots], dtype=np.int64)
+        soil = np.where(soil < 0, self.location_soil[location], soil)
+        ph = np.array([_number(plot.get("ph")) for plot in plots], dtype=np.float32)
+        ph = np.where(np.isnan(ph), self.location_ph[location], ph)
+        default_season = SEASONS.index(season_for())
+        season = np.array([SEASONS.index(plot["season"]) if plot.get("season") in SEASONS else default_season
+                           for plot in plots], dtype=np.int64)
+        irrigated = np.array([_flag(plot.get("irrigated")) for plot in plots], dtype=np.float32)
+        # Unknown irrigation: the district's irrigated share is the chance the plot has it.
+        irrigated = np.where(np.isnan(irrigated), self.location_irrigated[location], irrigated)
+
+        rain = self.season_rain[location, season][:, None]
+        temperature = self.season_temp[location, season][:, None]
+        rainfed_fit = np.clip(rain / self.water_low, 0, 1) ** 1.5
+        water_fit = irrigated[:, None] + (1 - irrigated[:, None]) * rainfed_fit
+        factors = {
+            "soil": self.soil_fit[soil],
+            "ph": _range_fit(ph[:, None], self.ph_low, self.ph_high, PH_TOLERANCE),
+            "temperature": _range_fit(temperature, self.temp_low, self.temp_high, TEMPERATURE_TOLERANCE),
+            "water": water_fit,
+        }
+        suitability = self.season_mask[season] * factors["soil"] * factors["ph"] * factors["temperature"] * water_fit
+        score = suitability * (PRIOR_FLOOR + (1 - PRIOR_FLOOR) * self.prior[location])
+        water_need = np.array(self.water_need, dtype=np.float32)
+        self.stats["requests"] += 1
+        self.stats["plots"] += len(plots)
+        self.stats["seconds"] += time.perf_counter() - started
+        return {
+            "location": location, "soil": soil, "ph": ph, "season": season, "irrigated": irrigated,
+            "rain": rain[:, 0], "factors": factors, "suitability": suitability, "score": score,
+            "yield": self.expected_yield[location] * (YIELD_FLOOR + (1 - YIELD_FLOOR) * suitability),
+            "irrigation_mm": np.maximum(water_need - rain, 0),
+        }
+
+    def ranked(self, scored: Dict[str, np.ndarray], areas: Sequence[float], k: int = DEFAULT_TOP_K) -> List[List[Dict[str, Any]]]:
+        """Top-k crops per plot; fields for every plot are gathered as (plots x k) arrays before any dicts are built."""
+        scores = scored["score"]
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable"), axis=1)
+        rows = np.arange(len(scores))[:, None]
+        factors = np.stack([scored["factors"][name] for name in LIMITING_FACTORS])[:, rows, top]
+        weakest = np.where(factors.min(axis=0) < LIMITING_BELOW, factors.argmin(axis=0), -1)
+        # float64 before rounding so float32 noise doesn't reach the JSON.
+        yields = np.round(scored["yield"][rows, top].astype(np.float64), 1)
+        columns = zip(
+            top.tolist(), np.round(scores[rows, top].astype(np.float64), 3).tolist(),
+            np.round(scored["suitability"][rows, top].astype(np.float64), 3).tolist(), yields.tolist(), np.rint(scored["irrigation_mm"][rows, top]).astype(int).tolist(), weakest.tolist(),
+        )
+        results = []
+        for area, (crops, row_scores, suitability, row_yields, irrigation, limits) in zip(areas, columns):
+            ranked = []
+            for index, score, fit, expected, irrigation_mm, limit in zip(crops, row_scores, suitability, row_yields, irrigation, limits):
+                if score <= 0:
+                    break
+                crop = self.crops[index]
+                result = {
+                    "crop_id": crop["id"],
+                    "crop": crop["name"],
+                    "score": score,
+                    "suitability": fit,
+                    "expected_yield_q_per_ha": expected,
+                    "water_need_mm": self.water_need[index],
+                    "irrigation_need_mm": irrigation_mm,
+                    "duration_days": crop["duration_days"],
+                    "limiting_factor": LIMITING_FACTORS[limit] if limit >= 0 else None,
+                }
+                if area and not np.isnan(area):
+                    result["expected_production_q"] = round(expected * area, 1)
+                ranked.append(result)
+            results.append(ranked)
+        return results
+
+    def conditions(self, scored: Dict[str, np.ndarray], row: int) -> Dict[str, Any]:
+        """The inputs a plot was scored on, including those taken from its district."""
+        location = self.locations[scored["location"][row]]
+        return {
+            "district": location["district"],
+            "state": location["state"],
+            "agro_climatic_zone": location["agro_climatic_zone"],
+            "soil": SOILS[scored["soil"][row]],
+            "ph": round(float(scored["ph"][row]), 1),
+            "season": SEASONS[scored["season"][row]],
+            "season_rainfall_mm": int(round(float(scored["rain"][row]))),
+            "irrigated_probability": round(float(scored["irrigated"][row]), 2),
+        }
+
+    def recommend(self, plot: Dict[str, Any], k: int = DEFAULT_TOP_K) -> Dict[str, Any]:
+        scored = self.score([plot])
+        return {
+            "conditions": self.conditions(scored, 0),
+            "crops": self.ranked(scored, [_number(plot.get("area_hectares"))], k)[0],
+        }
+
+    def recommend_many(self, plots: Sequence[Dict[str, Any]], k: int = 3) -> List[Dict[str, Any]]:
+        scored = self.score(plots)
+        ranked = self.ranked(scored, [_number(plot.get("area_hectares")) for plot in plots], k)
+        return [
+            {"plot_id": plot.get("plot_id", str(row)), "crops": crops}
+            for row, (plot, crops) in enumerate(zip(plots, ranked))
+        ]
+
+    def metrics(self) -> Dict[str, Any]:
+        requests = self.stats["requests"]
+        return {
+            "crops": len(self.crops),
+            "locations": len(self.location_index),
+            "requests": requests,
+            "plots_scored": self.stats["plots"],
+            "avg_request_ms": round(self.stats["seconds"] / requests * 1000, 3) if requests else 0.0,
+        }
+
+
+def plots_from_csv(text: str) -> List[Dict[str, Any]]:
+    """Plot rows from CSV with headers such as plot_id, district, state, soil, ph, season, irrigated, area_hectares."""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames:
+        raise ValueError("CSV has no header row")
+    plots = []
+    for row in reader:
+        plot = {key.strip().casefold(): (value or "").strip() for key, value in row.items() if key}
+        if plot.get("soil"):
+            soil = plot["soil"].casefold()
+            plot["soil"] = soil if soil in SOILS else SOIL_ALIASES.get(soil)
+        if plot.get("season"):
+            season = plot["season"].casefold()
+            plot["season"] = season if season in SEASONS else SEASON_ALIASES.get(season)
+        plots.append({key: value for key, value in plot.items() if value not in ("", None)})
+    return plots
+
+
+def describe(recommendation: Dict[str, Any], count: int = 3) -> str:
+    conditions = recommendation["conditions"]
+    crops = recommendation["crops"][:count]
+    place = conditions["district"] or conditions["state"] or "your area"
+    if not crops:
+        return f"No crop in the table suits {conditions['soil']} soil in {place} for the {conditions['season']} season."
+    parts = [
+        f"{crop['crop']} (about {crop['expected_yield_q_per_ha']:g} quintals per hectare, "
+        f"needs about {crop['water_need_mm']} mm of water)"
+        for crop in crops
+    ]
+    return (f"For {conditions['season']} on {conditions['soil']} soil in {place}, the best options are "
+            f"{'; '.join(parts)}.")
+
+
+def benchmark(recommender: CropRecommender, plots: int = 100_000, seed: int = 0) -> Dict[str, Any]:
+    """Time single-plot and whole-village scoring over random plots in the known districts."""
+    rng = np.random.default_rng(seed)
+    districts = [location["district"] for location in recommender.locations if location["district"]]
+    village = [{
+        "district": districts[rng.integers(len(districts))],
+        "soil": SOILS[rng.integers(len(SOILS))],
+        "season": SEASONS[rng.integers(len(SEASONS))],
+        "irrigated": bool(rng.integers(2)),
+        "area_hectares": float(rng.uniform(0.2, 5)),
+    } for _ in range(plots)]
+    started = time.perf_counter()
+    for plot in village[:1000]:
+        recommender.recommend(plot)
+    single_ms = (time.perf_counter() - started)
+    started = time.perf_counter()
+    scored = recommender.score(village)
+    score_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    recommender.recommend_many(village)
+    total_seconds = time.perf_counter() - started
+    return {
+        "crops": len(recommender.crops),
+        "plots": plots,
+        "single_plot_ms": round(single_ms, 3),
+        "bulk_score_seconds": round(score_seconds, 3),
+        "bulk_ranked_seconds": round(total_seconds, 3),
+        "scored_shape": list(scored["score"].shape),
+    }
+
+
+if __name__ == "__main__":
+    import os
+
+    knowledge = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge")
+    recommender = CropRecommender.load(os.path.join(knowledge, "crops.json"), os.path.join(knowledge, "districts.json"))
+    print(json.dumps(benchmark(recommender), indent=2))
@@ -0,0 +1,454 @@
+"""Scheme eligibility over farmer profiles, evaluated column-wise.
+
+Each scheme's `criteria` (landholding, state, crops, income, social category,
+farmer type, age, disqualifying and required flags) is compiled once into
+predicates over a columnar `FarmerTable`. One farmer is a table of one row; a
+cooperative's member list is the same table with many rows, so both go through
+the same vectorized path.
+
+Unknown profile values never disqualify: a scheme whose only open questions are
+missing fields is reported as eligible with those fields listed as unverified,
+and each unverified criterion lowers its rank.
+"""
+import csv
+import io
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+NUMERIC_FIELDS = ("land_hectares", "annual_income", "age")
+CATEGORICAL_FIELDS = ("state", "category", "farmer_type", "gender")
+FLAG_FIELDS = ("income_tax_payer", "government_employee", "institutional", "irrigation_source", "bank_account")
+
+# Criteria keys naming a list of allowed values, and the profile column each one tests.
+LIST_CRITERIA = {"states": "state", "categories": "category", "farmer_types": "farmer_type", "genders": "gender"}
+RANGE_CRITERIA = NUMERIC_FIELDS
+
+FARMER_TYPE_ALIASES = {"landowner": "owner", "owner cultivator": "owner", "lessee": "tenant", "oral lessee": "tenant"}
+TRUE_VALUES = {"1", "true", "yes", "y"}
+FALSE_VALUES = {"0", "false", "no", "n"}
+
+# (passed, known) boolean arrays over the table's rows.
+Outcome = Tuple[np.ndarray, np.ndarray]
+
+
+def _text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = " ".join(str(value).split()).casefold()
+    return text or None
+
+
+def _number(value: Any) -> float:
+    try:
+        return float(value) if value not in (None, "") else np.nan
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _flag(value: Any) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    text = _text(value)
+    if text in TRUE_VALUES:
+        return 1
+    if text in FALSE_VALUES:
+        return 0
+    return -1
+
+
+def _crops(value: Any) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.replace(";", ",").split(",")
+    return [crop for crop in (_text(item) for item in value) if crop]
+
+
+def normalize_profile(profile: Dict[str, Any]) -> Dict[str, Any]:
+    """Profile dict with known fields coerced to the types the engine expects; other keys are kept."""
+    normalized = dict(profile)
+    for field in NUMERIC_FIELDS:
+        if field in profile:
+            value = _number(profile[field])
+            normalized[field] = None if np.isnan(value) else value
+    for field in CATEGORICAL_FIELDS:
+        if field in profile:
+            # Keep the caller's casing for display; the table casefolds when it encodes.
+            text = " ".join(str(profile[field]).split()) if profile[field] is not None else ""
+            normalized[field] = text or None
+    if normalized.get("farmer_type"):
+        farmer_type = normalized["farmer_type"].casefold()
+        normalized["farmer_type"] = FARMER_TYPE_ALIASES.get(farmer_type, farmer_type)
+    for field in FLAG_FIELDS:
+        if field in profile:
+            flag = _flag(profile[field])
+            normalized[field] = None if flag < 0 else bool(flag)
+    if "crops" in profile:
+        normalized["crops"] = _crops(profile["crops"])
+    return normalized
+
+
+class FarmerTable:
+    """Farmer profiles as columns: floats with NaN for unknown, integer codes, flags and a crop matrix."""
+
+    def __init__(self, ids: List[str], numeric: Dict[str, np.ndarray], codes: Dict[str, np.ndarray],
+                 vocab: Dict[str, Dict[str, int]], flags: Dict[str, np.ndarray],
+                 crops: np.ndarray, crop_vocab: Dict[str, int], crops_known: np.ndarray):
+        self.ids = ids
+        self.numeric = numeric
+        self.codes = codes
+        self.vocab = vocab
+        self.flags = flags
+        self.crops = crops
+        self.crop_vocab = crop_vocab
+        self.crops_known = crops_known
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_profiles(cls, profiles: Iterable[Dict[str, Any]]) -> "FarmerTable":
+        profiles = list(profiles)
+        columns = {field: [profile.get(field) for profile in profiles]
+                   for field in ("crops",) + NUMERIC_FIELDS + CATEGORICAL_FIELDS + FLAG_FIELDS}
+        columns["member_id"] = [profile.get("member_id") or profile.get("user_id") for profile in profiles]
+        return cls.from_columns(columns)
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, Sequence[Any]]) -> "FarmerTable":
+        """Table from column lists or arrays; missing columns are unknown for every row."""
+        rows = len(next(iter(columns.values()), []))
+        member_ids = columns.get("member_id")
+        if member_ids is None:
+            member_ids = [None] * rows
+        ids = [str(index) if member in (None, "") else str(member) for index, member in enumerate(member_ids)]
+        numeric = {field: _numeric_column(columns.get(field), rows) for field in NUMERIC_FIELDS}
+
+        codes, vocab = {}, {}
+        for field in CATEGORICAL_FIELDS:
+            aliases = FARMER_TYPE_ALIASES if field == "farmer_type" else None
+            codes[field], vocab[field] = _categorical_column(columns.get(field), rows, aliases)
+
+        flags = {field: _flag_column(columns.get(field), rows) for field in FLAG_FIELDS}
+
+        crop_column = columns.get("crops")
+        parsed: Dict[str, List[str]] = {}
+        crop_lists = [
+            (parsed[value] if value in parsed else parsed.setdefault(value, _crops(value)))
+            if isinstance(value, str) else _crops(value)
+            for value in crop_column
+        ] if crop_column is not None else [[]] * rows
+        crop_vocab = {crop: index for index, crop in enumerate(sorted({c for crops in crop_lists for c in crops}))}
+        crops = np.zeros((rows, len(crop_vocab)), dtype=bool)
+        row_index = [row for row, crop_list in enumerate(crop_lists) for _ in crop_list]
+        crops[row_index, [crop_vocab[crop] for crop_list in crop_lists for crop in crop_list]] = True
+        crops_known = crops.any(axis=1)
+        return cls(ids, numeric, codes, vocab, flags, crops, crop_vocab, crops_known)
+
+    @classmethod
+    def from_csv(cls, text: str) -> "FarmerTable":
+        """Member table with one row per farmer; `crops` holds a comma- or semicolon-separated list.
+
+        Blank rows are skipped and short rows read as empty in their missing columns.
+        """
+        reader = csv.DictReader(io.StringIO(text), restval="")
+        fieldnames = [name for name in reader.fieldnames or [] if name is not None]
+        rows = [row for row in reader if any((row[name] or "").strip() for name in fieldnames)]
+        return cls.from_columns({name.strip(): [row[name] for row in rows] for name in fieldnames})
+
+
+def _numeric_column(values: Optional[Sequence[Any]], rows: int) -> np.ndarray:
+    if values is None:
+        return np.full(rows, np.nan)
+    try:
+        return np.array([np.nan if value in (None, "") else value for value in values], dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([_number(value) for value in values], dtype=np.float64)
+
+
+def _categorical_column(values: Optional[Sequence[Any]], rows: int,
+                        aliases: Optional[Dict[str, str]] = None) -> Tuple[np.ndarray, Dict[str, int]]:
+    vocab: Dict[str, int] = {}
+    if values is None:
+        return np.full(rows, -1, dtype=np.int32), vocab
+    aliases = aliases or {}
+    # Columns hold few distinct raw values, so normalize each once rather than per row.
+    codes = {}
+    for value in set(values):
+        text = _text(value)
+        text = aliases.get(text, text)
+        codes[value] = vocab.setdefault(text, len(vocab)) if text else -1
+    return np.fromiter(map(codes.__getitem__, values), dtype=np.int32, count=rows), vocab
+
+
+def _flag_column(values: Optional[Sequence[Any]], rows: int) -> np.ndarray:
+    if values is None:
+        return np.full(rows, -1, dtype=np.int8)
+    flags = {value: _flag(value) for value in set(values)}
+    return np.fromiter(map(flags.__getitem__, values), dtype=np.int8, count=rows)
+
+
+def _range(field: str, bounds: Dict[str, float]) -> Callable[[FarmerTable], Outcome]:
+    low, high = bounds.get("min", -np.inf), bounds.get("max", np.inf)
+
+    def predicate(table: FarmerTable) -> Outcome:
+        column = table.numeric[field]
+        known = ~np.isnan(column)
+        return known & (column >= low) & (column <= high), known
+    return predicate
+
+
+def _one_of(field: str, allowed: List[str]) -> Callable[[FarmerTable], Outcome]:
+    allowed = [_text(value) for value in allowed]
+
+    def predicate(table: FarmerTable) -> Outcome:
+        column = table.codes[field]
+        vocab = table.vocab[field]
+        # Lookup mask over codes, with a trailing False slot that code -1 (unknown) lands on.
+        mask = np.zeros(len(vocab) + 1, dtype=bool)
+        mask[[vocab[value] for value in allowed if value in vocab]] = True
+        return mask[column], column >= 0
+    return predicate
+
+
+def _any_crop(allowed: List[str]) -> Callable[[FarmerTable], Outcome]:
+    allowed = [_text(value) for value in allowed]
+
+    def predicate(table: FarmerTable) -> Outcome:
+        columns = [table.crop_vocab[crop] for crop in allowed if crop in table.crop_vocab]
+        return table.crops[:, columns].any(axis=1), table.crops_known
+    return predicate
+
+
+def _flag_is(field: str, expected: int) -> Callable[[FarmerTable], Outcome]:
+    def predicate(table: FarmerTable) -> Outcome:
+        column = table.flags[field]
+        return column == expected, column >= 0
+    return predicate
+
+
+def compile_criteria(criteria: Dict[str, Any]) -> List[Tuple[str, str, Callable[[FarmerTable], Outcome]]]:
+    """(profile field, predicate key, predicate) triples for a criteria dict; equal keys mean equal predicates."""
+    predicates = []
+    for field in RANGE_CRITERIA:
+        if field in criteria:
+            bounds = criteria[field]
+            predicates.append((field, f"{field}:{bounds.get('min')}:{bounds.get('max')}", _range(field, bounds)))
+    for key, field in LIST_CRITERIA.items():
+        if key in criteria:
+            predicates.append((field, f"{field}:{sorted(criteria[key])}", _one_of(field, criteria[key])))
+    if "crops" in criteria:
+        predicates.append(("crops", f"crops:{sorted(criteria['crops'])}", _any_crop(criteria["crops"])))
+    for field in criteria.get("exclude", []):
+        predicates.append((field, f"{field}:0", _flag_is(field, 0)))
+    for field in criteria.get("requires", []):
+        predicates.append((field, f"{field}:1", _flag_is(field, 1)))
+    unknown = set(criteria) - set(RANGE_CRITERIA) - set(LIST_CRITERIA) - {"crops", "exclude", "requires", "preferred"}
+    if unknown:
+        raise ValueError(f"Unknown eligibility criteria: {', '.join(sorted(unknown))}")
+    return predicates
+
+
+class EligibilityResult:
+    """Per-farmer, per-scheme eligibility for one evaluated table."""
+
+    def __init__(self, engine: "EligibilityEngine", table: FarmerTable, eligible: np.ndarray,
+                 unverified: np.ndarray, scores: np.ndarray, unknown: np.ndarray):
+        self.engine = engine
+        self.table = table
+        self.eligible = eligible
+        self.unverified = unverified
+        self.scores = scores
+        self.unknown = unknown
+
+    def ranked(self, row: int) -> List[Dict[str, Any]]:
+        """Eligible schemes for one farmer, best score first; unverified criteria lower the score."""
+        schemes = self.engine.schemes
+        order = sorted(np.flatnonzero(self.eligible[row]), key=lambda s: (-self.scores[row, s], s))
+        unknown = self.unknown[row]
+        return [{
+            "scheme_id": schemes[s]["id"],
+            "name": schemes[s]["name"],
+            "score": round(float(self.scores[row, s]), 2),
+            "unverified": sorted({self.engine.fields[p] for p in np.flatnonzero(unknown & self.engine.rule_matrix[:, s])}),
+        } for s in order]
+
+    def counts(self) -> Dict[str, int]:
+        totals = self.eligible.sum(axis=0)
+        return {scheme["id"]: int(total) for scheme, total in zip(self.engine.schemes, totals)}
+
+
+class EligibilityEngine:
+    """Schemes' criteria compiled into one deduplicated predicate list.
+
+    Each predicate is evaluated once per table; scheme-level results come from
+    multiplying the (rows x predicates) outcomes by a (predicates x schemes)
+    incidence matrix, so cost grows with distinct predicates rather than schemes.
+    """
+
+    def __init__(self, schemes: List[Dict[str, Any]]):
+        self.schemes = schemes
+        self.fields: List[str] = []
+        self.predicates: List[Callable[[FarmerTable], Outcome]] = []
+        index: Dict[str, int] = {}
+        rules, preferences = [], []
+        for scheme in schemes:
+            criteria = scheme.get("criteria", {})
+            for target, compiled in ((rules, compile_criteria(criteria)),
+                                     (preferences, compile_criteria(criteria.get("preferred", {})))):
+                columns = []
+                for field, key, predicate in compiled:
+                    if key not in index:
+                        index[key] = len(self.predicates)
+                        self.fields.append(field)
+                        self.predicates.append(predicate)
+                    columns.append(index[key])
+                target.append(columns)
+        self.rule_matrix = np.zeros((len(self.predicates), len(schemes)), dtype=bool)
+        self.preference_matrix = np.zeros((len(self.predicates), len(schemes)), dtype=bool)
+        for s, (rule_columns, preference_columns) in enumerate(zip(rules, preferences)):
+            self.rule_matrix[rule_columns, s] = True
+            self.preference_matrix[preference_columns, s] = True
+        self.rule_weights = self.rule_matrix.astype(np.float32)
+        self.preference_weights = self.preference_matrix.astype(np.float32)
+        self.evaluations = 0
+        self.profiles_evaluated = 0
+        self.evaluation_seconds = 0.0
+
+    def evaluate(self, table: FarmerTable) -> EligibilityResult:
+        started = time.perf_counter()
+        passed = np.empty((len(table), len(self.predicates)), dtype=bool)
+        known = np.empty_like(passed)
+        for p, predicate in enumerate(self.predicates):
+            passed[:, p], known[:, p] = predicate(table)
+        # Unknown values don't disqualify; they're counted and reported instead.
+        failed = (known & ~passed).astype(np.float32) @ self.rule_weights
+        unverified = (~known).astype(np.float32) @ self.rule_weights
+        passed_weights = passed.astype(np.float32)
+        scores = passed_weights @ self.rule_weights + passed_weights @ self.preference_weights - 0.5 * unverified
+        self.evaluations += 1
+        self.profiles_evaluated += len(table)
+        self.evaluation_seconds += time.perf_counter() - started
+        return EligibilityResult(self, table, failed == 0, unverified, scores, ~known)
+
+    def match(self, profile: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Ranked eligible schemes for one farmer."""
+        return self.evaluate(FarmerTable.from_profiles([profile])).ranked(0)
+
+    def check(self, profile: Dict[str, Any], scheme_id: str) -> Optional[Dict[str, Any]]:
+        """Whether one farmer qualifies for one scheme, with the criteria that failed or couldn't be checked."""
+        s = next((s for s, scheme in enumerate(self.schemes) if scheme["id"] == scheme_id), None)
+        if s is None:
+            return None
+        table = FarmerTable.from_profiles([profile])
+        failed, unverified = [], []
+        for p in np.flatnonzero(self.rule_matrix[:, s]):
+            passed, known = self.predicates[p](table)
+            if not known[0]:
+                unverified.append(self.fields[p])
+            elif not passed[0]:
+                failed.append(self.fields[p])
+        return {"scheme_id": scheme_id, "eligible": not failed, "failed": failed, "unverified": unverified}
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "schemes": len(self.schemes),
+            "predicates": len(self.predicates),
+            "evaluations": self.evaluations,
+            "profiles_evaluated": self.profiles_evaluated,
+            "avg_us_per_profile": round(self.evaluation_seconds / self.profiles_evaluated * 1e6, 3)
+            if self.profiles_evaluated else 0.0,
+        }
+
+
+FIELD_LABELS = {
+    "land_hectares": "landholding", "annual_income": "income", "age": "age", "state": "state",
+    "category": "social category", "farmer_type": "type of farming (owner, tenant or sharecropper)",
+    "gender": "gender", "crops": "crops", "income_tax_payer": "income tax status",
+    "government_employee": "government employment", "institutional": "institutional landholding",
+    "irrigation_source": "irrigation source", "bank_account": "bank account",
+}
+
+
+def describe_matches(matches: List[Dict[str, Any]], limit: int = 5) -> str:
+    """One or two plain sentences naming the best-ranked eligible schemes."""
+    if not matches:
+        return "Based on your profile, none of the schemes I know about match you yet."
+    names = ", ".join(match["name"] for match in matches[:limit])
+    text = f"Based on your profile, you are likely eligible for: {names}."
+    unverified = sorted({field for match in matches[:limit] for field in match["unverified"]})
+    if unverified:
+        text += f" Adding your {', '.join(FIELD_LABELS.get(field, field) for field in unverified)} would confirm this."
+    return text
+
+
+def describe_check(check: Dict[str, Any]) -> str:
+    if check["failed"]:
+        reasons = ", ".join(FIELD_LABELS.get(field, field) for field in check["failed"])
+        return f"Based on your profile you may not qualify because of your {reasons}."
+    if check["unverified"]:
+        missing = ", ".join(FIELD_LABELS.get(field, field) for field in check["unverified"])
+        return f"You appear to qualify, but your {missing} could not be checked."
+    return "Based on your profile you appear to qualify."
+
+
+def synthetic_profiles(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Random but plausible member profiles, with some fields left unknown."""
+    rng = np.random.default_rng(seed)
+    states = ["Maharashtra", "Karnataka", "Uttar Pradesh", "Punjab", "Bihar", "Tamil Nadu", "Gujarat"]
+    crops = ["wheat", "rice", "cotton", "soybean", "sugarcane", "onion", "tomato", "mango", "banana", "grapes"]
+    land = rng.lognormal(0.0, 0.9, count)
+    ages = rng.integers(18, 80, count)
+    profiles = []
+    for i in range(count):
+        profiles.append({
+            "member_id": f"m{i}",
+            "state": states[i % len(states)],
+            "land_hectares": round(float(land[i]), 2) if i % 17 else None,
+            "annual_income": int(rng.integers(30_000, 900_000)),
+            "category": ("general", "obc", "sc", "st")[i % 4],
+            "gender": "female" if i % 5 == 0 else "male",
+            "farmer_type": ("owner", "owner", "tenant", "sharecropper")[i % 4],
+            "age": int(ages[i]),
+            "crops": [crops[j] for j in rng.choice(len(crops), 2, replace=False)],
+            "income_tax_payer": bool(i % 11 == 0),
+            "government_employee": False,
+            "irrigation_source": None if i % 3 else bool(i % 2),
+        })
+    return profiles
+
+
+def benchmark(engine: EligibilityEngine, count: int = 100_000) -> Dict[str, float]:
+    """Time table construction, batch evaluation and single-farmer matching."""
+    profiles = synthetic_profiles(count)
+    started = time.perf_counter()
+    table = FarmerTable.from_profiles(profiles)
+    built = time.perf_counter()
+    result = engine.evaluate(table)
+    evaluated = time.perf_counter()
+    singles = 1000
+    for profile in profiles[:singles]:
+        engine.match(profile)
+    matched = time.perf_counter()
+    return {
+        "profiles": count,
+        "table_build_s": round(built - started, 3),
+        "batch_evaluate_s": round(evaluated - built, 3),
+        "batch_us_per_profile": round((evaluated - built) / count * 1e6, 3),
+        "single_match_ms": round((matched - evaluated) / singles * 1000, 4),
+        "eligible_pairs": int(result.eligible.sum()),
+    }
+
+
+if __name__ == "__main__":
+    import json
+    import os
+    import sys
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge", "schemes.json")
+    with open(path, encoding="utf-8") as f:
+        schemes = json.load(f)
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    print(json.dumps(benchmark(EligibilityEngine(schemes), count), indent=2))
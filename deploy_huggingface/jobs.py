@@ -0,0 +1,184 @@
+"""Background job queue for long-running agent tasks.
+
+Jobs run on a fixed pool of asyncio workers pulling from a priority queue, so a
+burst of reports cannot starve interactive work. Finished jobs are kept for a TTL
+and can be polled, streamed (SSE / WebSocket subscribers) or cancelled.
+"""
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+PRIORITIES = {"interactive": 0, "normal": 1, "batch": 2}
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+PURGE_INTERVAL_SECONDS = 60.0
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, session_id: str, task_type: str, priority: str,
+                 work: Callable[[], Awaitable[Any]],
+                 on_complete: Optional[Callable[["Job"], None]] = None):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.task_type = task_type
+        self.priority = priority
+        self.work = work
+        self.on_complete = on_complete
+        self.status = QUEUED
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "task_type": self.task_type,
+            "priority": self.priority,
+            "status": self.status,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+        if include_result and self.status in FINISHED_STATES:
+            data["result"] = self.result
+            data["error"] = self.error
+        return data
+
+
+class JobQueue:
+    def __init__(self, workers: int = 4, result_ttl: float = 3600.0, max_queued: int = 1000):
+        self.worker_count = workers
+        self.result_ttl = result_ttl
+        self.max_queued = max_queued
+        self.jobs: Dict[str, Job] = {}
+        self.queue: Optional[asyncio.PriorityQueue] = None
+        self.sequence = itertools.count()
+        self.tasks = []
+
+    def start(self):
+        self.queue = asyncio.PriorityQueue()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        self.tasks.append(asyncio.create_task(self._purge_expired()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        for job in self.jobs.values():
+            if job.task and not job.task.done():
+                job.task.cancel()
+
+    def submit(self, session_id: str, task_type: str, work: Callable[[], Awaitable[Any]],
+               priority: str = "normal", on_complete: Optional[Callable[[Job], None]] = None) -> Job:
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        if self.queue.qsize() >= self.max_queued:
+            raise QueueFullError("Job queue is full")
+
+        job = Job(session_id, task_type, priority, work, on_complete)
+        self.jobs[job.id] = job
+        self.queue.put_nowait((PRIORITIES[priority], next(self.sequence), job.id))
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        if job.status == RUNNING and job.task:
+            # The worker records the cancellation once the task unwinds.
+            job.task.cancel()
+        else:
+            self._finish(job, CANCELLED)
+        return True
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        events: asyncio.Queue = asyncio.Queue()
+        job = self.jobs[job_id]
+        events.put_nowait(job.to_dict())
+        if job.status not in FINISHED_STATES:
+            job.subscribers.add(events)
+        return events
+
+    def unsubscribe(self, job_id: str, events: asyncio.Queue):
+        job = self.jobs.get(job_id)
+        if job:
+            job.subscribers.discard(events)
+
+    def metrics(self) -> Dict[str, Any]:
+        counts = {state: 0 for state in (QUEUED, RUNNING) + FINISHED_STATES}
+        for job in self.jobs.values():
+            counts[job.status] += 1
+        return {"workers": self.worker_count, "queue_depth": self.queue.qsize() if self.queue else 0, "jobs": counts}
+
+    def _publish(self, job: Job):
+        event = job.to_dict()
+        for events in job.subscribers:
+            events.put_nowait(event)
+
+    def _finish(self, job: Job, status: str, result: Any = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished_at = time.time()
+        self._publish(job)
+        job.subscribers.clear()
+        job.work = None
+        if job.on_complete:
+            try:
+                job.on_complete(job)
+            except Exception as e:
+                logging.error(f"Job {job.id} completion hook failed: {e}")
+
+    async def _worker(self):
+        while True:
+            _, _, job_id = await self.queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue
+
+            job.status = RUNNING
+            job.started_at = time.time()
+            self._publish(job)
+            job.task = asyncio.create_task(job.work())
+            try:
+                result = await job.task
+            except asyncio.CancelledError:
+                if not job.task.cancelled():
+                    # The worker itself is shutting down.
+                    raise
+                self._finish(job, CANCELLED)
+            except Exception as e:
+                logging.error(f"Job {job.id} ({job.task_type}) failed: {e}")
+                self._finish(job, FAILED, error=str(e))
+            else:
+                self._finish(job, SUCCEEDED, result=result)
+
+    async def _purge_expired(self):
+        while True:
+            await asyncio.sleep(PURGE_INTERVAL_SECONDS)
+            cutoff = time.time() - self.result_ttl
+            expired = [job_id for job_id, job in self.jobs.items()
+                       if job.status in FINISHED_STATES and job.finished_at < cutoff]
+            for job_id in expired:
+                del self.jobs[job_id]
@@ -0,0 +1,540 @@
+"""Local store of daily mandi prices (Agmarknet-style dumps) with vectorized analytics.
+
+Rows are kept in one fixed-width binary file sorted by (series, day) and read
+through a memory map; a series is one (commodity, variety, state, district,
+market). Series ids are renumbered in commodity order on every merge, so all
+markets for a commodity are one contiguous slice of the file, found through a
+CSR-style offsets array. Prices are rupees per quintal, as published.
+"""
+import csv
+import io
+import json
+import operator
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+RECORD_DTYPE = np.dtype([
+    ("series", "<u4"),
+    ("day", "<i4"),          # days since 1970-01-01
+    ("min_price", "<f4"),
+    ("max_price", "<f4"),
+    ("modal_price", "<f4"),
+    ("arrivals", "<f4"),     # tonnes; NaN when not reported
+])
+SERIES_FIELDS = ("commodity", "variety", "state", "district", "market")
+PRICE_FIELDS = ("min_price", "max_price", "modal_price", "arrivals")
+
+# Normalized CSV header prefix -> column; covers Agmarknet exports and data.gov.in variants.
+HEADER_PREFIXES = (
+    ("state", "state"),
+    ("district", "district"),
+    ("market", "market"),
+    ("commodity", "commodity"),
+    ("variety", "variety"),
+    ("arrival_date", "date"),
+    ("price_date", "date"),
+    ("reported_date", "date"),
+    ("date", "date"),
+    ("min_price", "min_price"),
+    ("max_price", "max_price"),
+    ("modal_price", "modal_price"),
+    ("arrivals", "arrivals"),
+)
+DATE_FORMATS = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%d-%b-%Y", "%d %b %Y", "%Y/%m/%d")
+EPOCH = date(1970, 1, 1)
+
+INGEST_CHUNK_ROWS = 250_000
+# Markets whose latest price is older than this are left out of "current" figures.
+STALE_AFTER_DAYS = 7
+TREND_THRESHOLD_PERCENT = 3.0
+
+
+def _normalize_header(name: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "_", name.casefold().replace("_x0020_", " ")).strip("_")
+
+
+def _column_for(header: str) -> Optional[str]:
+    normalized = _normalize_header(header)
+    for prefix, column in HEADER_PREFIXES:
+        if normalized.startswith(prefix):
+            return column
+    return None
+
+
+def _price(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(str(value).replace(",", "")) if value not in (None, "") else np.nan
+    except ValueError:
+        return np.nan
+
+
+def day_number(value: Any) -> Optional[int]:
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return (value - EPOCH).days
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return (datetime.strptime(text, fmt).date() - EPOCH).days
+        except ValueError:
+            continue
+    return None
+
+
+def day_to_iso(day: int) -> str:
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def _key(fields: Sequence[str]) -> Tuple[str, ...]:
+    return tuple(" ".join(str(field or "").split()).casefold() for field in fields)
+
+
+class PriceIndex:
+    """One immutable snapshot of the store: records plus the lookup tables derived from them.
+
+    Ingestion builds a new index and swaps the store's reference to it, so a reader
+    that takes `store.index` once sees series, offsets and records that agree.
+    """
+
+    def __init__(self, series: List[List[str]], records: np.ndarray):
+        self.series = series
+        self.records = records
+        self.series_ids = {_key(fields): index for index, fields in enumerate(series)}
+        self.offsets = np.searchsorted(records["series"], np.arange(len(series) + 1)) if len(series) else np.zeros(1, dtype=np.int64)
+        self.commodities: Dict[str, Tuple[str, int, int]] = {}
+        for index, fields in enumerate(series):
+            name = fields[0]
+            _, first, _ = self.commodities.get(name.casefold(), (name, index, index))
+            self.commodities[name.casefold()] = (name, first, index + 1)
+        self.series_states = np.array([fields[2].casefold() for fields in series], dtype=object)
+        self.states = sorted({fields[2] for fields in series if fields[2]})
+
+
+class MandiPriceStore:
+    def __init__(self, root: str):
+        self.root = root
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.last_ingest: Optional[Dict[str, Any]] = None
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    @property
+    def records_path(self) -> str:
+        return os.path.join(self.root, "prices.bin")
+
+    @property
+    def series_path(self) -> str:
+        return os.path.join(self.root, "series.json")
+
+    def _load(self):
+        series: List[List[str]] = []
+        if os.path.exists(self.series_path):
+            with open(self.series_path, encoding="utf-8") as f:
+                series = json.load(f)
+        if os.path.exists(self.records_path) and os.path.getsize(self.records_path):
+            records = np.memmap(self.records_path, dtype=RECORD_DTYPE, mode="r")
+        else:
+            records = np.zeros(0, dtype=RECORD_DTYPE)
+        self.index = PriceIndex(series, records)
+
+    # Single reads of the current snapshot; anything combining two of them takes `index` once.
+
+    @property
+    def records(self) -> np.ndarray:
+        return self.index.records
+
+    @property
+    def series(self) -> List[List[str]]:
+        return self.index.series
+
+    @property
+    def commodities(self) -> Dict[str, Tuple[str, int, int]]:
+        return self.index.commodities
+
+    @property
+    def states(self) -> List[str]:
+        return self.index.states
+
+    # Ingestion
+
+    def ingest_csv(self, source: Any) -> Dict[str, Any]:
+        """Ingest a CSV path, file object or text. Rows merge into the store; re-sent days replace old ones."""
+        if isinstance(source, str) and not os.path.exists(source) and "\n" in source:
+            return self._ingest(csv.reader(io.StringIO(source)))
+        if isinstance(source, str):
+            with open(source, newline="", encoding="utf-8-sig") as f:
+                return self._ingest(csv.reader(f))
+        return self._ingest(csv.reader(source))
+
+    def ingest_parquet(self, path: str) -> Dict[str, Any]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet ingestion needs pyarrow; install it or convert the dump to CSV")
+        table = pq.read_table(path)
+        columns = [table.column(name).to_pylist() for name in table.column_names]
+        return self._ingest(iter([table.column_names, *zip(*columns)]))
+
+    def _ingest(self, rows: Iterator[Sequence[Any]]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        header = next(rows, None)
+        if not header:
+            raise ValueError("Price file has no header row")
+        positions = {}
+        for position, name in enumerate(header):
+            column = _column_for(str(name))
+            if column and column not in positions:
+                positions[column] = position
+        missing = {"commodity", "market", "date", "modal_price"} - set(positions)
+        if missing:
+            raise ValueError(f"Price file is missing columns: {', '.join(sorted(missing))}")
+
+        # Absent optional columns read from one empty cell appended to every row.
+        width = len(header)
+        names_of = operator.itemgetter(*(positions.get(column, width) for column in SERIES_FIELDS))
+        prices_of = operator.itemgetter(*(positions.get(column, width) for column in PRICE_FIELDS))
+        date_of = operator.itemgetter(positions["date"])
+
+        with self.lock:
+            series = [list(fields) for fields in self.index.series]
+            series_ids = dict(self.index.series_ids)
+            # Raw cell values repeat on every row of a series, so normalize each distinct tuple once.
+            raw_ids: Dict[tuple, int] = {}
+            dates: Dict[Any, Optional[int]] = {}
+            chunks, buffer, skipped, total = [], [], 0, 0
+
+            for row in rows:
+                total += 1
+                row = [*row[:width], *[""] * (width - len(row)), ""]
+                raw_date = date_of(row)
+                if raw_date not in dates:
+                    dates[raw_date] = day_number(raw_date) if raw_date not in (None, "") else None
+                day = dates[raw_date]
+                low, high, modal, arrivals = map(_price, prices_of(row))
+                names = names_of(row)
+                if day is None or not names[0] or not names[4] or not modal > 0:
+                    skipped += 1
+                    continue
+                series_id = raw_ids.get(names)
+                if series_id is None:
+                    key = _key(names)
+                    series_id = series_ids.get(key)
+                    if series_id is None:
+                        series_id = series_ids[key] = len(series)
+                        series.append([" ".join(str(name or "").split()) for name in names])
+                    raw_ids[names] = series_id
+                buffer.append((series_id, day, low, high, modal, arrivals))
+                if len(buffer) >= INGEST_CHUNK_ROWS:
+                    chunks.append(np.array(buffer, dtype=RECORD_DTYPE))
+                    buffer = []
+            if buffer:
+                chunks.append(np.array(buffer, dtype=RECORD_DTYPE))
+
+            added = sum(len(chunk) for chunk in chunks)
+            if added:
+                self._merge(series, chunks)
+        self.last_ingest = {
+            "rows": total,
+            "ingested": added,
+            "skipped": skipped,
+            "series": len(self.series),
+            "seconds": round(time.perf_counter() - started, 3),
+            "at": datetime.utcnow().isoformat(),
+        }
+        return self.last_ingest
+
+    def _merge(self, series: List[List[str]], chunks: List[np.ndarray]):
+        """Rewrite the record file with new rows merged in, series renumbered in commodity order."""
+        combined = np.concatenate([np.asarray(self.index.records), *chunks])
+        # Renumber so each commodity's series (and so its rows) are contiguous.
+        order = sorted(range(len(series)), key=lambda index: _key(series[index]))
+        renumber = np.empty(len(series), dtype=np.uint32)
+        renumber[order] = np.arange(len(series), dtype=np.uint32)
+        combined["series"] = renumber[combined["series"]]
+        series = [series[index] for index in order]
+
+        # Stable sort keeps ingestion order within a (series, day), so the newest duplicate is last.
+        keys = combined["series"].astype(np.int64) << 32 | (combined["day"].astype(np.int64) & 0xFFFFFFFF)
+        combined = combined[np.argsort(keys, kind="stable")]
+        keys = np.sort(keys, kind="stable")
+        keep = np.ones(len(combined), dtype=bool)
+        keep[:-1] = keys[1:] != keys[:-1]
+        combined = combined[keep]
+
+        tmp_path = self.records_path + ".tmp"
+        combined.tofile(tmp_path)
+        with open(self.series_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(series, f, ensure_ascii=False)
+        os.replace(tmp_path, self.records_path)
+        os.replace(self.series_path + ".tmp", self.series_path)
+        self.index = PriceIndex(series, np.memmap(self.records_path, dtype=RECORD_DTYPE, mode="r") if len(combined) else combined)
+
+    # Lookup
+
+    def find_commodities(self, text: str) -> List[str]:
+        """Commodities named in free text, matched on whole words of the commodity name."""
+        words = set(re.findall(r"\w+", text.casefold()))
+        plural_folded = words | {word[:-1] for word in words if word.endswith("s")} | {word[:-2] for word in words if word.endswith("es")}
+        matches = []
+        for key, (name, _, _) in self.index.commodities.items():
+            head = re.findall(r"\w+", key.split("(")[0])
+            if head and all(word in plural_folded for word in head):
+                matches.append(name)
+        return matches
+
+    def find_states(self, text: str) -> List[str]:
+        padded = _padded_words(text)
+        return [state for state in self.index.states if _padded_words(state) in padded]
+
+    @staticmethod
+    def _commodity_rows(index: PriceIndex, commodity: str,
+                        states: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray, str]:
+        """Rows for a commodity (optionally limited to states) and their series ids."""
+        entry = index.commodities.get(commodity.casefold())
+        if entry is None:
+            raise KeyError(commodity)
+        name, first, last = entry
+        records = index.records[index.offsets[first]:index.offsets[last]]
+        if states:
+            wanted = {state.casefold() for state in states}
+            in_states = np.array([state in wanted for state in index.series_states[first:last]], dtype=bool)
+            records = records[in_states[records["series"] - first]]
+        return np.asarray(records), np.arange(first, last), name
+
+    # Analytics
+
+    def daily(self, records: np.ndarray, first_day: int, last_day: int) -> Dict[str, np.ndarray]:
+        """Per-day mean modal price and market count across `records`, NaN on days without reports."""
+        days = last_day - first_day + 1
+        in_range = (records["day"] >= first_day) & (records["day"] <= last_day)
+        offsets = records["day"][in_range] - first_day
+        counts = np.bincount(offsets, minlength=days)
+        sums = np.bincount(offsets, weights=records["modal_price"][in_range], minlength=days)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(counts > 0, sums / counts, np.nan)
+        return {"mean": mean, "counts": counts, "sums": sums}
+
+    @staticmethod
+    def moving_average(sums: np.ndarray, counts: np.ndarray, window: int) -> np.ndarray:
+        """Trailing `window`-day average over reported prices, from cumulative sums."""
+        total = np.concatenate([[0.0], np.cumsum(sums)])
+        count = np.concatenate([[0], np.cumsum(counts)])
+        window_sum = total[window:] - total[:-window] if len(sums) >= window else np.zeros(0)
+        window_count = count[window:] - count[:-window] if len(sums) >= window else np.zeros(0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = np.where(window_count > 0, window_sum / window_count, np.nan)
+        return np.concatenate([np.full(min(window - 1, len(sums)), np.nan), averages])
+
+    def summary(self, commodity: str, states: Optional[List[str]] = None, as_of: Any = None,
+                top_markets: int = 5) -> Optional[Dict[str, Any]]:
+        """Current prices, moving averages, week-over-week change and best markets for a commodity.
+
+        Raises ValueError when `as_of` is not a recognizable date.
+        """
+        started = time.perf_counter()
+        cutoff = day_number(as_of) if as_of is not None else None
+        if as_of is not None and cutoff is None:
+            raise ValueError(f"Unrecognized date: {as_of}")
+        index = self.index
+        try:
+            records, series_ids, name = self._commodity_rows(index, commodity, states)
+        except KeyError:
+            return None
+        if cutoff is not None:
+            records = records[records["day"] <= cutoff]
+        if not len(records):
+            return None
+
+        latest_day = int(records["day"].max())
+        # Latest row per series: rows are sorted by (series, day), so it's the last row of each run.
+        last_of_run = np.ones(len(records), dtype=bool)
+        last_of_run[:-1] = records["series"][1:] != records["series"][:-1]
+        latest = records[last_of_run]
+        current = latest[latest["day"] > latest_day - STALE_AFTER_DAYS]
+
+        window_start = latest_day - 59
+        daily = self.daily(records, window_start, latest_day)
+        ma7 = self.moving_average(daily["sums"], daily["counts"], 7)
+        ma30 = self.moving_average(daily["sums"], daily["counts"], 30)
+        this_week = daily["sums"][-7:].sum() / daily["counts"][-7:].sum() if daily["counts"][-7:].sum() else np.nan
+        last_week = daily["sums"][-14:-7].sum() / daily["counts"][-14:-7].sum() if daily["counts"][-14:-7].sum() else np.nan
+        week_change = (this_week - last_week) / last_week * 100 if last_week > 0 else np.nan
+
+        arrivals = current["arrivals"]
+        weighted = np.nansum(current["modal_price"] * arrivals) / np.nansum(arrivals) if np.nansum(arrivals) > 0 else np.nan
+        best = current[np.argsort(-current["modal_price"], kind="stable")[:top_markets]]
+
+        result = {
+            "commodity": name,
+            "states": states or [],
+            "unit": "Rs/quintal",
+            "as_of": day_to_iso(latest_day),
+            "markets_reporting": int(len(current)),
+            "current": {
+                "modal_price_median": _round(np.median(current["modal_price"])),
+                "modal_price_mean": _round(current["modal_price"].mean()),
+                "modal_price_arrival_weighted": _round(weighted),
+                "min_price": _round(np.nanmin(current["min_price"]) if np.isfinite(current["min_price"]).any() else np.nan),
+                "max_price": _round(np.nanmax(current["max_price"]) if np.isfinite(current["max_price"]).any() else np.nan),
+                "lowest_modal_price": _round(current["modal_price"].min()),
+                "highest_modal_price": _round(current["modal_price"].max()),
+            },
+            "moving_average_7d": _round(ma7[-1]),
+            "moving_average_30d": _round(ma30[-1]),
+            "week_over_week_percent": _round(week_change),
+            "trend": _trend(week_change),
+            "best_markets": [self._market(index, row) for row in best],
+        }
+        self.queries += 1
+        self.query_seconds += time.perf_counter() - started
+        return result
+
+    def history(self, commodity: str, states: Optional[List[str]] = None, days: int = 90) -> List[Dict[str, Any]]:
+        """Daily all-market mean modal price with 7- and 30-day moving averages."""
+        try:
+            records, _, _ = self._commodity_rows(self.index, commodity, states)
+        except KeyError:
+            return []
+        if not len(records):
+            return []
+        last_day = int(records["day"].max())
+        # Extra leading days so the first moving averages in the window are complete.
+        daily = self.daily(records, last_day - days - 29 + 1, last_day)
+        ma7 = self.moving_average(daily["sums"], daily["counts"], 7)
+        ma30 = self.moving_average(daily["sums"], daily["counts"], 30)
+        first = last_day - days + 1
+        return [
+            {
+                "date": day_to_iso(first + offset),
+                "modal_price": _round(daily["mean"][29 + offset]),
+                "markets": int(daily["counts"][29 + offset]),
+                "moving_average_7d": _round(ma7[29 + offset]),
+                "moving_average_30d": _round(ma30[29 + offset]),
+            }
+            for offset in range(days)
+        ]
+
+    @staticmethod
+    def _market(index: PriceIndex, row: np.void) -> Dict[str, Any]:
+        commodity, variety, state, district, market = index.series[int(row["series"])]
+        return {
+            "market": market,
+            "district": district,
+            "state": state,
+            "variety": variety,
+            "modal_price": _round(row["modal_price"]),
+            "date": day_to_iso(row["day"]),
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        index = self.index
+        return {
+            "rows": int(len(index.records)),
+            "series": len(index.series),
+            "commodities": len(index.commodities),
+            "bytes": int(index.records.nbytes),
+            "queries": self.queries,
+            "avg_query_ms": round(self.query_seconds / self.queries * 1000, 3) if self.queries else 0.0,
+            "last_ingest": self.last_ingest,
+        }
+
+
+def _padded_words(text: str) -> str:
+    return " " + " ".join(re.findall(r"\w+", text.casefold())) + " "
+
+
+def _round(value: Any) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, 2)
+
+
+def _trend(week_change: float) -> str:
+    if np.isnan(week_change):
+        return "unknown"
+    if week_change > TREND_THRESHOLD_PERCENT:
+        return "increasing"
+    if week_change < -TREND_THRESHOLD_PERCENT:
+        return "decreasing"
+    return "stable"
+
+
+def describe(summary: Dict[str, Any]) -> str:
+    """Plain-language price summary, used for speech and when narration is unavailable."""
+    current = summary["current"]
+    text = (f"{summary['commodity']}: median modal price Rs {current['modal_price_median']:,.0f} per quintal "
+            f"across {summary['markets_reporting']} markets as of {summary['as_of']}")
+    if summary["week_over_week_percent"] is not None:
+        text += f", {summary['trend']} ({summary['week_over_week_percent']:+.1f}% week over week)"
+    text += "."
+    if summary["best_markets"]:
+        best = summary["best_markets"][0]
+        text += f" Best price: {best['market']}, {best['state']} at Rs {best['modal_price']:,.0f}."
+    return text
+
+
+def synthetic_csv(markets: int = 200, commodities: int = 20, days: int = 120, seed: int = 0) -> str:
+    """An Agmarknet-style dump with random-walk prices, for benchmarks."""
+    rng = np.random.default_rng(seed)
+    states = ["Maharashtra", "Karnataka", "Uttar Pradesh", "Punjab", "Gujarat", "Madhya Pradesh"]
+    start = date(2024, 1, 1)
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["State", "District", "Market", "Commodity", "Variety", "Grade", "Arrival_Date",
+                     "Min_x0020_Price", "Max_x0020_Price", "Modal_x0020_Price"])
+    base = rng.uniform(800, 6000, commodities)
+    for m in range(markets):
+        state = states[m % len(states)]
+        offsets = rng.normal(0, 0.05, commodities)
+        walks = np.cumsum(rng.normal(0, 0.01, (commodities, days)), axis=1)
+        for c in range(commodities):
+            prices = base[c] * (1 + offsets[c]) * np.exp(walks[c])
+            for d in range(days):
+                modal = prices[d]
+                writer.writerow([state, f"District {m % 40}", f"Market {m}", f"Commodity {c}", "Other", "FAQ",
+                                 (start + timedelta(days=d)).strftime("%d/%m/%Y"),
+                                 f"{modal * 0.9:.0f}", f"{modal * 1.1:.0f}", f"{modal:.0f}"])
+    return out.getvalue()
+
+
+def benchmark(root: str, markets: int = 200, commodities: int = 20, days: int = 120) -> Dict[str, Any]:
+    text = synthetic_csv(markets, commodities, days)
+    store = MandiPriceStore(root)
+    ingest = store.ingest_csv(text)
+    started = time.perf_counter()
+    queries = 200
+    for index in range(queries):
+        store.summary(f"Commodity {index % commodities}")
+    summary_ms = (time.perf_counter() - started) / queries * 1000
+    started = time.perf_counter()
+    for index in range(queries):
+        store.summary(f"Commodity {index % commodities}", states=["Maharashtra"])
+    state_ms = (time.perf_counter() - started) / queries * 1000
+    return {
+        "rows": ingest["ingested"],
+        "ingest_s": ingest["seconds"],
+        "summary_ms": round(summary_ms, 3),
+        "summary_by_state_ms": round(state_ms, 3),
+        "store_bytes": int(store.records.nbytes),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as root:
+        size = [int(arg) for arg in sys.argv[1:4]]
+        print(json.dumps(benchmark(root, *size), indent=2))
@@ -0,0 +1,678 @@
+"""Marketplace product catalog with an in-memory faceted search index.
+
+Products persist in SQLite and are indexed in memory by slot number. Each
+product gets a slot; deleted products leave an empty one. The index is updated
+in place on every upsert and delete, and rebuilt from SQLite only at startup:
+
+- Text: term -> set of slots, covering title, description, category, craft type,
+  tags, state and district, plus crop group ids so "aloo" finds "potato".
+  English plurals are folded to the singular on both sides. Each query term
+  becomes a bitset, and the most used ones are cached until a write touches
+  that term. As in community search, the crops a query names are required (any
+  one of them) and its other words only rank; a query naming no known crop
+  matches any of its words.
+- Facets: category, price band, state and craft type have one packed bitset per
+  value; state and district match regardless of case. Filters are ORs within
+  a facet and ANDs across facets, each over capacity/8 bytes. Seller and
+  district have too many values for a bitmap each, so they are filtered
+  through per-slot facet codes. Those codes also give facet counts with one
+  bincount over the matched slots.
+- Sorting takes the next page with a partition rather than a full sort, and
+  keyset cursors carry (sort key, slot) so pages stay stable under inserts.
+
+Facet counts are disjunctive: a facet's counts apply every filter except its
+own, so selecting "vegetables" still shows how many fruits there are.
+"""
+import bisect
+import csv
+import io
+import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from community import STOPWORDS, TermIndex, decode_cursor, encode_cursor, normalize_tag, tokenize
+
+PRICE_BAND_EDGES = (0, 50, 100, 250, 500, 1000, 2500, 5000)
+PRICE_BANDS = tuple(f"{low}-{high}" for low, high in zip(PRICE_BAND_EDGES, PRICE_BAND_EDGES[1:])) + (f"{PRICE_BAND_EDGES[-1]}-plus",)
+BITMAP_FACETS = ("category", "price_band", "state", "craft_type")
+CODE_FACETS = ("seller_id", "district")
+FACETS = BITMAP_FACETS + CODE_FACETS
+# "relevance" orders by query words matched, newest first among equals; it is "newest" for an empty query.
+SORTS = {"relevance": (None, -1), "newest": ("updated_at", -1), "price_asc": ("price", 1), "price_desc": ("price", -1)}
+CASEFOLDED_FACETS = ("state", "district")
+MAX_PAGE_SIZE = 60
+SELLER_FACET_LIMIT = 10
+TERM_CACHE_SIZE = 512
+MARKET_STOPWORDS = STOPWORDS | {
+    "buy", "sell", "order", "want", "need", "price", "cheap", "cheapest", "lowest", "best", "fresh", "near",
+    "rs", "inr", "rupees", "kg", "खरीदना", "खरीदें", "चाहिए", "सस्ता", "सस्ते", "दाम", "रुपये", "kharidna", "sasta",
+}
+PRICE_LIMIT_PATTERNS = (
+    re.compile(r"(?:under|below|less than|up to|upto|within|max(?:imum)?)\s*(?:rs\.?|inr|₹)?\s*(\d+(?:\.\d+)?)"),
+    re.compile(r"(\d+(?:\.\d+)?)\s*(?:rs\.?|₹|रुपये|rupaye|rupees)?\s*(?:से कम|se kam|तक|tak)"),
+)
+CHEAP_PATTERN = re.compile(r"cheap|lowest|sasta|सस्ता|सस्ते")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    seller_id TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_products_seller ON products (seller_id);
+"""
+
+
+def price_band(price: float) -> str:
+    return PRICE_BANDS[bisect.bisect_right(PRICE_BAND_EDGES, price) - 1]
+
+
+def parse_price_limit(text: str) -> Tuple[Optional[float], str]:
+    """("under ₹50" -> 50.0, text without the phrase); (None, text) when no limit is named."""
+    lowered = text.casefold()
+    for pattern in PRICE_LIMIT_PATTERNS:
+        match = pattern.search(lowered)
+        if match:
+            return float(match.group(1)), lowered[:match.start()] + " " + lowered[match.end():]
+    return None, lowered
+
+
+def normalize_product(product: Dict[str, Any], seller_id: Optional[str] = None) -> Dict[str, Any]:
+    """Validate a seller's product record; raises ValueError naming the first problem."""
+    seller_id = str(product.get("seller_id") or seller_id or "").strip()
+    title = str(product.get("title") or product.get("name") or "").strip()
+    category = normalize_tag(str(product.get("category") or ""))
+    if not seller_id:
+        raise ValueError("seller_id is required")
+    if not title:
+        raise ValueError("title is required")
+    if not category:
+        raise ValueError("category is required")
+    try:
+        price = float(str(product.get("price", "")).replace("₹", "").replace(",", "").strip())
+    except ValueError:
+        raise ValueError("price must be a number")
+    if not math.isfinite(price) or not price > 0:
+        raise ValueError("price must be a positive number")
+    stock = product.get("stock")
+    if stock not in (None, ""):
+        try:
+            stock = int(float(stock))
+        except (ValueError, OverflowError):
+            raise ValueError("stock must be a whole number")
+    else:
+        stock = None
+    tags = product.get("tags") or []
+    if isinstance(tags, str):
+        tags = re.split(r"[,;|]", tags)
+    sku = str(product.get("sku") or "").strip()
+    product_id = str(product.get("product_id") or (f"{seller_id}:{sku}" if sku else uuid.uuid4().hex))
+    optional = lambda key: str(product.get(key) or "").strip() or None
+    return {
+        "product_id": product_id,
+        "seller_id": seller_id,
+        "seller_name": optional("seller_name"),
+        "title": title,
+        "description": optional("description") or "",
+        "category": category,
+        "craft_type": normalize_tag(product["craft_type"]) if product.get("craft_type") else None,
+        "price": round(price, 2),
+        "unit": optional("unit") or "kg",
+        "stock": stock,
+        "state": optional("state"),
+        "district": optional("district"),
+        "tags": [tag for tag in map(normalize_tag, tags) if tag],
+        "image_url": optional("image_url"),
+    }
+
+
+def products_from_csv(text: str) -> List[Dict[str, Any]]:
+    """Rows of a seller catalog CSV (title, category, price, unit, stock, sku, craft_type, state, district, tags, ...)."""
+    reader = csv.DictReader(io.StringIO(text))
+    if not reader.fieldnames or not {"title", "price"} <= {name.strip().lower() for name in reader.fieldnames}:
+        raise ValueError("CSV needs at least title and price columns")
+    return [{key.strip().lower(): value for key, value in row.items() if key} for row in reader]
+
+
+class _Facet:
+    """Value dictionary and per-slot codes for one facet, with a packed bitset per value when `bitmaps`.
+
+    With `casefold`, values differing only in case share a code, shown as the first spelling seen.
+    """
+
+    def __init__(self, capacity: int, bitmaps: bool, casefold: bool = False):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+        self.slot_codes = np.full(capacity, -1, dtype=np.int32)
+        self.totals = np.zeros(0, dtype=np.int64)
+        self.bitmaps: Optional[List[np.ndarray]] = [] if bitmaps else None
+        self.casefold = casefold
+
+    def key(self, value: str) -> str:
+        return " ".join(value.split()).casefold() if self.casefold else value
+
+    def code(self, value: str) -> int:
+        key = self.key(value)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(value)
+            self.totals = np.append(self.totals, 0)
+            if self.bitmaps is not None:
+                self.bitmaps.append(np.zeros(len(self.slot_codes) // 8, dtype=np.uint8))
+        return code
+
+    def grow(self, capacity: int):
+        self.slot_codes = np.concatenate([self.slot_codes, np.full(capacity - len(self.slot_codes), -1, dtype=np.int32)])
+        if self.bitmaps is not None:
+            self.bitmaps = [np.concatenate([bits, np.zeros(capacity // 8 - len(bits), dtype=np.uint8)]) for bits in self.bitmaps]
+
+
+def _set_bits(bits: np.ndarray, slots: np.ndarray):
+    np.bitwise_or.at(bits, slots >> 3, (1 << (slots & 7)).astype(np.uint8))
+
+
+def _clear_bits(bits: np.ndarray, slots: np.ndarray):
+    np.bitwise_and.at(bits, slots >> 3, ~(1 << (slots & 7)).astype(np.uint8))
+
+
+_M1, _M2, _M4 = np.uint64(0x5555555555555555), np.uint64(0x3333333333333333), np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01, _ONE, _TWO, _FOUR, _56 = np.uint64(0x0101010101010101), np.uint64(1), np.uint64(2), np.uint64(4), np.uint64(56)
+
+
+def _slots(bits: np.ndarray) -> np.ndarray:
+    """Ascending slot numbers set in a packed bitset (nonzero on a bool view is several times faster than on uint8)."""
+    return np.flatnonzero(np.unpackbits(bits, bitorder="little").view(bool))
+
+
+def _popcount(bits: np.ndarray) -> int:
+    """Set bits in a packed bitset (length a multiple of 8 bytes), SWAR-style since numpy 1.x has no bit count."""
+    x = bits.view(np.uint64)
+    x = x - ((x >> _ONE) & _M1)
+    x = (x & _M2) + ((x >> _TWO) & _M2)
+    x = (x + (x >> _FOUR)) & _M4
+    return int(((x * _H01) >> _56).sum())
+
+
+class ProductCatalog:
+    def __init__(self, db_path: str, terms: TermIndex, capacity: int = 1024):
+        capacity = max(64, -(-capacity // 64) * 64)
+        self.terms = terms
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.capacity = capacity
+        self.size = 0
+        self.docs: List[Optional[Dict[str, Any]]] = []
+        self.doc_terms: List[Tuple[str, ...]] = []
+        self.slots: Dict[str, int] = {}
+        self.price = np.zeros(capacity)
+        self.updated_at = np.zeros(capacity)
+        self.live = np.zeros(capacity // 8, dtype=np.uint8)
+        self.in_stock = np.zeros(capacity // 8, dtype=np.uint8)
+        self.facets = {name: _Facet(capacity, name in BITMAP_FACETS, name in CASEFOLDED_FACETS) for name in FACETS}
+        # Single-word crop terms, kept as they are when folding plurals ("kapas" is not a plural).
+        self.known_words = {phrase[0] for phrase in terms.phrases if len(phrase) == 1}
+        self.postings: Dict[str, Set[int]] = {}
+        self.term_bits: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.stats = {"queries": 0, "query_seconds": 0.0, "upserts": 0, "deletes": 0, "imports": 0}
+        rows = self.conn.execute("SELECT data, updated_at FROM products ORDER BY rowid").fetchall()
+        self._index([(json.loads(data), updated_at) for data, updated_at in rows])
+
+    def close(self):
+        self.conn.close()
+
+    # Index maintenance (callers hold self.lock)
+
+    def _grow(self, needed: int):
+        if needed <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+        extra = capacity - self.capacity
+        self.price = np.concatenate([self.price, np.zeros(extra)])
+        self.updated_at = np.concatenate([self.updated_at, np.zeros(extra)])
+        self.live = np.concatenate([self.live, np.zeros(extra // 8, dtype=np.uint8)])
+        self.in_stock = np.concatenate([self.in_stock, np.zeros(extra // 8, dtype=np.uint8)])
+        for facet in self.facets.values():
+            facet.grow(capacity)
+        self.term_bits.clear()
+        self.capacity = capacity
+
+    def _singular(self, word: str) -> str:
+        """English plural folded to its singular ("tomatoes" -> "tomato", "boxes" -> "box"), else the word."""
+        if word in self.known_words or len(word) < 4 or not word.isascii() or not word.endswith("s") \
+                or word.endswith(("ss", "us", "is")):
+            return word
+        stems = [word[:-1], word[:-2]] + ([word[:-3] + "y", word[:-3] + "i"] if word.endswith("ies") else [])
+        for stem in stems:
+            if stem in self.known_words:
+                return stem
+        if word.endswith("ies"):
+            return word[:-3] + "y"
+        if word.endswith(("sses", "ches", "shes", "xes")):
+            return word[:-2]
+        return word[:-1]
+
+    def _terms_of(self, product: Dict[str, Any]) -> Set[str]:
+        text = " ".join(filter(None, (product["title"], product["description"], product["category"],
+                                      product["craft_type"], " ".join(product["tags"]),
+                                      product["district"], product["state"])))
+        words = [self._singular(word) for word in tokenize(text)]
+        groups = set(self.terms.tags(text)) | set(self.terms.tags(" ".join(words)))
+        return set(words) | {f"#{group}" for group in groups}
+
+    def _unindex(self, slots: Sequence[int]):
+        slots_array = np.asarray(slots, dtype=np.int64)
+        _clear_bits(self.live, slots_array)
+        _clear_bits(self.in_stock, slots_array)
+        for facet in self.facets.values():
+            codes = facet.slot_codes[slots_array]
+            np.subtract.at(facet.totals, codes[codes >= 0], 1)
+            if facet.bitmaps is not None:
+                for code in np.unique(codes[codes >= 0]):
+                    _clear_bits(facet.bitmaps[code], slots_array[codes == code])
+            facet.slot_codes[slots_array] = -1
+        for slot in slots:
+            for term in self.doc_terms[slot]:
+                posting = self.postings.get(term)
+                if posting is not None:
+                    posting.discard(slot)
+                    if not posting:
+                        del self.postings[term]
+                self.term_bits.pop(term, None)
+            self.docs[slot] = None
+            self.doc_terms[slot] = ()
+
+    def _index(self, records: List[Tuple[Dict[str, Any], float]]):
+        """Insert or replace products; batched so a seller's whole catalog costs a few vector operations."""
+        if not records:
+            return
+        latest = {product["product_id"]: (product, updated_at) for product, updated_at in records}
+        replaced = [self.slots[product_id] for product_id in latest if product_id in self.slots]
+        if replaced:
+            self._unindex(replaced)
+        slots = []
+        for product_id in latest:
+            slot = self.slots.get(product_id)
+            if slot is None:
+                slot = self.slots[product_id] = self.size
+                self.size += 1
+                self.docs.append(None)
+                self.doc_terms.append(())
+            slots.append(slot)
+        self._grow(self.size)
+        slots_array = np.asarray(slots, dtype=np.int64)
+        products = [product for product, _ in latest.values()]
+        self.price[slots_array] = [product["price"] for product in products]
+        self.updated_at[slots_array] = [updated_at for _, updated_at in latest.values()]
+        _set_bits(self.live, slots_array)
+        _set_bits(self.in_stock, slots_array[[product["stock"] is None or product["stock"] > 0 for product in products]])
+        for name, facet in self.facets.items():
+            values = [price_band(product["price"]) if name == "price_band" else product[name] for product in products]
+            codes = np.array([facet.code(value) if value else -1 for value in values], dtype=np.int32)
+            facet.slot_codes[slots_array] = codes
+            np.add.at(facet.totals, codes[codes >= 0], 1)
+            if facet.bitmaps is not None:
+                for code in np.unique(codes[codes >= 0]):
+                    _set_bits(facet.bitmaps[code], slots_array[codes == code])
+        for slot, product in zip(slots, products):
+            self.docs[slot] = product
+            self.doc_terms[slot] = tuple(self._terms_of(product))
+            for term in self.doc_terms[slot]:
+                self.postings.setdefault(term, set()).add(slot)
+                self.term_bits.pop(term, None)
+
+    def _term_bitset(self, term: str) -> np.ndarray:
+        bits = self.term_bits.get(term)
+        if bits is not None:
+            self.term_bits.move_to_end(term)
+            return bits
+        bits = np.zeros(self.capacity // 8, dtype=np.uint8)
+        posting = self.postings.get(term)
+        if posting:
+            _set_bits(bits, np.fromiter(posting, dtype=np.int64, count=len(posting)))
+        self.term_bits[term] = bits
+        if len(self.term_bits) > TERM_CACHE_SIZE:
+            self.term_bits.popitem(last=False)
+        return bits
+
+    # Writes
+
+    def upsert(self, product: Dict[str, Any], seller_id: Optional[str] = None) -> Dict[str, Any]:
+        result = self.import_products([product], seller_id)
+        if result["rejected"]:
+            raise ValueError(result["rejected"][0]["error"])
+        return result["products"][0]
+
+    def import_products(self, products: Iterable[Dict[str, Any]], seller_id: Optional[str] = None) -> Dict[str, Any]:
+        """Bulk upsert a seller catalog. Invalid rows are reported and skipped; valid ones commit together."""
+        valid, rejected = [], []
+        for index, product in enumerate(products):
+            try:
+                record = normalize_product(product, seller_id)
+            except (ValueError, TypeError, AttributeError) as e:
+                rejected.append({"index": index, "error": str(e)})
+                continue
+            if seller_id and record["seller_id"] != seller_id:
+                rejected.append({"index": index, "error": "seller_id does not match the catalog's seller"})
+                continue
+            valid.append((index, record))
+        now = time.time()
+        with self.lock:
+            accepted = []
+            for index, record in valid:
+                slot = self.slots.get(record["product_id"])
+                existing = self.docs[slot] if slot is not None else None
+                if existing is not None and existing["seller_id"] != record["seller_id"]:
+                    rejected.append({"index": index, "error": "product_id belongs to another seller"})
+                    continue
+                accepted.append(record)
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO products (product_id, seller_id, data, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(product_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    [(record["product_id"], record["seller_id"], json.dumps(record, ensure_ascii=False), now)
+                     for record in accepted])
+            created = len({record["product_id"] for record in accepted
+                           if record["product_id"] not in self.slots or self.docs[self.slots[record["product_id"]]] is None})
+            self._index([(record, now) for record in accepted])
+            self.stats["upserts"] += len(accepted)
+            self.stats["imports"] += 1
+        return {
+            "created": created,
+            "updated": len({record["product_id"] for record in accepted}) - created,
+            "rejected": sorted(rejected, key=lambda item: item["index"]),
+            "products": [self._render(record, now) for record in accepted],
+        }
+
+    def delete(self, product_id: str) -> bool:
+        with self.lock:
+            slot = self.slots.get(product_id)
+            if slot is None or self.docs[slot] is None:
+                return False
+            with self.conn:
+                self.conn.execute("DELETE FROM products WHERE product_id = ?", (product_id,))
+            self._unindex([slot])
+            self.stats["deletes"] += 1
+        return True
+
+    # Reads
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            slot = self.slots.get(product_id)
+            if slot is None or self.docs[slot] is None:
+                return None
+            return self._render(self.docs[slot], float(self.updated_at[slot]))
+
+    def search(self, query: str = "", filters: Optional[Dict[str, Sequence[str]]] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None, in_stock: bool = False,
+               sort: str = "relevance", cursor: Optional[str] = None, limit: int = 24) -> Dict[str, Any]:
+        """Filtered, sorted page of products with disjunctive facet counts for the whole result set."""
+        if sort not in SORTS:
+            raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+        if any(price is not None and not math.isfinite(price) for price in (min_price, max_price)):
+            raise ValueError("min_price and max_price must be finite numbers")
+        filters = {name: [value for value in values if value] for name, values in (filters or {}).items()}
+        unknown = set(filters) - set(FACETS)
+        if unknown:
+            raise ValueError(f"Unknown facet: {', '.join(sorted(unknown))}")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after = decode_cursor(cursor, sort, float, int) if cursor else None
+        started = time.perf_counter()
+        with self.lock:
+            base = self.live & self.in_stock if in_stock else self.live.copy()
+            required, optional = self._query_terms(query)
+            terms = required + optional
+            if terms:
+                # Any named crop must match; without one, any word does. The rest only rank.
+                matching = np.zeros_like(base)
+                for term in required or optional:
+                    matching |= self._term_bitset(term)
+                base &= matching
+            if min_price is not None or max_price is not None:
+                price_ok = np.ones(self.capacity, dtype=bool)
+                if min_price is not None:
+                    price_ok &= self.price >= min_price
+                if max_price is not None:
+                    price_ok &= self.price <= max_price
+                base &= np.packbits(price_ok, bitorder="little")
+            masks = {name: self._facet_mask(name, values) for name, values in filters.items() if values}
+            # Counts over the whole live catalog (the landing page, or a facet whose own selection is the
+            # only filter) come from the totals maintained on write.
+            base_is_live = not in_stock and min_price is None and max_price is None and not terms
+            matched = base.copy()
+            for mask in masks.values():
+                matched &= mask
+            slots = _slots(matched)
+            facets = {}
+            for name, facet in self.facets.items():
+                if base_is_live and not set(masks) - {name}:
+                    facets[name] = self._ordered_counts(name, facet, facet.totals)
+                    continue
+                if name in masks:
+                    # Disjunctive: this facet's counts ignore its own selection.
+                    others = base.copy()
+                    for other, mask in masks.items():
+                        if other != name:
+                            others &= mask
+                    facet_bits, facet_slots = others, None
+                else:
+                    facet_bits, facet_slots = matched, slots
+                facets[name] = self._counts(name, facet, facet_bits, facet_slots)
+            keys = None
+            if sort == "relevance":
+                # Words matched first, then newest; both fit exactly in one float key.
+                matched_terms = np.zeros(len(slots))
+                for term in terms:
+                    matched_terms += np.unpackbits(self._term_bitset(term), bitorder="little").view(bool)[slots]
+                keys = -(matched_terms * 1e10 + self.updated_at[slots])
+            page_slots, next_cursor = self._page(slots, sort, after, limit, keys)
+            products = [self._render(self.docs[slot], float(self.updated_at[slot])) for slot in page_slots]
+            self.stats["queries"] += 1
+            self.stats["query_seconds"] += time.perf_counter() - started
+        return {"total": int(len(slots)), "products": products, "facets": facets, "next_cursor": next_cursor}
+
+    def comparables(self, text: str, limit: int = 5) -> Dict[str, Any]:
+        """Price spread of live listings whose craft type (else category) is named in free text, cheapest first."""
+        words = tokenize(text)
+        named = {"-".join(words[i:i + n]) for n in (1, 2, 3) for i in range(len(words) - n + 1)}
+        with self.lock:
+            for name in ("craft_type", "category"):
+                values = [value for value in self.facets[name].values if value in named]
+                if values:
+                    slots = _slots(self.live & self._facet_mask(name, values))
+                    if len(slots):
+                        break
+            else:
+                return {"facet": None, "values": [], "total": 0, "price_range": None, "products": []}
+            low, median, high = np.percentile(self.price[slots], [0, 50, 100])
+            page, _ = self._page(slots, "price_asc", None, limit)
+            products = [self._render(self.docs[slot], float(self.updated_at[slot])) for slot in page]
+        return {
+            "facet": name,
+            "values": values,
+            "total": int(len(slots)),
+            "price_range": {"min": round(float(low), 2), "median": round(float(median), 2), "max": round(float(high), 2)},
+            "products": products,
+        }
+
+    def _query_terms(self, query: str) -> Tuple[List[str], List[str]]:
+        """(crop group terms, other words) of a query, plurals folded."""
+        groups, words = [], []
+        for group, phrases in self.terms.analyze(query or ""):
+            word = self._singular(phrases[0][0]) if not group else None
+            group = group or self.terms.phrases.get((word,))
+            if group:
+                groups.append(f"#{group}")
+            elif word not in MARKET_STOPWORDS:
+                words.append(word)
+        return list(dict.fromkeys(groups)), list(dict.fromkeys(words))
+
+    def _facet_mask(self, name: str, values: Sequence[str]) -> np.ndarray:
+        facet = self.facets[name]
+        if name in ("category", "craft_type"):
+            values = [normalize_tag(value) for value in values]
+        keys = [facet.key(value) for value in values]
+        codes = [facet.codes[key] for key in keys if key in facet.codes]
+        if facet.bitmaps is not None:
+            mask = np.zeros(self.capacity // 8, dtype=np.uint8)
+            for code in codes:
+                mask |= facet.bitmaps[code]
+            return mask
+        return np.packbits(np.isin(facet.slot_codes, codes), bitorder="little")
+
+    def _counts(self, name: str, facet: _Facet, bits: np.ndarray, slots: Optional[np.ndarray]) -> List[Dict[str, Any]]:
+        # Measured costs, in units of one bincount entry: intersecting and counting one value's
+        # bitmap is about capacity/50, and extracting slots from a bitset about capacity/2.
+        bincount_cost = len(slots) if slots is not None else self.capacity / 2
+        if facet.bitmaps is not None and len(facet.values) * self.capacity / 50 < bincount_cost:
+            counts = np.array([_popcount(bits & bitmap) for bitmap in facet.bitmaps], dtype=np.int64)
+        else:
+            if slots is None:
+                slots = _slots(bits)
+            counts = np.bincount(facet.slot_codes[slots] + 1, minlength=len(facet.values) + 1)[1:]
+        return self._ordered_counts(name, facet, counts)
+
+    @staticmethod
+    def _ordered_counts(name: str, facet: _Facet, counts: np.ndarray) -> List[Dict[str, Any]]:
+        order = np.flatnonzero(counts)
+        if name == "price_band":
+            order = np.array(sorted(order, key=lambda code: PRICE_BANDS.index(facet.values[code])), dtype=np.int64)
+        else:
+            if name == "seller_id" and len(order) > SELLER_FACET_LIMIT:
+                order = order[np.argpartition(-counts[order], SELLER_FACET_LIMIT)[:SELLER_FACET_LIMIT]]
+            order = order[np.argsort(-counts[order], kind="stable")]
+        return [{"value": facet.values[code], "count": int(counts[code])} for code in order]
+
+    def _page(self, slots: np.ndarray, sort: str, after: Optional[list], limit: int,
+              keys: Optional[np.ndarray] = None) -> Tuple[List[int], Optional[str]]:
+        """Next page in ascending key order; `keys` (per slot) default to the sort's column."""
+        if keys is None:
+            column, direction = SORTS[sort]
+            keys = getattr(self, column)[slots] * direction
+        if after:
+            key, slot = after
+            keep = (keys > key) | ((keys == key) & (slots > slot))
+            slots, keys = slots[keep], keys[keep]
+        if len(slots) > limit + 1:
+            kth = np.partition(keys, limit)[limit]
+            below = keys < kth
+            ties = np.flatnonzero(keys == kth)
+            # Bulk imports share timestamps and prices repeat; keep only the lowest-slot ties the page
+            # needs. `slots` is ascending, so those are the first ones.
+            ties = ties[:limit + 1 - int(below.sum())]
+            keep = np.concatenate([np.flatnonzero(below), ties])
+            slots, keys = slots[keep], keys[keep]
+        order = np.lexsort((slots, keys))[:limit + 1]
+        page = slots[order].tolist()
+        if len(page) <= limit:
+            return page, None
+        last = order[limit - 1]
+        return page[:limit], encode_cursor(sort, float(keys[last]), int(slots[last]))
+
+    @staticmethod
+    def _render(product: Dict[str, Any], updated_at: float) -> Dict[str, Any]:
+        rendered = dict(product)
+        rendered["price_band"] = price_band(product["price"])
+        rendered["in_stock"] = product["stock"] is None or product["stock"] > 0
+        rendered["updated_at"] = datetime.utcfromtimestamp(updated_at).isoformat()
+        return rendered
+
+    def metrics(self) -> Dict[str, Any]:
+        queries = self.stats["queries"]
+        return {
+            "products": int(np.unpackbits(self.live).sum()),
+            "terms": len(self.postings),
+            "facet_values": {name: len(facet.values) for name, facet in self.facets.items()},
+            "queries": queries,
+            "avg_query_ms": round(self.stats["query_seconds"] / queries * 1000, 3) if queries else 0.0,
+            "upserts": self.stats["upserts"],
+            "deletes": self.stats["deletes"],
+        }
+
+
+def describe(result: Dict[str, Any], max_price: Optional[float] = None) -> str:
+    """Short spoken summary of a catalog search."""
+    products = result["products"]
+    if not products:
+        limit = f" under ₹{max_price:g}" if max_price else ""
+        return f"I couldn't find matching products{limit} in the marketplace right now."
+    items = [f"{p['title']} at ₹{p['price']:g} per {p['unit']}" + (f" from {p['district'] or p['state']}" if p['district'] or p['state'] else "")
+             for p in products[:3]]
+    return f"I found {result['total']} product{'s' if result['total'] != 1 else ''}. " + "; ".join(items) + "."
+
+
+def benchmark(products: int = 500_000, queries: int = 300, seed: int = 0) -> Dict[str, Any]:
+    """Bulk-import a synthetic catalog, then time facet, text, price and deep-page queries and single updates."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    terms = TermIndex.load(os.path.join(here, "knowledge", "crops.json"), os.path.join(here, "knowledge", "crop_health_terms.json"))
+    rng = np.random.default_rng(seed)
+    crops = [group for group in terms.groups if group in {c["id"] for c in json.load(open(os.path.join(here, "knowledge", "crops.json"), encoding="utf-8"))}]
+    categories = ["vegetables", "fruits", "grains", "pulses", "spices", "oilseeds", "dairy", "seeds", "handicrafts", "textiles"]
+    crafts = ["pottery", "handloom", "bamboo", "madhubani", "dokra", "block-print", "jute", "terracotta"]
+    states = ["Uttar Pradesh", "Maharashtra", "Punjab", "Bihar", "Rajasthan", "Karnataka", "Tamil Nadu", "West Bengal",
+              "Gujarat", "Madhya Pradesh", "Odisha", "Assam"]
+    words = "organic fresh farm local premium handmade natural graded sorted washed traditional export quality".split()
+    catalog = ProductCatalog(os.path.join(tempfile.mkdtemp(), "catalog.db"), terms)
+
+    def product(index):
+        category = categories[rng.integers(len(categories))]
+        crafted = category in ("handicrafts", "textiles")
+        name = crafts[rng.integers(len(crafts))] if crafted else crops[rng.integers(len(crops))]
+        return {"seller_id": f"seller-{rng.integers(20000)}", "sku": str(index), "category": category,
+                "title": f"{' '.join(rng.choice(words, 2))} {name}", "price": float(np.round(rng.lognormal(5, 1.2), 2)),
+                "stock": int(rng.integers(0, 200)), "state": states[rng.integers(len(states))],
+                "district": f"district-{rng.integers(600)}", "craft_type": name if crafted else None}
+
+    started = time.perf_counter()
+    for begin in range(0, products, 50000):
+        catalog.import_products([product(index) for index in range(begin, min(begin + 50000, products))])
+    import_seconds = time.perf_counter() - started
+
+    def timed(calls):
+        samples = []
+        for call in calls:
+            begin = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - begin) * 1000)
+        return {"p50_ms": round(float(np.percentile(samples, 50)), 3), "p99_ms": round(float(np.percentile(samples, 99)), 3)}
+
+    def deep(pages=10):
+        cursor = None
+        for _ in range(pages):
+            cursor = catalog.search("", {"category": ["vegetables"]}, sort="price_asc", cursor=cursor)["next_cursor"]
+
+    pick = lambda values: values[rng.integers(len(values))]
+    results = {
+        "products": products,
+        "import_per_second": round(products / import_seconds),
+        "all_products": timed(lambda: catalog.search() for _ in range(queries)),
+        "facet_filters": timed((lambda c=pick(categories), s=pick(states): catalog.search(
+            "", {"category": [c], "state": [s]}, in_stock=True)) for _ in range(queries)),
+        "text_and_price": timed((lambda q=pick(crops): catalog.search(q, max_price=300, sort="price_asc")) for _ in range(queries)),
+        "seller_filter": timed((lambda s=f"seller-{rng.integers(20000)}": catalog.search("", {"seller_id": [s]})) for _ in range(queries)),
+        "ten_pages_price_sorted": timed(lambda: deep() for _ in range(queries // 10)),
+        "single_upsert": timed((lambda i=int(i): catalog.upsert(product(i))) for i in rng.integers(products, size=queries)),
+    }
+    catalog.close()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
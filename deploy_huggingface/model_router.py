@@ -0,0 +1,206 @@
+"""Latency- and error-aware routing of LLM calls across Gemini tiers and backends.
+
+Call sites declare a task class instead of a model. Each class lists candidate
+model tiers cheapest first and carries an SLO; the router picks the cheapest
+healthy (backend, model) route whose observed p95 meets the SLO, and hedges with
+a second route when the first runs past its own p95.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from admission import OverloadedError
+from resilience import CircuitOpenError
+
+FLASH_LITE = "gemini-2.5-flash-lite"
+FLASH = "gemini-2.5-flash"
+PRO = "gemini-2.5-pro"
+
+# Candidate tiers (cheapest first) and latency SLO in seconds for each task class.
+TASK_POLICIES = {
+    "classify": {"tiers": [FLASH_LITE, FLASH], "slo_seconds": 2.0},
+    "extract": {"tiers": [FLASH_LITE, FLASH, PRO], "slo_seconds": 4.0},
+    "summarize": {"tiers": [FLASH_LITE, FLASH], "slo_seconds": 4.0},
+    "chat": {"tiers": [FLASH, PRO], "slo_seconds": 10.0},
+    "plan": {"tiers": [FLASH, PRO], "slo_seconds": 20.0},
+    "long_report": {"tiers": [FLASH, PRO], "slo_seconds": 30.0},
+}
+
+BACKEND_PREFERENCE = ["gemini", "vertex"]
+
+LATENCY_WINDOW = 200
+MIN_SAMPLES = 5
+ERROR_EWMA_ALPHA = 0.2
+MAX_ERROR_RATE = 0.5
+
+Route = Tuple[str, str]
+
+
+class NoRouteAvailableError(Exception):
+    pass
+
+
+class RouteStats:
+    """Recent latencies and an error-rate EWMA for one (backend, model) route."""
+
+    def __init__(self):
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.error_rate = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, latency: float, success: bool):
+        self.calls += 1
+        if success:
+            self.latencies.append(latency)
+        else:
+            self.errors += 1
+        self.error_rate = (1 - ERROR_EWMA_ALPHA) * self.error_rate + ERROR_EWMA_ALPHA * (0.0 if success else 1.0)
+
+    def record_abandoned(self, latency: float):
+        """A hedged-away call still tells us the route took at least `latency`."""
+        self.calls += 1
+        self.latencies.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.latencies) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+    @property
+    def healthy(self) -> bool:
+        return self.calls < MIN_SAMPLES or self.error_rate < MAX_ERROR_RATE
+
+    def to_dict(self) -> Dict[str, Any]:
+        p50, p95 = self.percentile(50), self.percentile(95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 3),
+            "p50_seconds": round(p50, 3) if p50 is not None else None,
+            "p95_seconds": round(p95, 3) if p95 is not None else None,
+        }
+
+
+class ModelRouter:
+    def __init__(self, available_backends: Callable[[], List[str]],
+                 route_available: Optional[Callable[[Route], bool]] = None):
+        self.available_backends = available_backends
+        # Lets callers veto routes whose circuit breaker is open.
+        self.route_available = route_available or (lambda route: True)
+        self.stats: Dict[Route, RouteStats] = {}
+        self.task_counts: Dict[str, Dict[str, int]] = {}
+        self.hedges_launched = 0
+        self.hedges_won = 0
+
+    def _stats(self, route: Route) -> RouteStats:
+        if route not in self.stats:
+            self.stats[route] = RouteStats()
+        return self.stats[route]
+
+    def candidates(self, task_class: str) -> List[Route]:
+        """Routes for a task class, best first."""
+        policy = TASK_POLICIES[task_class]
+        backends = [b for b in BACKEND_PREFERENCE if b in self.available_backends()]
+        if not backends:
+            raise NoRouteAvailableError("No LLM backend configured (set GEMINI_API_KEY or Vertex AI project/location).")
+
+        routes = [(backend, model) for model in policy["tiers"] for backend in backends]
+        healthy = [route for route in routes
+                   if self._stats(route).healthy and self.route_available(route)] or routes
+
+        def rank(indexed_route):
+            position, route = indexed_route
+            p95 = self._stats(route).percentile(95)
+            meets_slo = p95 is None or p95 <= policy["slo_seconds"]
+            # Cheapest route meeting the SLO wins; otherwise the fastest one observed.
+            return (0, position) if meets_slo else (1, p95)
+
+        return [route for _, route in sorted(enumerate(healthy), key=rank)]
+
+    def record(self, task_class: str, route: Route, latency: float, success: bool):
+        """Record a call made outside `call`, e.g. a streamed response."""
+        self._stats(route).record(latency, success)
+        if success:
+            counts = self.task_counts.setdefault(task_class, {})
+            counts[route[1]] = counts.get(route[1], 0) + 1
+
+    def _hedge_delay(self, task_class: str, route: Route) -> float:
+        p95 = self._stats(route).percentile(95)
+        return p95 if p95 is not None else TASK_POLICIES[task_class]["slo_seconds"]
+
+    async def _attempt(self, route: Route, invoke: Callable[[str, str], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        try:
+            result = await invoke(*route)
+        except asyncio.CancelledError:
+            self._stats(route).record_abandoned(time.monotonic() - started)
+            raise
+        except OverloadedError:
+            # Shed locally, out of time or behind an open circuit: nothing the route did.
+            raise
+        except Exception:
+            self._stats(route).record(time.monotonic() - started, success=False)
+            raise
+        self._stats(route).record(time.monotonic() - started, success=True)
+        return result
+
+    async def call(self, task_class: str, invoke: Callable[[str, str], Awaitable[Any]]) -> Any:
+        """Run `invoke(backend, model)` on the best route, hedging and failing over to the next ones."""
+        routes = self.candidates(task_class)
+        counts = self.task_counts.setdefault(task_class, {})
+        pending: Dict[asyncio.Task, Route] = {}
+        next_route = 0
+        hedged = False
+        last_error: Optional[Exception] = None
+
+        def launch():
+            nonlocal next_route
+            route = routes[next_route]
+            next_route += 1
+            pending[asyncio.ensure_future(self._attempt(route, invoke))] = route
+
+        launch()
+        try:
+            while pending:
+                timeout = None
+                if next_route < len(routes) and len(pending) == 1:
+                    timeout = self._hedge_delay(task_class, next(iter(pending.values())))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # The in-flight route ran past its p95: hedge on the next one.
+                    self.hedges_launched += 1
+                    hedged = True
+                    launch()
+                    continue
+
+                for task in done:
+                    route = pending.pop(task)
+                    if task.exception() is None:
+                        if hedged and route != routes[0]:
+                            self.hedges_won += 1
+                        counts[route[1]] = counts.get(route[1], 0) + 1
+                        return task.result()
+                    last_error = task.exception()
+                    # Local overload or a spent deadline would fail every route the same way.
+                    if isinstance(last_error, OverloadedError) and not isinstance(last_error, CircuitOpenError):
+                        raise last_error
+
+                if not pending and next_route < len(routes):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "routes": {f"{backend}/{model}": stats.to_dict() for (backend, model), stats in self.stats.items()},
+            "models_by_task": self.task_counts,
+            "hedges_launched": self.hedges_launched,
+            "hedges_won": self.hedges_won,
+        }
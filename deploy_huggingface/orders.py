@@ -0,0 +1,401 @@
+"""Marketplace orders: per-user history, status tracking and running summaries in SQLite.
+
+- History pages walk the (user_id, created_at, order_id) index with keyset
+  cursors, so a user's 500th order costs the same to list as their first.
+- Creation is idempotent per (user, Idempotency-Key): a retried request gets
+  the stored order back instead of a duplicate, and reusing a key for a
+  different request is refused.
+- Each user's summary row (counts by status, money spent, their latest order
+  and their most recent open one) is updated in the same transaction as the
+  order write. "Where is my order" is then two primary-key lookups, however
+  many orders the user or the table has.
+"""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from community import decode_cursor, encode_cursor
+
+STATUSES = ("placed", "confirmed", "packed", "shipped", "out_for_delivery", "delivered", "cancelled")
+OPEN_STATUSES = ("placed", "confirmed", "packed", "shipped", "out_for_delivery")
+TRANSITIONS = {
+    "placed": {"confirmed", "cancelled"},
+    "confirmed": {"packed", "cancelled"},
+    "packed": {"shipped", "cancelled"},
+    "shipped": {"out_for_delivery", "delivered"},
+    "out_for_delivery": {"delivered"},
+    "delivered": set(),
+    "cancelled": set(),
+}
+STATUS_PHRASES = {
+    "placed": "has been placed and is waiting for the seller",
+    "confirmed": "is confirmed by the seller",
+    "packed": "is packed and waiting to be shipped",
+    "shipped": "is on its way",
+    "out_for_delivery": "is out for delivery",
+    "delivered": "was delivered",
+    "cancelled": "was cancelled",
+}
+MAX_ITEMS = 50
+MAX_QUANTITY = 10_000
+MAX_PAGE_SIZE = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    idempotency_key TEXT,
+    request_hash TEXT NOT NULL,
+    status TEXT NOT NULL,
+    items TEXT NOT NULL,
+    total REAL NOT NULL,
+    delivery TEXT,
+    history TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_idempotency ON orders (user_id, idempotency_key)
+    WHERE idempotency_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_orders_user_created ON orders (user_id, created_at, order_id);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, updated_at);
+CREATE TABLE IF NOT EXISTS order_summaries (
+    user_id TEXT PRIMARY KEY,
+    order_count INTEGER NOT NULL,
+    open_count INTEGER NOT NULL,
+    total_spent REAL NOT NULL,
+    status_counts TEXT NOT NULL,
+    first_order_at REAL NOT NULL,
+    last_order_at REAL NOT NULL,
+    last_order_id TEXT NOT NULL,
+    active_order_id TEXT
+);
+"""
+COLUMNS = "order_id, user_id, status, items, total, delivery, history, created_at, updated_at"
+
+
+class IdempotencyConflict(ValueError):
+    """The idempotency key was already used for a different order request."""
+
+
+def request_hash(items: List[Dict[str, Any]], delivery: Optional[Dict[str, Any]]) -> str:
+    """Fingerprint of what the client asked for (products, quantities, address), not of resolved prices."""
+    requested = [[str(item.get("product_id") or ""), item.get("quantity")] for item in items]
+    payload = json.dumps({"items": requested, "delivery": delivery}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def price_items(items: List[Dict[str, Any]], lookup: Callable[[str], Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Order lines priced from the catalog; raises ValueError for unknown products or more than the listed stock.
+
+    Stock is the seller's listed figure and orders don't reserve it, so separate orders
+    can add up to more than is listed; the seller settles that when confirming.
+    """
+    if not items:
+        raise ValueError("An order needs at least one item")
+    if len(items) > MAX_ITEMS:
+        raise ValueError(f"Orders are limited to {MAX_ITEMS} items")
+    lines = []
+    for item in items:
+        product_id = str(item.get("product_id") or "")
+        try:
+            quantity = float(item.get("quantity", 1))
+        except (TypeError, ValueError):
+            raise ValueError(f"Quantity for {product_id or 'an item'} must be a number")
+        if not math.isfinite(quantity) or not 0 < quantity <= MAX_QUANTITY:
+            raise ValueError(f"Quantity for {product_id or 'an item'} must be between 0 and {MAX_QUANTITY}")
+        product = lookup(product_id) if product_id else None
+        if product is None:
+            raise ValueError(f"Unknown product {product_id!r}")
+        if product.get("stock") is not None and quantity > product["stock"]:
+            raise ValueError(f"Only {product['stock']} {product['unit']} of {product['title']} in stock")
+        lines.append({
+            "product_id": product_id, "seller_id": product["seller_id"], "title": product["title"],
+            "unit": product["unit"], "price": product["price"], "quantity": quantity,
+            "amount": round(product["price"] * quantity, 2),
+        })
+    return lines
+
+
+def _iso(timestamp: float) -> str:
+    return datetime.utcfromtimestamp(timestamp).isoformat()
+
+
+class OrderStore:
+    def __init__(self, db_path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.stats = {"created": 0, "replayed": 0, "conflicts": 0, "status_updates": 0,
+                      "lookups": 0, "lookup_seconds": 0.0}
+
+    def close(self):
+        self.conn.close()
+
+    # Writes
+
+    def create(self, user_id: str, items: List[Dict[str, Any]], lookup: Callable[[str], Optional[Dict[str, Any]]],
+               delivery: Optional[Dict[str, Any]] = None, idempotency_key: Optional[str] = None,
+               created_at: Optional[float] = None) -> Dict[str, Any]:
+        """Place an order, or return the one already placed with this idempotency key ("replayed": True)."""
+        if not user_id:
+            raise ValueError("user_id is required")
+        fingerprint = request_hash(items, delivery)
+        idempotency_key = (idempotency_key or "").strip() or None
+        with self.lock:
+            if idempotency_key:
+                # Checked before pricing, so a retry still gets its order after a product sells out.
+                row = self.conn.execute(
+                    f"SELECT request_hash, {COLUMNS} FROM orders WHERE user_id = ? AND idempotency_key = ?",
+                    (user_id, idempotency_key)).fetchone()
+                if row is not None:
+                    if row[0] != fingerprint:
+                        self.stats["conflicts"] += 1
+                        raise IdempotencyConflict("Idempotency-Key was already used for a different order")
+                    self.stats["replayed"] += 1
+                    return dict(self._order(row[1:]), replayed=True)
+            lines = price_items(items, lookup)
+            total = round(sum(line["amount"] for line in lines), 2)
+            created_at = time.time() if created_at is None else created_at
+            order_id = uuid.uuid4().hex
+            history = [{"status": "placed", "at": created_at}]
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO orders (order_id, user_id, idempotency_key, request_hash, status, items, total, delivery, "
+                    "history, created_at, updated_at) VALUES (?, ?, ?, ?, 'placed', ?, ?, ?, ?, ?, ?)",
+                    (order_id, user_id, idempotency_key, fingerprint, json.dumps(lines, ensure_ascii=False), total,
+                     json.dumps(delivery, ensure_ascii=False) if delivery else None, json.dumps(history),
+                     created_at, created_at))
+                self._summarize(user_id, order_id, created_at, None, "placed", total)
+            self.stats["created"] += 1
+        return {"order_id": order_id, "user_id": user_id, "status": "placed", "items": lines, "total": total,
+                "delivery": delivery, "history": [{"status": "placed", "at": _iso(created_at)}],
+                "created_at": _iso(created_at), "updated_at": _iso(created_at), "replayed": False}
+
+    def update_status(self, order_id: str, status: str, note: Optional[str] = None,
+                      user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Move an order along its lifecycle; KeyError if it doesn't exist (for this user), ValueError if not allowed."""
+        if status not in TRANSITIONS:
+            raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+        with self.lock:
+            row = self.conn.execute(f"SELECT {COLUMNS} FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+            if row is None or (user_id and row[1] != user_id):
+                raise KeyError(f"Order {order_id} not found")
+            current = row[2]
+            if status not in TRANSITIONS[current]:
+                raise ValueError(f"An order that is {current.replace('_', ' ')} cannot become {status.replace('_', ' ')}")
+            now = time.time()
+            history = json.loads(row[6]) + [dict({"status": status, "at": now}, **({"note": note} if note else {}))]
+            with self.conn:
+                self.conn.execute("UPDATE orders SET status = ?, history = ?, updated_at = ? WHERE order_id = ?",
+                                  (status, json.dumps(history, ensure_ascii=False), now, order_id))
+                self._summarize(row[1], order_id, row[7], current, status, row[4])
+            self.stats["status_updates"] += 1
+        order = self._order(row)
+        order["history"].append(dict(history[-1], at=_iso(now)))
+        order.update(status=status, updated_at=_iso(now))
+        return order
+
+    def _summarize(self, user_id: str, order_id: str, created_at: float, old: Optional[str], new: str, total: float):
+        """Fold one order write into the user's summary row, inside the caller's transaction."""
+        row = self.conn.execute(
+            "SELECT order_count, open_count, total_spent, status_counts, first_order_at, last_order_at, last_order_id, "
+            "active_order_id FROM order_summaries WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            row = (0, 0, 0.0, "{}", created_at, created_at, order_id, None)
+        count, open_count, spent, counts, first_at, last_at, last_id, active_id = row
+        counts = json.loads(counts)
+        if old is None:
+            count += 1
+            spent += total
+            if created_at >= last_at:
+                last_at, last_id = created_at, order_id
+            first_at = min(first_at, created_at)
+        else:
+            counts[old] -= 1
+            if not counts[old]:
+                del counts[old]
+        counts[new] = counts.get(new, 0) + 1
+        if new == "cancelled":
+            spent -= total
+        open_count += (new in OPEN_STATUSES) - (old in OPEN_STATUSES)
+        if old is None and (active_id is None or created_at >= last_at):
+            active_id = order_id
+        elif old is None or (active_id == order_id and new not in OPEN_STATUSES):
+            # A backdated order may be newer than the active one, or the active order just closed:
+            # take the newest open order from the user's index range.
+            placeholders = ", ".join("?" * len(OPEN_STATUSES))
+            newest = self.conn.execute(
+                f"SELECT order_id FROM orders WHERE user_id = ? AND status IN ({placeholders}) "
+                "ORDER BY created_at DESC, order_id DESC LIMIT 1", (user_id, *OPEN_STATUSES)).fetchone()
+            active_id = newest[0] if newest else None
+        self.conn.execute(
+            "INSERT OR REPLACE INTO order_summaries (user_id, order_count, open_count, total_spent, status_counts, "
+            "first_order_at, last_order_at, last_order_id, active_order_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, count, open_count, round(spent, 2), json.dumps(counts), first_at, last_at, last_id, active_id))
+
+    # Reads
+
+    def get(self, order_id: str, user_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(f"SELECT {COLUMNS} FROM orders WHERE order_id = ?", (order_id,)).fetchone()
+        if row is None or (user_id and row[1] != user_id):
+            return None
+        return self._order(row)
+
+    def summary(self, user_id: str) -> Dict[str, Any]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT order_count, open_count, total_spent, status_counts, first_order_at, last_order_at, "
+                "last_order_id, active_order_id FROM order_summaries WHERE user_id = ?", (user_id,)).fetchone()
+        if row is None:
+            return {"order_count": 0, "open_count": 0, "total_spent": 0.0, "status_counts": {},
+                    "first_order_at": None, "last_order_at": None, "last_order_id": None, "active_order_id": None}
+        count, open_count, spent, counts, first_at, last_at, last_id, active_id = row
+        return {"order_count": count, "open_count": open_count, "total_spent": spent,
+                "status_counts": json.loads(counts), "first_order_at": _iso(first_at), "last_order_at": _iso(last_at),
+                "last_order_id": last_id, "active_order_id": active_id}
+
+    def history(self, user_id: str, status: Optional[str] = None, cursor: Optional[str] = None,
+                limit: int = 20) -> Dict[str, Any]:
+        """A page of the user's orders, newest first; pass next_cursor back for the following page."""
+        if status and status not in TRANSITIONS:
+            raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        where, params = "user_id = ?", [user_id]
+        if status:
+            where += " AND status = ?"
+            params.append(status)
+        if cursor:
+            created_at, order_id = decode_cursor(cursor, "orders", float, str)
+            where += " AND (created_at, order_id) < (?, ?)"
+            params += [created_at, order_id]
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {COLUMNS} FROM orders WHERE {where} ORDER BY created_at DESC, order_id DESC LIMIT ?",
+                (*params, limit + 1)).fetchall()
+        next_cursor = encode_cursor("orders", rows[limit - 1][7], rows[limit - 1][0]) if len(rows) > limit else None
+        return {"orders": [self._order(row) for row in rows[:limit]], "next_cursor": next_cursor}
+
+    def where_is(self, user_id: str) -> Dict[str, Any]:
+        """The user's most recent open order (else their latest order) and summary, from primary-key lookups only."""
+        started = time.perf_counter()
+        summary = self.summary(user_id)
+        order_id = summary["active_order_id"] or summary["last_order_id"]
+        order = self.get(order_id) if order_id else None
+        self.stats["lookups"] += 1
+        self.stats["lookup_seconds"] += time.perf_counter() - started
+        return {"summary": summary, "order": order}
+
+    @staticmethod
+    def _order(row: tuple) -> Dict[str, Any]:
+        order_id, user_id, status, items, total, delivery, history, created_at, updated_at = row
+        return {
+            "order_id": order_id, "user_id": user_id, "status": status, "items": json.loads(items), "total": total,
+            "delivery": json.loads(delivery) if delivery else None,
+            "history": [dict(entry, at=_iso(entry["at"])) for entry in json.loads(history)],
+            "created_at": _iso(created_at), "updated_at": _iso(updated_at),
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        return {
+            "created": self.stats["created"],
+            "replayed": self.stats["replayed"],
+            "idempotency_conflicts": self.stats["conflicts"],
+            "status_updates": self.stats["status_updates"],
+            "lookups": lookups,
+            "avg_lookup_ms": round(self.stats["lookup_seconds"] / lookups * 1000, 3) if lookups else 0.0,
+        }
+
+
+def describe(found: Dict[str, Any]) -> str:
+    """Spoken answer to "where is my order"."""
+    order, summary = found["order"], found["summary"]
+    if order is None:
+        return "You haven't placed any orders yet."
+    items = order["items"]
+    what = items[0]["title"] + (f" and {len(items) - 1} more item{'s' if len(items) > 2 else ''}" if len(items) > 1 else "")
+    text = (f"Your order of {what} (₹{order['total']:g}), placed on {order['created_at'][:10]}, "
+            f"{STATUS_PHRASES[order['status']]}.")
+    others = summary["open_count"] - (order["status"] in OPEN_STATUSES)
+    if others > 0:
+        text += f" You have {others} other open order{'s' if others > 1 else ''}."
+    return text
+
+
+def benchmark(users: int = 5_000, orders: int = 100_000, lookups: int = 2_000, seed: int = 0) -> Dict[str, Any]:
+    """Create orders through the real write path, then time where-is, summary and history pages against a scan."""
+    rng = np.random.default_rng(seed)
+    catalog = {f"p{i}": {"product_id": f"p{i}", "seller_id": f"s{i % 50}", "title": f"Product {i}", "unit": "kg",
+                         "price": float(rng.integers(10, 500)), "stock": None} for i in range(1000)}
+    with tempfile.TemporaryDirectory() as root:
+        store = OrderStore(os.path.join(root, "orders.db"))
+        owners = rng.integers(0, users, orders)
+        requests = [[{"product_id": f"p{product}", "quantity": int(rng.integers(1, 5))}
+                     for product in rng.integers(0, 1000, rng.integers(1, 4))] for _ in range(orders)]
+        started = time.perf_counter()
+        created = [store.create(f"u{owner}", items, catalog.get, idempotency_key=f"k{index}",
+                                created_at=1.7e9 + index)["order_id"]
+                   for index, (owner, items) in enumerate(zip(owners, requests))]
+        create_seconds = time.perf_counter() - started
+        for order_id in rng.choice(created, orders // 2, replace=False):
+            store.update_status(str(order_id), "confirmed")
+        for order_id in rng.choice(created, orders // 4, replace=False):
+            try:
+                store.update_status(str(order_id), "cancelled")
+            except ValueError:
+                pass
+
+        def timed(call, count=lookups):
+            samples = []
+            for owner in rng.integers(0, users, count):
+                started = time.perf_counter()
+                call(f"u{owner}")
+                samples.append(time.perf_counter() - started)
+            return round(float(np.percentile(samples, 50)) * 1000, 3), round(float(np.percentile(samples, 99)) * 1000, 3)
+
+        def scan(user_id):
+            # What "where is my order" would cost without the summary row and index.
+            placeholders = ", ".join("?" * len(OPEN_STATUSES))
+            store.conn.execute(f"SELECT {COLUMNS} FROM orders NOT INDEXED WHERE user_id = ? AND status IN ({placeholders}) "
+                               "ORDER BY created_at DESC LIMIT 1", (user_id, *OPEN_STATUSES)).fetchone()
+
+        def last_page(user_id):
+            page = store.history(user_id, limit=5)
+            while page["next_cursor"]:
+                page = store.history(user_id, cursor=page["next_cursor"], limit=5)
+
+        started = time.perf_counter()
+        replays = 2000
+        for index in range(replays):
+            store.create(f"u{owners[index]}", requests[index], catalog.get, idempotency_key=f"k{index}")
+        replay_seconds = time.perf_counter() - started
+        results = {
+            "orders": orders,
+            "users": users,
+            "create_per_second": round(orders / create_seconds),
+            "replay_ms": round(replay_seconds / replays * 1000, 3),
+            "where_is_ms_p50_p99": timed(store.where_is),
+            "summary_ms_p50_p99": timed(store.summary),
+            "history_first_page_ms_p50_p99": timed(store.history),
+            "history_all_pages_of_5_ms_p50_p99": timed(last_page),
+        }
+        results["scan_where_is_ms_p50_p99"] = timed(scan, 50)
+        store.close()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,382 @@
+"""Batch price forecasts for every commodity x market series in the mandi store.
+
+One refresh turns the store into a dense (series x day) matrix and fits every
+model across all series at once: each time step is one vector operation over
+series and parameter grid, never a per-series loop. A holdout backtest picks
+the best model per series, which is then refit on the full history. Results
+are cached as a snapshot, so serving a forecast is an index lookup.
+
+Models: naive (last price), weekly seasonal naive, simple exponential
+smoothing and damped-trend Holt, with smoothing parameters chosen per series
+by one-step-ahead error.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from mandi_prices import STALE_AFTER_DAYS, MandiPriceStore, PriceIndex, day_to_iso
+
+HISTORY_DAYS = 365
+HORIZON_DAYS = 14
+BACKTEST_DAYS = 14
+SEASON_DAYS = 7
+# Series need this many observed days in the window, the latest within STALE_AFTER_DAYS, to be forecast.
+MIN_OBSERVED_DAYS = 21
+
+SES_ALPHAS = np.array([0.1, 0.2, 0.4, 0.7], dtype=np.float32)
+HOLT_ALPHAS = np.array([0.2, 0.5, 0.8], dtype=np.float32)
+HOLT_BETAS = np.array([0.05, 0.2], dtype=np.float32)
+HOLT_DAMPING = 0.9
+
+MODELS = ("naive", "seasonal_naive", "ses", "holt_damped")
+# Gains below this (percent) are reported as "sell now" rather than "hold".
+MIN_HOLD_GAIN_PERCENT = 2.0
+REFRESH_SECONDS = 6 * 3600
+
+
+def dense_matrix(store: MandiPriceStore, history_days: int = HISTORY_DAYS) -> Tuple[np.ndarray, int]:
+    """(series x day) modal prices over the last `history_days`, NaN where a market didn't report."""
+    return _dense_matrix(store.index, history_days)
+
+
+def _dense_matrix(index: PriceIndex, history_days: int) -> Tuple[np.ndarray, int]:
+    records = index.records
+    if not len(records):
+        return np.zeros((len(index.series), 0), dtype=np.float32), 0
+    last_day = int(records["day"].max())
+    first_day = last_day - history_days + 1
+    recent = records[records["day"] >= first_day]
+    matrix = np.full((len(index.series), history_days), np.nan, dtype=np.float32)
+    matrix[recent["series"], recent["day"] - first_day] = recent["modal_price"]
+    return matrix, first_day
+
+
+def fill_gaps(matrix: np.ndarray) -> np.ndarray:
+    """Carry the last price forward over missing days, and the first price back over leading ones."""
+    columns = np.arange(matrix.shape[1])
+    observed = ~np.isnan(matrix)
+    last_seen = np.maximum.accumulate(np.where(observed, columns, 0), axis=1)
+    filled = np.take_along_axis(matrix, last_seen, axis=1)
+    first_seen = np.argmax(observed, axis=1)
+    first_value = matrix[np.arange(len(matrix)), first_seen]
+    return np.where(columns < first_seen[:, None], first_value[:, None], filled)
+
+
+def forecast_naive(history: np.ndarray, horizon: int) -> np.ndarray:
+    return np.repeat(history[:, -1:], horizon, axis=1)
+
+
+def forecast_seasonal_naive(history: np.ndarray, horizon: int, season: int = SEASON_DAYS) -> np.ndarray:
+    return history[:, -season + (np.arange(horizon) % season)]
+
+
+def forecast_ses(history: np.ndarray, horizon: int, alphas: np.ndarray = SES_ALPHAS) -> np.ndarray:
+    """Simple exponential smoothing with the per-series alpha that minimizes one-step error."""
+    alpha = alphas[:, None]
+    level = np.repeat(history[None, :, 0], len(alphas), axis=0)
+    sse = np.zeros_like(level)
+    for t in range(1, history.shape[1]):
+        error = history[:, t] - level
+        sse += error * error
+        level += alpha * error
+    best = np.argmin(sse, axis=0)
+    final = level[best, np.arange(history.shape[0])]
+    return np.repeat(final[:, None], horizon, axis=1)
+
+
+def forecast_holt_damped(history: np.ndarray, horizon: int, alphas: np.ndarray = HOLT_ALPHAS,
+                         betas: np.ndarray = HOLT_BETAS, damping: float = HOLT_DAMPING) -> np.ndarray:
+    """Damped-trend Holt over an (alpha, beta) grid, best pair chosen per series by one-step error."""
+    alpha = np.repeat(alphas, len(betas))[:, None]
+    beta = np.tile(betas, len(alphas))[:, None]
+    combos = len(alpha)
+    level = np.repeat(history[None, :, 0], combos, axis=0)
+    trend = np.repeat((history[None, :, 1] - history[None, :, 0]) if history.shape[1] > 1 else
+                      np.zeros_like(history[None, :, 0]), combos, axis=0)
+    sse = np.zeros_like(level)
+    for t in range(1, history.shape[1]):
+        predicted = level + damping * trend
+        error = history[:, t] - predicted
+        sse += error * error
+        new_level = predicted + alpha * error
+        trend = damping * trend + alpha * beta * error
+        level = new_level
+    best = np.argmin(sse, axis=0)
+    rows = np.arange(history.shape[0])
+    steps = np.cumsum(damping ** np.arange(1, horizon + 1)).astype(np.float32)
+    return level[best, rows][:, None] + trend[best, rows][:, None] * steps[None, :]
+
+
+def forecast_all(history: np.ndarray, horizon: int) -> np.ndarray:
+    """(models x series x horizon) forecasts from a gap-free history."""
+    return np.stack([
+        forecast_naive(history, horizon),
+        forecast_seasonal_naive(history, horizon),
+        forecast_ses(history, horizon),
+        forecast_holt_damped(history, horizon),
+    ])
+
+
+def backtest(filled: np.ndarray, observed: np.ndarray, holdout: int = BACKTEST_DAYS) -> Dict[str, Any]:
+    """Fit on all but the last `holdout` days and score each model on the observed days held out.
+
+    Returns per-series MAPE per model (models x series, NaN where nothing was observed) and the
+    best model index per series.
+    """
+    predictions = forecast_all(filled[:, :-holdout], holdout)
+    actual = filled[:, -holdout:]
+    mask = observed[:, -holdout:]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        errors = np.abs(predictions - actual[None]) / actual[None]
+        counts = mask.sum(axis=1)
+        mape = np.where(counts > 0, np.where(mask[None], errors, 0).sum(axis=2) / counts, np.nan) * 100
+    best = np.where(np.isnan(mape).all(axis=0), 0, np.nanargmin(np.where(np.isnan(mape), np.inf, mape), axis=0))
+    return {"mape": mape.astype(np.float32), "best": best.astype(np.int8)}
+
+
+def evaluate_selection(filled: np.ndarray, observed: np.ndarray, holdout: int = BACKTEST_DAYS) -> Dict[str, Any]:
+    """Out-of-sample accuracy of per-series model selection.
+
+    The model is picked on the window before the last `holdout` days and scored on the last
+    window, so "selected" is not flattered by choosing on the data it is scored on. The
+    returned "best" is the choice on the latest window, used for the live forecast.
+    """
+    validation = backtest(filled[:, :-holdout], observed[:, :-holdout], holdout)
+    test = backtest(filled, observed, holdout)
+    rows = np.arange(len(filled))
+    return {"mape": test["mape"], "selected": test["mape"][validation["best"], rows], "best": test["best"]}
+
+
+class ForecastSnapshot:
+    """Forecasts for every series as of one store snapshot, with the lookup tables to read them."""
+
+    def __init__(self, store: MandiPriceStore, horizon: int = HORIZON_DAYS, history_days: int = HISTORY_DAYS):
+        started = time.perf_counter()
+        # One index throughout, so an ingest during the fit can't mismatch rows and series.
+        index = store.index
+        matrix, first_day = _dense_matrix(index, history_days)
+        observed = ~np.isnan(matrix)
+        self.series = index.series
+        self.commodities = index.commodities
+        self.series_states = index.series_states
+        self.horizon = horizon
+        self.start_day = first_day + matrix.shape[1]
+        # A market that stopped reporting would have its last price carried forward as "current".
+        if matrix.shape[1]:
+            days_since_report = np.argmax(observed[:, ::-1], axis=1)
+            fresh = observed.any(axis=1) & (days_since_report < STALE_AFTER_DAYS)
+        else:
+            fresh = np.zeros(len(matrix), dtype=bool)
+        self.valid = fresh & (observed.sum(axis=1) >= MIN_OBSERVED_DAYS)
+        self.stale_series = int((~fresh & observed.any(axis=1)).sum())
+        self.forecasts = np.full((len(matrix), horizon), np.nan, dtype=np.float32)
+        self.models = np.zeros(len(matrix), dtype=np.int8)
+        self.mape = np.full(len(matrix), np.nan, dtype=np.float32)
+        self.last_price = np.full(len(matrix), np.nan, dtype=np.float32)
+        self.model_mape: Dict[str, Optional[float]] = {}
+
+        rows = np.flatnonzero(self.valid)
+        if len(rows) and matrix.shape[1] > 2 * BACKTEST_DAYS + SEASON_DAYS:
+            filled = fill_gaps(matrix[rows])
+            tested = evaluate_selection(filled, observed[rows])
+            chosen = tested["best"]
+            final = forecast_all(filled, horizon)
+            self.forecasts[rows] = final[chosen, np.arange(len(rows))]
+            self.models[rows] = chosen
+            self.mape[rows] = tested["selected"]
+            self.last_price[rows] = filled[:, -1]
+            with np.errstate(invalid="ignore"):
+                self.model_mape = {name: _round(np.nanmean(tested["mape"][index])) for index, name in enumerate(MODELS)}
+                self.model_mape["selected"] = _round(np.nanmean(tested["selected"]))
+        self.fit_seconds = time.perf_counter() - started
+        self.computed_at = time.time()
+        # Ingests swap in a new index, even when they only correct prices already held.
+        self.index = index
+
+    def lookup(self, commodity: str, states: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        entry = self.commodities.get(commodity.casefold())
+        if entry is None:
+            return None
+        name, first, last = entry
+        rows = np.arange(first, last)
+        if states:
+            wanted = {state.casefold() for state in states}
+            rows = rows[np.array([state in wanted for state in self.series_states[first:last]], dtype=bool)]
+        rows = rows[self.valid[rows]]
+        if not len(rows):
+            return None
+
+        path = self.forecasts[rows].mean(axis=0)
+        current = float(self.last_price[rows].mean())
+        peak = int(np.argmax(path))
+        gain = (path[peak] - current) / current * 100
+        best_market = rows[np.argmax(self.forecasts[rows].max(axis=1))]
+        models, counts = np.unique(self.models[rows], return_counts=True)
+        return {
+            "commodity": name,
+            "states": states or [],
+            "unit": "Rs/quintal",
+            "markets": int(len(rows)),
+            "current_price": _round(current),
+            "horizon_days": self.horizon,
+            "forecast": [
+                {"date": day_to_iso(self.start_day + offset), "modal_price": _round(value)}
+                for offset, value in enumerate(path)
+            ],
+            "best_sell_date": day_to_iso(self.start_day + peak) if gain >= MIN_HOLD_GAIN_PERCENT else None,
+            "expected_change_percent": _round(gain),
+            "advice": "hold" if gain >= MIN_HOLD_GAIN_PERCENT else "sell_now",
+            "best_market": {
+                "market": self.series[best_market][4],
+                "state": self.series[best_market][2],
+                "peak_price": _round(self.forecasts[best_market].max()),
+            },
+            "backtest_mape_percent": _round(np.nanmedian(self.mape[rows])),
+            "models": {MODELS[model]: int(count) for model, count in zip(models, counts)},
+            "computed_at": self.computed_at,
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "series": int(len(self.forecasts)),
+            "forecast_series": int(self.valid.sum()),
+            "stale_series": self.stale_series,
+            "horizon_days": self.horizon,
+            "fit_seconds": round(self.fit_seconds, 3),
+            "backtest_mape_percent": self.model_mape,
+            "computed_at": self.computed_at,
+        }
+
+
+class PriceForecaster:
+    """Keeps a forecast snapshot current: refreshed on a timer and after new price data arrives."""
+
+    def __init__(self, store: MandiPriceStore, refresh_seconds: float = REFRESH_SECONDS,
+                 horizon: int = HORIZON_DAYS):
+        self.store = store
+        self.refresh_seconds = refresh_seconds
+        self.horizon = horizon
+        self.snapshot: Optional[ForecastSnapshot] = None
+        self.refreshes = 0
+        self.lock = threading.Lock()
+        self.task: Optional[asyncio.Task] = None
+        self.wakeup: Optional[asyncio.Event] = None
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    def request_refresh(self):
+        if self.wakeup is not None:
+            self.wakeup.set()
+
+    def refresh(self) -> ForecastSnapshot:
+        with self.lock:
+            snapshot = ForecastSnapshot(self.store, self.horizon)
+            self.snapshot = snapshot
+            self.refreshes += 1
+        return snapshot
+
+    def stale(self) -> bool:
+        """Whether the store has data the current snapshot wasn't fitted on, or the snapshot is due a refit."""
+        index = self.store.index
+        if not len(index.records):
+            return False
+        snapshot = self.snapshot
+        return (snapshot is None or snapshot.index is not index
+                or time.time() - snapshot.computed_at >= self.refresh_seconds)
+
+    async def _run(self):
+        while True:
+            if self.stale():
+                try:
+                    await asyncio.to_thread(self.refresh)
+                except Exception as e:
+                    logging.error(f"Price forecast refresh failed: {e}")
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.refresh_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def lookup(self, commodity: str, states: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        snapshot = self.snapshot
+        return snapshot.lookup(commodity, states) if snapshot else None
+
+    def metrics(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {"refreshes": self.refreshes, **(snapshot.metrics() if snapshot else {})}
+
+
+def describe(forecast: Dict[str, Any]) -> str:
+    """Plain-language sell advice from a forecast lookup."""
+    if forecast["advice"] == "hold":
+        return (f"{forecast['commodity']} prices are forecast to rise about {forecast['expected_change_percent']:.0f}% "
+                f"by {forecast['best_sell_date']}, so holding may pay if you can store it safely.")
+    return (f"{forecast['commodity']} prices are not forecast to rise meaningfully over the next "
+            f"{forecast['horizon_days']} days, so selling now is reasonable.")
+
+
+def _round(value: Any) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) else round(value, 2)
+
+
+def synthetic_matrix(series: int, days: int = HISTORY_DAYS, seed: int = 0) -> np.ndarray:
+    """Prices with level, drift, a weekly cycle, noise and missing reporting days."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(days, dtype=np.float32)
+    level = rng.uniform(800, 6000, (series, 1)).astype(np.float32)
+    drift = rng.normal(0, 0.0005, (series, 1)).astype(np.float32)
+    weekly = rng.uniform(0, 0.04, (series, 1)).astype(np.float32) * np.sin(2 * np.pi * t / SEASON_DAYS)
+    walk = np.cumsum(rng.normal(0, 0.01, (series, days)), axis=1).astype(np.float32)
+    prices = level * np.exp(drift * t + weekly + walk)
+    prices[rng.random((series, days)) < 0.15] = np.nan
+    return prices
+
+
+def benchmark(series: int = 20_000, days: int = HISTORY_DAYS) -> Dict[str, Any]:
+    """Backtest accuracy per model and total fit time over a full synthetic series set."""
+    matrix = synthetic_matrix(series, days)
+    started = time.perf_counter()
+    filled = fill_gaps(matrix)
+    tested = evaluate_selection(filled, ~np.isnan(matrix))
+    chosen = tested["best"]
+    final = forecast_all(filled, HORIZON_DAYS)[chosen, np.arange(series)]
+    elapsed = time.perf_counter() - started
+    return {
+        "series": series,
+        "history_days": days,
+        "fit_seconds": round(elapsed, 3),
+        "series_per_second": round(series / elapsed),
+        "backtest_mape_percent": {
+            **{name: _round(np.nanmean(tested["mape"][index])) for index, name in enumerate(MODELS)},
+            "selected": _round(np.nanmean(tested["selected"])),
+        },
+        "model_counts": {MODELS[index]: int((chosen == index).sum()) for index in range(len(MODELS))},
+        "forecast_finite": bool(np.isfinite(final).all()),
+    }
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and os.path.isdir(sys.argv[1]):
+        snapshot = ForecastSnapshot(MandiPriceStore(sys.argv[1]))
+        print(json.dumps(snapshot.metrics(), indent=2))
+    else:
+        print(json.dumps(benchmark(*(int(arg) for arg in sys.argv[1:3])), indent=2))
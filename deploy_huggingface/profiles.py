@@ -0,0 +1,250 @@
+"""Farmer profiles: SQLite persistence behind a read-through in-process cache.
+
+Reads are served from an LRU of normalized profiles. A miss costs one primary-key
+lookup, and misses are cached too, so a user without a profile doesn't reach
+SQLite on every prompt. Writes go to SQLite first and then replace the cached
+entry with a new dict, so the cache never holds a profile the database doesn't.
+Callers get deep copies, so nothing outside the store can change a cached one.
+
+`profile_context` renders a profile as one short line (place, land, crops,
+language, name, soil) cut to a token budget; personalized prompt templates
+carry it so farmers don't have to repeat themselves.
+"""
+import copy
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from eligibility import normalize_profile
+from prompts import estimate_tokens
+
+CACHE_SIZE = 10_000
+CONTEXT_TOKENS = 64
+LANGUAGE_NAMES = {
+    "en": "English", "hi": "Hindi", "bn": "Bengali", "mr": "Marathi", "te": "Telugu", "ta": "Tamil",
+    "gu": "Gujarati", "kn": "Kannada", "ml": "Malayalam", "pa": "Punjabi", "or": "Odia", "as": "Assamese",
+}
+# A bigha differs by state; 0.25 ha is the common north Indian (UP, Bihar) pucca bigha.
+HECTARES_PER_UNIT = {"hectare": 1.0, "ha": 1.0, "हेक्टेयर": 1.0, "acre": 0.4047, "एकड़": 0.4047,
+                     "bigha": 0.25, "बीघा": 0.25}
+LAND_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(hectares?|ha\b|acres?|bighas?|हेक्टेयर|एकड़|बीघा)")
+NAME_PATTERN = re.compile(r"(?:[Mm]y name is|[Nn]ame is|मेरा नाम)\s+([\wऀ-ॿ]+(?: [A-Z][a-z]+)?)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+
+def parse_details(text: str) -> Dict[str, Any]:
+    """Land size (as hectares) and name stated in free text; place, soil and crops are parsed by their owners."""
+    details: Dict[str, Any] = {}
+    land = LAND_PATTERN.search(text.casefold())
+    if land:
+        unit = land.group(2).rstrip("s") if land.group(2) != "ha" else "ha"
+        details["land_hectares"] = round(float(land.group(1)) * HECTARES_PER_UNIT[unit], 2)
+    name = NAME_PATTERN.search(text)
+    if name:
+        details["name"] = name.group(1).strip().title()
+    return details
+
+
+def language_name(code: Optional[str]) -> Optional[str]:
+    if not code:
+        return None
+    return LANGUAGE_NAMES.get(code.split("-")[0].casefold(), code)
+
+
+def profile_context(profile: Dict[str, Any], language: Optional[str] = None, max_tokens: int = CONTEXT_TOKENS) -> str:
+    """One-line profile summary, most useful facts first, stopping before `max_tokens` is exceeded."""
+    parts = []
+    place = ", ".join(value for value in (profile.get("district"), profile.get("state")) if value)
+    if place:
+        parts.append(place)
+    if profile.get("land_hectares"):
+        irrigation = {True: ", irrigated", False: ", rainfed"}.get(profile.get("irrigation_source"), "")
+        parts.append(f"{profile['land_hectares']:g} ha{irrigation}")
+    if profile.get("crops"):
+        parts.append("grows " + ", ".join(profile["crops"][:5]))
+    spoken = language_name(profile.get("language") or language)
+    if spoken:
+        parts.append(f"speaks {spoken}")
+    if profile.get("name"):
+        parts.append(f"name {profile['name']}")
+    if profile.get("soil"):
+        parts.append(f"{profile['soil']} soil")
+    if profile.get("farmer_type"):
+        parts.append(f"{profile['farmer_type']} farmer")
+    context = ""
+    for part in parts:
+        candidate = f"{context}; {part}" if context else part
+        if estimate_tokens(candidate) > max_tokens:
+            break
+        context = candidate
+    return context
+
+
+FIELD_LABELS = {"district": "district", "land_hectares": "land size", "crops": "crops"}
+ALSO_PATTERN = re.compile(r"\balso\b|\bbhi\b|भी")
+
+
+def missing_fields(profile: Optional[Dict[str, Any]]) -> List[str]:
+    """Conversational fields the agent still needs to personalize advice: place, land size and crops."""
+    profile = profile or {}
+    missing = []
+    if not (profile.get("district") or profile.get("state")):
+        missing.append("district")
+    for field in ("land_hectares", "crops"):
+        if not profile.get(field):
+            missing.append(field)
+    return missing
+
+
+class ProfileStore:
+    def __init__(self, db_path: str, cache: Optional["OrderedDict[str, Optional[Dict[str, Any]]]"] = None,
+                 cache_size: int = CACHE_SIZE, context_tokens: int = CONTEXT_TOKENS):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.cache = cache if cache is not None else OrderedDict()
+        self.cache_size = cache_size
+        self.context_tokens = context_tokens
+        # Rendered prompt blocks per cached user and session language; dropped with the profile.
+        self.contexts: Dict[str, Dict[Optional[str], str]] = {}
+        self.stats = {"hits": 0, "misses": 0, "writes": 0}
+
+    def close(self):
+        self.conn.close()
+
+    def _remember(self, user_id: str, profile: Optional[Dict[str, Any]]):
+        self.cache[user_id] = profile
+        self.cache.move_to_end(user_id)
+        self.contexts.pop(user_id, None)
+        while len(self.cache) > self.cache_size:
+            evicted, _ = self.cache.popitem(last=False)
+            self.contexts.pop(evicted, None)
+
+    def _load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Cached profile, reading it from SQLite on a miss; call with the lock held."""
+        if user_id in self.cache:
+            self.cache.move_to_end(user_id)
+            self.stats["hits"] += 1
+            return self.cache[user_id]
+        row = self.conn.execute("SELECT data FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        profile = json.loads(row[0]) if row else None
+        self._remember(user_id, profile)
+        self.stats["misses"] += 1
+        return profile
+
+    def get(self, user_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not user_id:
+            return None
+        with self.lock:
+            return copy.deepcopy(self._load(user_id))
+
+    def update(self, user_id: str, fields: Dict[str, Any], append_crops: bool = False) -> Dict[str, Any]:
+        """Merge `fields` into the user's profile, persist it, then refresh the cache.
+
+        A value that doesn't parse ("about five acres" as a number) leaves the stored one alone;
+        an explicit None or "" clears it. With `append_crops`, new crops are added after the stored
+        ones instead of replacing them, under the same lock as the write.
+        """
+        if not user_id:
+            raise ValueError("user_id is required")
+        with self.lock:
+            profile = copy.deepcopy(self._load(user_id) or {"user_id": user_id})
+            for key, value in normalize_profile(fields).items():
+                if value is None and fields.get(key) not in (None, ""):
+                    continue
+                if key == "crops" and append_crops and value:
+                    value = list(dict.fromkeys((profile.get("crops") or []) + value))
+                profile[key] = value
+            profile["user_id"] = user_id
+            profile["updated_at"] = datetime.utcnow().isoformat()
+            with self.conn:
+                self.conn.execute("INSERT OR REPLACE INTO profiles (user_id, data, updated_at) VALUES (?, ?, ?)",
+                                  (user_id, json.dumps(profile, ensure_ascii=False), time.time()))
+            self._remember(user_id, profile)
+            self.stats["writes"] += 1
+        return copy.deepcopy(profile)
+
+    def context(self, user_id: Optional[str], language: Optional[str] = None) -> str:
+        """The prompt block for a user: their profile line, or just their language when there is no profile."""
+        if not user_id:
+            return profile_context({}, language, self.context_tokens) if language else ""
+        with self.lock:
+            profile = self._load(user_id)
+            contexts = self.contexts.setdefault(user_id, {})
+            if language not in contexts:
+                contexts[language] = profile_context(profile or {}, language, self.context_tokens) if profile or language else ""
+            return contexts[language]
+
+    def metrics(self) -> Dict[str, Any]:
+        reads = self.stats["hits"] + self.stats["misses"]
+        return {
+            "cached": len(self.cache),
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "hit_rate": round(self.stats["hits"] / reads, 3) if reads else None,
+            "writes": self.stats["writes"],
+        }
+
+
+def benchmark(users: int = 50_000, reads: int = 200_000, cache_size: int = CACHE_SIZE, seed: int = 0) -> Dict[str, Any]:
+    """Zipf-distributed profile reads through the cache against reading SQLite every time."""
+    rng = np.random.default_rng(seed)
+    states = ["Uttar Pradesh", "Punjab", "Maharashtra", "Bihar", "Karnataka"]
+    crops = ["wheat", "rice", "mustard", "cotton", "sugarcane", "maize", "gram"]
+    with tempfile.TemporaryDirectory() as root:
+        store = ProfileStore(os.path.join(root, "profiles.db"), cache_size=cache_size)
+        started = time.perf_counter()
+        for user in range(users):
+            store.update(f"u{user}", {"state": states[user % 5], "district": f"District {user % 700}",
+                                      "land_hectares": round(float(rng.uniform(0.2, 6)), 2),
+                                      "crops": list(rng.choice(crops, 2, replace=False)), "language": "hi"})
+        write_seconds = time.perf_counter() - started
+        store.cache.clear()
+        # Active users dominate traffic: rank-frequency roughly Zipf.
+        order = (rng.zipf(1.2, reads) - 1) % users
+        ids = [f"u{user}" for user in order]
+
+        started = time.perf_counter()
+        for user_id in ids:
+            store.context(user_id)
+        cached_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for user_id in ids:
+            row = store.conn.execute("SELECT data FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+            profile_context(json.loads(row[0]))
+        uncached_seconds = time.perf_counter() - started
+        contexts = [store.context(f"u{user}") for user in range(100)]
+        result = {
+            "users": users,
+            "reads": reads,
+            "writes_per_second": round(users / write_seconds),
+            "cached_context_us": round(cached_seconds / reads * 1e6, 2),
+            "uncached_context_us": round(uncached_seconds / reads * 1e6, 2),
+            "avg_context_tokens": round(float(np.mean([estimate_tokens(text) for text in contexts])), 1),
+            **store.metrics(),
+        }
+        store.close()
+    return result
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
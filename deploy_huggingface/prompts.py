@@ -0,0 +1,730 @@
+"""Prompt template registry and context caching for the large static prompts.
+
+Each template is split into a static prefix (role, reference lists, report
+structure) and a short dynamic body with named slots. The prefix is sent as the
+system instruction, so it is byte-identical across calls and can be served from
+a Gemini/Vertex context cache once it is large enough to qualify. Instructions
+alone are a few hundred tokens, well under the cache minimum, so templates that
+answer from a static catalog (the scheme records) get it appended to their prefix
+at startup; that prefix crosses the minimum and is cached. Dynamic slots are
+truncated to a token budget before rendering.
+
+Personalized templates also get the current farmer's profile line (set per task
+through `run_with_farmer_context`) at the top of their body, never in the
+prefix, so per-farmer text doesn't break prefix caching.
+"""
+import contextvars
+import copy
+import hashlib
+import math
+import re
+import string
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from singleflight import SingleFlight
+
+# Rough bytes-per-token for Gemini tokenizers; UTF-8 bytes keep Indic scripts from being under-counted.
+BYTES_PER_TOKEN = 4
+
+# Smallest prefix the context-cache API accepts, per model.
+MIN_CACHE_TOKENS = {
+    "gemini-2.5-flash-lite": 1024,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 4096,
+}
+DEFAULT_MIN_CACHE_TOKENS = 4096
+CACHE_TTL_SECONDS = 3600
+# Recreate a cache this long before it expires rather than racing its expiry.
+CACHE_REFRESH_MARGIN_SECONDS = 120
+
+# Output budgets per profile. Profiles default to the task class; templates may name their own.
+GENERATION_PROFILES = {
+    "classify": {"max_output_tokens": 16, "temperature": 0.0, "stop_sequences": ["\n"]},
+    "extract": {"max_output_tokens": 256, "temperature": 0.0},
+    "summarize": {"max_output_tokens": 256, "temperature": 0.3},
+    "spoken_summary": {"max_output_tokens": 96, "temperature": 0.3, "stop_sequences": ["\n\n"]},
+    "chat": {"max_output_tokens": 512, "temperature": 0.7},
+    "plan": {"max_output_tokens": 2048, "temperature": 0.2},
+    "long_report": {"max_output_tokens": 1536, "temperature": 0.4},
+}
+
+# Gemini 2.5 thinking tokens count against max_output_tokens, so a 16-token classify budget
+# would be spent before any answer. The pinned SDKs cannot send a thinking budget, so the
+# output limit is raised by each model's thinking allowance instead; Flash-Lite only thinks
+# when asked to.
+THINKING_TOKENS = {
+    "gemini-2.5-flash-lite": 0,
+    "gemini-2.5-flash": 1024,
+    "gemini-2.5-pro": 2048,
+}
+
+SPOKEN_SUMMARY_MAX_WORDS = 40
+
+# Upper bound on the profile line added to personalized prompts; profiles.py renders it within this.
+FARMER_CONTEXT_TOKENS = 64
+farmer_context: contextvars.ContextVar[str] = contextvars.ContextVar("farmer_context", default="")
+
+
+def generation_config(profile: str, model_name: Optional[str] = None) -> Dict[str, Any]:
+    """The profile's config, with `model_name`'s thinking allowance added to the output limit."""
+    config = copy.deepcopy(GENERATION_PROFILES.get(profile, GENERATION_PROFILES["chat"]))
+    if config.get("max_output_tokens") is not None:
+        config["max_output_tokens"] += THINKING_TOKENS.get(model_name, 0)
+    return config
+
+
+def configure_profiles(overrides: Dict[str, Dict[str, Any]]):
+    """Merge per-profile overrides, e.g. {"long_report": {"max_output_tokens": 1024}}."""
+    for profile, settings in overrides.items():
+        GENERATION_PROFILES.setdefault(profile, {}).update(settings)
+
+
+def extractive_summary(text: str, max_words: int = SPOKEN_SUMMARY_MAX_WORDS) -> str:
+    """Leading sentences of `text` with markdown stripped, ending on a sentence boundary where possible."""
+    plain = re.sub(r"^\s*#.*$", "", text, flags=re.MULTILINE)
+    plain = re.sub(r"[#*_`>|]+", " ", plain)
+    plain = re.sub(r"^\s*(?:[-•]|\d+[.)])\s+", "", plain, flags=re.MULTILINE)
+    words = plain.split()
+    if len(words) <= max_words:
+        return " ".join(words)
+    clipped = " ".join(words[:max_words])
+    boundary = max(clipped.rfind(". "), clipped.rfind("? "), clipped.rfind("! "))
+    return clipped[:boundary + 1] if boundary > len(clipped) // 3 else clipped + "…"
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text.encode("utf-8")) / BYTES_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the start of `text` within roughly `max_tokens` tokens."""
+    limit = max_tokens * BYTES_PER_TOKEN
+    encoded = text.encode("utf-8")
+    if len(encoded) <= limit:
+        return text
+    return encoded[:limit].decode("utf-8", errors="ignore").rstrip() + " …[truncated]"
+
+
+def personalize(body: str) -> str:
+    """`body` headed by the current farmer's profile line, when a task has set one."""
+    context = farmer_context.get()
+    if not context:
+        return body
+    return f"Farmer: {truncate_to_tokens(context, FARMER_CONTEXT_TOKENS)}\n\n{body}"
+
+
+async def run_with_farmer_context(context: str, work: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `work` with `context` as the profile line for personalized prompts."""
+    token = farmer_context.set(context)
+    try:
+        return await work()
+    finally:
+        farmer_context.reset(token)
+
+
+class RenderedPrompt:
+    def __init__(self, template: "PromptTemplate", body: str):
+        self.template = template
+        self.name = template.name
+        self.prefix = template.prefix
+        self.body = body
+
+    @property
+    def text(self) -> str:
+        return f"{self.prefix}\n\n{self.body}"
+
+    @property
+    def estimated_tokens(self) -> int:
+        return self.template.prefix_tokens + estimate_tokens(self.body)
+
+
+class PromptTemplate:
+    """A static prefix plus a `str.format` body whose slots are truncated to per-slot token budgets.
+
+    `personalized` templates are advice written for one farmer; their body is headed by the farmer's profile line.
+    """
+
+    def __init__(self, name: str, prefix: str, body: str, task_class: str,
+                 slot_budgets: Optional[Dict[str, int]] = None, default_slot_budget: int = 512,
+                 profile: Optional[str] = None, personalized: bool = False):
+        self.name = name
+        self.prefix = _dedent(prefix)
+        self.body = _dedent(body)
+        self.task_class = task_class
+        self.profile = profile or task_class
+        self.personalized = personalized
+        self.slots = sorted({field for _, field, _, _ in string.Formatter().parse(self.body) if field})
+        self.slot_budgets = {slot: (slot_budgets or {}).get(slot, default_slot_budget) for slot in self.slots}
+        self._set_prefix(self.prefix)
+
+    def _set_prefix(self, prefix: str):
+        self.prefix = prefix
+        self.prefix_tokens = estimate_tokens(prefix)
+        self.prefix_hash = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:16]
+
+    def attach_reference(self, heading: str, reference: str):
+        """Append static reference data (a catalog loaded at startup) to the prefix, under `heading`."""
+        self._set_prefix(f"{self.prefix}\n\n{heading}:\n{reference.strip()}")
+
+    def render(self, **values: Any) -> RenderedPrompt:
+        missing = [slot for slot in self.slots if slot not in values]
+        if missing:
+            raise KeyError(f"Prompt '{self.name}' is missing slots: {', '.join(missing)}")
+        filled = {slot: truncate_to_tokens(str(values[slot]), self.slot_budgets[slot]) for slot in self.slots}
+        body = self.body.format(**filled)
+        return RenderedPrompt(self, personalize(body) if self.personalized else body)
+
+
+def _dedent(text: str) -> str:
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return "\n".join(lines)
+
+
+class PromptStats:
+    def __init__(self):
+        self.calls = 0
+        self.estimated_input_tokens = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+        self.cache_hits = 0
+        self.total_latency = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "estimated_input_tokens": self.estimated_input_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_hits": self.cache_hits,
+            "avg_latency_seconds": round(self.total_latency / self.calls, 3) if self.calls else None,
+        }
+
+
+class PromptRegistry:
+    def __init__(self):
+        self.templates: Dict[str, PromptTemplate] = {}
+        self.stats: Dict[str, PromptStats] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        if template.name in self.templates:
+            raise ValueError(f"Prompt '{template.name}' is already registered")
+        self.templates[template.name] = template
+        self.stats[template.name] = PromptStats()
+        return template
+
+    def render(self, name: str, **values: Any) -> RenderedPrompt:
+        return self.templates[name].render(**values)
+
+    def attach_reference(self, name: str, heading: str, reference: str) -> PromptTemplate:
+        template = self.templates[name]
+        template.attach_reference(heading, reference)
+        return template
+
+    def record(self, name: str, estimated_tokens: int, latency: float,
+               prompt_tokens: int = 0, cached_tokens: int = 0, output_tokens: int = 0):
+        stats = self.stats[name]
+        stats.output_tokens += output_tokens
+        stats.calls += 1
+        stats.estimated_input_tokens += estimated_tokens
+        stats.prompt_tokens += prompt_tokens
+        stats.cached_tokens += cached_tokens
+        stats.cache_hits += 1 if cached_tokens else 0
+        stats.total_latency += latency
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "prefix_tokens": template.prefix_tokens,
+                "slots": template.slots,
+                "personalized": template.personalized,
+                "max_output_tokens": GENERATION_PROFILES.get(template.profile, {}).get("max_output_tokens"),
+                **self.stats[name].to_dict(),
+            }
+            for name, template in self.templates.items()
+        }
+
+
+class ContextCache:
+    """Context-cache handles for static prompt prefixes, keyed by (backend, model, prefix).
+
+    `create(backend, model, prefix, ttl_seconds)` makes the cache upstream and returns
+    its handle. Prefixes below the model's minimum are never cached, and a route whose
+    cache creation fails is left uncached for one TTL before it is tried again.
+    """
+
+    def __init__(self, create: Callable[[str, str, str, int], Awaitable[Any]], ttl_seconds: int = CACHE_TTL_SECONDS):
+        self.create = create
+        self.ttl_seconds = ttl_seconds
+        self.entries: Dict[Tuple[str, str, str], Tuple[Any, float]] = {}
+        self.unsupported: Dict[Tuple[str, str], float] = {}
+        self.flight = SingleFlight("prompt_cache")
+        self.created = 0
+        self.failures = 0
+
+    def eligible(self, model: str, prompt: RenderedPrompt) -> bool:
+        return prompt.template.prefix_tokens >= MIN_CACHE_TOKENS.get(model, DEFAULT_MIN_CACHE_TOKENS)
+
+    async def get(self, backend: str, model: str, prompt: RenderedPrompt) -> Optional[Any]:
+        now = time.time()
+        if self.unsupported.get((backend, model), 0) > now or not self.eligible(model, prompt):
+            return None
+        key = (backend, model, prompt.template.prefix_hash)
+        entry = self.entries.get(key)
+        if entry and entry[1] - CACHE_REFRESH_MARGIN_SECONDS > now:
+            return entry[0]
+        try:
+            return await self.flight.do("/".join(key), lambda: self._create(key, prompt.prefix))
+        except Exception:
+            self.failures += 1
+            self.unsupported[(backend, model)] = now + self.ttl_seconds
+            self.entries.pop(key, None)
+            return None
+
+    async def _create(self, key: Tuple[str, str, str], prefix: str) -> Any:
+        handle = await self.create(key[0], key[1], prefix, self.ttl_seconds)
+        self.created += 1
+        self.entries[key] = (handle, time.time() + self.ttl_seconds)
+        return handle
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "live_caches": sum(1 for _, expires in self.entries.values() if expires > time.time()),
+            "created": self.created,
+            "failures": self.failures,
+            "unsupported_routes": [f"{backend}/{model}" for (backend, model), until in sorted(self.unsupported.items())
+                                   if until > time.time()],
+        }
+
+
+PROMPTS = PromptRegistry()
+
+PROMPTS.register(PromptTemplate(
+    "gov_schemes",
+    prefix="""
+        You are an expert agricultural consultant specializing in Indian government schemes for farmers.
+
+        Provide detailed information about relevant government schemes including:
+        1. Scheme name and full details
+        2. Eligibility criteria
+        3. Benefits and subsidies
+        4. Application process
+        5. Required documents
+        6. Contact information for help
+
+        Focus on schemes like:
+        - PM-KISAN (Pradhan Mantri Kisan Samman Nidhi)
+        - PMFBY (Pradhan Mantri Fasal Bima Yojana)
+        - Soil Health Card Scheme
+        - Kisan Credit Card
+        - National Agriculture Market (eNAM)
+        - Paramparagat Krishi Vikas Yojana
+        - Rashtriya Krishi Vikas Yojana
+        - Agricultural Mechanization schemes
+        - Micro Irrigation schemes
+        - And other relevant schemes based on the query
+
+        Take amounts, eligibility and application steps from the scheme records below when they cover the
+        scheme, and tell the farmer to confirm any detail they don't.
+
+        Structure your response as a clear, actionable summary that a farmer can understand and use.
+    """,
+    body='The user\'s query: "{query}"',
+    task_class="long_report",
+    slot_budgets={"query": 256},
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "scheme_answer",
+    prefix="""
+        You answer a farmer's question about Indian government schemes using only the scheme records you are given.
+
+        - Answer the question directly first, then give the eligibility, benefits, documents and how to apply
+          for the schemes that matter to it.
+        - Use only facts in the records. If they do not answer the question, say so and point to the scheme's
+          helpline or website.
+        - When the farmer's eligibility is given, lead with the schemes they qualify for.
+        - Keep it short and plain enough for a farmer to act on.
+    """,
+    body="""
+        Question: "{query}"
+
+        Farmer's eligibility: {eligibility}
+
+        Scheme records:
+        {records}
+    """,
+    task_class="summarize",
+    slot_budgets={"query": 256, "eligibility": 256, "records": 2048},
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "market_query_analysis",
+    prefix="""
+        Analyze the market query you are given.
+
+        Determine:
+        1. What type of products/commodities are they asking about (crops, fruits, vegetables, artifacts, etc.)
+        2. What specific items they want prices for
+        3. Any location preferences (All India or specific states)
+        4. Time period (current, weekly, monthly trends)
+
+        Respond with a JSON object containing:
+        {
+            "product_categories": ["list of categories"],
+            "specific_items": ["list of specific products"],
+            "locations": ["list of locations"],
+            "time_period": "current/weekly/monthly"
+        }
+    """,
+    body='Market query: "{query}"',
+    task_class="extract",
+    slot_budgets={"query": 256},
+))
+
+PROMPTS.register(PromptTemplate(
+    "market_report",
+    prefix="""
+        You are an expert agricultural market analyst. Provide comprehensive market price information for the products described.
+
+        For each product, provide:
+        1. Current market price per kg/quintal
+        2. Price range (min-max)
+        3. Major markets where it's traded
+        4. Price trends (increasing/decreasing/stable)
+        5. Factors affecting prices
+        6. Best time to sell
+        7. Alternative markets
+
+        Include data for:
+        - Major crops (rice, wheat, maize, cotton, sugarcane, etc.)
+        - Fruits (mango, banana, apple, grapes, orange, etc.)
+        - Vegetables (potato, tomato, onion, cabbage, cauliflower, etc.)
+        - Small farmer artifacts (handicrafts, traditional items, local products)
+        - Other agricultural commodities
+
+        Structure the response as detailed market intelligence that farmers can use for decision making.
+    """,
+    body="""
+        Categories: {categories}
+        Specific Items: {items}
+        Locations: {locations}
+        Time Period: {time_period}
+    """,
+    task_class="long_report",
+    default_slot_budget=128,
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "market_narration",
+    prefix="""
+        You explain mandi price figures to a farmer. The figures come from daily market reports and are in
+        rupees per quintal.
+
+        - Answer the farmer's question first, then mention the trend and the best markets to sell in.
+        - If a forecast is given, say whether to sell now or hold and until when, and that it is an estimate.
+        - Use only the numbers you are given; do not add prices, markets or forecasts of your own.
+        - Convert to rupees per kg where it helps (1 quintal = 100 kg).
+        - Keep it short and plain.
+    """,
+    body="""
+        Question: "{query}"
+
+        Price data:
+        {prices}
+    """,
+    task_class="summarize",
+    slot_budgets={"query": 256, "prices": 2048},
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "market_fallback",
+    prefix="""
+        Provide market price information for the query you are given.
+
+        Include prices for major agricultural products across India, focusing on:
+        - Crops and cereals
+        - Fruits and vegetables
+        - Small farmer artifacts and local products
+
+        Note: This is estimated data as real-time market access is not available.
+    """,
+    body='Query: "{query}"',
+    task_class="long_report",
+    slot_budgets={"query": 256},
+    personalized=True,
+))
+
+ARTISAN_CRAFTS = """
+        Focus on traditional Indian crafts like:
+        - Handloom textiles (sari, dupatta, traditional wear)
+        - Pottery and ceramics
+        - Metal work (brass, copper, silver jewelry)
+        - Wood carving and furniture
+        - Leather work and footwear
+        - Handicrafts (terracotta, bamboo, jute products)
+        - Traditional paintings (Madhubani, Warli, Pattachitra)
+        - Jewelry and ornament making
+        - Basket weaving and coir products
+        - Stone carving and sculpture
+"""
+
+PROMPTS.register(PromptTemplate(
+    "artisan_marketing",
+    prefix="""
+        You are an expert marketing consultant specializing in traditional Indian crafts and artisan products.
+        Analyze the artisan query/request you are given.
+
+        Provide comprehensive assistance for marketing their craft including:
+
+        1. **Craft Analysis**: Identify the type of craft/artisan product
+        2. **Story Development**: Create compelling narratives about the artisan's heritage, techniques, and cultural significance
+        3. **Market Positioning**: Suggest pricing strategies, target audiences, and unique selling propositions
+        4. **Digital Marketing**: Provide social media content ideas, product descriptions, and online presence strategies
+        5. **Sales Channels**: Recommend platforms, marketplaces, and distribution strategies
+        6. **Branding**: Suggest brand names, logos, packaging ideas, and visual identity
+        7. **Customer Engagement**: Ideas for storytelling, customer interactions, and community building
+    """ + ARTISAN_CRAFTS + """
+        Structure your response as actionable marketing intelligence that artisans can implement immediately.
+    """,
+    body='Artisan query: "{query}"',
+    task_class="long_report",
+    slot_budgets={"query": 256},
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "artisan_product",
+    prefix="""
+        You are an expert copywriter for traditional Indian crafts. Based on the artisan's query and craft analysis, create:
+
+        1. **Product Title**: Catchy, SEO-friendly titles for their products
+        2. **Product Description**: Engaging descriptions highlighting craftsmanship, heritage, and unique features
+        3. **Social Media Posts**: Ready-to-use captions for Instagram, Facebook, and other platforms
+        4. **Storytelling Content**: Narrative content about the artisan's journey and craft tradition
+        5. **Pricing Strategy**: Suggested price ranges and positioning
+        6. **Target Audience**: Specific customer segments and marketing channels
+
+        Make it culturally authentic and commercially viable.
+    """,
+    body="""
+        Artisan query: "{query}"
+
+        Craft analysis:
+        {craft_analysis}
+    """,
+    task_class="long_report",
+    slot_budgets={"query": 256, "craft_analysis": 1500},
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "artisan_advanced",
+    prefix="""
+        Provide advanced marketing strategy for Indian artisans.
+
+        Include:
+        1. **Market Research**: Current trends in traditional crafts, competitor analysis
+        2. **Digital Transformation**: E-commerce integration, online marketplace strategies
+        3. **Global Reach**: Export opportunities, international market insights
+        4. **Sustainability**: Eco-friendly marketing, fair trade positioning
+        5. **Technology Integration**: AR/VR product visualization, virtual showrooms
+        6. **Partnership Opportunities**: Collaborations with designers, brands, NGOs
+        7. **Funding and Grants**: Government schemes for artisans, crowdfunding strategies
+
+        Provide data-driven insights and actionable recommendations.
+    """,
+    body='Original Query: "{query}"',
+    task_class="long_report",
+    slot_budgets={"query": 256},
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "disease_diagnosis",
+    prefix="""
+        You analyze crop disease detection results produced by image labelling.
+
+        Please provide:
+        1. **Disease Diagnosis**: What specific disease/condition is likely present?
+        2. **Symptom Analysis**: Detailed explanation of visible symptoms
+        3. **Causal Factors**: What might be causing this condition?
+        4. **Impact Assessment**: How this affects crop health and yield
+        5. **Immediate Actions**: What to do right now
+        6. **Treatment Options**: Specific treatments with dosages/timing
+        7. **Prevention Strategies**: Long-term prevention measures
+
+        Format as a comprehensive agricultural diagnostic report.
+    """,
+    body="""
+        Analyze this crop disease detection result for {crop}:
+
+        DETECTED FEATURES:
+        - Primary Object: {primary_object}
+        - Confidence: {confidence}
+        - Disease Indicators: {indicator_count} found
+        - Affected Areas: {affected_areas}
+        - Severity Score: {severity_score}/10
+
+        DISEASE INDICATORS FOUND:
+        {indicators}
+    """,
+    task_class="long_report",
+    default_slot_budget=128,
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "disease_report",
+    prefix="""
+        Based on crop disease analysis results, provide a comprehensive report for farmers.
+
+        Please provide:
+        1. **Disease Identification**: Detailed description of the identified disease/symptoms
+        2. **Severity Assessment**: Rate the severity (Low/Medium/High) and explain why
+        3. **Spread Analysis**: How the disease might spread and current containment status
+        4. **Treatment Plan**: Step-by-step treatment recommendations with specific products/dosages
+        5. **Prevention Measures**: Long-term prevention strategies
+        6. **Expected Recovery**: Timeline and success factors
+        7. **Monitoring Plan**: How to monitor progress and when to seek expert help
+
+        Format the response as a structured medical report for farmers.
+    """,
+    body="""
+        Crop: {crop}
+
+        Analysis Results:
+        - Disease Detected: {has_disease}
+        - Primary Finding: {disease_type}
+        - Confidence Level: {confidence}
+        - Affected Areas: {affected_areas}
+    """,
+    task_class="long_report",
+    default_slot_budget=128,
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "advanced_disease",
+    prefix="""
+        Provide comprehensive advanced disease analysis from visual and hyperspectral results.
+
+        Please provide:
+        1. **Advanced Disease Diagnosis**: Specific pathogen identification based on visual and hyperspectral data
+        2. **Physiological Impact**: How the disease affects plant physiology (photosynthesis, water uptake, nutrient absorption)
+        3. **Stress Analysis**: Interpretation of hyperspectral stress indicators
+        4. **Precision Treatment**: Specific fungicides/herbicides with exact dosages and application methods
+        5. **Recovery Timeline**: Expected recovery time and monitoring milestones
+        6. **Preventive Protocols**: Advanced prevention strategies including resistant varieties
+        7. **Economic Impact**: Potential yield loss and cost-benefit analysis of treatments
+        8. **Expert Consultation**: When and why to consult agricultural pathologists
+
+        Format as a professional agricultural pathology report with actionable recommendations.
+    """,
+    body="""
+        Crop: {crop}
+
+        DISEASE ANALYSIS RESULTS:
+        - Disease Type: {disease_type}
+        - Severity Score: {severity_score}/10
+        - Confidence: {confidence}
+        - Affected Areas: {affected_areas}
+
+        HYPERSPECTRAL DATA:
+        - Chlorophyll Content: {chlorophyll_content}
+        - Water Stress Level: {water_stress}
+        - Nutrient Deficiency: {nutrient_deficiency}
+        - Disease Stress Index: {disease_stress_index}
+    """,
+    task_class="long_report",
+    default_slot_budget=128,
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "hyperspectral_report",
+    prefix="""
+        Provide comprehensive hyperspectral disease analysis from visual results, hyperspectral measurements and spectral indices.
+
+        Please provide:
+        1. **Spectral Disease Signature**: Analysis of how the disease affects light absorption/reflection patterns
+        2. **Physiological Stress Assessment**: Impact on photosynthesis, water relations, and nutrient uptake
+        3. **Early Detection Markers**: Spectral indicators that appear before visible symptoms
+        4. **Disease Progression Mapping**: How spectral signatures change as disease advances
+        5. **Precision Treatment Zones**: Identify specific areas needing different treatment intensities
+        6. **Recovery Monitoring**: Spectral indicators of treatment effectiveness and plant recovery
+        7. **Preventive Spectral Monitoring**: Baseline measurements for early warning systems
+        8. **Economic Optimization**: Cost-benefit analysis based on spectral treatment zoning
+
+        Include spectral data interpretation, treatment precision recommendations, and long-term monitoring protocols.
+        Format as a professional hyperspectral agricultural analysis report.
+    """,
+    body="""
+        Crop: {crop}
+
+        VISUAL ANALYSIS RESULTS:
+        - Disease Detected: {has_disease}
+        - Disease Type: {disease_type}
+        - Severity Score: {severity_score}/10
+        - Affected Areas: {affected_areas}
+
+        HYPERSPECTRAL MEASUREMENTS ({data_source}):
+        - Chlorophyll Content: {chlorophyll_content}
+        - Water Stress Level: {water_stress}
+        - Nutrient Deficiency: {nutrient_deficiency}
+        - Disease Stress Index: {disease_stress_index}
+        - Photosynthetic Efficiency: {photosynthetic_efficiency}
+        - Leaf Temperature: {leaf_temperature}
+        - Stomatal Conductance: {stomatal_conductance}
+
+        SPECTRAL INDICES:
+        - NDVI (Normalized Difference Vegetation Index): {ndvi}
+        - PRI (Photochemical Reflectance Index): {pri}
+        - ARI (Anthocyanin Reflectance Index): {ari}
+        - CRI (Carotenoid Reflectance Index): {cri}
+    """,
+    task_class="long_report",
+    default_slot_budget=128,
+    personalized=True,
+))
+
+PROMPTS.register(PromptTemplate(
+    "spoken_summary",
+    prefix=f"""
+        You write the short summary a voice assistant reads aloud to a farmer.
+        Summarize the report you are given in at most two plain sentences and under {SPOKEN_SUMMARY_MAX_WORDS} words.
+        Lead with the single most useful fact or action. Do not use markdown, lists or headings.
+    """,
+    body="""
+        Context: {context}
+
+        Report:
+        {report}
+    """,
+    task_class="summarize",
+    slot_budgets={"context": 64, "report": 1500},
+    profile="spoken_summary",
+))
+
+PROMPTS.register(PromptTemplate(
+    "json_repair",
+    prefix="""
+        You fix malformed JSON. Return only the corrected JSON value matching the schema you are given.
+        Keep every value from the original that fits the schema. Do not add commentary or markdown.
+    """,
+    body="""
+        Schema: {schema}
+        Problem: {error}
+
+        Original:
+        {original}
+    """,
+    task_class="extract",
+    slot_budgets={"schema": 1024, "error": 64, "original": 3000},
+))
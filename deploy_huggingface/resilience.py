@@ -0,0 +1,224 @@
+"""Deadlines, circuit breakers and bounded retries for upstream calls.
+
+Each request carries an absolute deadline in a context variable. Upstream calls
+are given only the time that remains, fail fast while their circuit breaker is
+open, and retry transient errors with jittered backoff only if the remaining
+budget still leaves room for another attempt.
+"""
+import asyncio
+import contextvars
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from google.api_core import exceptions as api_exceptions
+
+from admission import OverloadedError
+
+current_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("current_deadline", default=None)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+MAX_RETRIES = 2
+BACKOFF_BASE_SECONDS = 0.2
+BACKOFF_MAX_SECONDS = 2.0
+# Don't start an attempt with less time than this left on the deadline.
+MIN_ATTEMPT_SECONDS = 0.5
+
+TRANSIENT_ERRORS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.TooManyRequests,
+    api_exceptions.InternalServerError,
+    api_exceptions.GatewayTimeout,
+    api_exceptions.DeadlineExceeded,
+)
+
+
+def is_upstream_failure(error: Exception) -> bool:
+    """Errors that say the upstream is unhealthy, as opposed to rejecting this request."""
+    return isinstance(error, TRANSIENT_ERRORS) or isinstance(error, api_exceptions.ServerError)
+
+
+class DeadlineExceededError(OverloadedError):
+    def __init__(self, message: str = "Request deadline exceeded"):
+        super().__init__(message, retry_after=1.0, status_code=504)
+
+
+class CircuitOpenError(OverloadedError):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is unavailable (circuit open)", retry_after=retry_after, status_code=503)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None when there is no deadline."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+async def run_with_deadline(seconds: float, work: Callable[[], Awaitable[Any]]) -> Any:
+    """Run `work` with a deadline `seconds` from now, keeping any earlier deadline already set."""
+    deadline = time.monotonic() + seconds
+    outer = current_deadline.get()
+    token = current_deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        return await work()
+    finally:
+        current_deadline.reset(token)
+
+
+async def within_deadline(awaitable: Awaitable[Any]) -> Any:
+    """Await `awaitable`, giving up when the current deadline passes."""
+    budget = remaining()
+    if budget is None:
+        return await awaitable
+    if budget <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceededError()
+    try:
+        return await asyncio.wait_for(awaitable, timeout=budget)
+    except asyncio.TimeoutError:
+        raise DeadlineExceededError()
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through once the cool-down passes."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.times_opened = 0
+
+    @property
+    def available(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            return time.monotonic() - self.opened_at >= self.recovery_seconds
+        return not self.probe_in_flight
+
+    def before_call(self):
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.recovery_seconds:
+            self.state = HALF_OPEN
+        if self.state == OPEN or (self.state == HALF_OPEN and self.probe_in_flight):
+            self.rejected += 1
+            retry_after = max(0.0, self.recovery_seconds - (time.monotonic() - self.opened_at))
+            raise CircuitOpenError(self.name, retry_after=retry_after or 1.0)
+        if self.state == HALF_OPEN:
+            self.probe_in_flight = True
+
+    def on_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def on_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    def on_abandoned(self):
+        """The caller went away before the upstream answered; no verdict on its health."""
+        self.probe_in_flight = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
+
+
+class UpstreamGuard:
+    """Circuit breakers keyed by upstream name, plus the retry loop that uses them."""
+
+    def __init__(self, failure_threshold: int = 5, recovery_seconds: float = 30.0,
+                 max_retries: int = MAX_RETRIES):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.max_retries = max_retries
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retries = 0
+        self.deadline_exceeded = 0
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        if name not in self.breakers:
+            self.breakers[name] = CircuitBreaker(name, self.failure_threshold, self.recovery_seconds)
+        return self.breakers[name]
+
+    def available(self, name: str) -> bool:
+        return self.breaker(name).available
+
+    async def call(self, name: str, call: Callable[[Optional[float]], Awaitable[Any]]) -> Any:
+        """Run `call(timeout)` against upstream `name` within the current deadline.
+
+        `timeout` is the time left for that attempt (None without a deadline) so it
+        can be passed on to the client library as well.
+        """
+        breaker = self.breaker(name)
+        attempt = 0
+        while True:
+            budget = remaining()
+            if budget is not None and budget <= 0:
+                self.deadline_exceeded += 1
+                raise DeadlineExceededError(f"Deadline exceeded before calling {name}")
+            breaker.before_call()
+
+            try:
+                if budget is None:
+                    result = await call(None)
+                else:
+                    result = await asyncio.wait_for(call(budget), timeout=budget)
+            except OverloadedError:
+                # Shed locally before reaching the upstream; says nothing about its health.
+                breaker.on_abandoned()
+                raise
+            except asyncio.CancelledError:
+                breaker.on_abandoned()
+                raise
+            except Exception as e:
+                if is_upstream_failure(e):
+                    breaker.on_failure()
+                else:
+                    # The upstream answered; the request itself was bad.
+                    breaker.on_success()
+                backoff = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                left = remaining()
+                if (attempt >= self.max_retries or not isinstance(e, TRANSIENT_ERRORS)
+                        or not breaker.available
+                        or (left is not None and left - backoff < MIN_ATTEMPT_SECONDS)):
+                    if isinstance(e, asyncio.TimeoutError):
+                        self.deadline_exceeded += 1
+                        raise DeadlineExceededError(f"Deadline exceeded calling {name}") from e
+                    raise
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(backoff)
+                continue
+
+            breaker.on_success()
+            return result
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "breakers": {name: breaker.to_dict() for name, breaker in self.breakers.items()},
+            "retries": self.retries,
+            "deadline_exceeded": self.deadline_exceeded,
+        }
@@ -0,0 +1,356 @@
+"""Durable reminder scheduler for follow-up and monitoring actions.
+
+Reminders are persisted in SQLite and mirrored in an in-memory min-heap keyed by
+due time, so inserts and pops are O(log n) and a restart only needs one indexed
+scan of pending rows to rebuild the heap. Due reminders are dispatched in batches
+to a pluggable notifier. Reminders whose session is gone (e.g. after a restart)
+are kept as undelivered and handed to the user's next session.
+"""
+import abc
+import asyncio
+import heapq
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+DEFAULT_BATCH_SIZE = 500
+MAX_IDLE_SECONDS = 60.0
+RETRY_BASE_SECONDS = 30.0
+MAX_ATTEMPTS = 5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS reminders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    dedupe_key TEXT UNIQUE,
+    user_id TEXT,
+    session_id TEXT,
+    kind TEXT NOT NULL,
+    message TEXT NOT NULL,
+    payload TEXT NOT NULL DEFAULT '{}',
+    due_at REAL NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    fired_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_reminders_status_due ON reminders (status, due_at);
+CREATE INDEX IF NOT EXISTS idx_reminders_user_status ON reminders (user_id, status, due_at);
+"""
+
+
+class Notifier(abc.ABC):
+    """Receives batches of due reminders. Raise to have the batch retried later."""
+
+    @abc.abstractmethod
+    async def notify(self, reminders: List[Dict[str, Any]]) -> List[int]:
+        """Deliver `reminders`; returns the ids of those with nowhere to go, which are kept as undelivered."""
+
+
+class LoggingNotifier(Notifier):
+    async def notify(self, reminders: List[Dict[str, Any]]) -> List[int]:
+        for reminder in reminders:
+            logging.info(f"Reminder due for user {reminder['user_id']}: {reminder['message']}")
+        return []
+
+
+class SessionNotifier(Notifier):
+    """Delivers reminders as agent actions on the owning session's notification list."""
+
+    def __init__(self, sessions: Dict[str, dict]):
+        self.sessions = sessions
+
+    async def notify(self, reminders: List[Dict[str, Any]]) -> List[int]:
+        undelivered = []
+        for reminder in reminders:
+            session = self.sessions.get(reminder["session_id"])
+            if session is None:
+                undelivered.append(reminder["id"])
+                continue
+            session.setdefault("notifications", []).append({
+                "action": "reminder",
+                "reminder_id": reminder["id"],
+                "kind": reminder["kind"],
+                "message": reminder["message"],
+                "payload": reminder["payload"],
+                "due_at": datetime.utcfromtimestamp(reminder["due_at"]).isoformat(),
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        return undelivered
+
+
+def _parse_timestamp(value: str) -> float:
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is not None:
+        return parsed.timestamp()
+    # Handlers emit naive UTC timestamps (datetime.utcnow()).
+    return (parsed - datetime(1970, 1, 1)).total_seconds()
+
+
+class ReminderScheduler:
+    def __init__(self, db_path: str, notifier: Notifier, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.notifier = notifier
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+        self.heap: List[tuple] = []
+        self.pending: Dict[int, float] = {}
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        self.stats = {
+            "dispatched_total": 0,
+            "undelivered_total": 0,
+            "failed_batches_total": 0,
+            "last_batch_size": 0,
+            "last_batch_lag_seconds": 0.0,
+            "max_lag_seconds": 0.0,
+        }
+        self._load_pending()
+
+    def _load_pending(self):
+        rows = self.conn.execute("SELECT id, due_at FROM reminders WHERE status = 'pending'").fetchall()
+        self.pending = {reminder_id: due_at for reminder_id, due_at in rows}
+        self.heap = [(due_at, reminder_id) for reminder_id, due_at in rows]
+        heapq.heapify(self.heap)
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.conn.close()
+
+    def schedule(self, kind: str, message: str, due_at: float, user_id: str = None, session_id: str = None,
+                 payload: Dict[str, Any] = None, dedupe_key: str = None) -> Optional[int]:
+        """Persist a reminder and push it onto the heap. Returns None for duplicate dedupe keys."""
+        return self.schedule_many([{
+            "kind": kind, "message": message, "due_at": due_at, "user_id": user_id,
+            "session_id": session_id, "payload": payload or {}, "dedupe_key": dedupe_key,
+        }])[0]
+
+    def schedule_many(self, reminders: List[Dict[str, Any]]) -> List[Optional[int]]:
+        now = time.time()
+        ids = []
+        with self.lock, self.conn:
+            for reminder in reminders:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO reminders "
+                    "(dedupe_key, user_id, session_id, kind, message, payload, due_at, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (reminder.get("dedupe_key"), reminder.get("user_id"), reminder.get("session_id"),
+                     reminder["kind"], reminder["message"], json.dumps(reminder.get("payload", {})),
+                     reminder["due_at"], now)
+                )
+                if cursor.rowcount == 0:
+                    ids.append(None)
+                    continue
+                reminder_id = cursor.lastrowid
+                self.pending[reminder_id] = reminder["due_at"]
+                heapq.heappush(self.heap, (reminder["due_at"], reminder_id))
+                ids.append(reminder_id)
+
+        if self.wakeup is not None and self.heap and self.heap[0][0] <= now + MAX_IDLE_SECONDS:
+            self.wakeup.set()
+        return ids
+
+    def cancel(self, reminder_id: int) -> bool:
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "UPDATE reminders SET status = 'cancelled' WHERE id = ? AND status = 'pending'", (reminder_id,)
+            )
+            # The heap entry is dropped lazily when it reaches the top.
+            self.pending.pop(reminder_id, None)
+        return cursor.rowcount > 0
+
+    def redeliver(self, user_id: str, session_id: str) -> int:
+        """Point the user's undelivered reminders at their new session and make them due now."""
+        if not user_id:
+            return 0
+        now = time.time()
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "UPDATE reminders SET status = 'pending', session_id = ?, due_at = ? "
+                "WHERE user_id = ? AND status = 'undelivered' RETURNING id", (session_id, now, user_id)
+            ).fetchall()
+            for (reminder_id,) in rows:
+                self.pending[reminder_id] = now
+                heapq.heappush(self.heap, (now, reminder_id))
+        if rows and self.wakeup is not None:
+            self.wakeup.set()
+        return len(rows)
+
+    def schedule_from_result(self, session: Dict[str, Any], result: Dict[str, Any]) -> List[int]:
+        """Turn `schedule_followup` and `spectral_monitoring_schedule` actions into reminders."""
+        session_id = session.get("session_id")
+        user_id = session.get("user_id")
+        reminders = []
+        actions = []
+
+        for action in result.get("actions", []):
+            if action.get("action") == "schedule_followup" and action.get("followup_date"):
+                due_at = _parse_timestamp(action["followup_date"])
+                reminders.append({
+                    "kind": "followup",
+                    "message": action.get("reminder") or action.get("message", "Follow-up analysis due"),
+                    "due_at": due_at,
+                    "payload": {"task_type": result.get("task_type")},
+                    "dedupe_key": f"{session_id}:followup:{int(due_at)}",
+                })
+                actions.append(action)
+            elif action.get("action") == "spectral_monitoring_schedule":
+                start = datetime.fromisoformat(action["timestamp"]).replace(hour=9, minute=0, second=0, microsecond=0)
+                for step in action.get("schedule", []):
+                    due = start + timedelta(days=step["day"])
+                    due_at = (due - datetime(1970, 1, 1)).total_seconds()
+                    reminders.append({
+                        "kind": "spectral_monitoring",
+                        "message": f"Spectral monitoring due: {step['type']}",
+                        "due_at": due_at,
+                        "payload": {"task_type": result.get("task_type"), "day": step["day"]},
+                        "dedupe_key": f"{session_id}:spectral_monitoring:{due.date().isoformat()}",
+                    })
+                actions.append(action)
+
+        for reminder in reminders:
+            reminder["user_id"] = user_id
+            reminder["session_id"] = session_id
+        ids = [reminder_id for reminder_id in self.schedule_many(reminders) if reminder_id is not None]
+        for action in actions:
+            action["scheduled"] = True
+        return ids
+
+    def list_pending(self, user_id: str, limit: int = 100) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, user_id, session_id, kind, message, payload, due_at FROM reminders "
+                "WHERE user_id = ? AND status = 'pending' ORDER BY due_at LIMIT ?", (user_id, limit)
+            ).fetchall()
+        return [self._row_to_dict(row) for row in rows]
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.time()
+        with self.lock:
+            backlog = len(self.pending)
+            next_due = self._peek_due()
+        return {
+            "backlog": backlog,
+            "heap_size": len(self.heap),
+            "next_due_at": datetime.utcfromtimestamp(next_due).isoformat() if next_due else None,
+            "current_lag_seconds": round(max(0.0, now - next_due), 3) if next_due else 0.0,
+            **self.stats,
+        }
+
+    def _peek_due(self) -> Optional[float]:
+        # Discard cancelled, fired or rescheduled entries sitting at the top of the heap.
+        while self.heap and self.pending.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def _pop_due_batch(self, now: float) -> List[int]:
+        with self.lock:
+            batch = []
+            while len(batch) < self.batch_size:
+                due_at = self._peek_due()
+                if due_at is None or due_at > now:
+                    break
+                _, reminder_id = heapq.heappop(self.heap)
+                batch.append(reminder_id)
+            return batch
+
+    @staticmethod
+    def _row_to_dict(row) -> Dict[str, Any]:
+        reminder_id, user_id, session_id, kind, message, payload, due_at = row
+        return {
+            "id": reminder_id, "user_id": user_id, "session_id": session_id, "kind": kind,
+            "message": message, "payload": json.loads(payload), "due_at": due_at,
+        }
+
+    async def _run(self):
+        while True:
+            now = time.time()
+            batch_ids = self._pop_due_batch(now)
+            if batch_ids:
+                await self._dispatch(batch_ids, now)
+                continue
+
+            with self.lock:
+                next_due = self._peek_due()
+            timeout = MAX_IDLE_SECONDS if next_due is None else min(MAX_IDLE_SECONDS, max(0.0, next_due - now))
+            self.wakeup.clear()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _dispatch(self, batch_ids: List[int], now: float):
+        placeholders = ",".join("?" * len(batch_ids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT id, user_id, session_id, kind, message, payload, due_at FROM reminders "
+                f"WHERE id IN ({placeholders}) AND status = 'pending'", batch_ids
+            ).fetchall()
+        reminders = [self._row_to_dict(row) for row in rows]
+        if not reminders:
+            return
+
+        try:
+            undelivered = set(await self.notifier.notify(reminders) or ())
+        except Exception as e:
+            logging.error(f"Reminder notifier failed for {len(reminders)} reminders: {e}")
+            self.stats["failed_batches_total"] += 1
+            self._reschedule_failed(reminders, now)
+            return
+
+        fired_at = time.time()
+        fired = [reminder["id"] for reminder in reminders if reminder["id"] not in undelivered]
+        with self.lock, self.conn:
+            # A reminder cancelled while the batch was out stays cancelled.
+            if fired:
+                self.conn.execute(
+                    f"UPDATE reminders SET status = 'fired', fired_at = ?, attempts = attempts + 1 "
+                    f"WHERE id IN ({','.join('?' * len(fired))}) AND status = 'pending'", [fired_at] + fired
+                )
+            if undelivered:
+                self.conn.execute(
+                    f"UPDATE reminders SET status = 'undelivered', attempts = attempts + 1 "
+                    f"WHERE id IN ({','.join('?' * len(undelivered))}) AND status = 'pending'", list(undelivered)
+                )
+            for reminder in reminders:
+                self.pending.pop(reminder["id"], None)
+        self.stats["undelivered_total"] += len(undelivered)
+        if not fired:
+            return
+
+        reminders = [reminder for reminder in reminders if reminder["id"] not in undelivered]
+        lag = fired_at - min(reminder["due_at"] for reminder in reminders)
+        self.stats["dispatched_total"] += len(reminders)
+        self.stats["last_batch_size"] = len(reminders)
+        self.stats["last_batch_lag_seconds"] = round(lag, 3)
+        self.stats["max_lag_seconds"] = round(max(self.stats["max_lag_seconds"], lag), 3)
+
+    def _reschedule_failed(self, reminders: List[Dict[str, Any]], now: float):
+        with self.lock, self.conn:
+            for reminder in reminders:
+                attempts = self.conn.execute(
+                    "UPDATE reminders SET attempts = attempts + 1 WHERE id = ? RETURNING attempts", (reminder["id"],)
+                ).fetchone()[0]
+                if attempts >= MAX_ATTEMPTS:
+                    self.conn.execute("UPDATE reminders SET status = 'failed' WHERE id = ?", (reminder["id"],))
+                    self.pending.pop(reminder["id"], None)
+                    continue
+                retry_at = now + RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+                self.conn.execute("UPDATE reminders SET due_at = ? WHERE id = ?", (retry_at, reminder["id"]))
+                self.pending[reminder["id"]] = retry_at
+                heapq.heappush(self.heap, (retry_at, reminder["id"]))
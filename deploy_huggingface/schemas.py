@@ -0,0 +1,106 @@
+"""Pydantic models for structured LLM outputs.
+
+Models are lenient where LLMs are sloppy (numbers for strings, a bare string for
+a list, unknown extra keys) so small deviations validate instead of failing.
+"""
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+
+
+def _as_list(value: Any) -> Any:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(",") if part.strip()]
+    return value
+
+
+def _as_text(value: Any) -> Any:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+class MarketQuery(BaseModel):
+    product_categories: List[str] = Field(default_factory=list, description="Categories such as crops, fruits, vegetables, artifacts")
+    specific_items: List[str] = Field(default_factory=list, description="Specific products the user wants prices for")
+    locations: List[str] = Field(default_factory=list, description="Locations, or All India")
+    time_period: str = Field("current", description="current, weekly or monthly")
+
+    _lists = field_validator("product_categories", "specific_items", "locations", mode="before")(_as_list)
+
+    @field_validator("time_period", mode="before")
+    @classmethod
+    def _time_period(cls, value: Any) -> Any:
+        return value or "current"
+
+
+class BookingDetails(BaseModel):
+    crop_type: Optional[str] = Field(None, description="Crop to store, e.g. tomatoes")
+    quantity: Optional[str] = Field(None, description="Quantity with unit, e.g. 50kg")
+    duration: Optional[str] = Field(None, description="Storage duration, e.g. 2 weeks")
+    storage_date: Optional[str] = Field(None, description="Date storage starts, YYYY-MM-DD")
+
+    _text = field_validator("crop_type", "quantity", "duration", "storage_date", mode="before")(_as_text)
+
+
+# Step actions the client workflow engine executes (src/services/dynamicWorkflowEngine.ts).
+WORKFLOW_ACTIONS = frozenset({
+    "navigate", "click", "fill", "fill-field", "prompt-user", "speak", "ask_user", "upload_file", "take_photo",
+    "check_status", "if", "loop", "dispatch",
+})
+
+
+def _complete_steps(value: Any) -> Any:
+    # A response cut off mid-step leaves a trailing step without an action, or with a
+    # truncated one that JSON repair closed off ({"action": "spe"}).
+    if isinstance(value, list):
+        return [step for step in value if not isinstance(step, dict) or step.get("action") in WORKFLOW_ACTIONS]
+    return value
+
+
+class WorkflowStep(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    action: str = Field(description="navigate, click, fill, fill-field, speak, ask_user, upload_file, take_photo, check_status, if, loop or dispatch")
+    target: Optional[str] = Field(None, description="Route for navigate, selector for click")
+    field: Optional[str] = None
+    value: Optional[Any] = None
+    message: Optional[str] = None
+    speak: Optional[str] = None
+    condition: Optional[str] = None
+    steps: Optional[List["WorkflowStep"]] = None
+    count: Optional[int] = None
+    prompt: Optional[str] = None
+    response_key: Optional[str] = None
+    expected_response: Optional[Dict[str, str]] = None
+    file_path: Optional[str] = None
+    camera_selector: Optional[str] = None
+    event: Optional[str] = None
+
+    _steps = field_validator("steps", mode="before")(_complete_steps)
+
+    @field_validator("action")
+    @classmethod
+    def _known_action(cls, value: str) -> str:
+        if value not in WORKFLOW_ACTIONS:
+            raise ValueError(f"Unknown workflow action: {value!r}")
+        return value
+
+
+class Workflow(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    workflow: List[WorkflowStep] = Field(default_factory=list)
+
+    @model_validator(mode="before")
+    @classmethod
+    def _accept_bare_steps(cls, value: Any) -> Any:
+        if isinstance(value, list):
+            return {"workflow": value}
+        if isinstance(value, dict) and "workflow" not in value and isinstance(value.get("steps"), list):
+            return {**value, "workflow": value["steps"]}
+        return value
+
+    _drop_incomplete_steps = field_validator("workflow", mode="before")(_complete_steps)
@@ -0,0 +1,256 @@
+"""On-box knowledge base of government schemes for farmers.
+
+Scheme records (eligibility, benefits, documents, application steps, contacts)
+are indexed with BM25 over an inverted index, with per-field boosts so names and
+aliases outrank passing mentions. An embedding index can be attached and is
+fused with BM25 by reciprocal rank. Questions about one aspect of a clearly
+identified scheme are answered straight from its record; everything else gets
+the top-k records as grounding for the LLM.
+"""
+import json
+import math
+import re
+import time
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Word characters plus the Indic blocks, whose vowel signs `\w` alone would split words on.
+TOKEN_PATTERN = re.compile(r"[\wऀ-෿]+")
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "is", "are", "am", "i", "me", "my",
+    "we", "our", "it", "its", "be", "can", "do", "does", "what", "which", "how", "about", "tell",
+    "please", "with", "under", "there", "any", "get", "give", "know", "want", "need", "this", "that",
+    "scheme", "yojana", "योजना", "का", "की", "के", "में", "है", "क्या", "और",
+}
+
+FIELD_BOOSTS = {
+    "name": 3.0,
+    "aliases": 3.0,
+    "category": 2.0,
+    "description": 1.0,
+    "eligibility": 1.0,
+    "benefits": 1.0,
+    "geography": 1.0,
+    "documents": 0.5,
+    "application_process": 0.5,
+}
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+# A direct answer needs a named scheme, or a top hit this strong and this far ahead of the next.
+DIRECT_ANSWER_MIN_SCORE = 4.0
+DIRECT_ANSWER_MARGIN = 2.0
+
+ASPECT_KEYWORDS = {
+    "eligibility": ("eligib", "who can", "qualify", "criteria", "पात्र", "कौन"),
+    "documents": ("document", "papers", "paperwork", "proof", "दस्तावेज", "कागज"),
+    "benefits": ("benefit", "how much", "amount", "subsidy", "money", "instalment", "installment",
+                 "लाभ", "कितना", "पैसा", "राशि"),
+    "application_process": ("apply", "application", "register", "enrol", "enroll", "sign up",
+                            "आवेदन", "पंजीकरण"),
+    "contacts": ("contact", "helpline", "phone", "call", "website", "toll free", "संपर्क", "हेल्पलाइन"),
+}
+ASPECT_LABELS = {
+    "eligibility": "Who is eligible",
+    "documents": "Documents needed",
+    "benefits": "Benefits",
+    "application_process": "How to apply",
+    "contacts": "Contact",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.casefold()):
+        if token in STOPWORDS:
+            continue
+        # Cheap plural folding so "documents" matches "document".
+        if token.isascii() and len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def _field_text(value: Any) -> str:
+    if isinstance(value, dict):
+        return " ".join(str(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(str(item) for item in value)
+    return str(value or "")
+
+
+def _compact(text: str) -> str:
+    return "".join(TOKEN_PATTERN.findall(text.casefold()))
+
+
+def _spaced(text: str) -> str:
+    return " " + " ".join(TOKEN_PATTERN.findall(text.casefold())) + " "
+
+
+def detect_aspect(query: str) -> Optional[str]:
+    lowered = query.casefold()
+    for aspect, keywords in ASPECT_KEYWORDS.items():
+        if any(keyword in lowered for keyword in keywords):
+            return aspect
+    return None
+
+
+class SchemeKnowledgeBase:
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self.by_id = {record["id"]: record for record in records}
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        self.doc_lengths = np.zeros(len(records))
+        for doc, record in enumerate(records):
+            weights: Counter = Counter()
+            for field, boost in FIELD_BOOSTS.items():
+                for token in tokenize(_field_text(record.get(field))):
+                    weights[token] += boost
+            # Aliases also match written without spaces or hyphens, e.g. "pmkisan".
+            for alias in [record["name"], *record.get("aliases", [])]:
+                weights[_compact(alias)] += FIELD_BOOSTS["aliases"]
+            for token, weight in weights.items():
+                self.postings[token].append((doc, weight))
+            self.doc_lengths[doc] = sum(weights.values())
+        self.avg_length = float(self.doc_lengths.mean()) if len(records) else 0.0
+        self.idf = {
+            token: math.log(1 + (len(records) - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
+        self.names = [
+            [(_spaced(alias), _compact(alias)) for alias in [record["name"], *record.get("aliases", [])]]
+            for record in records
+        ]
+        self.embeddings: Optional[np.ndarray] = None
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.outcomes: Counter = Counter()
+
+    @classmethod
+    def load(cls, path: str) -> "SchemeKnowledgeBase":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def attach_embeddings(self, embed: Callable[[List[str]], Sequence[Sequence[float]]]):
+        """Build the embedding index with `embed(texts) -> vectors`; queries then need a vector too."""
+        vectors = np.asarray(embed([self.document_text(record) for record in self.records]), dtype=np.float32)
+        self.embeddings = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    @staticmethod
+    def document_text(record: Dict[str, Any]) -> str:
+        return " ".join(_field_text(record.get(field)) for field in FIELD_BOOSTS)
+
+    def bm25(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self.records))
+        terms = tokenize(query) + [_compact(query)]
+        for term in set(terms):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf[term]
+            for doc, tf in postings:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths[doc] / self.avg_length)
+                scores[doc] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def mentioned(self, query: str) -> List[str]:
+        """Ids of schemes whose name or an alias appears in the query."""
+        spaced = _spaced(query)
+        words = set(spaced.split())
+        return [
+            record["id"] for record, names in zip(self.records, self.names)
+            if any(alias in spaced or compact in words for alias, compact in names)
+        ]
+
+    def search(self, query: str, k: int = 3, query_vector: Optional[Sequence[float]] = None) -> List[Dict[str, Any]]:
+        """Top-k records as {"scheme", "score"}; with a query vector, BM25 and cosine ranks are fused."""
+        started = time.perf_counter()
+        scores = self.bm25(query)
+        order = [doc for doc in np.argsort(-scores, kind="stable") if scores[doc] > 0]
+        if query_vector is not None and self.embeddings is not None:
+            vector = np.asarray(query_vector, dtype=np.float32)
+            similarity = self.embeddings @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+            fused = np.zeros(len(self.records))
+            for rank, doc in enumerate(order):
+                fused[doc] += 1 / (RRF_K + rank + 1)
+            for rank, doc in enumerate(np.argsort(-similarity, kind="stable")):
+                fused[doc] += 1 / (RRF_K + rank + 1)
+            order = list(np.argsort(-fused, kind="stable"))
+        hits = [{"scheme": self.records[doc], "score": round(float(scores[doc]), 4)} for doc in order[:k]]
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return hits
+
+    def confident_match(self, query: str, hits: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """The record a query is unambiguously about, if any."""
+        if not hits:
+            return None
+        named = self.mentioned(query)
+        if len(named) == 1:
+            return self.by_id[named[0]]
+        if named:
+            return None
+        top = hits[0]["score"]
+        runner_up = hits[1]["score"] if len(hits) > 1 else 0.0
+        if top >= DIRECT_ANSWER_MIN_SCORE and top >= DIRECT_ANSWER_MARGIN * runner_up:
+            return hits[0]["scheme"]
+        return None
+
+    def answer(self, query: str, hits: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """A direct answer from one record for FAQ-style questions, else None."""
+        scheme = self.confident_match(query, hits)
+        if scheme is None:
+            return None
+        aspect = detect_aspect(query)
+        if aspect is None:
+            return {"scheme_id": scheme["id"], "aspect": "overview", "text": self.overview(scheme)}
+        value = scheme.get(aspect)
+        if not value:
+            return None
+        if isinstance(value, dict):
+            items = [f"{key}: {item}" for key, item in value.items()]
+        else:
+            items = list(value) if isinstance(value, list) else [str(value)]
+        text = f"{self.title(scheme)}. {ASPECT_LABELS[aspect]}: " + "; ".join(items) + "."
+        return {"scheme_id": scheme["id"], "aspect": aspect, "text": text}
+
+    @staticmethod
+    def title(scheme: Dict[str, Any]) -> str:
+        short = next((alias for alias in scheme.get("aliases", []) if alias.isascii()), None)
+        return f"{scheme['name']} ({short})" if short and short != scheme["name"] else scheme["name"]
+
+    def overview(self, scheme: Dict[str, Any]) -> str:
+        parts = [f"{self.title(scheme)}: {scheme['description']}"]
+        if scheme.get("benefits"):
+            parts.append(f"Benefits: {'; '.join(scheme['benefits'])}.")
+        if scheme.get("application_process"):
+            parts.append(f"How to apply: {'; '.join(scheme['application_process'])}.")
+        return " ".join(parts)
+
+    def context(self, hits: List[Dict[str, Any]]) -> str:
+        """Retrieved records as compact JSON for grounding a prompt."""
+        return "\n".join(
+            json.dumps({key: value for key, value in hit["scheme"].items() if key != "aliases"}, ensure_ascii=False)
+            for hit in hits
+        )
+
+    def catalog(self) -> str:
+        """Every record in `context` form: the static reference appended to scheme prompt prefixes."""
+        return self.context([{"scheme": record} for record in self.records])
+
+    def record(self, outcome: str):
+        """Count how a query was answered: direct, llm or no_match."""
+        self.outcomes[outcome] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "schemes": len(self.records),
+            "terms": len(self.postings),
+            "embeddings": self.embeddings is not None,
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 3) if self.searches else 0.0,
+            "answers": dict(self.outcomes),
+        }
@@ -0,0 +1,580 @@
+"""Time-series store for field IoT sensors (soil moisture, temperatures, humidity).
+
+Readings arrive in batches and are written three ways, all vectorized over the
+batch:
+
+- a fixed-size ring per sensor holding the latest raw readings, for status and
+  short ranges;
+- open 1 min / 1 h / 1 day rollup buckets per sensor (count, sum, min, max per
+  metric), updated in place;
+- closed buckets, appended to one binary file per sensor and level. They are
+  buffered in memory and written in bulk so a flush opens each file once.
+
+Nothing is rewritten. A bucket can end up split across rows (late readings,
+restarts), so queries merge rows that share a bucket start. Range queries read
+the finest level whose point count fits the request.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+METRICS = ("soil_moisture", "soil_temperature", "air_temperature", "humidity")
+METRIC_ALIASES = {
+    "moisture": "soil_moisture", "soil_moisture_percent": "soil_moisture", "vwc": "soil_moisture",
+    "temperature": "air_temperature", "temp": "air_temperature", "air_temp": "air_temperature",
+    "soil_temp": "soil_temperature", "rh": "humidity", "relative_humidity": "humidity",
+}
+METRIC_UNITS = {"soil_moisture": "%", "soil_temperature": "°C", "air_temperature": "°C", "humidity": "%"}
+
+LEVELS = (("1m", 60), ("1h", 3600), ("1d", 86400))
+RAW_POINTS = 256
+DEFAULT_MAX_POINTS = 500
+# Closed buckets buffered before they're written out.
+PERSIST_ROWS = 200_000
+# A sensor with nothing newer than this is reported offline.
+STALE_SECONDS = 15 * 60
+# Readings stamped outside [2000-01-01, now + a day] are clock or unit errors; one would
+# otherwise become the sensor's latest reading for good.
+EARLIEST_TIMESTAMP = 946_684_800.0
+MAX_FUTURE_SECONDS = 86_400
+
+ROLLUP_FIELDS = [("start", "<i8")] + [
+    (f"{metric}_{stat}", dtype) for metric in METRICS
+    for stat, dtype in (("n", "<u4"), ("sum", "<f8"), ("min", "<f4"), ("max", "<f4"))
+]
+ROLLUP_DTYPE = np.dtype(ROLLUP_FIELDS)
+BUFFERED_DTYPE = np.dtype([("series", "<u4")] + ROLLUP_FIELDS)
+
+
+def parse_timestamp(value: Any) -> float:
+    """Epoch seconds from a number (seconds or milliseconds) or an ISO string; naive times are UTC."""
+    if value is None:
+        return time.time()
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+    if isinstance(value, (int, float)):
+        return value / 1000.0 if value > 1e11 else float(value)
+    parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _metric(name: str) -> Optional[str]:
+    name = name.strip().casefold()
+    return name if name in METRICS else METRIC_ALIASES.get(name)
+
+
+def _values(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def readings_from_payload(payload: Any) -> List[Tuple[str, str, np.ndarray, np.ndarray]]:
+    """Normalize a batch into (field_id, sensor_id, timestamps, values[n x metrics]) groups.
+
+    Accepts a list of readings, {"readings": [...]}, or columnar batches such as
+    {"field_id": ..., "sensor_id": ..., "timestamps": [...], "soil_moisture": [...]}, alone or
+    as a list under "batches". Readings are dicts with field_id, sensor_id, timestamp and metric keys.
+    """
+    if isinstance(payload, dict) and "batches" in payload:
+        groups = []
+        for batch in payload["batches"]:
+            groups.extend(readings_from_payload(batch))
+        return groups
+    if isinstance(payload, dict) and "timestamps" in payload:
+        field_id = str(payload.get("field_id") or "")
+        if not field_id:
+            raise ValueError("Columnar batches need a field_id")
+        timestamps = payload["timestamps"]
+        if timestamps and isinstance(timestamps[0], (int, float)):
+            ts = np.asarray(timestamps, dtype=np.float64)
+            ts = np.where(ts > 1e11, ts / 1000.0, ts)
+        else:
+            ts = np.array([parse_timestamp(value) for value in timestamps], dtype=np.float64)
+        values = np.full((len(ts), len(METRICS)), np.nan, dtype=np.float32)
+        for key, column in payload.items():
+            metric = _metric(key) if isinstance(column, list) else None
+            if metric is not None:
+                if len(column) != len(ts):
+                    raise ValueError(f"{key} has {len(column)} values for {len(ts)} timestamps")
+                values[:, METRICS.index(metric)] = np.asarray([_values(v) for v in column], dtype=np.float32)
+        return [(field_id, str(payload.get("sensor_id") or "default"), ts, values)]
+
+    readings = payload.get("readings", []) if isinstance(payload, dict) else payload
+    if not isinstance(readings, list):
+        raise ValueError("Expected a list of readings")
+    grouped: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for reading in readings:
+        if not isinstance(reading, dict) or not reading.get("field_id"):
+            raise ValueError("Every reading needs a field_id")
+        grouped.setdefault((str(reading["field_id"]), str(reading.get("sensor_id") or "default")), []).append(reading)
+    groups = []
+    for (field_id, sensor_id), rows in grouped.items():
+        ts = np.array([parse_timestamp(row.get("timestamp")) for row in rows], dtype=np.float64)
+        values = np.full((len(rows), len(METRICS)), np.nan, dtype=np.float32)
+        for i, row in enumerate(rows):
+            for key, value in row.items():
+                metric = _metric(key)
+                if metric is not None:
+                    values[i, METRICS.index(metric)] = _values(value)
+        groups.append((field_id, sensor_id, ts, values))
+    return groups
+
+
+class _OpenBuckets:
+    """Per-sensor accumulators for the bucket currently filling at one rollup level."""
+
+    def __init__(self, capacity: int):
+        self.start = np.full(capacity, -1, dtype=np.int64)
+        self.n = np.zeros((capacity, len(METRICS)), dtype=np.int64)
+        self.sum = np.zeros((capacity, len(METRICS)), dtype=np.float64)
+        self.min = np.full((capacity, len(METRICS)), np.inf, dtype=np.float32)
+        self.max = np.full((capacity, len(METRICS)), -np.inf, dtype=np.float32)
+
+    def grow(self, capacity: int):
+        extra = capacity - len(self.start)
+        self.start = np.concatenate([self.start, np.full(extra, -1, dtype=np.int64)])
+        self.n = np.concatenate([self.n, np.zeros((extra, len(METRICS)), dtype=np.int64)])
+        self.sum = np.concatenate([self.sum, np.zeros((extra, len(METRICS)))])
+        self.min = np.concatenate([self.min, np.full((extra, len(METRICS)), np.inf, dtype=np.float32)])
+        self.max = np.concatenate([self.max, np.full((extra, len(METRICS)), -np.inf, dtype=np.float32)])
+
+    def rows(self, series: np.ndarray) -> np.ndarray:
+        return _rows(series, self.start[series], self.n[series], self.sum[series], self.min[series], self.max[series])
+
+
+def _rows(series, start, n, total, low, high) -> np.ndarray:
+    rows = np.zeros(len(series), dtype=BUFFERED_DTYPE)
+    rows["series"] = series
+    rows["start"] = start
+    for index, metric in enumerate(METRICS):
+        rows[f"{metric}_n"] = n[:, index]
+        rows[f"{metric}_sum"] = total[:, index]
+        rows[f"{metric}_min"] = low[:, index]
+        rows[f"{metric}_max"] = high[:, index]
+    return rows
+
+
+class SensorStore:
+    def __init__(self, root: str, raw_points: int = RAW_POINTS):
+        self.root = root
+        self.raw_points = raw_points
+        self.lock = threading.Lock()
+        self.series: List[Tuple[str, str]] = []
+        self.series_ids: Dict[Tuple[str, str], int] = {}
+        self.fields: Dict[str, List[int]] = {}
+        for name, _ in LEVELS:
+            os.makedirs(os.path.join(root, name), exist_ok=True)
+        self.capacity = 0
+        self.raw_ts = np.zeros((0, raw_points), dtype=np.float64)
+        self.raw_values = np.zeros((0, raw_points, len(METRICS)), dtype=np.float32)
+        self.raw_head = np.zeros(0, dtype=np.int64)
+        self.raw_count = np.zeros(0, dtype=np.int64)
+        # Per series, the time from which the ring holds every reading. Rings start empty on
+        # load, and readings from before the restart only survive in the rollups.
+        self.raw_since = np.zeros(0, dtype=np.float64)
+        self.open = {name: _OpenBuckets(0) for name, _ in LEVELS}
+        self.buffers: Dict[str, List[np.ndarray]] = {name: [] for name, _ in LEVELS}
+        self.buffered_rows = 0
+        self.stats = {"readings": 0, "batches": 0, "ingest_seconds": 0.0, "queries": 0, "query_seconds": 0.0}
+        self._load_series()
+
+    @property
+    def series_path(self) -> str:
+        return os.path.join(self.root, "series.json")
+
+    def _load_series(self):
+        if os.path.exists(self.series_path):
+            with open(self.series_path, encoding="utf-8") as f:
+                for field_id, sensor_id in json.load(f):
+                    self._add_series(field_id, sensor_id)
+        self.raw_since[:len(self.series)] = time.time()
+
+    def _add_series(self, field_id: str, sensor_id: str) -> int:
+        series_id = len(self.series)
+        self.series.append((field_id, sensor_id))
+        self.series_ids[(field_id, sensor_id)] = series_id
+        self.fields.setdefault(field_id, []).append(series_id)
+        if series_id >= self.capacity:
+            self._grow(max(64, self.capacity * 2))
+        return series_id
+
+    def _grow(self, capacity: int):
+        extra = capacity - self.capacity
+        self.raw_ts = np.concatenate([self.raw_ts, np.zeros((extra, self.raw_points))])
+        self.raw_values = np.concatenate([self.raw_values, np.full((extra, self.raw_points, len(METRICS)), np.nan, dtype=np.float32)])
+        self.raw_head = np.concatenate([self.raw_head, np.zeros(extra, dtype=np.int64)])
+        self.raw_count = np.concatenate([self.raw_count, np.zeros(extra, dtype=np.int64)])
+        self.raw_since = np.concatenate([self.raw_since, np.full(extra, -np.inf)])
+        for buckets in self.open.values():
+            buckets.grow(capacity)
+        self.capacity = capacity
+
+    def _series_file(self, level: str, series_id: int) -> str:
+        return os.path.join(self.root, level, f"{series_id}.bin")
+
+    # Ingestion
+
+    def ingest(self, groups: Iterable[Tuple[str, str, np.ndarray, np.ndarray]]) -> Dict[str, Any]:
+        """Append readings grouped as (field_id, sensor_id, timestamps, values); see `readings_from_payload`."""
+        started = time.perf_counter()
+        with self.lock:
+            new_series = False
+            ids, timestamps, values = [], [], []
+            for field_id, sensor_id, ts, vals in groups:
+                key = (field_id, sensor_id)
+                series_id = self.series_ids.get(key)
+                if series_id is None:
+                    series_id = self._add_series(field_id, sensor_id)
+                    new_series = True
+                ids.append(np.full(len(ts), series_id, dtype=np.int64))
+                timestamps.append(ts)
+                values.append(vals)
+            if new_series:
+                with open(self.series_path + ".tmp", "w", encoding="utf-8") as f:
+                    json.dump(self.series, f, ensure_ascii=False)
+                os.replace(self.series_path + ".tmp", self.series_path)
+            if not ids:
+                return {"accepted": 0}
+            series = np.concatenate(ids)
+            ts = np.concatenate(timestamps)
+            vals = np.concatenate(values)
+            valid = ((ts >= EARLIEST_TIMESTAMP) & (ts <= time.time() + MAX_FUTURE_SECONDS)
+                     & ~np.isnan(vals).all(axis=1))
+            series, ts, vals = series[valid], ts[valid], vals[valid]
+            order = np.lexsort((ts, series))
+            series, ts, vals = series[order], ts[order], vals[order]
+            if len(series):
+                self._append_raw(series, ts, vals)
+                for name, resolution in LEVELS:
+                    self._roll_up(name, resolution, series, ts, vals)
+                if self.buffered_rows >= PERSIST_ROWS:
+                    self._persist()
+            self.stats["readings"] += len(series)
+            self.stats["batches"] += 1
+            self.stats["ingest_seconds"] += time.perf_counter() - started
+        return {"accepted": int(len(series)), "rejected": int((~valid).sum())}
+
+    def _append_raw(self, series: np.ndarray, ts: np.ndarray, values: np.ndarray):
+        first = np.flatnonzero(np.r_[True, series[1:] != series[:-1]])
+        counts = np.diff(np.r_[first, len(series)])
+        group_series = series[first]
+        rank = np.arange(len(series)) - np.repeat(first, counts)
+        # Only the newest raw_points of a long run survive; drop the rest so ring slots aren't written twice.
+        keep = rank >= np.repeat(counts, counts) - self.raw_points
+        position = (self.raw_head[series] + rank) % self.raw_points
+        self.raw_ts[series[keep], position[keep]] = ts[keep]
+        self.raw_values[series[keep], position[keep]] = values[keep]
+        self.raw_head[group_series] = (self.raw_head[group_series] + counts) % self.raw_points
+        self.raw_count[group_series] = np.minimum(self.raw_count[group_series] + counts, self.raw_points)
+
+    def _roll_up(self, level: str, resolution: int, series: np.ndarray, ts: np.ndarray, values: np.ndarray):
+        buckets = self.open[level]
+        starts = (ts // resolution).astype(np.int64) * resolution
+        # Sorted by (series, time), so every (series, bucket) group is a contiguous run.
+        first = np.flatnonzero(np.r_[True, (series[1:] != series[:-1]) | (starts[1:] != starts[:-1])])
+        present = ~np.isnan(values)
+        n = np.add.reduceat(present.astype(np.int64), first)
+        total = np.add.reduceat(np.where(present, values, 0).astype(np.float64), first)
+        low = np.minimum.reduceat(np.where(present, values, np.inf), first)
+        high = np.maximum.reduceat(np.where(present, values, -np.inf), first)
+        group_series = series[first]
+        group_start = starts[first]
+        open_start = buckets.start[group_series]
+        last_of_series = np.r_[group_series[1:] != group_series[:-1], True]
+
+        # At most one group per series matches its open bucket: merge it in place.
+        same = group_start == open_start
+        target = group_series[same]
+        buckets.n[target] += n[same]
+        buckets.sum[target] += total[same]
+        buckets.min[target] = np.minimum(buckets.min[target], low[same])
+        buckets.max[target] = np.maximum(buckets.max[target], high[same])
+
+        # Newer buckets close the open one; the newest per series becomes the open bucket.
+        newer = group_start > open_start
+        closing = np.unique(group_series[newer])
+        closing = closing[buckets.start[closing] >= 0]
+        emitted = [buckets.rows(closing)] if len(closing) else []
+        # Older than the open bucket (late) or superseded within this batch: already closed.
+        done = (group_start < open_start) | (newer & ~last_of_series)
+        if done.any():
+            emitted.append(_rows(group_series[done], group_start[done], n[done], total[done], low[done], high[done]))
+        opening = newer & last_of_series
+        target = group_series[opening]
+        buckets.start[target] = group_start[opening]
+        buckets.n[target] = n[opening]
+        buckets.sum[target] = total[opening]
+        buckets.min[target] = low[opening]
+        buckets.max[target] = high[opening]
+        for rows in emitted:
+            self.buffers[level].append(rows)
+            self.buffered_rows += len(rows)
+
+    def _persist(self):
+        """Write buffered closed buckets, opening each sensor's file once per level."""
+        for level, chunks in self.buffers.items():
+            if not chunks:
+                continue
+            rows = np.concatenate(chunks)
+            rows = rows[np.argsort(rows["series"], kind="stable")]
+            bounds = np.flatnonzero(np.r_[True, rows["series"][1:] != rows["series"][:-1], True])
+            plain = rows[[name for name, _ in ROLLUP_FIELDS]]
+            for begin, end in zip(bounds[:-1], bounds[1:]):
+                with open(self._series_file(level, int(rows["series"][begin])), "ab") as f:
+                    np.ascontiguousarray(plain[begin:end]).astype(ROLLUP_DTYPE).tofile(f)
+            self.buffers[level] = []
+        self.buffered_rows = 0
+
+    def flush(self):
+        """Persist buffered buckets and the open ones (as partial rows) so nothing is lost on shutdown."""
+        with self.lock:
+            active = np.arange(len(self.series))
+            for level, _ in LEVELS:
+                buckets = self.open[level]
+                open_series = active[buckets.start[active] >= 0]
+                if len(open_series):
+                    self.buffers[level].append(buckets.rows(open_series))
+                    buckets.start[open_series] = -1
+                    buckets.n[open_series] = 0
+                    buckets.sum[open_series] = 0
+                    buckets.min[open_series] = np.inf
+                    buckets.max[open_series] = -np.inf
+            self._persist()
+
+    # Queries
+
+    def status(self, field_id: str, now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Latest reading per sensor plus this hour's and today's aggregates for the field."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        with self.lock:
+            series = np.array(self.fields.get(field_id, []), dtype=np.int64)
+            if not len(series):
+                return None
+            latest = (self.raw_head[series] - 1) % self.raw_points
+            latest_ts = np.where(self.raw_count[series] > 0, self.raw_ts[series, latest], np.nan)
+            # Sensors may send metrics separately: take each metric's newest reading in the ring.
+            filled = np.arange(self.raw_points)[None, :] < self.raw_count[series][:, None]
+            values = self.raw_values[series]
+            stamped = np.where(filled[:, :, None] & ~np.isnan(values), self.raw_ts[series][:, :, None], -np.inf)
+            newest = np.argmax(stamped, axis=1)[:, None, :]
+            latest_values = np.take_along_axis(values, newest, axis=1)[:, 0, :]
+            windows = {}
+            for level, name in (("1h", "last_hour"), ("1d", "today")):
+                buckets = self.open[level]
+                windows[name] = (buckets.start[series].copy(), buckets.n[series].copy(), buckets.sum[series].copy(),
+                                 buckets.min[series].copy(), buckets.max[series].copy())
+        online = np.nan_to_num(now - latest_ts, nan=np.inf) <= STALE_SECONDS
+        sensors = [{
+            "sensor_id": self.series[series_id][1],
+            "last_seen": _iso(latest_ts[i]),
+            "online": bool(online[i]),
+            "latest": {metric: _round(latest_values[i, j]) for j, metric in enumerate(METRICS) if not np.isnan(latest_values[i, j])},
+        } for i, series_id in enumerate(series)]
+        current = {}
+        for j, metric in enumerate(METRICS):
+            column = latest_values[online, j] if online.any() else latest_values[:, j]
+            if not np.isnan(column).all():
+                current[metric] = _round(np.nanmean(column))
+        summary = {
+            "field_id": field_id,
+            "sensors": len(series),
+            "online": int(online.sum()),
+            "last_seen": _iso(np.nanmax(latest_ts)) if not np.isnan(latest_ts).all() else None,
+            "current": current,
+            "units": METRIC_UNITS,
+            "sensor_status": sensors,
+        }
+        for name, (starts, n, total, low, high) in windows.items():
+            # Only sensors whose open bucket is the most recent one count toward "this hour" / "today".
+            live = starts == starts.max()
+            count = n[live].sum(axis=0)
+            summary[name] = {
+                metric: {
+                    "mean": _round(total[live, j].sum() / count[j]),
+                    "min": _round(low[live, j].min()),
+                    "max": _round(high[live, j].max()),
+                }
+                for j, metric in enumerate(METRICS) if count[j]
+            }
+        self._timed(started)
+        return summary
+
+    def history(self, field_id: str, metric: str, start: float, end: float, max_points: int = DEFAULT_MAX_POINTS,
+                sensor_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Points over [start, end) from the finest level that fits in `max_points`; raw when the ring covers it."""
+        started = time.perf_counter()
+        metric = _metric(metric)
+        if metric is None:
+            raise ValueError(f"Unknown metric; use one of {', '.join(METRICS)}")
+        column = METRICS.index(metric)
+        series = [s for s in self.fields.get(field_id, []) if sensor_id is None or self.series[s][1] == sensor_id]
+        if not series:
+            return None
+        series = np.array(series, dtype=np.int64)
+
+        with self.lock:
+            # Once a ring wraps, readings older than its oldest slot were evicted.
+            oldest_raw = self.raw_ts[series, self.raw_head[series] % self.raw_points]
+            full = self.raw_count[series] == self.raw_points
+            covered = np.maximum(self.raw_since[series], np.where(full, oldest_raw, -np.inf))
+            ts = self.raw_ts[series].ravel()
+            values = self.raw_values[series, :, column].ravel()
+            filled = (np.arange(self.raw_points)[None, :] < self.raw_count[series][:, None]).ravel()
+            keep = filled & (ts >= start) & (ts < end) & ~np.isnan(values)
+            if covered.max() <= start and keep.sum() <= max_points:
+                owners = np.repeat(series, self.raw_points)
+                order = np.argsort(ts[keep], kind="stable")
+                points = [
+                    {"time": _iso(t), "sensor_id": self.series[o][1], "value": _round(v)}
+                    for t, o, v in zip(ts[keep][order], owners[keep][order], values[keep][order])
+                ]
+                self._timed(started)
+                return {"field_id": field_id, "metric": metric, "level": "raw", "resolution_seconds": None, "points": points}
+
+            level, resolution = next(((name, res) for name, res in LEVELS if (end - start) / res <= max_points), LEVELS[-1])
+            buckets = self.open[level]
+            pending = [rows[np.isin(rows["series"], series)] for rows in self.buffers[level]]
+            pending.append(buckets.rows(series[buckets.start[series] >= 0]))
+        names = ["start", f"{metric}_n", f"{metric}_sum", f"{metric}_min", f"{metric}_max"]
+        parts = [rows[names] for rows in pending if len(rows)]
+        for series_id in series:
+            path = self._series_file(level, int(series_id))
+            if os.path.exists(path) and os.path.getsize(path):
+                stored = np.memmap(path, dtype=ROLLUP_DTYPE, mode="r")
+                parts.append(np.asarray(stored[(stored["start"] >= start - resolution) & (stored["start"] < end)][names]))
+        if parts:
+            rows = np.concatenate([np.asarray(part, dtype=np.dtype([(name, ROLLUP_DTYPE[name]) for name in names])) for part in parts])
+        else:
+            rows = np.zeros(0, dtype=np.dtype([(name, ROLLUP_DTYPE[name]) for name in names]))
+        rows = rows[(rows["start"] + resolution > start) & (rows["start"] < end) & (rows[f"{metric}_n"] > 0)]
+        rows = rows[np.argsort(rows["start"], kind="stable")]
+        points = []
+        if len(rows):
+            # Merge split rows and sensors that share a bucket.
+            first = np.flatnonzero(np.r_[True, rows["start"][1:] != rows["start"][:-1]])
+            n = np.add.reduceat(rows[f"{metric}_n"].astype(np.int64), first)
+            total = np.add.reduceat(rows[f"{metric}_sum"], first)
+            low = np.minimum.reduceat(rows[f"{metric}_min"], first)
+            high = np.maximum.reduceat(rows[f"{metric}_max"], first)
+            points = [
+                {"time": _iso(s), "mean": _round(t / c), "min": _round(lo), "max": _round(hi), "count": int(c)}
+                for s, c, t, lo, hi in zip(rows["start"][first], n, total, low, high)
+            ]
+        self._timed(started)
+        return {"field_id": field_id, "metric": metric, "level": level, "resolution_seconds": resolution, "points": points}
+
+    def _timed(self, started: float):
+        self.stats["queries"] += 1
+        self.stats["query_seconds"] += time.perf_counter() - started
+
+    def fields_summary(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [{
+                "field_id": field_id,
+                "sensors": len(series),
+                "last_seen": _iso(max(
+                    (self.raw_ts[s, (self.raw_head[s] - 1) % self.raw_points] for s in series if self.raw_count[s]),
+                    default=np.nan,
+                )),
+            } for field_id, series in self.fields.items()]
+
+    def metrics(self) -> Dict[str, Any]:
+        ingest_seconds = self.stats["ingest_seconds"]
+        queries = self.stats["queries"]
+        return {
+            "series": len(self.series),
+            "fields": len(self.fields),
+            "readings": self.stats["readings"],
+            "batches": self.stats["batches"],
+            "readings_per_second": round(self.stats["readings"] / ingest_seconds) if ingest_seconds else 0,
+            "buffered_rollup_rows": self.buffered_rows,
+            "queries": queries,
+            "avg_query_ms": round(self.stats["query_seconds"] / queries * 1000, 3) if queries else 0.0,
+        }
+
+
+def _iso(timestamp: float) -> Optional[str]:
+    if timestamp is None or np.isnan(timestamp):
+        return None
+    return datetime.fromtimestamp(float(timestamp), tz=timezone.utc).isoformat()
+
+
+def _round(value: Any) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else round(value, 2)
+
+
+def describe(status: Dict[str, Any]) -> str:
+    labels = {"soil_moisture": "soil moisture", "soil_temperature": "soil temperature",
+              "air_temperature": "air temperature", "humidity": "humidity"}
+    parts = [f"{labels[metric]} {value:g}{METRIC_UNITS[metric]}" for metric, value in status["current"].items()]
+    text = f"Your field's sensors report {', '.join(parts)}." if parts else "No recent sensor readings for your field."
+    offline = status["sensors"] - status["online"]
+    if offline:
+        text += f" {offline} of {status['sensors']} sensors have not reported in the last {STALE_SECONDS // 60} minutes."
+    return text
+
+
+def benchmark(root: str, sensors: int = 2000, minutes: int = 120, interval_seconds: int = 10,
+              batch_size: int = 20_000, seed: int = 0) -> Dict[str, Any]:
+    """Ingest a synthetic fleet in time order in columnar batches, then time status and range queries."""
+    rng = np.random.default_rng(seed)
+    store = SensorStore(root)
+    origin = time.time() - minutes * 60
+    steps = minutes * 60 // interval_seconds
+    per_batch = max(1, batch_size // sensors)
+    base = rng.uniform([15, 18, 20, 40], [45, 30, 35, 90], (sensors, len(METRICS))).astype(np.float32)
+    started = time.perf_counter()
+    for step in range(0, steps, per_batch):
+        count = min(per_batch, steps - step)
+        ts = origin + (step + np.arange(count)) * interval_seconds
+        groups = []
+        noise = rng.normal(0, 0.5, (sensors, count, len(METRICS))).astype(np.float32)
+        for sensor in range(sensors):
+            groups.append((f"field-{sensor // 4}", f"s{sensor % 4}", ts, base[sensor] + noise[sensor]))
+        store.ingest(groups)
+    ingest_seconds = time.perf_counter() - started
+    readings = sensors * steps
+
+    fields = [f"field-{index}" for index in range(sensors // 4)]
+    now = origin + steps * interval_seconds
+    timings = {}
+    for name, call in (
+        ("status", lambda field: store.status(field, now)),
+        ("raw_5min", lambda field: store.history(field, "soil_moisture", now - 300, now)),
+        ("1m_2h", lambda field: store.history(field, "soil_moisture", now - 7200, now)),
+        ("1h_30d", lambda field: store.history(field, "soil_moisture", now - 30 * 86400, now)),
+    ):
+        started = time.perf_counter()
+        for field in fields[:200]:
+            call(field)
+        timings[f"{name}_ms"] = round((time.perf_counter() - started) / min(200, len(fields)) * 1000, 3)
+    store.flush()
+    return {
+        "sensors": sensors,
+        "readings": readings,
+        "ingest_seconds": round(ingest_seconds, 3),
+        "readings_per_second": round(readings / ingest_seconds),
+        **timings,
+    }
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as root:
+        print(json.dumps(benchmark(root, *(int(arg) for arg in sys.argv[1:3])), indent=2))
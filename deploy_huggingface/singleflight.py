@@ -0,0 +1,59 @@
+"""Coalescing of identical concurrent upstream calls.
+
+Concurrent callers asking for the same key share one in-flight upstream call and
+its result (or exception). The shared call runs as its own task, so a caller that
+disconnects does not cancel the work the other callers are waiting on.
+"""
+import asyncio
+import hashlib
+import re
+import unicodedata
+from typing import Any, Awaitable, Callable, Dict
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Canonical form of a prompt for coalescing: NFC, trimmed, whitespace collapsed."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", prompt)).strip()
+
+
+def make_key(*parts: Any) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.requests = 0
+        self.upstream_calls = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        self.requests += 1
+        task = self.inflight.get(key)
+        if task is None:
+            self.upstream_calls += 1
+            task = asyncio.ensure_future(call())
+            self.inflight[key] = task
+            task.add_done_callback(lambda done: self._complete(key, done))
+        return await asyncio.shield(task)
+
+    def _complete(self, key: str, task: asyncio.Task):
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away.
+            task.exception()
+
+    def metrics(self) -> Dict[str, Any]:
+        saved = self.requests - self.upstream_calls
+        return {
+            "requests": self.requests,
+            "upstream_calls": self.upstream_calls,
+            "calls_saved": saved,
+            "saved_ratio": round(saved / self.requests, 4) if self.requests else 0.0,
+            "in_flight": len(self.inflight),
+        }
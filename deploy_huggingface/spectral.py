@@ -0,0 +1,489 @@
+"""Hyperspectral / multispectral cube ingestion and spectral-index computation.
+
+Cubes are opened memory-mapped and processed in row tiles, so only one tile of
+reflectance values is resident at a time regardless of the size of the capture.
+"""
+import json
+import os
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+CUBE_EXTENSIONS = (".npy", ".hdr", ".tif", ".tiff")
+
+# Band centres (nm) of the common 5-band drone multispectral cameras, used when
+# a cube carries no wavelength metadata of its own.
+DEFAULT_MULTISPECTRAL_WAVELENGTHS = [475.0, 560.0, 668.0, 717.0, 842.0]
+
+# Maximum distance (nm) between a requested wavelength and the closest band.
+BAND_TOLERANCE_NM = 50.0
+
+# Target number of values per tile (rows * cols * bands), roughly 64 MB of float32.
+TILE_VALUE_BUDGET = 16 * 1024 * 1024
+
+# Wavelengths each index needs, keyed by the role used in its formula.
+INDEX_BANDS = {
+    "ndvi": {"nir": 800.0, "red": 670.0},
+    "pri": {"r531": 531.0, "r570": 570.0},
+    "ari": {"green": 550.0, "red_edge": 700.0},
+    "cri": {"blue": 510.0, "green": 550.0},
+    "ci_red_edge": {"nir": 800.0, "red_edge": 700.0},
+    "ndwi": {"nir": 860.0, "swir": 1240.0},
+}
+
+# Histogram ranges used for streaming percentiles of each index.
+INDEX_RANGES = {
+    "ndvi": (-1.0, 1.0),
+    "pri": (-0.5, 0.5),
+    "ari": (-20.0, 20.0),
+    "cri": (-20.0, 20.0),
+    "ci_red_edge": (-1.0, 10.0),
+    "ndwi": (-1.0, 1.0),
+    "disease_probability": (0.0, 1.0),
+}
+
+HISTOGRAM_BINS = 512
+
+# Pixels below this NDVI are treated as soil/background and excluded from field statistics.
+VEGETATION_NDVI_THRESHOLD = 0.3
+STRESS_NDVI_THRESHOLD = 0.55
+STRESS_PRI_THRESHOLD = -0.05
+
+ENVI_DTYPES = {
+    "1": np.uint8,
+    "2": np.int16,
+    "3": np.int32,
+    "4": np.float32,
+    "5": np.float64,
+    "12": np.uint16,
+    "13": np.uint32,
+    "14": np.int64,
+    "15": np.uint64,
+}
+
+
+class SpectralCubeError(Exception):
+    pass
+
+
+class SpectralCube:
+    """A band-stacked reflectance raster exposed as (rows, cols, bands) windows."""
+
+    def __init__(self, data: np.ndarray, wavelengths: List[float], interleave: str = "bip",
+                 scale: float = 1.0, source: str = ""):
+        interleave = interleave.lower()
+        if interleave not in ("bsq", "bil", "bip"):
+            raise SpectralCubeError(f"Unsupported interleave: {interleave}")
+        if data.ndim != 3:
+            raise SpectralCubeError(f"Expected a 3-D cube, got shape {data.shape}")
+
+        self.data = data
+        self.interleave = interleave
+        self.scale = scale
+        self.source = source
+
+        if interleave == "bsq":
+            self.bands, self.rows, self.cols = data.shape
+        elif interleave == "bil":
+            self.rows, self.bands, self.cols = data.shape
+        else:
+            self.rows, self.cols, self.bands = data.shape
+
+        if not wavelengths and self.bands == len(DEFAULT_MULTISPECTRAL_WAVELENGTHS):
+            wavelengths = list(DEFAULT_MULTISPECTRAL_WAVELENGTHS)
+        if len(wavelengths) != self.bands:
+            raise SpectralCubeError(
+                f"Cube has {self.bands} bands but {len(wavelengths)} wavelengths were provided"
+            )
+        self.wavelengths = np.asarray(wavelengths, dtype=np.float64)
+
+    @property
+    def shape(self) -> Tuple[int, int, int]:
+        return self.rows, self.cols, self.bands
+
+    @property
+    def wavelength_range(self) -> Tuple[float, float]:
+        return float(self.wavelengths.min()), float(self.wavelengths.max())
+
+    def band_index(self, wavelength: float) -> Optional[int]:
+        """Index of the band closest to `wavelength`, or None if none is within tolerance."""
+        distances = np.abs(self.wavelengths - wavelength)
+        index = int(np.argmin(distances))
+        if distances[index] > BAND_TOLERANCE_NM:
+            return None
+        return index
+
+    def available_indices(self) -> List[str]:
+        return [name for name in INDEX_BANDS if self.resolve_bands(name) is not None]
+
+    def resolve_bands(self, index_name: str) -> Optional[Dict[str, int]]:
+        roles = {}
+        for role, wavelength in INDEX_BANDS[index_name].items():
+            band = self.band_index(wavelength)
+            if band is None:
+                return None
+            roles[role] = band
+        # Coarse multispectral bands can snap two roles onto one band, which makes the index meaningless.
+        if len(set(roles.values())) != len(roles):
+            return None
+        return roles
+
+    def read_window(self, row_start: int, row_stop: int, col_start: int = 0, col_stop: Optional[int] = None,
+                    bands: Optional[List[int]] = None, step: int = 1) -> np.ndarray:
+        """Read a (rows, cols, bands) float32 window, optionally subsampled by `step`."""
+        col_stop = self.cols if col_stop is None else col_stop
+        band_sel = slice(None) if bands is None else list(bands)
+        rows = slice(row_start, row_stop, step)
+        cols = slice(col_start, col_stop, step)
+
+        if self.interleave == "bsq":
+            window = self.data[band_sel, rows, cols]
+            window = np.moveaxis(window, 0, -1)
+        elif self.interleave == "bil":
+            window = self.data[rows, band_sel, cols]
+            window = np.moveaxis(window, 1, -1)
+        else:
+            window = self.data[rows, cols, band_sel]
+
+        window = np.asarray(window, dtype=np.float32)
+        if self.scale != 1.0:
+            window *= np.float32(self.scale)
+        return window
+
+    def iter_row_tiles(self, bands: Optional[List[int]] = None) -> Iterator[np.ndarray]:
+        """Yield full-width row tiles sized to stay within TILE_VALUE_BUDGET."""
+        band_count = self.bands if bands is None else len(bands)
+        tile_rows = max(1, TILE_VALUE_BUDGET // max(1, self.cols * band_count))
+        for row_start in range(0, self.rows, tile_rows):
+            yield self.read_window(row_start, min(self.rows, row_start + tile_rows), bands=bands)
+
+
+def _read_wavelength_sidecar(path: str) -> List[float]:
+    sidecar = os.path.splitext(path)[0] + ".json"
+    if not os.path.exists(sidecar):
+        return []
+    with open(sidecar) as f:
+        meta = json.load(f)
+    return [float(w) for w in meta.get("wavelengths", [])]
+
+
+def parse_envi_header(header_path: str) -> Dict[str, str]:
+    """Parse an ENVI .hdr file into a dict of lower-cased keys to raw string values."""
+    with open(header_path, errors="replace") as f:
+        text = f.read()
+    if not text.lstrip().startswith("ENVI"):
+        raise SpectralCubeError(f"{header_path} is not an ENVI header")
+
+    header = {}
+    for match in re.finditer(r"^\s*([^=\n]+?)\s*=\s*(\{[^}]*\}|[^\n]*)", text, re.MULTILINE):
+        header[match.group(1).strip().lower()] = match.group(2).strip()
+    return header
+
+
+def _envi_list(value: str) -> List[str]:
+    return [item.strip() for item in value.strip("{}").split(",") if item.strip()]
+
+
+def open_envi(header_path: str) -> SpectralCube:
+    header = parse_envi_header(header_path)
+    try:
+        samples = int(header["samples"])
+        lines = int(header["lines"])
+        bands = int(header["bands"])
+        dtype = np.dtype(ENVI_DTYPES[header.get("data type", "4")])
+    except (KeyError, ValueError) as e:
+        raise SpectralCubeError(f"Invalid ENVI header {header_path}: {e}")
+
+    if header.get("byte order", "0") == "1":
+        dtype = dtype.newbyteorder(">")
+    interleave = header.get("interleave", "bsq").lower()
+    offset = int(header.get("header offset", "0"))
+
+    base = os.path.splitext(header_path)[0]
+    data_path = next((base + ext for ext in ("", ".raw", ".img", ".dat", ".bsq", ".bil", ".bip")
+                      if os.path.exists(base + ext)), None)
+    if data_path is None:
+        raise SpectralCubeError(f"No data file found next to {header_path}")
+
+    shape = {
+        "bsq": (bands, lines, samples),
+        "bil": (lines, bands, samples),
+        "bip": (lines, samples, bands),
+    }.get(interleave)
+    if shape is None:
+        raise SpectralCubeError(f"Unsupported ENVI interleave: {interleave}")
+
+    data = np.memmap(data_path, dtype=dtype, mode="r", offset=offset, shape=shape)
+    wavelengths = [float(w) for w in _envi_list(header.get("wavelength", ""))]
+    if wavelengths and header.get("wavelength units", "nm").lower().startswith("micro"):
+        wavelengths = [w * 1000.0 for w in wavelengths]
+    scale = 1.0 / float(header["reflectance scale factor"]) if "reflectance scale factor" in header else 1.0
+
+    return SpectralCube(data, wavelengths, interleave, scale=scale, source=header_path)
+
+
+def open_numpy(path: str, wavelengths: Optional[List[float]] = None, interleave: str = "bip") -> SpectralCube:
+    data = np.load(path, mmap_mode="r")
+    return SpectralCube(data, wavelengths or _read_wavelength_sidecar(path), interleave, source=path)
+
+
+def open_tiff(path: str, wavelengths: Optional[List[float]] = None) -> SpectralCube:
+    try:
+        import tifffile
+    except ImportError:
+        tifffile = None
+
+    if tifffile is not None:
+        try:
+            data = tifffile.memmap(path, mode="r")
+        except ValueError:
+            # Compressed or tiled TIFFs cannot be memory-mapped.
+            data = tifffile.imread(path)
+        # tifffile returns band-first stacks for multi-page captures.
+        interleave = "bsq" if data.ndim == 3 and data.shape[0] < min(data.shape[1:]) else "bip"
+        return SpectralCube(data, wavelengths or _read_wavelength_sidecar(path), interleave, source=path)
+
+    from PIL import Image, ImageSequence
+
+    with Image.open(path) as image:
+        pages = [np.asarray(page, dtype=np.float32) for page in ImageSequence.Iterator(image)]
+    if len(pages) == 1 and pages[0].ndim == 3:
+        data, interleave = pages[0], "bip"
+    else:
+        data, interleave = np.stack(pages), "bsq"
+    return SpectralCube(data, wavelengths or _read_wavelength_sidecar(path), interleave, source=path)
+
+
+def open_cube(path: str, wavelengths: Optional[List[float]] = None) -> SpectralCube:
+    """Open a band-stacked raster (ENVI header, .npy cube or multi-band TIFF)."""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".hdr":
+        return open_envi(path)
+    if ext == ".npy":
+        return open_numpy(path, wavelengths)
+    if ext in (".tif", ".tiff"):
+        return open_tiff(path, wavelengths)
+    raise SpectralCubeError(f"Unsupported cube format: {ext}")
+
+
+def is_cube_filename(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(CUBE_EXTENSIONS)
+
+
+def compute_index(index_name: str, window: np.ndarray, roles: Dict[str, int]) -> np.ndarray:
+    """Compute one spectral index per pixel for a (rows, cols, bands) window."""
+    band = {role: window[..., i] for role, i in roles.items()}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if index_name == "ndvi":
+            result = (band["nir"] - band["red"]) / (band["nir"] + band["red"])
+        elif index_name == "pri":
+            result = (band["r531"] - band["r570"]) / (band["r531"] + band["r570"])
+        elif index_name == "ari":
+            result = 1.0 / band["green"] - 1.0 / band["red_edge"]
+        elif index_name == "cri":
+            result = 1.0 / band["blue"] - 1.0 / band["green"]
+        elif index_name == "ci_red_edge":
+            result = band["nir"] / band["red_edge"] - 1.0
+        elif index_name == "ndwi":
+            result = (band["nir"] - band["swir"]) / (band["nir"] + band["swir"])
+        else:
+            raise SpectralCubeError(f"Unknown spectral index: {index_name}")
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+def disease_probability(ndvi: np.ndarray, pri: Optional[np.ndarray] = None) -> np.ndarray:
+    """Per-pixel stress/disease likelihood from NDVI deficit and PRI depression."""
+    score = (STRESS_NDVI_THRESHOLD - ndvi) * 12.0
+    if pri is not None:
+        score = score + np.nan_to_num(STRESS_PRI_THRESHOLD - pri) * 40.0
+    with np.errstate(over="ignore"):
+        probability = 1.0 / (1.0 + np.exp(-score))
+    probability[ndvi < VEGETATION_NDVI_THRESHOLD] = np.nan
+    return probability.astype(np.float32)
+
+
+class _IndexAccumulator:
+    """Streaming mean/std/min/max and histogram percentiles of one index."""
+
+    def __init__(self, value_range: Tuple[float, float]):
+        self.low, self.high = value_range
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+        self.histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+
+    def add(self, values: np.ndarray):
+        values = values[np.isfinite(values)]
+        if values.size == 0:
+            return
+        values64 = values.astype(np.float64)
+        self.count += values.size
+        self.total += values64.sum()
+        self.total_sq += np.square(values64).sum()
+        self.minimum = min(self.minimum, float(values.min()))
+        self.maximum = max(self.maximum, float(values.max()))
+        hist, _ = np.histogram(np.clip(values, self.low, self.high), bins=HISTOGRAM_BINS,
+                               range=(self.low, self.high))
+        self.histogram += hist
+
+    def percentile(self, q: float) -> float:
+        cumulative = np.cumsum(self.histogram)
+        target = q / 100.0 * cumulative[-1]
+        bin_index = int(np.searchsorted(cumulative, target))
+        width = (self.high - self.low) / HISTOGRAM_BINS
+        return self.low + (bin_index + 0.5) * width
+
+    def summary(self) -> Optional[Dict[str, float]]:
+        if self.count == 0:
+            return None
+        mean = float(self.total / self.count)
+        std = max(0.0, float(self.total_sq / self.count) - mean * mean) ** 0.5
+        return {
+            "mean": round(mean, 4),
+            "std": round(std, 4),
+            "min": round(self.minimum, 4),
+            "max": round(self.maximum, 4),
+            "p10": round(self.percentile(10), 4),
+            "p50": round(self.percentile(50), 4),
+            "p90": round(self.percentile(90), 4),
+        }
+
+
+def compute_field_statistics(cube: SpectralCube) -> Dict[str, object]:
+    """Compute field-level statistics of every index the cube's bands support."""
+    index_roles = {name: cube.resolve_bands(name) for name in INDEX_BANDS}
+    index_roles = {name: roles for name, roles in index_roles.items() if roles is not None}
+    if "ndvi" not in index_roles:
+        raise SpectralCubeError("Cube does not cover the red and NIR bands needed for NDVI")
+
+    # Read only the bands the supported indices need, remapped to window positions.
+    needed = sorted({band for roles in index_roles.values() for band in roles.values()})
+    position = {band: i for i, band in enumerate(needed)}
+    window_roles = {name: {role: position[band] for role, band in roles.items()}
+                    for name, roles in index_roles.items()}
+
+    accumulators = {name: _IndexAccumulator(INDEX_RANGES[name]) for name in index_roles}
+    accumulators["disease_probability"] = _IndexAccumulator(INDEX_RANGES["disease_probability"])
+    total_pixels = 0
+    vegetation_pixels = 0
+    stressed_pixels = 0
+
+    for tile in cube.iter_row_tiles(bands=needed):
+        ndvi = compute_index("ndvi", tile, window_roles["ndvi"])
+        vegetation = ndvi >= VEGETATION_NDVI_THRESHOLD
+        total_pixels += ndvi.size
+        vegetation_pixels += int(vegetation.sum())
+
+        pri = None
+        for name, roles in window_roles.items():
+            values = ndvi if name == "ndvi" else compute_index(name, tile, roles)
+            if name == "pri":
+                pri = values
+            accumulators[name].add(values[vegetation])
+
+        stressed = vegetation & (ndvi < STRESS_NDVI_THRESHOLD)
+        if pri is not None:
+            stressed |= vegetation & (pri < STRESS_PRI_THRESHOLD)
+        stressed_pixels += int(stressed.sum())
+        accumulators["disease_probability"].add(disease_probability(ndvi, pri)[vegetation])
+
+    low, high = cube.wavelength_range
+    return {
+        "shape": {"rows": cube.rows, "cols": cube.cols, "bands": cube.bands},
+        "wavelength_range_nm": [round(low, 1), round(high, 1)],
+        "total_pixels": total_pixels,
+        "vegetation_pixels": vegetation_pixels,
+        "vegetation_fraction": round(vegetation_pixels / total_pixels, 4) if total_pixels else 0.0,
+        "stressed_fraction": round(stressed_pixels / vegetation_pixels, 4) if vegetation_pixels else 0.0,
+        "indices": {name: acc.summary() for name, acc in accumulators.items()},
+    }
+
+
+def parse_measurement(value: object) -> Optional[float]:
+    """Leading number of a reported field such as "42.5 µg/cm²" or "12%"; None for "Not measured"."""
+    match = re.match(r"\s*(-?\d+(?:\.\d+)?)", str(value))
+    return float(match.group(1)) if match else None
+
+
+def hyperspectral_data_from_statistics(stats: Dict[str, object]) -> Dict[str, object]:
+    """Map field statistics onto the `hyperspectral_data` fields the handlers report."""
+    indices = stats["indices"]
+
+    def mean_of(name: str) -> Optional[float]:
+        summary = indices.get(name)
+        return summary["mean"] if summary else None
+
+    ndvi = mean_of("ndvi")
+    pri = mean_of("pri")
+    ci_red_edge = mean_of("ci_red_edge")
+    ndwi = mean_of("ndwi")
+    stressed_fraction = stats["stressed_fraction"]
+
+    low, high = stats["wavelength_range_nm"]
+    if ndvi is None:
+        # No pixel reached the vegetation threshold (bare soil, water, or a cube of the
+        # wrong scene): there is no canopy to estimate chlorophyll or stress from.
+        return {
+            "chlorophyll_content": "Not measured",
+            "water_stress": "Not measured",
+            "nutrient_deficiency": "Not assessed",
+            "disease_stress_index": "Not measured",
+            "photosynthetic_efficiency": "Not measured",
+            "leaf_temperature": "Not measured",
+            "stomatal_conductance": "Not measured",
+            "ndvi": None,
+            "pri": None,
+            "ari": None,
+            "cri": None,
+            "spectral_bands_analyzed": f"{low:g}-{high:g}nm ({stats['shape']['bands']} bands)",
+            "measurement_accuracy": "No vegetated pixels in the cube",
+            "data_quality": "Low",
+            "data_source": "measured",
+            "field_statistics": stats,
+        }
+
+    # Empirical red-edge chlorophyll relation (Gitelson et al.), falling back to NDVI.
+    if ci_red_edge is not None:
+        chlorophyll = max(0.0, 6.0 + 20.0 * ci_red_edge)
+    else:
+        chlorophyll = max(0.0, 70.0 * ndvi - 5.0)
+
+    if ndwi is not None:
+        water_stress = min(100.0, max(0.0, (0.4 - ndwi) * 125.0))
+    else:
+        water_stress = min(100.0, max(0.0, (0.8 - ndvi) * 100.0))
+
+    photosynthetic_efficiency = (
+        min(100.0, max(0.0, 50.0 + pri * 500.0)) if pri is not None
+        else min(100.0, max(0.0, ndvi * 110.0))
+    )
+
+    if chlorophyll < 30:
+        nutrient_deficiency = "Nitrogen"
+    elif indices.get("ari") and indices["ari"]["mean"] > 1.5:
+        nutrient_deficiency = "Phosphorus"
+    else:
+        nutrient_deficiency = "None detected"
+
+    return {
+        "chlorophyll_content": f"{round(chlorophyll, 1)} µg/cm²",
+        "water_stress": f"{round(water_stress, 1)}%",
+        "nutrient_deficiency": nutrient_deficiency,
+        "disease_stress_index": f"{round(stressed_fraction * 100, 1)}%",
+        "photosynthetic_efficiency": f"{round(photosynthetic_efficiency, 1)}%",
+        "leaf_temperature": "Not measured",
+        "stomatal_conductance": "Not measured",
+        "ndvi": round(ndvi, 3),
+        "pri": round(pri, 3) if pri is not None else None,
+        "ari": round(mean_of("ari"), 3) if mean_of("ari") is not None else None,
+        "cri": round(mean_of("cri"), 3) if mean_of("cri") is not None else None,
+        "spectral_bands_analyzed": f"{low:g}-{high:g}nm ({stats['shape']['bands']} bands)",
+        "measurement_accuracy": "Field statistics over measured pixels",
+        "data_quality": "High" if stats["vegetation_fraction"] > 0.2 else "Medium",
+        "data_source": "measured",
+        "field_statistics": stats,
+    }
@@ -0,0 +1,264 @@
+"""Per-field longitudinal store of spectral indices and disease scores.
+
+Observations are appended to a fixed-width binary column file per field and read
+back through a memory map only when history is requested. Change detection runs
+against a small persisted state (baseline, running moments, rolling window, EWMA
+trend), so assessing a new observation is O(1) and never reloads history.
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+METRICS = (
+    "ndvi", "pri", "ari", "cri",
+    "chlorophyll", "water_stress", "disease_stress", "severity",
+)
+
+# +1 when a rising value means the crop is getting worse, -1 when a falling value does.
+WORSENING_DIRECTION = {
+    "ndvi": -1,
+    "pri": -1,
+    "ari": 1,
+    "cri": 1,
+    "chlorophyll": -1,
+    "water_stress": 1,
+    "disease_stress": 1,
+    "severity": 1,
+}
+
+# Absolute change from baseline treated as meaningful for each metric.
+BASELINE_THRESHOLDS = {
+    "ndvi": 0.08,
+    "pri": 0.03,
+    "ari": 0.5,
+    "cri": 1.0,
+    "chlorophyll": 8.0,
+    "water_stress": 10.0,
+    "disease_stress": 10.0,
+    "severity": 2.0,
+}
+
+RECORD_DTYPE = np.dtype([("timestamp", "<f8")] + [(name, "<f4") for name in METRICS])
+
+ROLLING_WINDOW = 5
+EWMA_ALPHA = 0.3
+Z_SCORE_THRESHOLD = 2.0
+MIN_OBSERVATIONS_FOR_Z = 3
+# Field states kept in memory; the rest are reloaded from state.json on their next observation.
+STATE_CACHE_SIZE = 10_000
+
+
+def _parse_number(value: Any) -> float:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        match = re.search(r"-?\d+(\.\d+)?", value)
+        if match:
+            return float(match.group())
+    return math.nan
+
+
+def observation_from_analysis(hyperspectral_data: dict, visual_analysis: dict) -> Dict[str, float]:
+    """Flatten handler outputs into the numeric metrics tracked per field."""
+    return {
+        "ndvi": _parse_number(hyperspectral_data.get("ndvi")),
+        "pri": _parse_number(hyperspectral_data.get("pri")),
+        "ari": _parse_number(hyperspectral_data.get("ari")),
+        "cri": _parse_number(hyperspectral_data.get("cri")),
+        "chlorophyll": _parse_number(hyperspectral_data.get("chlorophyll_content")),
+        "water_stress": _parse_number(hyperspectral_data.get("water_stress")),
+        "disease_stress": _parse_number(hyperspectral_data.get("disease_stress_index")),
+        "severity": _parse_number(visual_analysis.get("severity_score")),
+    }
+
+
+class _MetricState:
+    """Baseline, Welford moments, rolling window and EWMA trend of one metric."""
+
+    def __init__(self, data: Optional[dict] = None):
+        data = data or {}
+        self.baseline = data.get("baseline")
+        self.count = data.get("count", 0)
+        self.mean = data.get("mean", 0.0)
+        self.m2 = data.get("m2", 0.0)
+        self.window = data.get("window", [])
+        self.window_sum = data.get("window_sum", 0.0)
+        self.last = data.get("last")
+        self.ewma = data.get("ewma")
+        self.trend = data.get("trend", 0.0)
+
+    def to_dict(self) -> dict:
+        return dict(self.__dict__)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def update(self, value: float):
+        if self.baseline is None:
+            self.baseline = value
+
+        if self.last is not None:
+            self.trend = EWMA_ALPHA * (value - self.last) + (1 - EWMA_ALPHA) * self.trend
+        self.ewma = value if self.ewma is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * self.ewma
+        self.last = value
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+        self.window.append(value)
+        self.window_sum += value
+        if len(self.window) > ROLLING_WINDOW:
+            self.window_sum -= self.window.pop(0)
+
+
+class SpectralMonitoringStore:
+    def __init__(self, root: str, cache_size: int = STATE_CACHE_SIZE):
+        self.root = root
+        self.states: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _field_dir(self, field_id: str) -> str:
+        """The field's directory: a readable prefix plus a hash of the exact id, so ids never collide or escape root."""
+        if not field_id or field_id in (".", ".."):
+            raise ValueError(f"Invalid field id: {field_id!r}")
+        readable = re.sub(r"[^A-Za-z0-9_-]", "_", field_id)[:40]
+        digest = hashlib.sha1(field_id.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.root, f"{readable}-{digest}")
+
+    def _load_state(self, field_id: str) -> Dict[str, Any]:
+        state = self.states.get(field_id)
+        if state is not None:
+            self.states.move_to_end(field_id)
+            return state
+
+        state_path = os.path.join(self._field_dir(field_id), "state.json")
+        raw = {}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                raw = json.load(f)
+        state = {
+            "observations": raw.get("observations", 0),
+            "metrics": {name: _MetricState(raw.get("metrics", {}).get(name)) for name in METRICS},
+        }
+        self.states[field_id] = state
+        while len(self.states) > self.cache_size:
+            self.states.popitem(last=False)
+        return state
+
+    def _save_state(self, field_id: str, state: Dict[str, Any]):
+        state_path = os.path.join(self._field_dir(field_id), "state.json")
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "observations": state["observations"],
+                "metrics": {name: metric.to_dict() for name, metric in state["metrics"].items()},
+            }, f)
+        os.replace(tmp_path, state_path)
+
+    def record(self, field_id: str, timestamp: float, metrics: Dict[str, float]) -> Dict[str, Any]:
+        """Append one observation and assess it against the field's baseline and recent trend."""
+        with self.lock:
+            state = self._load_state(field_id)
+            os.makedirs(self._field_dir(field_id), exist_ok=True)
+
+            record = np.zeros(1, dtype=RECORD_DTYPE)
+            record["timestamp"] = timestamp
+            for name in METRICS:
+                record[name] = metrics.get(name, math.nan)
+            with open(os.path.join(self._field_dir(field_id), "observations.bin"), "ab") as f:
+                f.write(record.tobytes())
+
+            assessment = self._assess(state, metrics)
+            for name, value in metrics.items():
+                if name in state["metrics"] and value is not None and not math.isnan(value):
+                    state["metrics"][name].update(value)
+            state["observations"] += 1
+            self._save_state(field_id, state)
+
+        assessment["field_id"] = field_id
+        assessment["observation_number"] = state["observations"]
+        return assessment
+
+    def _assess(self, state: Dict[str, Any], metrics: Dict[str, float]) -> Dict[str, Any]:
+        signals = []
+        changes = {}
+        for name, value in metrics.items():
+            metric = state["metrics"].get(name)
+            if metric is None or value is None or math.isnan(value) or metric.baseline is None:
+                continue
+
+            direction = WORSENING_DIRECTION[name]
+            baseline_change = value - metric.baseline
+            rolling_mean = metric.window_sum / len(metric.window)
+            z_score = (value - metric.mean) / metric.std if metric.std > 0 else 0.0
+            changes[name] = {
+                "value": round(value, 4),
+                "baseline": round(metric.baseline, 4),
+                "change_from_baseline": round(baseline_change, 4),
+                "rolling_mean": round(rolling_mean, 4),
+                "z_score": round(z_score, 2),
+                "trend": round(metric.trend, 4),
+            }
+
+            if direction * baseline_change > BASELINE_THRESHOLDS[name]:
+                signals.append(f"{name} worse than baseline by {abs(baseline_change):.3g}")
+            if metric.count >= MIN_OBSERVATIONS_FOR_Z and direction * z_score > Z_SCORE_THRESHOLD:
+                signals.append(f"{name} is {abs(z_score):.1f} standard deviations outside its recent range")
+            elif metric.count >= 2 and direction * (value - rolling_mean) > BASELINE_THRESHOLDS[name] \
+                    and direction * metric.trend > 0:
+                signals.append(f"{name} continues a worsening trend")
+
+        return {
+            "is_baseline": state["observations"] == 0,
+            "worsening": bool(signals),
+            "signals": signals,
+            "changes": changes,
+        }
+
+    def history(self, field_id: str, since: Optional[float] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Observations since `since`, the most recent `limit` of them; a limit below 1 returns none."""
+        path = os.path.join(self._field_dir(field_id), "observations.bin")
+        if (limit is not None and limit < 1) or not os.path.exists(path) or os.path.getsize(path) == 0:
+            return []
+
+        records = np.memmap(path, dtype=RECORD_DTYPE, mode="r")
+        if since is not None:
+            # Observations are appended in time order, so the cut-off is a binary search.
+            records = records[np.searchsorted(records["timestamp"], since):]
+        if limit is not None:
+            records = records[-limit:]
+        return [
+            {name: (None if math.isnan(float(row[name])) else round(float(row[name]), 4)) for name in RECORD_DTYPE.names}
+            for row in records
+        ]
+
+    def summary(self, field_id: str) -> Dict[str, Any]:
+        with self.lock:
+            state = self._load_state(field_id)
+            return {
+                "field_id": field_id,
+                "observations": state["observations"],
+                "metrics": {
+                    name: {
+                        "baseline": metric.baseline,
+                        "latest": metric.last,
+                        "mean": round(metric.mean, 4) if metric.count else None,
+                        "std": round(metric.std, 4) if metric.count else None,
+                        "ewma": round(metric.ewma, 4),
+                        "trend": round(metric.trend, 4),
+                    }
+                    for name, metric in state["metrics"].items() if metric.count
+                },
+            }
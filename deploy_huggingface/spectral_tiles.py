@@ -0,0 +1,240 @@
+"""Lazily rendered, disk-cached map tiles for spectral index and disease-probability layers.
+
+Tiles follow the usual XYZ pyramid: zoom `max_zoom` is native cube resolution and
+every lower zoom halves it, so a 256px tile always covers `256 * 2**(max_zoom - z)`
+source pixels. Tiles are rendered on first request and kept on disk under an LRU
+byte budget.
+"""
+import hashlib
+import io
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+from spectral import SpectralCube, compute_index, disease_probability
+
+TILE_SIZE = 256
+TILE_FORMATS = {"png": "image/png", "webp": "image/webp"}
+
+# Bump when rendering changes so clients and the disk cache drop stale tiles.
+RENDER_VERSION = "1"
+
+DISEASE_PROBABILITY_LAYER = "disease_probability"
+
+# Value range mapped onto the colour ramp for each layer.
+DISPLAY_RANGES = {
+    "ndvi": (0.0, 1.0),
+    "pri": (-0.2, 0.2),
+    "ari": (0.0, 5.0),
+    "cri": (0.0, 10.0),
+    "ci_red_edge": (0.0, 5.0),
+    "ndwi": (-0.5, 0.5),
+    DISEASE_PROBABILITY_LAYER: (0.0, 1.0),
+}
+
+# Layers where high values are bad and the ramp runs green -> red.
+INVERTED_LAYERS = {"ari", DISEASE_PROBABILITY_LAYER}
+
+
+def _build_color_ramp() -> np.ndarray:
+    """256-entry red -> yellow -> green RGBA lookup table."""
+    t = np.linspace(0.0, 1.0, 256)
+    red = np.where(t < 0.5, 215, 215 - (t - 0.5) * 2 * (215 - 26))
+    green = np.where(t < 0.5, 48 + t * 2 * (217 - 48), 217 - (t - 0.5) * 2 * (217 - 150))
+    blue = np.where(t < 0.5, 39 + t * 2 * (139 - 39), 139 - (t - 0.5) * 2 * (139 - 65))
+    alpha = np.full(256, 255)
+    return np.stack([red, green, blue, alpha], axis=-1).astype(np.uint8)
+
+
+COLOR_RAMP = _build_color_ramp()
+
+
+class TileCache:
+    """Disk-backed tile store evicting least recently used tiles beyond a byte budget."""
+
+    def __init__(self, root: str, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self._load_existing()
+
+    def _load_existing(self):
+        existing = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(".tmp"):
+                    os.remove(path)
+                    continue
+                stat = os.stat(path)
+                existing.append((stat.st_atime, os.path.relpath(path, self.root), stat.st_size))
+        for _, key, size in sorted(existing):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            self.entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+            return None
+
+    def put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = len(data)
+            self.total_bytes += len(data)
+            self._evict()
+
+    def invalidate_prefix(self, prefix: str, keep: Optional[str] = None):
+        """Drop tiles under `prefix`, except those under `keep`."""
+        with self.lock:
+            for key in [k for k in self.entries if k.startswith(prefix) and not (keep and k.startswith(keep))]:
+                self.total_bytes -= self.entries.pop(key)
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+
+    def _evict(self):
+        while self.total_bytes > self.budget_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+
+def content_version(paths: Sequence[str]) -> str:
+    """Hash of the cube files' bytes; tiles are cached under it."""
+    digest = hashlib.sha1()
+    for path in paths:
+        with open(path, "rb") as f:
+            while chunk := f.read(8 * 1024 * 1024):
+                digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+class SpectralTileRenderer:
+    """Renders XYZ tiles of one cube's index layers."""
+
+    def __init__(self, cube: SpectralCube, cube_version: str):
+        self.cube = cube
+        self.cube_version = cube_version
+        self.max_zoom = max(0, math.ceil(math.log2(max(cube.rows, cube.cols) / TILE_SIZE)))
+
+    def layers(self) -> List[str]:
+        layers = self.cube.available_indices()
+        if "ndvi" in layers:
+            layers.append(DISEASE_PROBABILITY_LAYER)
+        return layers
+
+    def tile_range(self, zoom: int) -> Tuple[int, int]:
+        """Number of tile columns and rows at `zoom`."""
+        span = TILE_SIZE * 2 ** (self.max_zoom - zoom)
+        return math.ceil(self.cube.cols / span), math.ceil(self.cube.rows / span)
+
+    def etag(self, layer: str, zoom: int, x: int, y: int, fmt: str) -> str:
+        raw = f"{self.cube_version}:{RENDER_VERSION}:{layer}:{zoom}/{x}/{y}.{fmt}"
+        return '"' + hashlib.sha1(raw.encode()).hexdigest() + '"'
+
+    def _layer_values(self, layer: str, window: np.ndarray, roles: Dict[str, Dict[str, int]]) -> np.ndarray:
+        if layer != DISEASE_PROBABILITY_LAYER:
+            return compute_index(layer, window, roles[layer])
+        ndvi = compute_index("ndvi", window, roles["ndvi"])
+        pri = compute_index("pri", window, roles["pri"]) if "pri" in roles else None
+        return disease_probability(ndvi, pri)
+
+    def render(self, layer: str, zoom: int, x: int, y: int, fmt: str = "png") -> bytes:
+        names = ["ndvi", "pri"] if layer == DISEASE_PROBABILITY_LAYER else [layer]
+        index_roles = {name: self.cube.resolve_bands(name) for name in names}
+        index_roles = {name: roles for name, roles in index_roles.items() if roles is not None}
+
+        # Read only the needed bands, striding through the memory map at lower zooms.
+        needed = sorted({band for roles in index_roles.values() for band in roles.values()})
+        position = {band: i for i, band in enumerate(needed)}
+        window_roles = {name: {role: position[band] for role, band in roles.items()}
+                        for name, roles in index_roles.items()}
+
+        step = 2 ** (self.max_zoom - zoom)
+        span = TILE_SIZE * step
+        row_start, col_start = y * span, x * span
+        window = self.cube.read_window(
+            row_start, min(self.cube.rows, row_start + span),
+            col_start, min(self.cube.cols, col_start + span),
+            bands=needed, step=step,
+        )
+        values = self._layer_values(layer, window, window_roles)
+
+        low, high = DISPLAY_RANGES.get(layer, (0.0, 1.0))
+        normalized = np.clip((values - low) / (high - low), 0.0, 1.0)
+        if layer in INVERTED_LAYERS:
+            normalized = 1.0 - normalized
+        lut_index = np.nan_to_num(normalized * 255).astype(np.uint8)
+
+        rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+        colored = COLOR_RAMP[lut_index]
+        colored[~np.isfinite(values)] = 0
+        rgba[:colored.shape[0], :colored.shape[1]] = colored
+
+        buffer = io.BytesIO()
+        Image.fromarray(rgba, "RGBA").save(buffer, format=fmt.upper())
+        return buffer.getvalue()
+
+
+class SpectralMapService:
+    """Keeps one renderer per ingested cube and serves tiles through the shared cache."""
+
+    def __init__(self, cache: TileCache):
+        self.cache = cache
+        self.renderers: Dict[str, SpectralTileRenderer] = {}
+
+    def register(self, session_id: str, cube: SpectralCube, cube_paths: Sequence[str]) -> SpectralTileRenderer:
+        """Serve `cube` for the session; tiles cached for other content of the session are dropped.
+
+        `cube_paths` are every file the cube reads (an ENVI header and its data file).
+        Re-uploading identical bytes keeps the tiles already rendered for them.
+        """
+        version = content_version(cube_paths)
+        self.cache.invalidate_prefix(session_id + os.sep, keep=os.path.join(session_id, version) + os.sep)
+        renderer = SpectralTileRenderer(cube, version)
+        self.renderers[session_id] = renderer
+        return renderer
+
+    def get_renderer(self, session_id: str) -> Optional[SpectralTileRenderer]:
+        return self.renderers.get(session_id)
+
+    def get_tile(self, session_id: str, layer: str, zoom: int, x: int, y: int, fmt: str) -> bytes:
+        renderer = self.renderers[session_id]
+        key = os.path.join(session_id, renderer.cube_version, layer, str(zoom), str(x), f"{y}.{fmt}")
+        tile = self.cache.get(key)
+        if tile is None:
+            tile = renderer.render(layer, zoom, x, y, fmt)
+            self.cache.put(key, tile)
+        return tile
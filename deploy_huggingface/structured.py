@@ -0,0 +1,276 @@
+"""Structured (JSON) output from LLM responses.
+
+Models are asked for schema-constrained JSON, but responses still arrive wrapped
+in markdown fences, followed by prose, cut off at the output-token budget or
+sprinkled with Python literals. `parse_json` scans for the first JSON value and
+repairs those cases locally; callers re-ask the model only when that fails.
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel, ValidationError
+
+FENCE_PATTERN = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+BARE_LITERALS = {"True": "true", "False": "false", "None": "null"}
+CLOSERS = {"{": "}", "[": "]"}
+# A bare word, including the combining vowel signs of Indic scripts that \w leaves out.
+WORD_PATTERN = re.compile(r"[\w\u0300-\u036F\u0900-\u0DFF]+")
+
+# Nested object schemas past this depth are dropped from the response schema (Gemini schemas can't recurse).
+MAX_SCHEMA_DEPTH = 3
+
+
+class StructuredOutputError(Exception):
+    pass
+
+
+def _find_start(text: str) -> int:
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return min(starts) if starts else -1
+
+
+def _normalize(text: str) -> str:
+    """Rewrite a JSON-ish value into JSON, stopping after the first complete value.
+
+    Handles single-quoted strings, smart quotes, Python literals, comments, trailing
+    commas and values truncated mid-way (open strings and brackets are closed).
+    """
+    text = text.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
+    out: List[str] = []
+    stack: List[str] = []
+    quote: Optional[str] = None
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < len(text):
+                nxt = text[i + 1]
+                # \' is valid inside single-quoted strings only; JSON strings take it literally.
+                out.append("'" if nxt == "'" else ch + nxt)
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote = None
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == "\n":
+                out.append("\\n")
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in "\"'":
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                return "".join(out)
+        elif ch == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = len(text) if newline < 0 else newline
+            continue
+        elif ch.isalpha():
+            match = WORD_PATTERN.match(text, i)
+            if match is None:
+                raise StructuredOutputError(f"Unexpected character {ch!r} at position {i}")
+            word = match.group(0)
+            if re.match(r"\s*:", text[i + len(word):]):
+                out.append(f'"{word}"')  # unquoted key
+            elif not word.isascii():
+                out.append(f'"{word}"')  # unquoted value in another script; no JSON literal is non-ASCII
+            else:
+                out.append(BARE_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    # Truncated value: close the open string, drop a dangling key or comma, then close brackets.
+    if quote:
+        out.append('"')
+    result = "".join(out).rstrip()
+    result = re.sub(r'(,\s*"(?:[^"\\]|\\.)*"\s*:?\s*|,\s*|:\s*)$', "", result)
+    if result.endswith(":"):
+        result = result[:-1]
+    if stack and stack[-1] == "{":
+        # A lone trailing string in an object is a key without a value.
+        result = re.sub(r'([{,])\s*"(?:[^"\\]|\\.)*"$', r"\1", result).rstrip(",")
+    return result + "".join(CLOSERS[opener] for opener in reversed(stack))
+
+
+def _drop_trailing_comma(out: List[str]):
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
+
+
+def parse_json(text: str) -> Tuple[Any, bool]:
+    """Parse the first JSON value in `text`. Returns (value, repaired) or raises StructuredOutputError."""
+    stripped = text.strip()
+    try:
+        return json.loads(stripped), False
+    except ValueError:
+        pass
+
+    fenced = FENCE_PATTERN.search(stripped)
+    candidate = fenced.group(1) if fenced else stripped
+    start = _find_start(candidate)
+    if start < 0:
+        raise StructuredOutputError("No JSON object or array in response")
+    try:
+        return json.loads(_normalize(candidate[start:])), True
+    except ValueError as e:
+        raise StructuredOutputError(f"Unrepairable JSON: {e}") from e
+
+
+class IncrementalArrayParser:
+    """Emits the objects of a streamed JSON array as soon as each one is complete.
+
+    The array is the first one opened at the top level or directly inside the top-level
+    object, e.g. the steps of `{"workflow": [...]}`, so items can be acted on before
+    the rest of the response has arrived.
+    """
+
+    def __init__(self):
+        self.chars: List[str] = []
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.array_depth: Optional[int] = None
+        self.item_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chars)
+
+    def feed(self, chunk: str) -> List[Any]:
+        items = []
+        for ch in chunk:
+            position = len(self.chars)
+            self.chars.append(ch)
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.depth += 1
+                if ch == "[" and self.array_depth is None and self.depth <= 2:
+                    self.array_depth = self.depth
+                elif ch == "{" and self.array_depth is not None and self.depth == self.array_depth + 1:
+                    self.item_start = position
+            elif ch in "}]":
+                if (ch == "}" and self.item_start is not None and self.array_depth is not None
+                        and self.depth == self.array_depth + 1):
+                    try:
+                        items.append(json.loads("".join(self.chars[self.item_start:])))
+                    except ValueError:
+                        pass
+                    self.item_start = None
+                self.depth -= 1
+        return items
+
+
+def response_schema(model: Type[BaseModel]) -> Dict[str, Any]:
+    """The OpenAPI subset Gemini and Vertex accept for `response_schema`, built from a Pydantic model."""
+    full = model.model_json_schema()
+    definitions = full.get("$defs", {})
+
+    def convert(node: Dict[str, Any], depth: int) -> Optional[Dict[str, Any]]:
+        if "$ref" in node:
+            node = definitions[node["$ref"].split("/")[-1]]
+        nullable = False
+        if "anyOf" in node:
+            options = [option for option in node["anyOf"] if option.get("type") != "null"]
+            nullable = len(options) < len(node["anyOf"])
+            if len(options) != 1:
+                return None
+            node = {**options[0], **{k: v for k, v in node.items() if k == "description"}}
+            if "$ref" in node:
+                node = definitions[node["$ref"].split("/")[-1]]
+
+        kind = node.get("type")
+        if kind not in ("object", "array", "string", "integer", "number", "boolean"):
+            return None
+        schema: Dict[str, Any] = {"type": kind}
+        if nullable:
+            schema["nullable"] = True
+        for key in ("description", "enum", "format"):
+            if key in node:
+                schema[key] = node[key]
+
+        if kind == "object":
+            if depth >= MAX_SCHEMA_DEPTH or "properties" not in node:
+                return None
+            properties = {}
+            for name, child in node["properties"].items():
+                converted = convert(child, depth + 1)
+                if converted is not None:
+                    properties[name] = converted
+            schema["properties"] = properties
+            required = [name for name in node.get("required", []) if name in properties]
+            if required:
+                schema["required"] = required
+        elif kind == "array":
+            items = convert(node.get("items", {}), depth + 1)
+            if items is None:
+                return None
+            schema["items"] = items
+        return schema
+
+    return convert(full, 0)
+
+
+def compact_schema(model: Type[BaseModel]) -> str:
+    """A one-line schema description for repair prompts."""
+    return json.dumps(response_schema(model), separators=(",", ":"))
+
+
+def validate(model: Type[BaseModel], value: Any) -> BaseModel:
+    try:
+        return model.model_validate(value)
+    except ValidationError as e:
+        raise StructuredOutputError(f"Response does not match {model.__name__}: {e.error_count()} errors") from e
+
+
+class StructuredOutputStats:
+    """Per-schema counts of how responses were turned into validated objects."""
+
+    def __init__(self):
+        self.by_schema: Dict[str, Dict[str, int]] = {}
+
+    def record(self, schema: str, outcome: str):
+        counts = self.by_schema.setdefault(schema, {"clean": 0, "repaired": 0, "reasked": 0, "failed": 0})
+        counts[outcome] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        result = {}
+        for schema, counts in self.by_schema.items():
+            total = sum(counts.values())
+            result[schema] = {
+                **counts,
+                "total": total,
+                # Responses that did not parse and validate as returned by the model.
+                "parse_failure_rate": round((total - counts["clean"]) / total, 4) if total else 0.0,
+                "failure_rate": round(counts["failed"] / total, 4) if total else 0.0,
+            }
+        return result
@@ -0,0 +1,29 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app_module(tmp_path_factory):
+    """The FastAPI app, imported once with its data stores under a temporary directory."""
+    os.environ["KISAN_DATA_DIR"] = str(tmp_path_factory.mktemp("data"))
+    return importlib.import_module("app")
+
+
+@pytest.fixture(scope="session")
+def _test_client(app_module):
+    from fastapi.testclient import TestClient
+
+    with TestClient(app_module.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def client(_test_client, request):
+    """The shared test client, with a rate-limit bucket of its own for each test."""
+    _test_client.headers["X-Forwarded-For"] = f"test:{request.node.nodeid}"
+    return _test_client
@@ -0,0 +1,60 @@
+from admission import client_key
+
+
+def test_client_key_reads_address_added_by_trusted_proxy():
+    # The client forged the first entry; the proxy appended the real address.
+    assert client_key("1.2.3.4, 203.0.113.9", "10.0.0.1") == "ip:203.0.113.9"
+    assert client_key("1.2.3.4, 203.0.113.9, 10.0.0.7", "10.0.0.1", trusted_proxies=2) == "ip:203.0.113.9"
+
+
+def test_client_key_without_proxy_uses_peer():
+    assert client_key("1.2.3.4", "10.0.0.1", trusted_proxies=0) == "ip:10.0.0.1"
+    assert client_key(None, "10.0.0.1") == "ip:10.0.0.1"
+
+
+def test_rotating_user_header_does_not_escape_the_limit(app_module, client):
+    burst = int(app_module.RATE_LIMIT_USER_BURST)
+    statuses = [
+        client.get("/api/dashboard/pages",
+                   headers={"X-Forwarded-For": "198.51.100.4", "X-User-Id": f"user-{attempt}"}).status_code
+        for attempt in range(burst + 1)
+    ]
+    assert statuses[-1] == 429
+
+
+def test_users_behind_one_proxy_get_separate_buckets(app_module, client):
+    burst = int(app_module.RATE_LIMIT_USER_BURST)
+    for attempt in range(burst):
+        assert client.get("/api/dashboard/pages", headers={"X-Forwarded-For": "198.51.100.1"}).status_code == 200
+    limited = client.get("/api/dashboard/pages", headers={"X-Forwarded-For": "198.51.100.1"})
+    assert limited.status_code == 429
+    assert "Retry-After" in limited.headers
+    assert client.get("/api/dashboard/pages", headers={"X-Forwarded-For": "198.51.100.2"}).status_code == 200
+
+
+def test_map_tiles_do_not_spend_rate_tokens(app_module, client):
+    burst = int(app_module.RATE_LIMIT_USER_BURST)
+    for attempt in range(burst + 5):
+        response = client.get("/api/spectral-maps/no-such-session", headers={"X-Forwarded-For": "198.51.100.3"})
+        assert response.status_code == 404
+
+
+def test_voice_command_is_rate_limited_before_transcription(app_module, client, monkeypatch):
+    transcriptions = []
+
+    async def transcribe(audio_file, language):
+        transcriptions.append(language)
+        return ""
+
+    monkeypatch.setattr(app_module, "process_audio_with_gcp", transcribe)
+    session_id = "voice-rate-test"
+    burst = int(app_module.RATE_LIMIT_SESSION_BURST)
+    statuses = [
+        client.post("/api/agent/voice-command", data={"session_id": session_id},
+                    files={"audio_file": ("a.wav", b"RIFF", "audio/wav")},
+                    headers={"X-User-Id": f"voice-{attempt}"}).status_code
+        for attempt in range(burst + 3)
+    ]
+    assert statuses[:burst] == [400] * burst
+    assert statuses[burst:] == [429] * 3
+    assert len(transcriptions) == burst
@@ -0,0 +1,70 @@
+import time
+
+import numpy as np
+
+from alerts import AlertEngine, AlertHub
+from sensor_store import METRICS
+
+MOISTURE = METRICS.index("soil_moisture")
+
+
+def moisture(values):
+    rows = np.full((len(values), len(METRICS)), np.nan)
+    rows[:, MOISTURE] = values
+    return rows
+
+
+def test_threshold_fires_once_on_entering_violation():
+    engine = AlertEngine()
+    now = time.time()
+    alerts = engine.observe("sensor", [("f1", "s1", now + np.arange(4), moisture([30, 10, 9, 8]))])
+    assert [alert["rule_id"] for alert in alerts] == ["soil_moisture_low"]
+    assert alerts[0]["value"] == 10
+
+
+def test_impossible_timestamp_is_skipped_without_losing_the_batch():
+    engine = AlertEngine()
+    now = time.time()
+    alerts = engine.observe("sensor", [("f1", "s1", np.array([now * 1e6, now]), moisture([5, 10]))])
+    assert [(alert["rule_id"], alert["value"]) for alert in alerts] == [("soil_moisture_low", 10)]
+    assert engine.metrics()["rejected"] == 1
+
+
+def test_cooldown_and_field_rate_limit():
+    clock = [1000.0]
+    engine = AlertEngine(cooldown_seconds=600, burst=2, per_hour=1, clock=lambda: clock[0])
+    now = time.time()
+
+    def dip(source, offset):
+        return engine.observe("sensor", [("f1", source, now + offset + np.arange(2), moisture([30, 10]))])
+
+    assert len(dip("s1", 0)) == 1
+    assert dip("s2", 10) == []  # same field and rule within the cooldown
+    clock[0] += 601
+    assert len(dip("s3", 20)) == 1
+    clock[0] += 601
+    # Two alerts used the burst; 20 minutes at one per hour hasn't refilled a token.
+    assert dip("s4", 30) == []
+    assert engine.stats["deduplicated"] == 1 and engine.stats["rate_limited"] == 1
+
+
+def test_hub_delivers_to_sessions_naming_the_field_only():
+    sessions = {"a": {"field_id": "f1"}, "b": {"user_id": "f1"}}
+    hub = AlertHub(sessions)
+    hub.publish([{"field_id": "f1", "rule_id": "frost_risk"}])
+    assert len(sessions["a"]["notifications"]) == 1
+    assert "notifications" not in sessions["b"]
+    assert hub.history("f1")[0]["rule_id"] == "frost_risk"
+
+
+def test_sensor_post_with_a_bad_timestamp_stores_the_rest_and_alerts(client):
+    now = time.time()
+    response = client.post("/api/crop-monitor/readings", json={
+        "field_id": "alerts-post", "sensor_id": "s1", "timestamps": [now * 1e6, now - 1, now],
+        "soil_moisture": [5, 30, 10],
+    })
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["accepted"], body["rejected"]) == (2, 1)
+    assert [alert["rule_id"] for alert in body["alerts"]] == ["soil_moisture_low"]
+    assert client.get("/api/crop-monitor/status", params={"field_id": "alerts-post"}).status_code == 200
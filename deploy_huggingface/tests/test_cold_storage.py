@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from cold_storage import ColdStorageStore, parse_choice, temperature_class
+
+FACILITY = {
+    "id": "cs-agra-1", "name": "Agra Cold Storage", "district": "Agra", "state": "Uttar Pradesh",
+    "latitude": 27.18, "longitude": 78.01,
+    "chambers": [{"id": "A", "temperature_class": "cold", "capacity_quintals": 100, "rate_per_quintal_day": 1.5}],
+}
+
+
+@pytest.mark.parametrize("crop, storage_class", [
+    ("pineapple", "cold"),
+    ("pearl millet", "cold"),
+    ("apples", "controlled_atmosphere"),
+    ("potatoes", "cold"),
+    ("tomatoes", "cool"),
+    ("ice cream", "frozen"),
+])
+def test_temperature_class_matches_whole_words(crop, storage_class):
+    assert temperature_class(crop) == storage_class
+
+
+@pytest.mark.parametrize("reply, choice", [
+    ("yes", 0), ("book option 2", 1), ("second one", 1), ("haan", 0),
+    ("no thanks", None), ("don't book", None), ("7", None), ("what is the rate?", None),
+])
+def test_parse_choice(reply, choice):
+    assert parse_choice(reply, 3) == choice
+
+
+def test_cancel_after_chamber_removed(tmp_path):
+    db_path = str(tmp_path / "cold.db")
+    store = ColdStorageStore([FACILITY], db_path)
+    booking = store.book("cs-agra-1", "A", "potato", 10, 7, user_id="farmer-1")
+    store.close()
+
+    store = ColdStorageStore([{**FACILITY, "chambers": []}], db_path)
+    assert store.cancel(booking["booking_id"]) is True
+    assert store.get(booking["booking_id"])["status"] == "cancelled"
+    assert store.cancel(booking["booking_id"]) is False
+
+
+def offer(app_module, session_id, user_id):
+    app_module.agent_state.sessions[session_id] = {"session_id": session_id, "user_id": user_id, "history": []}
+    options = app_module.cold_storage.find_available("potato", 5, 7, state="Uttar Pradesh")
+    assert options
+    asyncio.run(app_module.smart_agent.offer_cold_storage(session_id, "potato", 5, 7, app_module.storage_day(None), options))
+    return options
+
+
+def test_offer_books_only_after_confirmation(app_module):
+    options = offer(app_module, "cold-confirm", "farmer-cold")
+    assert app_module.cold_storage.bookings("farmer-cold") == []
+
+    result = asyncio.run(app_module.smart_agent.confirm_cold_storage_booking("cold-confirm", "book option 2"))
+    assert result["status"] == "completed"
+    [booking] = app_module.cold_storage.bookings("farmer-cold")
+    assert (booking["facility_id"], booking["chamber_id"]) == (options[1]["facility_id"], options[1]["chamber_id"])
+    assert "pending_cold_storage" not in app_module.agent_state.sessions["cold-confirm"]
+
+
+def test_declined_or_anonymous_offer_books_nothing(app_module):
+    offer(app_module, "cold-decline", "farmer-decline")
+    result = asyncio.run(app_module.smart_agent.confirm_cold_storage_booking("cold-decline", "no, just asking"))
+    assert result["status"] == "cancelled"
+    assert app_module.cold_storage.bookings("farmer-decline") == []
+
+    offer(app_module, "cold-anonymous", None)
+    result = asyncio.run(app_module.smart_agent.confirm_cold_storage_booking("cold-anonymous", "yes"))
+    assert result["status"] == "awaiting_info"
+    assert not any(action["action"] == "cold_storage_booking" for action in result["actions"])
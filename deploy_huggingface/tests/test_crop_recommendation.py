@@ -0,0 +1,27 @@
+import os
+
+import pytest
+
+from crop_recommendation import CropRecommender
+
+KNOWLEDGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge")
+
+
+@pytest.fixture(scope="module")
+def recommender():
+    return CropRecommender.load(os.path.join(KNOWLEDGE, "crops.json"), os.path.join(KNOWLEDGE, "districts.json"))
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("black cotton soil in Nashik during monsoon", {"district": "Nashik", "soil": "black", "season": "kharif"}),
+    ("arid land, rainfed", {"soil": "sandy", "irrigated": False}),
+    ("मेरी जलोढ़ मिट्टी है, खरीफ में क्या बोऊँ", {"soil": "alluvial", "season": "kharif"}),
+])
+def test_plot_fields_are_read_from_text(recommender, text, expected):
+    assert recommender.parse_query(text) == expected
+
+
+@pytest.mark.parametrize("text", ["wheat in Faridabad", "my summertime plans", "a redder loamier field"])
+def test_aliases_only_match_whole_words(recommender, text):
+    plot = recommender.parse_query(text)
+    assert "soil" not in plot and "season" not in plot
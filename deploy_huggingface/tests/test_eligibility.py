@@ -0,0 +1,30 @@
+import math
+
+from eligibility import FarmerTable
+
+HEADER = "member_id,state,land_hectares,annual_income,crops\n"
+
+
+def test_from_csv_skips_blank_rows():
+    table = FarmerTable.from_csv(HEADER + "m1,Punjab,2,90000,wheat\n\n,,,,\nm2,Bihar,1,50000,rice\n")
+    assert table.ids == ["m1", "m2"]
+
+
+def test_from_csv_pads_short_rows():
+    table = FarmerTable.from_csv(HEADER + "m1,Punjab,2,90000,wheat\nm2,Bihar\n")
+    assert table.ids == ["m1", "m2"]
+    land = table.numeric["land_hectares"]
+    assert land[0] == 2 and math.isnan(land[1])
+    assert not math.isnan(table.numeric["annual_income"][0])
+
+
+def test_upload_that_is_not_utf8_is_rejected(client):
+    response = client.post("/api/schemes/eligibility/batch",
+                           files={"file": ("members.csv", HEADER.encode() + "m1,Pañjab\n".encode("latin-1"), "text/csv")})
+    assert response.status_code == 400
+    response = client.post("/api/crops/recommend/batch",
+                           files={"file": ("plots.csv", b"plot_id,soil\n1,\xff\xfe\n", "text/csv")})
+    assert response.status_code == 400
+    response = client.post("/api/marketplace/catalog/import", data={"seller_id": "s1"},
+                           files={"file": ("catalog.csv", b"title,price\n\xffpot,10\n", "text/csv")})
+    assert response.status_code == 400
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from community import TermIndex
+from marketplace import ProductCatalog
+
+HERE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    terms = TermIndex.load(os.path.join(HERE, "knowledge", "crops.json"),
+                           os.path.join(HERE, "knowledge", "crop_health_terms.json"))
+    catalog = ProductCatalog(str(tmp_path / "catalog.db"), terms)
+    catalog.import_products([
+        {"sku": "1", "title": "Fresh potato", "category": "vegetables", "price": 20, "state": "Uttar Pradesh",
+         "district": "Agra"},
+        {"sku": "2", "title": "Red onion", "category": "vegetables", "price": 30, "state": "Maharashtra",
+         "district": "Nashik"},
+        {"sku": "3", "title": "Desi tomato", "category": "vegetables", "price": 25, "state": "Maharashtra",
+         "district": "Nashik"},
+        {"sku": "4", "title": "Hybrid tomatoes", "category": "vegetables", "price": 22, "state": "maharashtra",
+         "district": "Pune"},
+    ], seller_id="seller-1")
+    return catalog
+
+
+def titles(result):
+    return [product["title"] for product in result["products"]]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("get me potatoes", {"Fresh potato"}),
+    ("aloo chahiye", {"Fresh potato"}),
+    ("looking for onions or tomatoes", {"Red onion", "Desi tomato", "Hybrid tomatoes"}),
+    ("मुझे टमाटर चाहिए", {"Desi tomato", "Hybrid tomatoes"}),
+])
+def test_everyday_queries_find_listings(catalog, query, expected):
+    assert set(titles(catalog.search(query))) == expected
+
+
+def test_place_names_rank_without_excluding(catalog):
+    result = catalog.search("tomatoes from Nashik")
+    assert titles(result) == ["Desi tomato", "Hybrid tomatoes"]
+
+
+def test_state_facet_ignores_case(catalog):
+    lower = catalog.search("", {"state": ["maharashtra"]})
+    upper = catalog.search("", {"state": ["Maharashtra"]})
+    assert lower["total"] == upper["total"] == 3
+    assert {"value": "Maharashtra", "count": 3} in upper["facets"]["state"]
+
+
+@pytest.mark.parametrize("price", ["inf", "nan", "1e400"])
+def test_non_finite_prices_are_rejected(catalog, price):
+    with pytest.raises(ValueError):
+        catalog.upsert({"title": "Onion", "category": "vegetables", "price": price}, seller_id="seller-1")
+    with pytest.raises(ValueError):
+        catalog.search("onion", max_price=float(price))
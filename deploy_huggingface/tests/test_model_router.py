@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from admission import OverloadedError
+from model_router import FLASH, FLASH_LITE, ModelRouter
+from resilience import CircuitOpenError, DeadlineExceededError
+
+LITE, MAIN = ("gemini", FLASH_LITE), ("gemini", FLASH)
+
+
+def router():
+    return ModelRouter(lambda: ["gemini"])
+
+
+def run(router, invoke, task_class="classify"):
+    return asyncio.run(router.call(task_class, invoke))
+
+
+@pytest.mark.parametrize("error", [OverloadedError("shed", retry_after=1.0), DeadlineExceededError()])
+def test_local_overload_is_not_held_against_routes(error):
+    model_router = router()
+    tried = []
+
+    async def invoke(backend, model):
+        tried.append(model)
+        raise error
+
+    for attempt in range(10):
+        with pytest.raises(type(error)):
+            run(model_router, invoke)
+    assert tried == [FLASH_LITE] * 10
+    assert model_router.stats[LITE].errors == 0
+    assert model_router.candidates("classify")[0] == LITE
+
+
+def test_open_circuit_fails_over_without_recording_an_error():
+    model_router = router()
+
+    async def invoke(backend, model):
+        if model == FLASH_LITE:
+            raise CircuitOpenError(f"{backend}/{model}", retry_after=5.0)
+        return model
+
+    assert run(model_router, invoke) == FLASH
+    assert model_router.stats[LITE].errors == 0
+
+
+def test_upstream_failures_fail_over_and_count():
+    model_router = router()
+
+    async def invoke(backend, model):
+        if model == FLASH_LITE:
+            raise RuntimeError("500 from upstream")
+        return model
+
+    for attempt in range(5):
+        assert run(model_router, invoke) == FLASH
+    assert model_router.stats[LITE].errors == 5
+    assert model_router.candidates("classify")[0] == MAIN
+
+
+def test_slow_route_is_hedged():
+    model_router = router()
+    for attempt in range(5):
+        model_router.record("classify", LITE, 0.01, success=True)
+
+    async def invoke(backend, model):
+        await asyncio.sleep(1.0 if model == FLASH_LITE else 0.0)
+        return model
+
+    assert run(model_router, invoke) == FLASH
+    assert (model_router.hedges_launched, model_router.hedges_won) == (1, 1)
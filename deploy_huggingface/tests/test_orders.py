@@ -0,0 +1,46 @@
+import pytest
+
+from community import encode_cursor
+from orders import MAX_QUANTITY, OrderStore, price_items
+
+PRODUCT = {"seller_id": "seller-1", "title": "Red onion", "unit": "kg", "price": 30.0, "stock": None}
+
+
+def lookup(product_id):
+    return PRODUCT if product_id == "onion" else None
+
+
+@pytest.mark.parametrize("quantity", ["inf", "nan", "1e400", 0, -1, MAX_QUANTITY + 1])
+def test_unbounded_quantities_are_rejected(quantity):
+    with pytest.raises(ValueError):
+        price_items([{"product_id": "onion", "quantity": quantity}], lookup)
+
+
+def test_quantity_is_priced():
+    [line] = price_items([{"product_id": "onion", "quantity": "2.5"}], lookup)
+    assert line["amount"] == 75.0
+
+
+def test_history_pages_with_its_own_cursor(tmp_path):
+    store = OrderStore(str(tmp_path / "orders.db"))
+    for created_at in (1.0, 2.0, 3.0):
+        store.create("u1", [{"product_id": "onion", "quantity": 1}], lookup, created_at=created_at)
+    first = store.history("u1", limit=2)
+    rest = store.history("u1", cursor=first["next_cursor"], limit=2)
+    assert [order["created_at"] for order in first["orders"] + rest["orders"]] == [
+        "1970-01-01T00:00:03", "1970-01-01T00:00:02", "1970-01-01T00:00:01"]
+    assert rest["next_cursor"] is None
+
+
+@pytest.mark.parametrize("path, cursor", [
+    ("/api/orders/u1", encode_cursor("orders", 1.0)),
+    ("/api/orders/u1", encode_cursor("orders", 1.0, "a", "b")),
+    ("/api/orders/u1", encode_cursor("orders", [1.0], "a")),
+    ("/api/community/posts", encode_cursor("hot", 1.0)),
+    ("/api/community/posts", encode_cursor("new", {"id": 1})),
+    ("/api/community/search?q=wheat", encode_cursor("relevance", 1.0, 2, 3)),
+    ("/api/marketplace/products", encode_cursor("relevance", "high", 1)),
+])
+def test_malformed_cursors_are_bad_requests(client, path, cursor):
+    separator = "&" if "?" in path else "?"
+    assert client.get(f"{path}{separator}cursor={cursor}").status_code == 400
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import date, timedelta
+
+import pytest
+
+from mandi_prices import MandiPriceStore
+from price_forecast import ForecastSnapshot, PriceForecaster
+
+LAST_DAY = date(2024, 6, 30)
+
+
+def price_rows(market, first_day, last_day, price):
+    rows = []
+    day = first_day
+    while day <= last_day:
+        rows.append(f"Onion,Red,Maharashtra,Nashik,{market},{day.isoformat()},{price},{price},{price},10")
+        day += timedelta(days=1)
+    return rows
+
+
+def test_markets_that_stopped_reporting_are_not_forecast(tmp_path):
+    store = MandiPriceStore(str(tmp_path))
+    rows = ["Commodity,Variety,State,District,Market,Arrival_Date,Min_Price,Max_Price,Modal_Price,Arrivals"]
+    rows += price_rows("Lasalgaon", LAST_DAY - timedelta(days=120), LAST_DAY, 1500)
+    # Stopped reporting 240 days before the latest data at a much higher price.
+    rows += price_rows("Pimpalgaon", LAST_DAY - timedelta(days=360), LAST_DAY - timedelta(days=240), 4000)
+    store.ingest_csv("\n".join(rows) + "\n")
+
+    snapshot = ForecastSnapshot(store)
+    forecast = snapshot.lookup("onion")
+    assert forecast["markets"] == 1
+    assert forecast["current_price"] == 1500
+    assert forecast["best_market"]["market"] == "Lasalgaon"
+    assert snapshot.metrics()["stale_series"] == 1
+
+
+def test_summary_rejects_unrecognized_as_of(tmp_path):
+    store = MandiPriceStore(str(tmp_path))
+    rows = ["Commodity,Variety,State,District,Market,Arrival_Date,Min_Price,Max_Price,Modal_Price,Arrivals"]
+    rows += price_rows("Lasalgaon", LAST_DAY - timedelta(days=30), LAST_DAY, 1500)
+    store.ingest_csv("\n".join(rows) + "\n")
+
+    assert store.summary("onion", as_of=LAST_DAY.isoformat())["markets_reporting"] == 1
+    with pytest.raises(ValueError):
+        store.summary("onion", as_of="last tuesday")
+
+
+def test_readers_keep_the_index_they_started_with(tmp_path):
+    store = MandiPriceStore(str(tmp_path))
+    header = "Commodity,Variety,State,District,Market,Arrival_Date,Min_Price,Max_Price,Modal_Price,Arrivals"
+    store.ingest_csv("\n".join([header] + price_rows("Lasalgaon", LAST_DAY - timedelta(days=60), LAST_DAY, 1500)) + "\n")
+    index = store.index
+    # A commodity sorting first renumbers every existing series.
+    store.ingest_csv("\n".join([header] + [row.replace("Onion", "Garlic") for row in
+                                           price_rows("Mandsaur", LAST_DAY - timedelta(days=60), LAST_DAY, 9000)]) + "\n")
+    assert store.index is not index
+    name, first, last = index.commodities["onion"]
+    assert set(index.records[index.offsets[first]:index.offsets[last]]["modal_price"]) == {1500}
+    assert store.summary("onion")["current"]["modal_price_median"] == 1500
+
+
+def test_corrected_prices_for_the_same_days_refit_the_forecast(tmp_path):
+    store = MandiPriceStore(str(tmp_path))
+    header = "Commodity,Variety,State,District,Market,Arrival_Date,Min_Price,Max_Price,Modal_Price,Arrivals"
+    first_day = LAST_DAY - timedelta(days=120)
+    store.ingest_csv("\n".join([header] + price_rows("Lasalgaon", first_day, LAST_DAY, 1500)) + "\n")
+    forecaster = PriceForecaster(store)
+
+    async def correct_and_wait():
+        forecaster.start()
+        while forecaster.snapshot is None:
+            await asyncio.sleep(0.01)
+        # Same rows, corrected prices: the row count doesn't change.
+        store.ingest_csv("\n".join([header] + price_rows("Lasalgaon", first_day, LAST_DAY, 3000)) + "\n")
+        assert forecaster.stale()
+        forecaster.request_refresh()
+        while forecaster.stale():
+            await asyncio.sleep(0.01)
+        await forecaster.stop()
+
+    asyncio.run(asyncio.wait_for(correct_and_wait(), timeout=10))
+    assert forecaster.lookup("onion")["current_price"] == 3000
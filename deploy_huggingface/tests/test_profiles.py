@@ -0,0 +1,41 @@
+import asyncio
+
+from profiles import ProfileStore
+
+
+def test_callers_cannot_change_the_cached_profile(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    store.update("u1", {"crops": ["wheat"], "state": "Punjab"})
+
+    store.get("u1")["crops"].append("rice")
+    store.update("u1", {})["crops"].append("maize")
+    assert store.get("u1")["crops"] == ["wheat"]
+    assert "rice" not in store.context("u1")
+
+
+def test_unparseable_values_keep_the_stored_ones(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    store.update("u1", {"land_hectares": 2.5, "state": "Punjab"})
+
+    profile = store.update("u1", {"land_hectares": "about a few", "state": "Punjab"})
+    assert profile["land_hectares"] == 2.5
+
+    profile = store.update("u1", {"land_hectares": None})
+    assert profile["land_hectares"] is None
+
+
+def test_appended_crops_merge_with_the_stored_ones(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    store.update("u1", {"crops": ["wheat", "rice"]})
+
+    assert store.update("u1", {"crops": ["maize", "wheat"]}, append_crops=True)["crops"] == ["wheat", "rice", "maize"]
+    assert store.update("u1", {"crops": ["mustard"]})["crops"] == ["mustard"]
+
+
+def test_agent_adds_crops_the_farmer_also_grows(app_module):
+    app_module.agent_state.sessions["profile-also"] = {"session_id": "profile-also", "user_id": "farmer-also"}
+    app_module.profile_store.update("farmer-also", {"crops": ["wheat"]})
+
+    asyncio.run(app_module.smart_agent.handle_profile("profile-also", "I also grow maize"))
+    profile = asyncio.run(app_module.smart_agent.farmer_profile("profile-also"))
+    assert profile["crops"] == ["wheat", "maize"]
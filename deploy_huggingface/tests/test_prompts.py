@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from model_router import FLASH, FLASH_LITE, PRO
+from prompts import GENERATION_PROFILES, MIN_CACHE_TOKENS, ContextCache, generation_config
+
+
+@pytest.mark.parametrize("model_name", [FLASH, PRO])
+def test_thinking_models_keep_the_answer_budget(model_name):
+    for profile, settings in GENERATION_PROFILES.items():
+        config = generation_config(profile, model_name)
+        # Room for the default thinking budget on top of the visible answer.
+        assert config["max_output_tokens"] >= settings["max_output_tokens"] + 1024
+    assert generation_config("classify", FLASH_LITE)["max_output_tokens"] == 16
+
+
+def test_each_route_gets_its_own_config(app_module, monkeypatch):
+    seen = {}
+
+    def generate_sync(prompt, model_name, backend, timeout, system_instruction, cached_content, config):
+        seen[model_name] = config
+        if model_name == FLASH_LITE:
+            raise RuntimeError("500 from upstream")
+        return "yes", None
+
+    monkeypatch.setattr(app_module, "_generate_text_sync", generate_sync)
+    monkeypatch.setattr(app_module.model_router, "candidates", lambda task_class: [("gemini", FLASH_LITE),
+                                                                                   ("gemini", FLASH)])
+    assert asyncio.run(app_module.generate_text("is this a pest question?", "classify")) == "yes"
+    assert seen[FLASH_LITE]["max_output_tokens"] == 16
+    assert seen[FLASH]["max_output_tokens"] == 16 + 1024
+    assert seen[FLASH]["stop_sequences"] == ["\n"]
+
+
+def test_context_cache_engages_once_the_prefix_carries_the_catalog(app_module):
+    created = []
+
+    async def create(backend, model_name, prefix, ttl_seconds):
+        created.append((model_name, prefix))
+        return f"cache-{len(created)}"
+
+    cache = ContextCache(create)
+    schemes = app_module.PROMPTS.render("gov_schemes", query="kisan credit card")
+    instructions_only = app_module.PROMPTS.render("market_fallback", query="onion price")
+
+    async def lookups():
+        return [await cache.get("gemini", FLASH, schemes), await cache.get("gemini", FLASH, schemes),
+                await cache.get("gemini", FLASH, instructions_only)]
+
+    assert asyncio.run(lookups()) == ["cache-1", "cache-1", None]
+    [(model_name, prefix)] = created
+    assert model_name == FLASH and "Pradhan Mantri Kisan Samman Nidhi" in prefix
+    assert instructions_only.template.prefix_tokens < MIN_CACHE_TOKENS[FLASH] <= schemes.template.prefix_tokens
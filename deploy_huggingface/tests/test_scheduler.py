@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import pytest
+
+from scheduler import Notifier, ReminderScheduler, SessionNotifier
+
+
+def status_of(scheduler, reminder_id):
+    return scheduler.conn.execute("SELECT status FROM reminders WHERE id = ?", (reminder_id,)).fetchone()[0]
+
+
+def test_notifier_is_abstract():
+    with pytest.raises(TypeError):
+        Notifier()
+
+
+def test_reminder_without_session_waits_for_next_session(tmp_path):
+    sessions = {}
+    scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), SessionNotifier(sessions))
+    reminder_id = scheduler.schedule("followup", "Check the field", time.time() - 1, user_id="u1", session_id="gone")
+
+    asyncio.run(scheduler._dispatch([reminder_id], time.time()))
+    assert status_of(scheduler, reminder_id) == "undelivered"
+
+    sessions["s2"] = {"session_id": "s2", "user_id": "u1"}
+    assert scheduler.redeliver("u1", "s2") == 1
+    asyncio.run(scheduler._dispatch(scheduler._pop_due_batch(time.time() + 1), time.time()))
+    assert status_of(scheduler, reminder_id) == "fired"
+    assert [n["reminder_id"] for n in sessions["s2"]["notifications"]] == [reminder_id]
+    scheduler.conn.close()
+
+
+def test_reminder_cancelled_during_dispatch_stays_cancelled(tmp_path):
+    class CancellingNotifier(Notifier):
+        async def notify(self, reminders):
+            for reminder in reminders:
+                scheduler.cancel(reminder["id"])
+            return []
+
+    scheduler = ReminderScheduler(str(tmp_path / "reminders.db"), CancellingNotifier())
+    reminder_id = scheduler.schedule("followup", "Spray", time.time() - 1, user_id="u1", session_id="s1")
+    asyncio.run(scheduler._dispatch([reminder_id], time.time()))
+    assert status_of(scheduler, reminder_id) == "cancelled"
+    scheduler.conn.close()
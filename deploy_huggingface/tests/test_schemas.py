@@ -0,0 +1,22 @@
+import pytest
+from pydantic import ValidationError
+
+from schemas import Workflow, WorkflowStep
+from structured import parse_json
+
+
+def test_truncated_final_step_is_dropped():
+    value, repaired = parse_json('{"workflow": [{"action": "navigate", "target": "/market"}, {"action": "spe')
+    assert repaired
+    workflow = Workflow.model_validate(value)
+    assert [step.action for step in workflow.workflow] == ["navigate"]
+
+
+def test_truncated_nested_step_is_dropped():
+    workflow = Workflow.model_validate([{"action": "loop", "count": 2, "steps": [{"action": "speak"}, {"action": "cli"}]}])
+    assert [step.action for step in workflow.workflow[0].steps] == ["speak"]
+
+
+def test_unknown_action_is_rejected_step_by_step():
+    with pytest.raises(ValidationError):
+        WorkflowStep.model_validate({"action": "spe"})
@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+from sensor_store import METRICS, SensorStore
+
+
+def readings(field_id, sensor_id, timestamps, moisture):
+    values = np.full((len(timestamps), len(METRICS)), np.nan, dtype=np.float32)
+    values[:, METRICS.index("soil_moisture")] = moisture
+    return [(field_id, sensor_id, np.asarray(timestamps, dtype=np.float64), values)]
+
+
+def test_history_after_restart_uses_rollups_until_the_ring_covers_the_range(tmp_path):
+    now = time.time() // 60 * 60
+    before = SensorStore(str(tmp_path))
+    before.ingest(readings("f1", "s1", now - 7200 + np.arange(0, 7200, 60), 30.0))
+    before.flush()
+
+    after = SensorStore(str(tmp_path))
+    after.ingest(readings("f1", "s1", now + np.arange(5) * 10, 31.0))
+    history = after.history("f1", "soil_moisture", now - 7200, now + 60)
+    assert history["level"] == "1m"
+    assert len(history["points"]) == 121
+
+    # Ranges that start after the restart are fully held by the ring.
+    recent = after.history("f1", "soil_moisture", time.time(), now + 3600)
+    assert recent["level"] == "raw"
+
+
+def test_new_series_serves_short_ranges_from_the_ring(tmp_path):
+    store = SensorStore(str(tmp_path), raw_points=16)
+    now = time.time()
+    store.ingest(readings("f1", "s1", now + np.arange(10) * 10, 20.0))
+    assert store.history("f1", "soil_moisture", now - 3600, now + 3600)["level"] == "raw"
+
+    # After the ring wraps, a range reaching past its oldest reading falls back to rollups.
+    store.ingest(readings("f1", "s1", now + 100 + np.arange(20) * 10, 20.0))
+    assert store.history("f1", "soil_moisture", now - 3600, now + 3600)["level"] != "raw"
+
+
+def test_readings_with_impossible_timestamps_are_rejected(tmp_path):
+    store = SensorStore(str(tmp_path))
+    now = time.time()
+    result = store.ingest(readings("f1", "s1", [now, now * 1e6, 12.0, np.inf, now + 2 * 86400], 25.0))
+    assert result == {"accepted": 1, "rejected": 4}
+
+    status = store.status("f1")
+    assert status["current"] == {"soil_moisture": 25.0}
+    assert store.fields_summary()[0]["last_seen"] == status["last_seen"]
@@ -0,0 +1,29 @@
+import numpy as np
+
+from spectral import SpectralCube, compute_field_statistics, hyperspectral_data_from_statistics, parse_measurement
+
+WAVELENGTHS = [450.0, 550.0, 670.0, 720.0, 800.0]
+
+
+def cube_of(reflectance):
+    data = np.tile(np.asarray(reflectance, dtype=np.float32), (8, 8, 1))
+    return SpectralCube(data, WAVELENGTHS)
+
+
+def test_bare_soil_reports_no_estimates():
+    # Red and NIR nearly equal: NDVI ~0.05, below the vegetation threshold everywhere.
+    stats = compute_field_statistics(cube_of([0.20, 0.22, 0.25, 0.26, 0.28]))
+    assert stats["vegetation_pixels"] == 0
+
+    data = hyperspectral_data_from_statistics(stats)
+    assert data["ndvi"] is None
+    assert data["chlorophyll_content"] == "Not measured"
+    assert parse_measurement(data["water_stress"]) is None
+
+
+def test_vegetated_field_reports_estimates():
+    stats = compute_field_statistics(cube_of([0.04, 0.08, 0.04, 0.20, 0.50]))
+    data = hyperspectral_data_from_statistics(stats)
+    assert data["ndvi"] > 0.8
+    assert parse_measurement(data["chlorophyll_content"]) > 0
+    assert parse_measurement(data["water_stress"]) is not None
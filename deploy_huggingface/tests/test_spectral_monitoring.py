@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from spectral_monitoring import SpectralMonitoringStore
+
+
+def test_field_ids_stay_inside_root_and_never_collide(tmp_path):
+    store = SpectralMonitoringStore(str(tmp_path / "monitoring"))
+    for field_id in ("..", ".", ""):
+        with pytest.raises(ValueError):
+            store.record(field_id, 1.0, {"ndvi": 0.7})
+
+    store.record("farm/1", 1.0, {"ndvi": 0.7})
+    store.record("farm_1", 2.0, {"ndvi": 0.5})
+    store.record("../escape", 3.0, {"ndvi": 0.6})
+    assert [row["ndvi"] for row in store.history("farm/1")] == [0.7]
+    assert [row["ndvi"] for row in store.history("farm_1")] == [0.5]
+    assert sorted(os.listdir(tmp_path)) == ["monitoring"]
+
+
+def test_state_cache_is_bounded(tmp_path):
+    store = SpectralMonitoringStore(str(tmp_path), cache_size=2)
+    for index in range(5):
+        store.record(f"field-{index}", 1.0, {"ndvi": 0.7})
+    assert list(store.states) == ["field-3", "field-4"]
+    # An evicted field's state is reloaded from disk.
+    assert store.record("field-0", 2.0, {"ndvi": 0.7})["observation_number"] == 2
+
+
+def test_history_limit(tmp_path):
+    store = SpectralMonitoringStore(str(tmp_path))
+    for timestamp in range(1, 6):
+        store.record("f", float(timestamp), {"ndvi": 0.7})
+    assert store.history("f", limit=0) == []
+    assert store.history("f", limit=-2) == []
+    assert [row["timestamp"] for row in store.history("f", limit=2)] == [4.0, 5.0]
+
@@ -0,0 +1,59 @@
+import io
+import os
+
+import numpy as np
+
+from spectral import open_cube
+from spectral_tiles import SpectralMapService, TileCache
+
+WAVELENGTHS = [450.0, 550.0, 670.0, 720.0, 800.0]
+
+
+def save_cube(path, nir):
+    data = np.tile(np.asarray([0.04, 0.08, 0.04, 0.20, nir], dtype=np.float32), (16, 16, 1))
+    np.save(path, data)
+    return open_cube(path, WAVELENGTHS)
+
+
+def test_reregistering_identical_content_keeps_tiles(tmp_path):
+    cache = TileCache(str(tmp_path / "tiles"), 10_000_000)
+    service = SpectralMapService(cache)
+    path = str(tmp_path / "cube.npy")
+    service.register("s1", save_cube(path, 0.5), [path])
+    service.get_tile("s1", "ndvi", 0, 0, 0, "png")
+    assert len(cache.entries) == 1
+
+    # Same bytes written again (new mtime), or a fresh service after a restart.
+    service.register("s1", save_cube(path, 0.5), [path])
+    assert len(cache.entries) == 1
+    restarted = SpectralMapService(TileCache(str(tmp_path / "tiles"), 10_000_000))
+    restarted.register("s1", save_cube(path, 0.5), [path])
+    assert len(restarted.cache.entries) == 1
+
+    service.register("s1", save_cube(path, 0.9), [path])
+    assert len(cache.entries) == 0
+    assert not any(files for _, _, files in os.walk(tmp_path / "tiles"))
+
+
+def npy_bytes(nir):
+    buffer = io.BytesIO()
+    np.save(buffer, np.tile(np.asarray([0.04, 0.08, 0.04, 0.20, nir], dtype=np.float32), (16, 16, 1)))
+    return buffer.getvalue()
+
+
+def test_reupload_leaves_the_mapped_cube_intact(app_module, client):
+    app_module.agent_state.sessions["tiles-reupload"] = {}
+    form = {"session_id": "tiles-reupload", "wavelengths": ",".join(map(str, WAVELENGTHS))}
+
+    def upload(nir):
+        response = client.post("/api/spectral/cubes", data=form, files={"file": ("capture.npy", npy_bytes(nir))})
+        assert response.status_code == 200
+
+    upload(0.5)
+    mapped = app_module.spectral_maps.get_renderer("tiles-reupload").cube
+    before = np.array(mapped.read_window(0, 16, 0, 16))
+    upload(0.9)
+    # The old renderer's memory map still reads the bytes it was opened on.
+    assert np.array_equal(np.array(mapped.read_window(0, 16, 0, 16)), before)
+    assert app_module.spectral_maps.get_renderer("tiles-reupload").cube is not mapped
+    assert os.listdir(os.path.join(app_module.SPECTRAL_DATA_DIR, "tiles-reupload")) == ["cube.npy"]
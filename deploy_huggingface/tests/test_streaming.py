@@ -0,0 +1,52 @@
+import asyncio
+import threading
+
+import pytest
+
+from resilience import HALF_OPEN, CircuitBreaker, CircuitOpenError
+
+ROUTE = ("gemini", "test-model")
+
+
+@pytest.fixture
+def breaker(app_module, monkeypatch):
+    breaker = CircuitBreaker("gemini/test-model")
+    monkeypatch.setattr(app_module.model_router, "candidates", lambda task_class: [ROUTE])
+    monkeypatch.setattr(app_module.upstream_guard, "breaker", lambda name: breaker)
+    return breaker
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+def test_circuit_opening_after_the_check_reaches_the_caller(app_module, breaker, monkeypatch):
+    # Another request takes the half-open probe between `available` and `before_call`.
+    monkeypatch.setattr(CircuitBreaker, "available", property(lambda self: True))
+    breaker.state = HALF_OPEN
+    breaker.probe_in_flight = True
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(asyncio.wait_for(collect(app_module.stream_text("hello", "chat")), timeout=2))
+
+
+def test_abandoned_stream_releases_the_probe(app_module, breaker, monkeypatch):
+    released = threading.Event()
+
+    def stream_sync(prompt, model_name, backend, timeout, config, emit, stopped):
+        emit("first")
+        while not stopped():
+            released.wait(0.01)
+
+    monkeypatch.setattr(app_module, "_stream_text_sync", stream_sync)
+    breaker.state = HALF_OPEN
+    breaker.opened_at = -1e9
+
+    async def read_one():
+        stream = app_module.stream_text("hello", "chat")
+        assert await stream.__anext__() == "first"
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(read_one())
+    assert not breaker.probe_in_flight
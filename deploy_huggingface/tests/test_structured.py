@@ -0,0 +1,11 @@
+from structured import parse_json
+
+
+def test_bare_words_in_other_scripts_become_strings():
+    assert parse_json('{"crop": आलू, "season": रबी}') == ({"crop": "आलू", "season": "रबी"}, True)
+    assert parse_json("{फसल: 'टमाटर', irrigated: True}") == ({"फसल": "टमाटर", "irrigated": True}, True)
+
+
+def test_truncated_output_keeps_the_complete_values():
+    # A string cut off mid-way may be a half-written word, so it is dropped.
+    assert parse_json('```json\n{"items": ["onion", "pot') == ({"items": ["onion"]}, True)
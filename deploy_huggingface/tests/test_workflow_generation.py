@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+COMPLETE = '{"workflow": [{"action": "navigate", "target": "/market"}, {"action": "speak", "message": "Here"}]}'
+TRUNCATED = '{"workflow": [{"action": "navigate", "target": "/market"}, {"action": "speak", "message": "He'
+
+
+def payload(user_prompt):
+    return {"system_prompt": "plan", "user_prompt": user_prompt, "ui_schema": {"pages": ["market"]}}
+
+
+@pytest.fixture
+def model_output(app_module, monkeypatch):
+    output = {}
+
+    async def generate_text(*args, **kwargs):
+        return output["text"]
+
+    async def stream_text(*args, **kwargs):
+        text = output["text"]
+        for start in range(0, len(text), 16):
+            yield text[start:start + 16]
+
+    monkeypatch.setattr(app_module, "generate_text", generate_text)
+    monkeypatch.setattr(app_module, "stream_text", stream_text)
+    return output
+
+
+@pytest.mark.parametrize("text, cached", [(COMPLETE, True), (TRUNCATED, False)])
+def test_only_complete_workflows_are_cached(client, model_output, text, cached):
+    model_output["text"] = text
+    body = payload(f"open the market ({cached})")
+    first = client.post("/api/agent/generate-workflow", json=body)
+    assert first.status_code == 200 and first.json()["workflow"]
+    second = client.post("/api/agent/generate-workflow", json=body)
+    assert second.headers["X-Workflow-Cache"] == ("hit" if cached else "miss")
+
+
+@pytest.mark.parametrize("text, cached", [(COMPLETE, True), (TRUNCATED, False)])
+def test_only_complete_streamed_workflows_are_cached(client, model_output, text, cached):
+    model_output["text"] = text
+    body = payload(f"stream the market ({cached})")
+    events = client.post("/api/agent/generate-workflow/stream", json=body).text
+    done = json.loads(events.split("event: done\ndata: ")[1].split("\n")[0])
+    assert done["workflow"] and done["cached"] is False
+    again = client.post("/api/agent/generate-workflow/stream", json=body).text
+    assert ('"cached": true' in again) is cached
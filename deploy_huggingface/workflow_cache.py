@@ -0,0 +1,78 @@
+"""Cache of generated UI workflows.
+
+Entries are keyed by a hash of (system prompt, normalized user prompt, language,
+UI schema version). A request carrying a new schema version drops every entry
+built against an older one, since their targets and selectors may no longer exist.
+"""
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from singleflight import make_key, normalize_prompt
+
+
+def schema_version(ui_schema: Any, declared: Optional[str] = None) -> str:
+    """The schema's declared version, else a hash of its canonical JSON."""
+    if declared:
+        return str(declared)
+    return make_key(json.dumps(ui_schema, sort_keys=True, separators=(",", ":")))[:16]
+
+
+class WorkflowCache:
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.current_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def key(self, system_prompt: str, user_prompt: str, language: str, version: str) -> str:
+        return make_key(system_prompt or "", normalize_prompt(user_prompt or "").casefold(), language or "", version)
+
+    def observe_version(self, version: str):
+        """Drop entries built against other schema versions when a new version shows up."""
+        if version == self.current_version:
+            return
+        if self.current_version is not None:
+            stale = [key for key, (_, _, entry_version) in self.entries.items() if entry_version != version]
+            for key in stale:
+                del self.entries[key]
+            self.invalidations += len(stale)
+        self.current_version = version
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(key)
+        if entry is None or entry[1] < time.time():
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: str, workflow: Dict[str, Any], version: str):
+        self.entries[key] = (workflow, time.time() + self.ttl_seconds, version)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> int:
+        count = len(self.entries)
+        self.entries.clear()
+        self.invalidations += count
+        return count
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "schema_version": self.current_version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }